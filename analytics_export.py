@@ -0,0 +1,349 @@
+# analytics_export.py
+"""
+Typed, columnar exports for analytics: items, transactions, transaction_items,
+sales and logs as Parquet (when pyarrow is installed) or .npz files.
+
+    python analytics_export.py                         # everything new since the last run, into analytics/
+    python analytics_export.py --tables transactions transaction_items --format npz
+    python analytics_export.py --full                  # ignore the watermarks, export everything again
+
+Each table is read in row groups of ROW_GROUP_ROWS rows (a keyset range on id per
+group, so no read lock is held between groups) and each group is written out
+before the next is read. Memory stays flat however large the table is.
+
+Incremental exports: analytics/manifest.json keeps, per table, the highest id
+already exported (the watermark) and the files written. A run first reads
+MAX(id) of every table, then exports the rows in (watermark, max]. transactions,
+transaction_items, sales and logs are append-only, so a file never changes once
+written and all tables of a run stop at the same moment. items is mutable (its
+quantity changes with every sale), so every run replaces items/items.<ext> with
+a full copy. --full re-exports append-only tables as one file each and deletes
+their earlier files, so no row is in two files. Logs moved to the archive (log_retention.py) before they were
+exported are not in any file.
+
+Other files go to <dest>/<table>/<table>_<first id>_<last id>.<ext>. All are renamed
+into place when complete. Column types: integers are int64, prices float64, text
+UTF-8, and timestamps are seconds since the epoch (UTC), i.e. Parquet
+timestamp[s] / NumPy datetime64[s]. NULLs are Parquet nulls. In .npz they are
+flagged in a "<column>.null" boolean array.
+
+The .npz files are written with the standard library (a .npy member is a short
+header followed by raw little-endian values), so the fallback needs no optional
+library. Reading them needs NumPy:
+
+    z = np.load("analytics/sales/sales_0000000001_0000127189.npz")
+    z["qty_sold"], z["timestamp"]                      # int64, datetime64[s]
+    off, blob = z["user.offsets"], z["user.utf8"]      # text: row i is blob[off[i]:off[i+1]]
+"""
+import os
+import sys
+import json
+import time
+import array
+import shutil
+import struct
+import zipfile
+import sqlite3
+import tempfile
+from datetime import datetime
+from itertools import accumulate
+
+from export_jobs import atomic_path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except Exception:
+    HAS_PYARROW = False
+
+DB_FILE = "inventory.db"
+ANALYTICS_DIR = "analytics"
+ROW_GROUP_ROWS = 65536
+MANIFEST = "manifest.json"
+COMPRESS_LEVEL = 3       # zlib level of the .npz members (6 is ~10% smaller, twice as slow)
+
+# table -> (columns as (name, kind), append-only); the first column is the id watermarks are kept on
+# kinds: int (int64), float (float64), str (UTF-8), ts (seconds since the epoch, UTC)
+TABLES = {
+    "items": ([("id", "int"), ("name", "str"), ("category", "str"), ("barcode", "str"), ("quantity", "int"),
+               ("supplier", "str"), ("purchase_price", "float"), ("sale_price", "float"), ("location", "str"),
+               ("created_at", "ts")], False),
+    "transactions": ([("id", "int"), ("timestamp", "ts"), ("user", "str"), ("type", "str"), ("customer", "str"),
+                      ("total_amount", "float"), ("notes", "str"), ("location_id", "int")], True),
+    "transaction_items": ([("id", "int"), ("transaction_id", "int"), ("item_id", "int"), ("barcode", "str"),
+                           ("item_name", "str"), ("quantity_changed", "int"), ("quantity_before", "int"),
+                           ("quantity_after", "int"), ("unit_price", "float"), ("location_id", "int")], True),
+    "sales": ([("id", "int"), ("timestamp", "ts"), ("user", "str"), ("item_id", "int"), ("qty_sold", "int")], True),
+    "logs": ([("id", "int"), ("timestamp", "ts"), ("user", "str"), ("action", "str"), ("item_id", "int"),
+              ("quantity", "int"), ("location", "str")], True),
+}
+
+def _select(table):
+    exprs = []
+    for name, kind in TABLES[table][0]:
+        col = f'"{name}"'
+        exprs.append(f"CAST(strftime('%s', {col}) AS INTEGER)" if kind == "ts" else col)
+    return f"SELECT {', '.join(exprs)} FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+
+def read_groups(conn, table, after_id, upto_id, rows=ROW_GROUP_ROWS):
+    """Row groups (lists of tuples) of `table` with after_id < id <= upto_id, in id order."""
+    sql = _select(table)
+    while True:
+        group = conn.execute(sql, (after_id, upto_id, rows)).fetchall()
+        if not group:
+            return
+        yield group
+        if len(group) < rows:
+            return
+        after_id = group[-1][0]
+
+# ------------------------
+# Parquet
+# ------------------------
+def _arrow_schema(columns):
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "ts": pa.timestamp("s", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+def write_parquet(groups, path, columns):
+    """Write row groups to a Parquet file (one Parquet row group each). Returns the row count."""
+    schema = _arrow_schema(columns)
+    n = 0
+    with atomic_path(path) as tmp:
+        writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+        try:
+            for group in groups:
+                arrays = []
+                for (name, kind), values in zip(columns, zip(*group)):
+                    if kind == "ts":
+                        arrays.append(pa.array(values, type=pa.int64()).cast(schema.field(name).type))
+                    else:
+                        arrays.append(pa.array(values, type=schema.field(name).type))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=len(group))
+                n += len(group)
+        finally:
+            writer.close()
+    return n
+
+# ------------------------
+# .npz (standard library)
+# ------------------------
+NAT = -(2 ** 63)          # NumPy's NaT for datetime64
+_DESCR = {"int": "<i8", "float": "<f8", "ts": "<M8[s]"}
+
+def npy_header(descr, shape):
+    """Header of a version 1.0 .npy file; the data that follows starts on a 64-byte boundary."""
+    d = "{'descr': '%s', 'fortran_order': False, 'shape': %r, }" % (descr, tuple(shape))
+    pad = -(10 + len(d) + 1) % 64
+    header = (d + " " * pad + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header
+
+def _le(arr):
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+class _NpzColumn:
+    # spools one column to temporary files while the groups stream past
+    def __init__(self, folder, name, kind):
+        self.name, self.kind = name, kind
+        self.data = open(os.path.join(folder, f"{name}.data"), "wb+")
+        self.nulls = open(os.path.join(folder, f"{name}.null"), "wb+")
+        self.has_null = False
+        self.rows = 0
+        if kind == "str":
+            self.offsets = open(os.path.join(folder, f"{name}.offsets"), "wb+")
+            self.offsets.write(_le(array.array("q", [0])))
+            self.end = 0
+
+    def append(self, values):
+        # values: one group's column (a tuple); the common no-NULL case skips the per-value checks
+        nulls = values.count(None)
+        if nulls:
+            self.has_null = True
+            self.nulls.write(bytes(v is None for v in values))
+        else:
+            self.nulls.write(bytes(len(values)))
+        self.rows += len(values)
+        if self.kind == "str":
+            encoded = [b"" if v is None else str(v).encode("utf-8") for v in values]
+            offsets = array.array("q", accumulate(map(len, encoded), initial=self.end))
+            self.end = offsets[-1]
+            self.data.write(b"".join(encoded))
+            self.offsets.write(_le(offsets[1:]))
+        elif self.kind == "float":
+            if nulls:
+                values = [float("nan") if v is None else v for v in values]
+            self.data.write(_le(array.array("d", values)))
+        else:
+            if nulls:
+                missing = NAT if self.kind == "ts" else 0
+                values = [missing if v is None else v for v in values]
+            self.data.write(_le(array.array("q", values)))
+
+    def members(self):
+        # (member name, .npy header, spool file) of everything this column stores
+        if self.kind == "str":
+            out = [(f"{self.name}.offsets.npy", npy_header("<i8", (self.rows + 1,)), self.offsets),
+                   (f"{self.name}.utf8.npy", npy_header("|u1", (self.end,)), self.data)]
+        else:
+            out = [(f"{self.name}.npy", npy_header(_DESCR[self.kind], (self.rows,)), self.data)]
+        if self.has_null:
+            out.append((f"{self.name}.null.npy", npy_header("|b1", (self.rows,)), self.nulls))
+        return out
+
+    def close(self):
+        for f in (self.data, self.nulls, getattr(self, "offsets", None)):
+            if f:
+                f.close()
+
+def write_npz(groups, path, columns, meta=None):
+    """Write row groups to a compressed .npz (one .npy member per column). Returns the row count."""
+    folder = tempfile.mkdtemp(prefix=".npz_", dir=os.path.dirname(os.path.abspath(path)))
+    cols = [_NpzColumn(folder, name, kind) for name, kind in columns]
+    n = 0
+    try:
+        for group in groups:
+            for col, values in zip(cols, zip(*group)):
+                col.append(values)
+            n += len(group)
+        with atomic_path(path) as tmp:
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=COMPRESS_LEVEL) as zf:
+                for col in cols:
+                    for member, header, spool in col.members():
+                        spool.flush()
+                        spool.seek(0)
+                        with zf.open(member, "w", force_zip64=True) as out:
+                            out.write(header)
+                            shutil.copyfileobj(spool, out, 1024 * 1024)
+                schema = {"columns": [{"name": name, "kind": kind} for name, kind in columns], "rows": n}
+                schema.update(meta or {})
+                zf.writestr("schema.json", json.dumps(schema, indent=1))
+    finally:
+        for col in cols:
+            col.close()
+        shutil.rmtree(folder, ignore_errors=True)
+    return n
+
+# ------------------------
+# Runs
+# ------------------------
+def load_manifest(dest_dir):
+    path = os.path.join(dest_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(dest_dir, manifest):
+    path = os.path.join(dest_dir, MANIFEST)
+    with atomic_path(path) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+def remove_files(dest_dir, entries, keep=None):
+    """Delete the files of manifest `entries` (already dropped from the manifest), except `keep`."""
+    for e in entries:
+        path = os.path.join(dest_dir, e["file"])
+        if keep is None or os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def pick_format(fmt="auto"):
+    if fmt == "auto":
+        return "parquet" if HAS_PYARROW else "npz"
+    if fmt == "parquet" and not HAS_PYARROW:
+        raise RuntimeError("pyarrow is not installed. Run: pip install pyarrow (or use --format npz)")
+    if fmt not in ("parquet", "npz"):
+        raise ValueError("format must be auto, parquet or npz")
+    return fmt
+
+def export_tables(db_file=DB_FILE, dest_dir=ANALYTICS_DIR, tables=None, fmt="auto", full=False,
+                  rows=ROW_GROUP_ROWS):
+    """
+    Export the rows of `tables` (default: all of TABLES) added since the last run.
+    Returns {"format", "seconds", "tables": [{table, file, from_id, to_id, rows, bytes, seconds}]}
+    (file is None when a table had nothing new). The manifest is updated after each file.
+    """
+    start = time.perf_counter()
+    fmt = pick_format(fmt)
+    tables = list(tables or TABLES)
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        raise ValueError(f"unknown table(s) {unknown}; choose from {list(TABLES)}")
+    os.makedirs(dest_dir, exist_ok=True)
+    manifest = load_manifest(dest_dir)
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        # one cut for every table: ids up to these were committed when the run started
+        conn.execute("BEGIN")
+        upto = {t: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {t}").fetchone()[0] for t in tables}
+        conn.execute("COMMIT")
+        results = []
+        for table in tables:
+            t0 = time.perf_counter()
+            columns, append_only = TABLES[table]
+            entry = manifest["tables"].setdefault(table, {"watermark": 0, "files": []})
+            after = entry["watermark"] if append_only and not full else 0
+            result = {"table": table, "file": None, "from_id": after + 1, "to_id": upto[table],
+                      "rows": 0, "bytes": 0, "seconds": 0.0}
+            results.append(result)
+            if upto[table] <= after:
+                continue
+            folder = os.path.join(dest_dir, table)
+            os.makedirs(folder, exist_ok=True)
+            name = f"{table}_{after + 1:010d}_{upto[table]:010d}" if append_only else table
+            path = os.path.join(folder, f"{name}.{fmt}")
+            groups = read_groups(conn, table, after, upto[table], rows)
+            if fmt == "parquet":
+                n = write_parquet(groups, path, columns)
+            else:
+                n = write_npz(groups, path, columns, {"table": table, "from_id": after + 1, "to_id": upto[table]})
+            result.update(file=path, rows=n, bytes=os.path.getsize(path), seconds=round(time.perf_counter() - t0, 3))
+            if append_only:
+                entry["watermark"] = upto[table]
+            stale = []
+            if full or not append_only:
+                # the new file holds every row: earlier files would count them twice
+                stale, entry["files"] = entry["files"], []
+            entry["files"].append({"file": os.path.relpath(path, dest_dir), "from_id": after + 1,
+                                   "to_id": upto[table], "rows": n, "format": fmt,
+                                   "exported_at": datetime.now().isoformat(timespec="seconds")})
+            save_manifest(dest_dir, manifest)
+            remove_files(dest_dir, stale, keep=path)
+    finally:
+        conn.close()
+    return {"format": fmt, "seconds": round(time.perf_counter() - start, 3), "tables": results}
+
+def print_export_stats(stats):
+    for r in stats["tables"]:
+        if r["file"] is None:
+            print(f"   {r['table']}: nothing new (up to id {r['to_id']})")
+        else:
+            print(f"✅ {r['table']}: {os.path.abspath(r['file'])} "
+                  f"({r['rows']} rows, {r['bytes'] / 1024:.1f} KB, {r['seconds']:.3f}s)")
+    print(f"   {stats['format']}, took {stats['seconds']:.3f}s")
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Columnar (Parquet / .npz) exports for analytics")
+    p.add_argument("--db", default=DB_FILE)
+    p.add_argument("--dest", default=ANALYTICS_DIR)
+    p.add_argument("--tables", nargs="+", choices=list(TABLES), default=None)
+    p.add_argument("--format", choices=("auto", "parquet", "npz"), default="auto",
+                   help="auto: Parquet when pyarrow is installed, otherwise .npz")
+    p.add_argument("--full", action="store_true", help="export everything again, ignoring the watermarks")
+    p.add_argument("--row-group", type=int, default=ROW_GROUP_ROWS, help="rows read and written per group")
+    args = p.parse_args(argv)
+    try:
+        stats = export_tables(args.db, args.dest, args.tables, args.format, args.full, max(1, args.row_group))
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    print_export_stats(stats)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
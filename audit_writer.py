@@ -0,0 +1,26 @@
+# audit_writer.py
+"""
+Audit log rows (the `logs` table).
+
+Every row is written with the cursor of the change it describes, inside the
+caller's transaction: it commits or rolls back atomically with that change and
+costs no commit (and no fsync) of its own. The old log_action() opened a
+connection and committed once per row, doubling the write latency of every
+operation.
+
+There is no buffer, flush or exit hook: a row is exactly as durable as the
+transaction it was written in. (A write-behind buffer would only help rows
+logged outside a transaction, and every audit row describes a change made in
+one; buffering those would flush rows for changes that were later rolled back.)
+"""
+from datetime import datetime, timezone
+
+INSERT_LOG_SQL = "INSERT INTO logs (timestamp, user, action, item_id, quantity, location) VALUES (?, ?, ?, ?, ?, ?)"
+
+def _utc_now():
+    # same text format as CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def write_log(c, user, action, item_id, quantity, location):
+    """Write one audit row with the caller's cursor; it is committed with the caller's change."""
+    c.execute(INSERT_LOG_SQL, (_utc_now(), user, action, item_id, quantity, location or "N/A"))
@@ -0,0 +1,217 @@
+# backup_tool.py
+"""
+Online snapshots of inventory.db using the sqlite3 backup API.
+
+By default the whole database is copied in a single backup step, i.e. one
+consistent read. The backup API restarts a stepped copy from page 0 whenever
+another connection commits, so on a busy database a stepped backup may never
+finish; one step cannot be restarted. Writers only wait for that one read (on a
+WAL database they don't wait at all). --pages N still copies N pages per step
+for very large files, but after MAX_RESTARTS restarts it falls back to a single
+step. Snapshots are optionally gzip-compressed, rotated, and verified with
+PRAGMA integrity_check.
+
+Usage:
+    python backup_tool.py                       # backup inventory.db into backups/
+    python backup_tool.py --keep 14 --no-compress
+    python backup_tool.py --verify backups/inventory_20250815_223654.db.gz
+"""
+import os
+import sys
+import glob
+import gzip
+import time
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+DB_FILE = "inventory.db"
+BACKUP_DIR = "backups"
+DEFAULT_PAGES_PER_STEP = -1  # -1 = everything in one step
+DEFAULT_STEP_SLEEP_MS = 5
+MAX_RESTARTS = 3
+DEFAULT_KEEP = 7
+
+def _snapshot_prefix(db_file):
+    return os.path.splitext(os.path.basename(db_file))[0] + "_"
+
+def list_snapshots(db_file=DB_FILE, dest_dir=BACKUP_DIR):
+    """Snapshot paths for db_file, newest first."""
+    pattern = os.path.join(dest_dir, _snapshot_prefix(db_file) + "*.db*")
+    return sorted(glob.glob(pattern), key=lambda p: (os.path.getmtime(p), p), reverse=True)
+
+def rotate_snapshots(db_file=DB_FILE, dest_dir=BACKUP_DIR, keep=DEFAULT_KEEP):
+    """Delete all but the newest `keep` snapshots. Returns the deleted paths."""
+    removed = []
+    for path in list_snapshots(db_file, dest_dir)[keep:]:
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+def verify_snapshot(path):
+    """Run PRAGMA integrity_check on a snapshot (.db or .db.gz). Returns (ok, message)."""
+    tmp = None
+    try:
+        if path.endswith(".gz"):
+            fd, tmp = tempfile.mkstemp(suffix=".db")
+            with os.fdopen(fd, "wb") as out, gzip.open(path, "rb") as src:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            check_path = tmp
+        else:
+            check_path = path
+        conn = sqlite3.connect(f"file:{check_path}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table'").fetchone()[0]
+        finally:
+            conn.close()
+        return result == "ok", f"integrity_check={result}, tables={tables}"
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+
+class _BackupRestarted(Exception):
+    pass
+
+def _copy(src, dst_path, pages, step_sleep_ms):
+    """Back src up into dst_path. Returns (steps, restarts, page_count, page_size)."""
+    state = {"steps": 0, "restarts": 0, "remaining": None}
+    def progress(status, remaining, total):
+        state["steps"] += 1
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            # another connection committed and the copy started over
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _BackupRestarted()
+        state["remaining"] = remaining
+        # give writers a chance between steps; they only wait for the current step
+        if remaining and step_sleep_ms:
+            time.sleep(step_sleep_ms / 1000.0)
+
+    dst = sqlite3.connect(dst_path)
+    try:
+        if pages and pages > 0:
+            try:
+                src.backup(dst, pages=pages, progress=progress)
+            except _BackupRestarted:
+                state["steps"] += 1
+                src.backup(dst, pages=-1)
+        else:
+            state["steps"] = 1
+            src.backup(dst, pages=-1)
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dst.close()
+    return state["steps"], state["restarts"], page_count, page_size
+
+def backup_database(db_file=DB_FILE, dest_dir=BACKUP_DIR, pages=DEFAULT_PAGES_PER_STEP,
+                    step_sleep_ms=DEFAULT_STEP_SLEEP_MS, compress=True, keep=DEFAULT_KEEP, verify=True):
+    """
+    Take a snapshot of db_file into dest_dir. Returns a stats dict:
+    path, bytes, pages, steps, restarts, seconds, mb_per_s, verified,
+    verify_message, rotated.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ext = ".db.gz" if compress else ".db"
+    final_path = os.path.join(dest_dir, f"{_snapshot_prefix(db_file)}{stamp}{ext}")
+    n = 1
+    while os.path.exists(final_path):
+        final_path = os.path.join(dest_dir, f"{_snapshot_prefix(db_file)}{stamp}_{n}{ext}")
+        n += 1
+    tmp_db = os.path.join(dest_dir, f".{_snapshot_prefix(db_file)}{stamp}.db.partial")
+
+    start = time.perf_counter()
+    src = sqlite3.connect(db_file, timeout=30)
+    try:
+        steps, restarts, page_count, page_size = _copy(src, tmp_db, pages, step_sleep_ms)
+    except Exception:
+        if os.path.exists(tmp_db):
+            os.remove(tmp_db)
+        raise
+    finally:
+        src.close()
+    copy_seconds = time.perf_counter() - start
+
+    try:
+        if compress:
+            tmp_gz = tmp_db + ".gz"
+            with open(tmp_db, "rb") as f_in, gzip.open(tmp_gz, "wb", compresslevel=6) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            os.remove(tmp_db)
+            os.replace(tmp_gz, final_path)
+        else:
+            os.replace(tmp_db, final_path)
+    except Exception:
+        for p in (tmp_db, tmp_db + ".gz"):
+            if os.path.exists(p):
+                os.remove(p)
+        raise
+    seconds = time.perf_counter() - start
+
+    db_bytes = page_count * page_size
+    stats = {
+        "path": final_path,
+        "bytes": db_bytes,
+        "stored_bytes": os.path.getsize(final_path),
+        "pages": page_count,
+        "steps": steps,
+        "restarts": restarts,
+        "copy_seconds": round(copy_seconds, 3),
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(db_bytes / (1024 * 1024) / seconds, 2) if seconds > 0 else None,
+        "verified": None,
+        "verify_message": "",
+        "rotated": [],
+    }
+    if verify:
+        stats["verified"], stats["verify_message"] = verify_snapshot(final_path)
+        if not stats["verified"]:
+            # never let a bad snapshot push a good one out of rotation
+            return stats
+    if keep:
+        stats["rotated"] = rotate_snapshots(db_file, dest_dir, keep)
+    return stats
+
+def print_backup_stats(stats):
+    print(f"✅ Backup written: {os.path.abspath(stats['path'])}")
+    print(f"   {stats['pages']} pages ({stats['bytes'] / (1024 * 1024):.2f} MB) in {stats['steps']} steps, "
+          f"stored {stats['stored_bytes'] / (1024 * 1024):.2f} MB")
+    if stats["restarts"]:
+        print(f"   restarted {stats['restarts']} time(s) by concurrent writes")
+    print(f"   took {stats['seconds']:.3f}s (copy {stats['copy_seconds']:.3f}s), throughput {stats['mb_per_s']} MB/s")
+    if stats["verified"] is True:
+        print(f"   verify: OK ({stats['verify_message']})")
+    elif stats["verified"] is False:
+        print(f"❌ verify FAILED: {stats['verify_message']}")
+    for path in stats["rotated"]:
+        print(f"   rotated out: {path}")
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Online backup of the inventory database")
+    p.add_argument("--db", default=DB_FILE)
+    p.add_argument("--dest", default=BACKUP_DIR)
+    p.add_argument("--pages", type=int, default=DEFAULT_PAGES_PER_STEP, help="pages copied per step (-1 = one step)")
+    p.add_argument("--sleep-ms", type=int, default=DEFAULT_STEP_SLEEP_MS, help="pause between steps")
+    p.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="snapshots to keep (0 = keep all)")
+    p.add_argument("--no-compress", action="store_true")
+    p.add_argument("--no-verify", action="store_true")
+    p.add_argument("--verify", metavar="SNAPSHOT", help="only verify an existing snapshot")
+    args = p.parse_args(argv)
+
+    if args.verify:
+        ok, msg = verify_snapshot(args.verify)
+        print(("✅ " if ok else "❌ ") + f"{args.verify}: {msg}")
+        return 0 if ok else 1
+    stats = backup_database(args.db, args.dest, args.pages, args.sleep_ms,
+                            compress=not args.no_compress, keep=args.keep, verify=not args.no_verify)
+    print_backup_stats(stats)
+    return 0 if stats["verified"] is not False else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+# benchmark.py
+"""
+Reproducible synthetic-load benchmarks.
+
+Generates a seeded synthetic database (items, years of transactions, sales and
+audit logs), then times the core operations through the same code paths the
+CLI and GUI use: barcode lookup, sale, multi-item transaction, inventory
+listing, CSV/Excel/PDF export, a multi-format export job and scan ingestion
+through ScanHandler.
+Results are written as JSON so runs from different releases can be compared.
+
+Usage:
+    python benchmark.py                                  # default dataset, JSON to stdout
+    python benchmark.py --items 50000 --years 3 --tx-per-day 200 -o bench_v2.json
+    python benchmark.py --compare bench_v1.json -o bench_v2.json
+    python benchmark.py --db bench.db --reuse           # skip generation, reuse a dataset
+    python benchmark.py --streaming-check 5000000       # peak RSS listing 500k vs 5M rows must stay flat
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import platform
+import statistics
+import tempfile
+import threading
+import contextlib
+import urllib.request
+from datetime import datetime, timedelta
+
+import inventory_cli
+import export_jobs
+import replenishment
+import query_stats
+from migrations import ensure_schema
+from scan_server import create_scan_server, scan_queue
+from scan_journal import ScanJournal
+
+BENCH_DB = "benchmark.db"
+DEFAULT_ITEMS = 5000
+DEFAULT_YEARS = 2
+DEFAULT_TX_PER_DAY = 50
+DEFAULT_LOGS = 100000
+DEFAULT_SEED = 42
+DEFAULT_REPEAT = 200
+END_DAY = datetime(2025, 8, 1)   # last day of history (fixed, so reruns are identical)
+
+CATEGORIES = ["Electronics", "Accessories", "Cables", "Peripherals", "Storage", "Networking",
+              "Audio", "Office", "Furniture", "Cleaning", "Tools", "Lighting"]
+SUPPLIERS = ["Logitech", "Dell", "HP", "Lenovo", "Samsung", "Sony", "Anker", "Belkin",
+             "TP-Link", "Kingston", "SanDisk", "Philips", "3M", "Bosch", "Generic Co"]
+LOCATIONS = ["Store A", "Store B", "Store C", "Warehouse 1", "Warehouse 2"]
+NAME_WORDS = ["Wireless", "USB", "Mouse", "Keyboard", "Cable", "Charger", "Adapter", "Monitor",
+              "Stand", "Hub", "Drive", "Speaker", "Headset", "Lamp", "Router", "Switch",
+              "Pro", "Mini", "Max", "Compact", "Ergonomic", "Portable", "HD", "Dual"]
+TX_TYPE_WEIGHTS = [("sale", 70), ("restock", 15), ("purchase", 5), ("return", 5),
+                   ("adjustment", 3), ("damage", 2)]
+USERS = ["admin", "cashier1", "cashier2", "stock1"]
+
+def barcode_for(i):
+    return f"9{i:011d}"
+
+# ------------------------
+# Dataset generation
+# ------------------------
+def generate_dataset(db_file=BENCH_DB, items=DEFAULT_ITEMS, years=DEFAULT_YEARS,
+                     tx_per_day=DEFAULT_TX_PER_DAY, logs=DEFAULT_LOGS, seed=DEFAULT_SEED):
+    """
+    (Re)create db_file with a seeded synthetic dataset. The same arguments always
+    produce the same rows. Returns a dict of row counts and generation time.
+    """
+    rng = random.Random(seed)
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_file)
+    ensure_schema(conn)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    c = conn.cursor()
+    end_day = END_DAY
+    first_day = end_day - timedelta(days=int(365 * years))
+
+    item_rows = []
+    prices = []
+    for i in range(1, items + 1):
+        cost = round(rng.uniform(1, 400), 2)
+        sale = round(cost * rng.uniform(1.1, 1.8), 2)
+        prices.append(sale)
+        name = " ".join(rng.sample(NAME_WORDS, 3)) + f" {i}"
+        item_rows.append((i, name, rng.choice(CATEGORIES), barcode_for(i), rng.randint(500, 5000),
+                          rng.choice(SUPPLIERS), cost, sale, rng.choice(LOCATIONS),
+                          (first_day - timedelta(days=rng.randint(0, 365))).strftime("%Y-%m-%d %H:%M:%S")))
+    c.executemany("""INSERT INTO items (id, name, category, barcode, quantity, supplier, purchase_price,
+                     sale_price, location, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", item_rows)
+    names = {r[0]: r[1] for r in item_rows}
+    del item_rows
+
+    types = [t for t, _w in TX_TYPE_WEIGHTS]
+    weights = [w for _t, w in TX_TYPE_WEIGHTS]
+    tx_count = line_count = sale_count = 0
+    tx_id = 0
+    day = first_day
+    while day < end_day:
+        tx_rows, line_rows, sale_rows = [], [], []
+        for _ in range(tx_per_day):
+            tx_id += 1
+            ttype = rng.choices(types, weights)[0]
+            user = rng.choice(USERS)
+            ts = (day + timedelta(seconds=rng.randint(8 * 3600, 20 * 3600))).strftime("%Y-%m-%d %H:%M:%S")
+            total = 0.0
+            for _line in range(rng.randint(1, 4)):
+                item_id = rng.randint(1, items)
+                q = rng.randint(1, 5)
+                changed = -q if ttype in ("sale", "damage") else q
+                price = prices[item_id - 1]
+                before = rng.randint(q, 5000)
+                line_rows.append((tx_id, item_id, barcode_for(item_id), names[item_id], changed,
+                                  before, before + changed, price))
+                total += q * price
+                if ttype == "sale":
+                    sale_rows.append((ts, user, item_id, q, tx_id))
+            tx_rows.append((tx_id, ts, user, ttype, "", round(total, 2), "synthetic"))
+        c.executemany("INSERT INTO transactions (id, timestamp, user, type, customer, total_amount, notes) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?)", tx_rows)
+        c.executemany("INSERT INTO transaction_items (transaction_id, item_id, barcode, item_name, quantity_changed, "
+                      "quantity_before, quantity_after, unit_price) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", line_rows)
+        c.executemany("INSERT INTO sales (timestamp, user, item_id, qty_sold, transaction_id) VALUES (?, ?, ?, ?, ?)",
+                      sale_rows)
+        tx_count += len(tx_rows)
+        line_count += len(line_rows)
+        sale_count += len(sale_rows)
+        day += timedelta(days=1)
+
+    span = int((end_day - first_day).total_seconds())
+    actions = ["sell", "add", "update", "transaction:sale", "transaction:restock"]
+    for chunk_start in range(0, logs, 10000):
+        log_rows = []
+        for _ in range(min(10000, logs - chunk_start)):
+            ts = (first_day + timedelta(seconds=rng.randint(0, span))).strftime("%Y-%m-%d %H:%M:%S")
+            log_rows.append((ts, rng.choice(USERS), rng.choice(actions), rng.randint(1, items),
+                             rng.randint(1, 20), rng.choice(LOCATIONS)))
+        c.executemany("INSERT INTO logs (timestamp, user, action, item_id, quantity, location) "
+                      "VALUES (?, ?, ?, ?, ?, ?)", log_rows)
+    conn.commit()
+    c.execute("ANALYZE")
+    conn.close()
+    return {"items": items, "transactions": tx_count, "transaction_items": line_count,
+            "sales": sale_count, "logs": logs, "seconds": round(time.perf_counter() - start, 3),
+            "db_bytes": os.path.getsize(db_file)}
+
+def dataset_counts(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("items", "transactions", "transaction_items", "sales", "logs")}
+    finally:
+        conn.close()
+
+# ------------------------
+# Timing helpers
+# ------------------------
+def summarize(samples_ms):
+    s = sorted(samples_ms)
+    n = len(s)
+    total = sum(s)
+    return {
+        "n": n,
+        "median_ms": round(statistics.median(s), 4),
+        "p95_ms": round(s[min(n - 1, int(n * 0.95))], 4),
+        "min_ms": round(s[0], 4),
+        "max_ms": round(s[-1], 4),
+        "mean_ms": round(total / n, 4),
+        "ops_per_s": round(n / (total / 1000.0), 1) if total > 0 else None,
+    }
+
+def time_calls(fn, repeat, warmup=3):
+    """Call fn(i) warmup + repeat times; returns the per-call milliseconds of the timed calls."""
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):  # the front-end helpers print status lines
+        for i in range(warmup):
+            fn(i)
+        for i in range(repeat):
+            t0 = time.perf_counter()
+            fn(warmup + i)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+# ------------------------
+# Benchmarks
+# ------------------------
+def bench_barcode_lookup(ctx, repeat):
+    conn = inventory_cli.connect_db()
+    c = conn.cursor()
+    rng = random.Random(ctx["seed"])
+    barcodes = [barcode_for(rng.randint(1, ctx["items"])) for _ in range(repeat + 3)]
+    try:
+        return time_calls(lambda i: inventory_cli._find_item(c, barcodes[i]), repeat)
+    finally:
+        conn.close()
+
+def bench_sale(ctx, repeat):
+    rng = random.Random(ctx["seed"] + 1)
+    barcodes = [barcode_for(rng.randint(1, ctx["items"])) for _ in range(repeat + 3)]
+    return time_calls(lambda i: inventory_cli.sell(barcodes[i], 1), repeat)
+
+def bench_transaction(ctx, repeat, lines=5):
+    rng = random.Random(ctx["seed"] + 2)
+    baskets = [[{"barcode": barcode_for(rng.randint(1, ctx["items"])), "qty": 1} for _ in range(lines)]
+               for _ in range(repeat + 3)]
+    def run(i):
+        conn = inventory_cli.connect_db()
+        c = conn.cursor()
+        try:
+            inventory_cli.transaction_op(c, "sale", baskets[i], user="bench", notes="benchmark")
+            conn.commit()
+        finally:
+            conn.close()
+    return time_calls(run, repeat)
+
+def bench_listing(ctx, repeat):
+    return time_calls(lambda i: sum(1 for _ in inventory_cli.iter_items()), repeat)
+
+def bench_export(kind, ctx, repeat):
+    fn = {"csv": inventory_cli.export_transactions_csv,
+          "excel": inventory_cli.export_inventory_to_excel,
+          "pdf": inventory_cli.export_inventory_to_pdf}[kind]
+    ext = {"csv": "csv", "excel": "xlsx", "pdf": "pdf"}[kind]
+    out = os.path.join(ctx["tmp_dir"], f"export.{ext}")
+    return time_calls(lambda i: fn(out), repeat, warmup=1)
+
+def bench_export_jobs(ctx, repeat):
+    """The CSV formats (no optional libraries needed) from one snapshot, one worker process each."""
+    out = os.path.join(ctx["tmp_dir"], "exports")
+    formats = ["inventory-csv", "transactions-csv", "logs-csv"]
+    return time_calls(lambda i: export_jobs.run_exports(formats, out, inventory_cli.DB_FILE, keep=1),
+                      repeat, warmup=1)
+
+def bench_scan_ingest(ctx, repeat):
+    """POST /scan to a live ScanHandler and wait for the code to reach scan_queue (journaled)."""
+    journal = ScanJournal(os.path.join(ctx["tmp_dir"], "scan_journal.db"), scan_queue)
+    httpd = create_scan_server("127.0.0.1", 0, journal=journal)
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/scan"
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    while not scan_queue.empty():
+        scan_queue.get_nowait()
+    def run(i):
+        body = json.dumps({"code": barcode_for(i + 1), "client_id": "bench", "seq": i}).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            resp.read()
+        journal.mark_consumed([scan_queue.get(timeout=5).journal_id])
+    try:
+        return time_calls(run, repeat)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        journal.close()
+
+def bench_replenish_plan(ctx, repeat):
+    """Plan draft POs for every item from the last 28 days of history (rolled back)."""
+    conn = inventory_cli.connect_db()
+    c = conn.cursor()
+    last_day = (END_DAY - timedelta(days=1)).date()
+    def run(i):
+        replenishment.plan(c, history_days=28, today=last_day)
+        conn.rollback()
+    try:
+        return time_calls(run, repeat, warmup=1)
+    finally:
+        conn.close()
+
+BENCHMARKS = [
+    ("barcode_lookup", bench_barcode_lookup, 1),
+    ("sale", bench_sale, 1),
+    ("transaction_5_items", bench_transaction, 1),
+    ("inventory_listing", bench_listing, 0.1),
+    ("export_csv", lambda ctx, r: bench_export("csv", ctx, r), 0.05),
+    ("export_excel", lambda ctx, r: bench_export("excel", ctx, r), 0.05),
+    ("export_pdf", lambda ctx, r: bench_export("pdf", ctx, r), 0.05),
+    ("export_jobs_csv", bench_export_jobs, 0.05),
+    ("scan_ingest", bench_scan_ingest, 1),
+    ("replenish_plan", bench_replenish_plan, 0.05),
+]
+# (name, function, share of --repeat it runs: the slow whole-table operations run fewer times)
+
+# ------------------------
+# Streaming memory check
+# ------------------------
+STREAM_RSS_TOLERANCE = 1.25   # the large listing may peak at most this much above the small one
+
+def _fill_logs(db_file, rows):
+    conn = sqlite3.connect(db_file)
+    try:
+        ensure_schema(conn)
+        have = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+        if have < rows:
+            with conn:
+                conn.execute("""
+                    WITH RECURSIVE n(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                    INSERT INTO logs (timestamp, user, action, item_id, quantity, location)
+                    SELECT datetime('2020-01-01', '+' || i || ' seconds'), 'bench', 'sell', i % 5000 + 1, 1, 'Store A'
+                    FROM n
+                """, (have + 1, rows))
+    finally:
+        conn.close()
+
+def _peak_rss_kb(argv, cwd):
+    """Run argv to completion (stdout discarded) and return its peak resident set in KB."""
+    import subprocess
+    proc = subprocess.Popen(argv, cwd=cwd, stdout=subprocess.DEVNULL)
+    _pid, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode:
+        raise RuntimeError(f"{' '.join(argv)} exited with {proc.returncode}")
+    return usage.ru_maxrss
+
+def streaming_rss_check(rows=5_000_000, keep_db=None):
+    """
+    Peak RSS of `inventory_cli.py report logs --limit 0` (every row, printed to
+    /dev/null) over rows // 10 and then `rows` audit log rows, each in a fresh
+    process. With streamed listings the two peaks are about equal; a fetchall()
+    would grow with the row count. Returns {"small", "large", "ratio", "flat"}.
+    """
+    if not hasattr(os, "wait4"):
+        return {"skipped": "needs os.wait4 (Unix)"}
+    tmp_dir = tempfile.mkdtemp(prefix="inventory_rss_")
+    db_file = keep_db or os.path.join(tmp_dir, "rss.db")
+    cli = [sys.executable, os.path.abspath(inventory_cli.__file__), "--db", os.path.abspath(db_file),
+           "report", "logs", "--limit", "0"]
+    result = {}
+    try:
+        for label, n in (("small", rows // 10), ("large", rows)):
+            _fill_logs(db_file, n)
+            start = time.perf_counter()
+            peak = _peak_rss_kb(cli, tmp_dir)
+            result[label] = {"rows": n, "peak_rss_mb": round(peak / 1024.0, 1),
+                             "seconds": round(time.perf_counter() - start, 2)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    result["ratio"] = round(result["large"]["peak_rss_mb"] / result["small"]["peak_rss_mb"], 3)
+    result["flat"] = result["ratio"] <= STREAM_RSS_TOLERANCE
+    return result
+
+def skipped_reason(name):
+    if name == "export_excel" and not inventory_cli.HAS_OPENPYXL:
+        return "openpyxl not installed"
+    if name == "export_pdf" and not inventory_cli.HAS_REPORTLAB:
+        return "reportlab not installed"
+    return None
+
+def run_benchmarks(db_file=BENCH_DB, repeat=DEFAULT_REPEAT, only=None, seed=DEFAULT_SEED):
+    """Time every benchmark against an existing dataset. Returns {name: summary}."""
+    counts = dataset_counts(db_file)
+    tmp_dir = tempfile.mkdtemp(prefix="inventory_bench_")
+    old_db = inventory_cli.DB_FILE
+    inventory_cli.DB_FILE = db_file
+    ctx = {"items": counts["items"], "seed": seed, "tmp_dir": tmp_dir}
+    results = {}
+    try:
+        for name, fn, share in BENCHMARKS:
+            if only and name not in only:
+                continue
+            reason = skipped_reason(name)
+            if reason:
+                results[name] = {"skipped": reason}
+                continue
+            results[name] = summarize(fn(ctx, max(3, int(repeat * share))))
+    finally:
+        inventory_cli.DB_FILE = old_db
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # benchmark statements shouldn't end up in the application's query_stats.json
+        query_stats.STATS.reset()
+    return results
+
+def compare_results(old, new):
+    """Lines of 'name: old -> new median (ratio)' for benchmarks present in both runs."""
+    lines = []
+    for name, cur in new["results"].items():
+        prev = old.get("results", {}).get(name)
+        if not prev or "median_ms" not in prev or "median_ms" not in cur:
+            continue
+        ratio = cur["median_ms"] / prev["median_ms"] if prev["median_ms"] else float("inf")
+        lines.append(f"{name:<22} {prev['median_ms']:>10.3f} -> {cur['median_ms']:>10.3f} ms  ({ratio:.2f}x)")
+    return lines
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Synthetic-load benchmarks for the inventory app")
+    p.add_argument("--db", default=BENCH_DB, help="benchmark database (recreated unless --reuse)")
+    p.add_argument("--reuse", action="store_true", help="reuse an existing --db instead of generating")
+    p.add_argument("--items", type=int, default=DEFAULT_ITEMS)
+    p.add_argument("--years", type=float, default=DEFAULT_YEARS, help="years of transaction history")
+    p.add_argument("--tx-per-day", type=int, default=DEFAULT_TX_PER_DAY)
+    p.add_argument("--logs", type=int, default=DEFAULT_LOGS, help="audit log rows")
+    p.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    p.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed calls per fast operation")
+    p.add_argument("--only", nargs="+", choices=[b[0] for b in BENCHMARKS])
+    p.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    p.add_argument("--compare", metavar="OLD_JSON", help="print median changes against an earlier run")
+    p.add_argument("--streaming-check", type=int, nargs="?", const=5_000_000, metavar="ROWS",
+                   help="only check that listing ROWS (default 5M) log rows keeps peak RSS flat")
+    args = p.parse_args(argv)
+
+    if args.streaming_check:
+        result = streaming_rss_check(args.streaming_check)
+        print(json.dumps(result, indent=2))
+        if "skipped" in result:
+            return 0
+        print("✅ Peak RSS flat" if result["flat"] else "❌ Peak RSS grows with the row count", file=sys.stderr)
+        return 0 if result["flat"] else 1
+
+    if args.reuse:
+        if not os.path.exists(args.db):
+            print(f"❌ {args.db} not found", file=sys.stderr)
+            return 1
+        dataset = dataset_counts(args.db)
+    else:
+        print(f"Generating dataset in {args.db} ...", file=sys.stderr)
+        dataset = generate_dataset(args.db, args.items, args.years, args.tx_per_day, args.logs, args.seed)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "query_stats": query_stats.ENABLED,
+            "params": {"items": args.items, "years": args.years, "tx_per_day": args.tx_per_day,
+                       "logs": args.logs, "seed": args.seed, "repeat": args.repeat, "reuse": args.reuse},
+            "dataset": dataset,
+        },
+        "results": run_benchmarks(args.db, args.repeat, args.only, args.seed),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ Results written to {os.path.abspath(args.output)}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            for line in compare_results(json.load(f), report):
+                print(line, file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
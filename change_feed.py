@@ -0,0 +1,176 @@
+# change_feed.py
+"""
+Change feed: a sequence-numbered outbox of inventory mutations.
+
+Triggers (migration 8) append one change_events row for every insert, update
+and delete of items and item_stock and every new transaction, in the same
+transaction as the change itself. That covers the GUI, the CLI, batch imports
+and old scripts alike. Consumers remember the last seq they saw and read only
+what came after it:
+
+    for ev in subscribe("inventory.db", after_seq=last):       # blocking iterator
+        ...
+
+or over HTTP, next to /scan (see scan_server.py):
+
+    GET /events?after=120&timeout=25&entity=stock               # long-poll
+
+Waiting is cheap: PRAGMA data_version only changes when another connection
+commits, so an idle subscriber issues no queries against change_events.
+Old events are pruned with prune_events() (`inventory_cli.py events prune`).
+"""
+import json
+import time
+
+import query_stats
+import storage
+
+DEFAULT_RETENTION_DAYS = 7
+DEFAULT_POLL_INTERVAL = 0.2
+ENTITIES = ("item", "stock", "transaction")
+
+_EVENT_INSERT = "INSERT INTO change_events (entity, entity_id, op, data) VALUES"
+
+CHANGE_FEED_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS change_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        entity TEXT NOT NULL,
+        entity_id INTEGER,
+        op TEXT NOT NULL,
+        data TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_change_events_ts ON change_events(ts)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_items_ai AFTER INSERT ON items BEGIN
+        {_EVENT_INSERT} ('item', NEW.id, 'insert', json_object(
+            'barcode', NEW.barcode, 'name', NEW.name, 'category', NEW.category,
+            'quantity', NEW.quantity, 'location', NEW.location));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_items_au AFTER UPDATE ON items
+    WHEN OLD.quantity IS NOT NEW.quantity OR OLD.name IS NOT NEW.name OR OLD.barcode IS NOT NEW.barcode
+      OR OLD.category IS NOT NEW.category OR OLD.supplier IS NOT NEW.supplier
+      OR OLD.purchase_price IS NOT NEW.purchase_price OR OLD.sale_price IS NOT NEW.sale_price
+      OR OLD.location IS NOT NEW.location
+    BEGIN
+        {_EVENT_INSERT} ('item', NEW.id, 'update', json_object(
+            'barcode', NEW.barcode, 'name', NEW.name, 'quantity', NEW.quantity,
+            'old_quantity', OLD.quantity, 'sale_price', NEW.sale_price, 'location', NEW.location));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_items_ad AFTER DELETE ON items BEGIN
+        {_EVENT_INSERT} ('item', OLD.id, 'delete', json_object('barcode', OLD.barcode, 'name', OLD.name));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_stock_ai AFTER INSERT ON item_stock BEGIN
+        {_EVENT_INSERT} ('stock', NEW.item_id, 'insert', json_object(
+            'location_id', NEW.location_id, 'qty', NEW.qty, 'old_qty', 0));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_stock_au AFTER UPDATE ON item_stock WHEN OLD.qty IS NOT NEW.qty BEGIN
+        {_EVENT_INSERT} ('stock', NEW.item_id, 'update', json_object(
+            'location_id', NEW.location_id, 'qty', NEW.qty, 'old_qty', OLD.qty));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_stock_ad AFTER DELETE ON item_stock BEGIN
+        {_EVENT_INSERT} ('stock', OLD.item_id, 'delete', json_object(
+            'location_id', OLD.location_id, 'qty', 0, 'old_qty', OLD.qty));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS change_transactions_ai AFTER INSERT ON transactions BEGIN
+        {_EVENT_INSERT} ('transaction', NEW.id, 'insert', json_object(
+            'type', NEW.type, 'user', NEW.user, 'total_amount', NEW.total_amount,
+            'location_id', NEW.location_id));
+    END
+    """,
+]
+
+def _row_to_event(row):
+    seq, ts, entity, entity_id, op, data = row
+    try:
+        payload = json.loads(data) if data else {}
+    except ValueError:
+        payload = {"raw": data}
+    return {"seq": seq, "ts": ts, "entity": entity, "id": entity_id, "op": op, "data": payload}
+
+def latest_seq(conn):
+    row = conn.execute("SELECT MAX(seq) FROM change_events").fetchone()
+    return row[0] or 0
+
+def read_events(conn, after_seq=0, limit=100, entities=None):
+    """Events with seq > after_seq, oldest first (a primary-key range read)."""
+    sql = "SELECT seq, ts, entity, entity_id, op, data FROM change_events WHERE seq > ?"
+    params = [int(after_seq or 0)]
+    if entities:
+        sql += f" AND entity IN ({','.join('?' * len(entities))})"
+        params += list(entities)
+    sql += " ORDER BY seq LIMIT ?"
+    params.append(int(limit))
+    return [_row_to_event(r) for r in conn.execute(sql, params).fetchall()]
+
+def data_version(conn):
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def wait_for_events(conn, after_seq=0, timeout=25.0, limit=100, entities=None,
+                    poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Return events after after_seq as soon as there are any, or [] after timeout seconds.
+    conn must not be written through while waiting (its own commits don't move data_version).
+    """
+    deadline = time.monotonic() + max(0.0, timeout)
+    # the version first: a commit landing after it is seen either by this read or as a
+    # version change below, never lost between the two
+    version = data_version(conn)
+    events = read_events(conn, after_seq, limit, entities)
+    while not events and time.monotonic() < deadline:
+        time.sleep(poll_interval)
+        v = data_version(conn)
+        if v != version:
+            version = v
+            events = read_events(conn, after_seq, limit, entities)
+    return events
+
+def subscribe(db_file, after_seq=None, entities=None, poll_interval=DEFAULT_POLL_INTERVAL,
+              idle_timeout=None, batch=500):
+    """
+    Blocking iterator over new events. after_seq=None starts at the current end of the
+    feed (only future changes); 0 replays everything still retained. Stops after
+    idle_timeout seconds without events (None = never).
+    """
+    conn = query_stats.connect(db_file, timeout=30)
+    try:
+        seq = latest_seq(conn) if after_seq is None else int(after_seq)
+        while True:
+            events = wait_for_events(conn, seq, idle_timeout if idle_timeout is not None else 3600.0,
+                                     batch, entities, poll_interval)
+            if not events:
+                if idle_timeout is not None:
+                    return
+                continue
+            for ev in events:
+                seq = ev["seq"]
+                yield ev
+    finally:
+        conn.close()
+
+def prune_events(conn, older_than_days=None):
+    """Delete events older than the retention period (settings key change_feed_retention_days).
+    Returns the number of rows removed; commits."""
+    if older_than_days is None:
+        row = conn.execute("SELECT value FROM settings WHERE key='change_feed_retention_days'").fetchone()
+        try:
+            older_than_days = int(row[0]) if row else DEFAULT_RETENTION_DAYS
+        except ValueError:
+            older_than_days = DEFAULT_RETENTION_DAYS
+    cur = conn.execute("DELETE FROM change_events WHERE ts < ?", (storage.utc_cutoff(int(older_than_days)),))
+    conn.commit()
+    return cur.rowcount
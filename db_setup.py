@@ -3,69 +3,16 @@ import sqlite3
 import hashlib
 from datetime import datetime
 
+from migrations import ensure_schema
+
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 conn = sqlite3.connect("inventory.db")
 c = conn.cursor()
 
-# Create tables
-c.execute("""
-CREATE TABLE IF NOT EXISTS items (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    category TEXT,
-    barcode TEXT UNIQUE,
-    quantity INTEGER DEFAULT 0,
-    supplier TEXT,
-    purchase_price REAL,
-    sale_price REAL,
-    location TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-c.execute("""
-CREATE TABLE IF NOT EXISTS logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    user TEXT,
-    action TEXT,
-    item_id INTEGER,
-    quantity INTEGER,
-    location TEXT,
-    FOREIGN KEY (item_id) REFERENCES items (id)
-)
-""")
-
-c.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE,
-    role TEXT,
-    password TEXT
-)
-""")
-
-c.execute("""
-CREATE TABLE IF NOT EXISTS sales (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    user TEXT,
-    item_id INTEGER,
-    qty_sold INTEGER,
-    FOREIGN KEY (item_id) REFERENCES items (id)
-)
-""")
-
-c.execute("""
-CREATE TABLE IF NOT EXISTS settings (
-    key TEXT PRIMARY KEY,
-    value TEXT
-)
-""")
-
-conn.commit()
+# Create / upgrade tables (see migrations.py)
+ensure_schema(conn, verbose=True)
 
 # Seed default admin user (if not exists)
 admin_username = "admin"
@@ -0,0 +1,443 @@
+# export_jobs.py
+"""
+Export job runner: several export formats from one consistent read snapshot,
+written in parallel by worker processes.
+
+    python export_jobs.py inventory-xlsx inventory-pdf transactions-csv --dest exports
+    python export_jobs.py all --workers 4 --keep 14
+    python export_jobs.py all --nightly 02:30           # stay running, export every night
+
+A run first copies the datasets the requested formats need (inventory, the
+transactions joined to their lines, logs) into a temporary SQLite file. The copy
+is made in a single read transaction, so every file of a run describes the same
+moment even while the GUI and scan server keep writing. Only the export columns
+are copied, as plain table scans: on a large database the snapshot is a fraction
+of inventory.db, and writers are held off only while those scans run (the joins,
+sorts and indexes happen afterwards, on the copy). Each format then
+runs in its own worker process (openpyxl and reportlab are CPU-bound Python, so
+threads wouldn't overlap them) and streams its rows from the snapshot.
+
+Files are written under a hidden ".<name>.partial" name and renamed into place
+when complete, so a reader or a sync tool never sees half a file, and a failed
+job leaves nothing behind. The single-format helpers in inventory_cli.py and the
+GUI use the same writers.
+"""
+import os
+import sys
+import csv
+import glob
+import time
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+# Excel
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    HAS_OPENPYXL = True
+except Exception:
+    HAS_OPENPYXL = False
+
+# PDF
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter, A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    HAS_REPORTLAB = True
+except Exception:
+    HAS_REPORTLAB = False
+
+DB_FILE = "inventory.db"
+EXPORT_DIR = "exports"
+DEFAULT_WORKERS = 4
+LOG_EXPORT_LIMIT = 200         # latest log rows exported when no --logs-since is given (as the GUI window)
+
+INVENTORY_HEADERS = ["Barcode", "Name", "Category", "Quantity", "Sale Price", "Location"]
+TRANSACTION_HEADERS = ["transaction_id", "timestamp", "user", "type", "customer", "total_amount", "item_barcode",
+                       "item_name", "qty_changed", "qty_before", "qty_after", "unit_price"]
+LOG_HEADERS = ["timestamp", "user", "action", "item_id", "quantity", "location"]
+
+# ------------------------
+# Datasets (what a snapshot holds)
+# ------------------------
+DATASETS = {
+    "inventory": "SELECT barcode, name, category, quantity, sale_price, location FROM items ORDER BY id",
+    # one row per line (a transaction without lines still gets one row), newest transaction first
+    "transactions": """
+        SELECT t.id, t.timestamp, t.user, t.type, t.customer, t.total_amount, ti.barcode, ti.item_name,
+               ti.quantity_changed, ti.quantity_before, ti.quantity_after, ti.unit_price
+        FROM transactions t LEFT JOIN transaction_items ti ON ti.transaction_id = t.id
+        ORDER BY t.timestamp DESC, t.id DESC, ti.id
+    """,
+    "logs": "SELECT timestamp, user, action, item_id, quantity, location FROM logs",
+}
+
+# How a snapshot holds each dataset: (tables copied inside the read transaction,
+# indexes built after it, query the worker reads the rows with). The copies are
+# plain scans, so writers wait as little as possible; joins and sorts happen later,
+# on the snapshot.
+SNAPSHOT_TABLES = {
+    "inventory": ([("inventory", DATASETS["inventory"])], [], "SELECT * FROM inventory ORDER BY rowid"),
+    "transactions": (
+        [("tx", "SELECT id, timestamp, user, type, customer, total_amount FROM transactions"),
+         ("tx_lines", "SELECT transaction_id, id, barcode, item_name, quantity_changed, quantity_before, "
+                      "quantity_after, unit_price FROM transaction_items")],
+        ["CREATE INDEX snap.tx_timestamp ON tx(timestamp, id)",
+         "CREATE INDEX snap.tx_lines_tx ON tx_lines(transaction_id, id)"],
+        """
+        SELECT t.id, t.timestamp, t.user, t.type, t.customer, t.total_amount, ti.barcode, ti.item_name,
+               ti.quantity_changed, ti.quantity_before, ti.quantity_after, ti.unit_price
+        FROM tx t LEFT JOIN tx_lines ti ON ti.transaction_id = t.id
+        ORDER BY t.timestamp DESC, t.id DESC, ti.id
+        """),
+    "logs": ([("logs", None)], [], "SELECT * FROM logs ORDER BY rowid"),   # None: dataset_query (logs_since)
+}
+
+def dataset_query(name, logs_since=None):
+    """(sql, params) reading one dataset from the live database."""
+    if name != "logs":
+        return DATASETS[name], ()
+    if logs_since:
+        return DATASETS[name] + " WHERE timestamp >= ? ORDER BY timestamp DESC, id DESC", (logs_since,)
+    return DATASETS[name] + " ORDER BY timestamp DESC, id DESC LIMIT ?", (LOG_EXPORT_LIMIT,)
+
+# ------------------------
+# Writers (rows -> file; rows can be any iterable, read once)
+# ------------------------
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to `path`; it becomes `path` only if the block succeeds."""
+    folder, name = os.path.split(os.path.abspath(path))
+    tmp = os.path.join(folder, f".{name}.partial")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _write_csv(rows, path, headers):
+    n = 0
+    with atomic_path(path) as tmp:
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            for r in rows:
+                writer.writerow(["" if v is None else v for v in r])
+                n += 1
+    return n
+
+def write_inventory_csv(rows, path):
+    return _write_csv(rows, path, INVENTORY_HEADERS)
+
+def write_transactions_csv(rows, path):
+    return _write_csv(rows, path, TRANSACTION_HEADERS)
+
+def write_logs_csv(rows, path):
+    return _write_csv(rows, path, LOG_HEADERS)
+
+def write_inventory_xlsx(rows, path):
+    if not HAS_OPENPYXL:
+        raise RuntimeError("openpyxl is not installed. Run: pip install openpyxl")
+    wb = Workbook(write_only=True)     # rows go straight to the file instead of a cell tree
+    ws = wb.create_sheet("Inventory")
+    header = [WriteOnlyCell(ws, value=h) for h in INVENTORY_HEADERS]
+    for cell in header:
+        cell.font = Font(bold=True)
+    ws.append(header)
+    n = 0
+    for r in rows:
+        ws.append([
+            r[0] or "",
+            r[1] or "",
+            r[2] or "",
+            r[3] if r[3] is not None else 0,
+            float(r[4]) if r[4] is not None else 0.0,
+            r[5] or ""
+        ])
+        n += 1
+    with atomic_path(path) as tmp:
+        wb.save(tmp)
+    return n
+
+def write_inventory_pdf(rows, path):
+    if not HAS_REPORTLAB:
+        raise RuntimeError("reportlab is not installed. Run: pip install reportlab")
+    data = [INVENTORY_HEADERS]
+    for r in rows:
+        data.append([
+            r[0] or "",
+            r[1] or "",
+            r[2] or "",
+            str(r[3] if r[3] is not None else 0),
+            f"{(r[4] if r[4] is not None else 0):.2f}",
+            r[5] or ""
+        ])
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]))
+    with atomic_path(path) as tmp:
+        SimpleDocTemplate(tmp, pagesize=letter).build([table])
+    return len(data) - 1
+
+def write_logs_pdf(rows, path):
+    if not HAS_REPORTLAB:
+        raise RuntimeError("reportlab is not installed. Run: pip install reportlab")
+    styles = getSampleStyleSheet()
+    elements = [Paragraph("Inventory Logs", styles['Title']), Spacer(1, 12)]
+    n = 0
+    for row in rows:
+        log_line = f"Time: {row[0]}, User: {row[1]}, Action: {row[2]}, ItemID: {row[3]}, Qty: {row[4]}"
+        elements.append(Paragraph(log_line, styles['Normal']))
+        elements.append(Spacer(1, 6))
+        n += 1
+    with atomic_path(path) as tmp:
+        SimpleDocTemplate(tmp, pagesize=A4).build(elements)
+    return n
+
+# name -> (dataset, file prefix, extension, writer, required library or None)
+FORMATS = {
+    "inventory-xlsx": ("inventory", "inventory_export", "xlsx", write_inventory_xlsx, "openpyxl"),
+    "inventory-pdf": ("inventory", "inventory_report", "pdf", write_inventory_pdf, "reportlab"),
+    "inventory-csv": ("inventory", "inventory_export", "csv", write_inventory_csv, None),
+    "transactions-csv": ("transactions", "transactions_export", "csv", write_transactions_csv, None),
+    "logs-pdf": ("logs", "logs_export", "pdf", write_logs_pdf, "reportlab"),
+    "logs-csv": ("logs", "logs_export", "csv", write_logs_csv, None),
+}
+
+def missing_library(fmt):
+    lib = FORMATS[fmt][4]
+    if lib == "openpyxl" and not HAS_OPENPYXL:
+        return lib
+    if lib == "reportlab" and not HAS_REPORTLAB:
+        return lib
+    return None
+
+def resolve_formats(names):
+    """Expand "all" and validate format names; keeps the given order, drops repeats."""
+    out = []
+    for name in names:
+        for fmt in (FORMATS if name == "all" else [name]):
+            if fmt not in FORMATS:
+                raise ValueError(f"unknown format {fmt!r}; choose from {list(FORMATS)} or 'all'")
+            if fmt not in out:
+                out.append(fmt)
+    return out
+
+# ------------------------
+# Snapshot
+# ------------------------
+def take_snapshot(db_file, path, datasets, logs_since=None):
+    """
+    Copy the tables of `datasets` (see SNAPSHOT_TABLES) from db_file into a new
+    SQLite file at `path`, all inside one read transaction. Returns
+    ({table: rows}, seconds the live database was read).
+    """
+    open(path, "wb").close()   # empty it in place (run_exports' mkstemp file stays until its cleanup)
+    conn = sqlite3.connect(db_file, timeout=30)
+    conn.isolation_level = None   # explicit BEGIN/COMMIT
+    try:
+        conn.execute("ATTACH DATABASE ? AS snap", (path,))
+        # a throwaway file: no rollback journal, no fsync
+        conn.execute("PRAGMA snap.journal_mode=OFF")
+        conn.execute("PRAGMA snap.synchronous=OFF")
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        try:
+            for name in datasets:
+                for table, sql in SNAPSHOT_TABLES[name][0]:
+                    sql, params = (sql, ()) if sql else dataset_query(name, logs_since)
+                    conn.execute(f"CREATE TABLE snap.{table} AS {sql}", params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # the live database is no longer read from here on
+        read_seconds = time.perf_counter() - start
+        counts = {}
+        for name in datasets:
+            for ddl in SNAPSHOT_TABLES[name][1]:
+                conn.execute(ddl)
+            for table, _sql in SNAPSHOT_TABLES[name][0]:
+                counts[table] = conn.execute(f"SELECT COUNT(*) FROM snap.{table}").fetchone()[0]
+        conn.execute("DETACH DATABASE snap")
+    finally:
+        conn.close()
+    return counts, round(read_seconds, 3)
+
+def _run_job(fmt, snapshot_path, path):
+    # runs in a worker process: stream one dataset out of the snapshot into one file
+    start = time.perf_counter()
+    dataset, _prefix, _ext, writer, _lib = FORMATS[fmt]
+    conn = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    try:
+        rows = writer(conn.execute(SNAPSHOT_TABLES[dataset][2]), path)
+    finally:
+        conn.close()
+    return {"format": fmt, "path": path, "rows": rows, "bytes": os.path.getsize(path),
+            "seconds": round(time.perf_counter() - start, 3), "error": None}
+
+# ------------------------
+# Runs
+# ------------------------
+def rotate_exports(dest_dir, fmt, keep):
+    """Delete all but the newest `keep` files of one format in dest_dir. Returns the deleted paths."""
+    _dataset, prefix, ext, _writer, _lib = FORMATS[fmt]
+    paths = sorted(glob.glob(os.path.join(dest_dir, f"{prefix}_*.{ext}")),
+                   key=lambda p: (os.path.getmtime(p), p), reverse=True)
+    for p in paths[keep:]:
+        os.remove(p)
+    return paths[keep:]
+
+def run_exports(formats, dest_dir=EXPORT_DIR, db_file=DB_FILE, workers=DEFAULT_WORKERS,
+                logs_since=None, keep=0):
+    """
+    Export `formats` (names from FORMATS, or "all") from one snapshot of db_file
+    into dest_dir. Returns a stats dict:
+    stamp, snapshot_rows, read_seconds (live database read), snapshot_seconds, seconds, jobs [{format, path, rows, bytes, seconds, error}].
+    Formats whose library isn't installed are reported as failed jobs; the others still run.
+    """
+    start = time.perf_counter()
+    formats = resolve_formats(formats)
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    jobs, results = [], []
+    for fmt in formats:
+        _dataset, prefix, ext, _writer, _lib = FORMATS[fmt]
+        lib = missing_library(fmt)
+        if lib:
+            results.append({"format": fmt, "path": None, "rows": 0, "bytes": 0, "seconds": 0,
+                            "error": f"{lib} is not installed"})
+        else:
+            jobs.append((fmt, os.path.join(dest_dir, f"{prefix}_{stamp}.{ext}")))
+
+    stats = {"stamp": stamp, "snapshot_rows": {}, "read_seconds": 0.0, "snapshot_seconds": 0.0, "seconds": 0.0, "jobs": results}
+    if jobs:
+        datasets = []
+        for fmt, _path in jobs:
+            if FORMATS[fmt][0] not in datasets:
+                datasets.append(FORMATS[fmt][0])
+        fd, snapshot = tempfile.mkstemp(prefix=".export_snapshot_", suffix=".db", dir=dest_dir)
+        os.close(fd)
+        try:
+            stats["snapshot_rows"], stats["read_seconds"] = take_snapshot(db_file, snapshot, datasets, logs_since)
+            stats["snapshot_seconds"] = round(time.perf_counter() - start, 3)
+            if workers > 1 and len(jobs) > 1:
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                    futures = [(fmt, path, pool.submit(_run_job, fmt, snapshot, path)) for fmt, path in jobs]
+                    outcomes = []
+                    for fmt, path, fut in futures:
+                        try:
+                            outcomes.append(fut.result())
+                        except Exception as e:
+                            outcomes.append(_failed(fmt, e))
+            else:
+                outcomes = []
+                for fmt, path in jobs:
+                    try:
+                        outcomes.append(_run_job(fmt, snapshot, path))
+                    except Exception as e:
+                        outcomes.append(_failed(fmt, e))
+            results.extend(outcomes)
+        finally:
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+    if keep:
+        for fmt in formats:
+            rotate_exports(dest_dir, fmt, keep)
+    results.sort(key=lambda r: formats.index(r["format"]))
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def _failed(fmt, e):
+    return {"format": fmt, "path": None, "rows": 0, "bytes": 0, "seconds": 0, "error": str(e)}
+
+def print_export_stats(stats):
+    rows = ", ".join(f"{k} {v}" for k, v in stats["snapshot_rows"].items())
+    print(f"Snapshot: {rows or 'nothing to copy'} ({stats['snapshot_seconds']:.3f}s, "
+          f"live database read for {stats['read_seconds']:.3f}s)")
+    for job in stats["jobs"]:
+        if job["error"]:
+            print(f"❌ {job['format']}: {job['error']}")
+        else:
+            print(f"✅ {job['format']}: {os.path.abspath(job['path'])} "
+                  f"({job['rows']} rows, {job['bytes'] / 1024:.1f} KB, {job['seconds']:.3f}s)")
+    print(f"   took {stats['seconds']:.3f}s")
+
+# ------------------------
+# Nightly schedule
+# ------------------------
+def next_run(at, now=None):
+    """Next datetime at the daily time `at` ("HH:MM"), strictly after now."""
+    hour, minute = (int(p) for p in at.split(":"))
+    now = now or datetime.now()
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += timedelta(days=1)
+    return run
+
+def run_nightly(at, formats, dest_dir=EXPORT_DIR, db_file=DB_FILE, workers=DEFAULT_WORKERS, keep=0):
+    """
+    Run the exports every day at `at` until interrupted. Each run exports the logs
+    written since the previous run (24 hours for the first one). The schedule is
+    local time; the logs watermark is UTC, like logs.timestamp.
+    """
+    resolve_formats(formats)     # fail now, not at 2 am
+    last = datetime.now(timezone.utc) - timedelta(days=1)
+    while True:
+        when = next_run(at)
+        print(f"Next export run at {when:%Y-%m-%d %H:%M}")
+        while datetime.now() < when:
+            time.sleep(min(60.0, max(0.0, (when - datetime.now()).total_seconds())))
+        started = datetime.now(timezone.utc)
+        try:
+            stats = run_exports(formats, dest_dir, db_file, workers,
+                                logs_since=last.strftime("%Y-%m-%d %H:%M:%S"), keep=keep)
+            print_export_stats(stats)
+            last = started
+        except Exception as e:
+            # keep the schedule; the next run exports the logs this one missed
+            print(f"❌ Export run failed: {e}")
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Export several formats from one consistent snapshot")
+    p.add_argument("formats", nargs="+", help=f"{', '.join(FORMATS)} or all")
+    p.add_argument("--db", default=DB_FILE)
+    p.add_argument("--dest", default=EXPORT_DIR)
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes (1 = run in this process)")
+    p.add_argument("--logs-since", help=f"logs from this timestamp (default: the latest {LOG_EXPORT_LIMIT})")
+    p.add_argument("--keep", type=int, default=0, help="files to keep per format (0 = keep all)")
+    p.add_argument("--nightly", metavar="HH:MM", help="stay running and export every day at this time")
+    args = p.parse_args(argv)
+
+    try:
+        resolve_formats(args.formats)
+        if args.nightly:
+            next_run(args.nightly)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if args.nightly:
+        try:
+            run_nightly(args.nightly, args.formats, args.dest, args.db, args.workers, args.keep)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    stats = run_exports(args.formats, args.dest, args.db, args.workers, args.logs_since, args.keep)
+    print_export_stats(stats)
+    return 0 if all(not job["error"] for job in stats["jobs"]) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,353 @@
 # inspect_db.py
+"""
+Database diagnostics for inventory.db.
+
+    python inspect_db.py                  # everything below, as text
+    python inspect_db.py --plans          # only EXPLAIN QUERY PLAN of the app's queries
+    python inspect_db.py --timings --json # hot-query timings as JSON (compare across releases)
+
+Sections: row counts, sample items, settings, storage (per-table size, pages and
+fragmentation from dbstat), indexes (and whether any app query uses them), query
+plans for every statement the CLI and GUI issue (full table scans flagged), and
+timings of the hot queries.
+"""
+import sys
+import json
+import time
 import sqlite3
+import statistics
+
+DB_FILE = "inventory.db"
+
+# Every statement the CLI (inventory_cli.py), GUI (inventory_gui.py), scan server endpoints
+# and the export / stocktake / replenishment modules issue, with sample parameters. Keep this
+# in step with those modules when queries are added or changed.
+# expect_scan marks statements that read a whole table by design (full listings/exports).
+QUERY_CATALOG = [
+    # (name, sql, params, expect_scan)
+    ("item by barcode", "SELECT id, name, quantity, sale_price, purchase_price, location FROM items WHERE barcode=?", ("111111111111",), False),
+    ("item by barcode (gui)", "SELECT id, name, category, barcode, quantity, supplier, purchase_price, sale_price, location FROM items WHERE barcode=?", ("111111111111",), False),
+    ("item by id", "SELECT name, quantity FROM items WHERE id=?", (1,), False),
+    ("delete item", "DELETE FROM items WHERE id=?", (0,), False),
+    ("low stock threshold", "SELECT value FROM settings WHERE key='low_stock_threshold'", (), False),
+    ("inventory listing", "SELECT id, name, barcode, quantity, sale_price, location FROM items ORDER BY id", (), True),
+    ("export items", "SELECT barcode, name, category, quantity, sale_price, location FROM items ORDER BY id", (), True),
+    ("latest logs", "SELECT timestamp, user, action, item_id, quantity FROM logs ORDER BY timestamp DESC LIMIT ?", (20,), False),
+    ("logs range", "SELECT id, timestamp, user, action, item_id, quantity, location FROM logs WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp DESC, id DESC", ("2025-01-01", "2025-02-01"), False),
+    ("oldest log", "SELECT MIN(timestamp) FROM logs", (), False),
+    ("recent transactions", "SELECT id, timestamp, user, type, customer, total_amount FROM transactions ORDER BY timestamp DESC LIMIT ?", (50,), False),
+    ("transaction by id", "SELECT id, timestamp, user, type, customer, total_amount, notes FROM transactions WHERE id=?", (1,), False),
+    ("transaction lines", "SELECT barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price FROM transaction_items WHERE transaction_id=?", (1,), False),
+    ("export transactions", "SELECT id, timestamp, user, type, customer, total_amount FROM transactions ORDER BY timestamp DESC", (), True),
+    ("search (fts)", "SELECT i.id, i.name FROM items_fts f JOIN items i ON i.id = f.rowid WHERE items_fts MATCH ? ORDER BY f.rank LIMIT ?", ('"app"*', 50), False),
+    ("insert log", "INSERT INTO logs (timestamp, user, action, item_id, quantity, location) VALUES (?, ?, ?, ?, ?, ?)", ("2025-01-01 00:00:00", "admin", "x", 1, 1, "N/A"), False),
+    ("insert sale", "INSERT INTO sales (user, item_id, qty_sold, location_id) VALUES (?, ?, ?, ?)", ("admin", 1, 1, 1), False),
+    ("insert transaction sale", "INSERT INTO sales (user, item_id, qty_sold, transaction_id, location_id) VALUES (?, ?, ?, ?, ?)", ("admin", 1, 1, 1, 1), False),
+    ("location by name", "SELECT id FROM locations WHERE name=?", ("Main",), False),
+    ("stock at location", "SELECT qty FROM item_stock WHERE item_id=? AND location_id=?", (1, 1), False),
+    ("set stock", "INSERT INTO item_stock (item_id, location_id, qty) VALUES (?, ?, ?) ON CONFLICT (item_id, location_id) DO UPDATE SET qty = excluded.qty", (0, 0, 0), False),
+    ("item stock by location", "SELECT l.name, s.qty FROM item_stock s JOIN locations l ON l.id = s.location_id WHERE s.item_id=? ORDER BY l.name", (1,), False),
+    ("location totals", "SELECT l.name, t.items, t.qty FROM (SELECT location_id, COUNT(*) AS items, SUM(qty) AS qty FROM item_stock WHERE qty <> 0 GROUP BY location_id) t JOIN locations l ON l.id = t.location_id ORDER BY l.name", (), True),
+    ("change events after seq", "SELECT seq, ts, entity, entity_id, op, data FROM change_events WHERE seq > ? ORDER BY seq LIMIT ?", (0, 100), False),
+    ("latest change seq", "SELECT MAX(seq) FROM change_events", (), False),
+    ("items at location", "SELECT i.barcode, i.name, s.qty FROM item_stock s JOIN items i ON i.id = s.item_id WHERE s.location_id=? AND s.qty <> 0 ORDER BY i.name", (1,), False),
+    ("stock valuation by category", "SELECT i.category AS grp, COUNT(*), SUM(COALESCE(i.quantity, 0)), SUM(COALESCE(i.quantity, 0) * COALESCE(i.purchase_price, 0)), SUM(COALESCE(i.quantity, 0) * COALESCE(i.sale_price, 0)) FROM items i WHERE COALESCE(i.quantity, 0) <> 0 GROUP BY grp ORDER BY 5 DESC", (), True),
+    ("losses over period", "SELECT t.type AS grp, COUNT(DISTINCT t.id), SUM(-ti.quantity_changed), SUM(-ti.quantity_changed * COALESCE(ti.unit_price, 0)), SUM(-ti.quantity_changed * COALESCE(i.purchase_price, 0)) FROM transactions t JOIN transaction_items ti ON ti.transaction_id = t.id LEFT JOIN items i ON i.id = ti.item_id WHERE t.type IN (?,?) AND t.timestamp >= ? AND t.timestamp < ? GROUP BY grp ORDER BY 4 DESC", ("damage", "adjustment", "2025-01-01", "2025-04-01"), False),
+    ("plain sales margin", "SELECT i.category AS grp, COUNT(*), SUM(s.qty_sold), SUM(s.qty_sold * COALESCE(i.sale_price, 0)), SUM(s.qty_sold * COALESCE(i.purchase_price, 0)) FROM sales s LEFT JOIN items i ON i.id = s.item_id WHERE s.transaction_id IS NULL AND s.timestamp >= ? AND s.timestamp < ? GROUP BY grp ORDER BY 4 DESC", ("2025-01-01", "2025-04-01"), False),
+    ("sales by month", "SELECT substr(day, 1, 7) AS period, SUM(units_sold), SUM(revenue) FROM daily_category_stats WHERE day >= ? AND day < ? GROUP BY period ORDER BY period", ("2025-01-01", "2026-01-01"), False),
+    ("item sales by day", "SELECT day, units_sold, revenue FROM daily_item_stats WHERE item_id = ? AND day >= ? ORDER BY day", (1, "2025-01-01"), False),
+    # POST /transactions (transaction_api.py)
+    ("idempotency key", "SELECT request_hash, transaction_id, total_amount FROM idempotency_keys WHERE key=?", ("till3-000123",), False),
+    ("record idempotency key", "INSERT INTO idempotency_keys (key, request_hash, transaction_id, total_amount) VALUES (?, ?, ?, ?)", ("till3-000123", "0" * 64, 1, 0.0), False),
+    ("prune idempotency keys", "DELETE FROM idempotency_keys WHERE created_at < ?", ("2025-01-01 00:00:00",), False),
+    # GET endpoints (query_api.py): keyset pages as list_rows() builds them, after a cursor
+    ("api items page", "SELECT i.id, i.barcode, i.name, i.quantity, i.id FROM items i WHERE (i.id) > (?) ORDER BY i.id LIMIT ?", (1000, 100), False),
+    ("api items page by category", "SELECT i.id, i.barcode, i.name, i.quantity, i.id FROM items i WHERE i.category = ? AND (i.id) > (?) ORDER BY i.id LIMIT ?", ("Cables", 1000, 100), False),
+    ("api stock page", "SELECT s.item_id, i.barcode, i.name, l.name, s.qty, s.item_id, s.location_id FROM item_stock s JOIN items i ON i.id = s.item_id JOIN locations l ON l.id = s.location_id WHERE (s.item_id, s.location_id) > (?, ?) ORDER BY s.item_id, s.location_id LIMIT ?", (1000, 1, 100), False),
+    ("api stock page by location", "SELECT s.item_id, i.barcode, i.name, l.name, s.qty, s.item_id, s.location_id FROM item_stock s JOIN items i ON i.id = s.item_id JOIN locations l ON l.id = s.location_id WHERE l.name = ? AND (s.item_id, s.location_id) > (?, ?) ORDER BY s.item_id, s.location_id LIMIT ?", ("Main", 1000, 1, 100), False),
+    ("api logs page", "SELECT g.id, g.timestamp, g.user, g.action, g.item_id, g.quantity, g.location, g.id FROM logs g WHERE (g.id) < (?) ORDER BY g.id DESC LIMIT ?", (100000, 100), False),
+    ("api transactions page by type", "SELECT t.id, t.timestamp, t.user, t.type, t.customer, t.total_amount, t.notes, l.name, t.id FROM transactions t LEFT JOIN locations l ON l.id = t.location_id WHERE t.type = ? AND (t.id) < (?) ORDER BY t.id DESC LIMIT ?", ("sale", 100000, 100), False),
+    ("api item stock by barcode", "SELECT l.name, s.qty FROM item_stock s JOIN items i ON i.id = s.item_id JOIN locations l ON l.id = s.location_id WHERE i.barcode = ? ORDER BY l.name", ("111111111111",), False),
+    ("api transaction lines", "SELECT ti.item_id, ti.barcode, ti.item_name, ti.quantity_changed, ti.quantity_before, ti.quantity_after, ti.unit_price, l.name FROM transaction_items ti LEFT JOIN locations l ON l.id = ti.location_id WHERE ti.transaction_id = ? ORDER BY ti.id", (1,), False),
+    ("api logs version", "SELECT (SELECT MIN(id) FROM logs), (SELECT MAX(id) FROM logs)", (), False),
+    # columnar items snapshot (inventory_snapshot.py)
+    ("snapshot load", "SELECT id, name, category, barcode, quantity, supplier, purchase_price, sale_price, location FROM items ORDER BY id", (), True),
+    ("snapshot changed items", "SELECT DISTINCT entity_id FROM change_events WHERE seq > ? AND entity = 'item'", (0,), False),
+    ("snapshot reload items", "SELECT id, name, category, barcode, quantity, supplier, purchase_price, sale_price, location FROM items WHERE id IN (?,?,?)", (1, 2, 3), False),
+    ("oldest change seq", "SELECT MIN(seq) FROM change_events", (), False),
+    # export jobs (export_jobs.py): tables copied into the snapshot, logs since the last run
+    ("export snapshot transactions", "SELECT id, timestamp, user, type, customer, total_amount FROM transactions", (), True),
+    ("export snapshot transaction lines", "SELECT transaction_id, id, barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price FROM transaction_items", (), True),
+    ("export logs since", "SELECT timestamp, user, action, item_id, quantity, location FROM logs WHERE timestamp >= ? ORDER BY timestamp DESC, id DESC", ("2025-01-01 00:00:00",), False),
+    ("export latest logs", "SELECT timestamp, user, action, item_id, quantity, location FROM logs ORDER BY timestamp DESC, id DESC LIMIT ?", (200,), False),
+    # analytics exports (analytics_export.py): one row group of an append-only table
+    ("analytics max id", "SELECT COALESCE(MAX(id), 0) FROM sales", (), False),
+    ("analytics row group", "SELECT \"id\", CAST(strftime('%s', \"timestamp\") AS INTEGER), \"user\", \"item_id\", \"qty_sold\" FROM sales WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (0, 1000000, 65536), False),
+    # store shards (shards.py)
+    ("shard settings", "SELECT key, value FROM settings WHERE key IN ('shard_store', 'shard_index')", (), False),
+    # stocktake (stocktake.py); stocktake_counts / stocktake_diff are TEMP tables (CATALOG_SETUP)
+    ("stocktake expected qty", "SELECT i.barcode, COALESCE((SELECT s.qty FROM item_stock s JOIN locations l ON l.id = s.location_id WHERE s.item_id = i.id AND l.name = ?), 0) FROM items i WHERE i.barcode IN (?, ?)", ("Main", "111111111111", "222222222222"), False),
+    ("stocktake counted diff", "INSERT INTO stocktake_diff (item_id, barcode, item_name, expected, counted, current, unit_price) SELECT i.id, i.barcode, i.name, COALESCE(k.expected, s.qty, 0), k.counted, COALESCE(s.qty, 0), COALESCE(i.sale_price, i.purchase_price, 0) FROM stocktake_counts k CROSS JOIN items i LEFT JOIN item_stock s ON s.item_id = i.id AND s.location_id = ? WHERE i.barcode = k.barcode AND COALESCE(k.expected, s.qty, 0) <> k.counted", (1,), True),
+    ("stocktake uncounted diff", "INSERT INTO stocktake_diff (item_id, barcode, item_name, expected, counted, current, unit_price) SELECT i.id, i.barcode, i.name, s.qty, 0, s.qty, COALESCE(i.sale_price, i.purchase_price, 0) FROM item_stock s JOIN items i ON i.id = s.item_id WHERE s.location_id = ? AND s.qty <> 0 AND COALESCE(i.barcode, '') <> '' AND NOT EXISTS (SELECT 1 FROM stocktake_counts k WHERE k.barcode = i.barcode)", (1,), False),
+    ("stocktake apply", "UPDATE item_stock SET qty = qty + (SELECT d.counted - d.expected FROM stocktake_diff d WHERE d.item_id = item_stock.item_id) WHERE location_id = ? AND item_id IN (SELECT item_id FROM stocktake_diff)", (1,), False),
+    # replenishment and purchase orders (replenishment.py)
+    ("replenishment demand", "SELECT item_id, SUM(units_sold) * 1.0 / ? AS velocity, SUM(units_sold * units_sold) * 1.0 / ? AS mean_sq FROM daily_item_stats WHERE day >= ? AND day < ? AND units_sold > 0 GROUP BY item_id", (90, 90, "2025-01-01", "2025-04-01"), False),
+    ("on order by item", "SELECT poi.item_id, SUM(poi.quantity) AS qty FROM purchase_orders po JOIN purchase_order_items poi ON poi.po_id = po.id WHERE po.status = 'ordered' GROUP BY poi.item_id", (), False),
+    ("purchase orders", "SELECT id, supplier, status, created_at, lines, units, total_cost, transaction_id FROM purchase_orders ORDER BY id DESC LIMIT ?", (50,), False),
+    ("purchase orders by status", "SELECT id, supplier, status, created_at, lines, units, total_cost, transaction_id FROM purchase_orders WHERE status = ? ORDER BY id DESC LIMIT ?", ("draft", 50), False),
+    ("purchase order lines", "SELECT barcode, item_name, quantity, unit_cost, on_hand, on_order, velocity, reorder_point, order_up_to FROM purchase_order_items WHERE po_id = ? ORDER BY item_name", (1,), False),
+    ("supplier lead time", "INSERT INTO suppliers (name, lead_time_days, review_days) VALUES (?, ?, ?) ON CONFLICT (name) DO UPDATE SET lead_time_days = COALESCE(excluded.lead_time_days, lead_time_days), review_days = COALESCE(excluded.review_days, review_days)", ("Acme", 10, 7), False),
+]
+
+# TEMP tables some catalog statements work on (created on the inspecting connection only)
+CATALOG_SETUP = [
+    "CREATE TEMP TABLE IF NOT EXISTS stocktake_counts (barcode TEXT PRIMARY KEY, counted INTEGER NOT NULL, expected INTEGER)",
+    "CREATE TEMP TABLE IF NOT EXISTS stocktake_diff (item_id INTEGER PRIMARY KEY, barcode TEXT, item_name TEXT, expected INTEGER NOT NULL, counted INTEGER NOT NULL, current INTEGER NOT NULL, unit_price REAL)",
+]
+
+# read-only statements timed by --timings (name -> catalog entry)
+HOT_QUERIES = ["item by barcode", "item by id", "inventory listing", "latest logs", "recent transactions",
+               "transaction lines", "search (fts)", "export transactions", "item stock by location",
+               "location totals", "stock valuation by category", "losses over period", "sales by month",
+               "item sales by day", "idempotency key", "api items page", "api stock page by location",
+               "api logs version", "snapshot changed items", "stocktake expected qty", "purchase orders"]
+
+def _tables(c, include_shadow=True):
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    names = [r[0] for r in c.fetchall()]
+    if not include_shadow:
+        try:
+            # FTS5 internals (items_fts_data, ...); PRAGMA table_list needs SQLite 3.37+
+            shadow = {r[1] for r in c.execute("PRAGMA table_list").fetchall() if r[2] == "shadow"}
+        except sqlite3.OperationalError:
+            shadow = set()
+        names = [n for n in names if n not in shadow]
+    return names
 
-conn = sqlite3.connect("inventory.db")
-c = conn.cursor()
+def row_counts(conn):
+    c = conn.cursor()
+    counts = {}
+    for t in _tables(c):
+        try:
+            c.execute(f'SELECT COUNT(*) FROM "{t}"')
+            counts[t] = c.fetchone()[0]
+        except Exception as e:
+            counts[t] = f"error: {e}"
+    return counts
 
-tables = ["items", "users", "logs", "sales", "settings"]
-for t in tables:
+def storage_stats(conn):
+    """
+    Per table/index: pages, bytes, unused bytes and fragmentation (% of pages not
+    directly following the previous page of the same b-tree). Needs the dbstat
+    virtual table; without it only the database totals are returned.
+    """
+    c = conn.cursor()
+    page_size = c.execute("PRAGMA page_size").fetchone()[0]
+    totals = {
+        "page_size": page_size,
+        "page_count": c.execute("PRAGMA page_count").fetchone()[0],
+        "freelist_count": c.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+    totals["bytes"] = totals["page_count"] * page_size
     try:
-        c.execute(f"SELECT COUNT(*) FROM {t}")
-        cnt = c.fetchone()[0]
-    except Exception as e:
-        cnt = f"error: {e}"
-    print(f"{t}: {cnt} rows")
-
-print("\nSample items:")
-c.execute("SELECT id, name, barcode, quantity, location FROM items LIMIT 10")
-for row in c.fetchall():
-    print(row)
-
-print("\nSettings:")
-c.execute("SELECT key, value FROM settings")
-for r in c.fetchall():
-    print(r)
-
-conn.close()
+        c.execute("SELECT name, pageno FROM dbstat ORDER BY name, path")
+    except sqlite3.OperationalError:
+        return totals, None
+    per_object = {}
+    last_page = {}
+    for name, pageno in c.fetchall():
+        s = per_object.setdefault(name, {"pages": 0, "out_of_order": 0})
+        s["pages"] += 1
+        if name in last_page and pageno != last_page[name] + 1:
+            s["out_of_order"] += 1
+        last_page[name] = pageno
+    c.execute("SELECT name, SUM(pgsize), SUM(unused) FROM dbstat GROUP BY name")
+    for name, size, unused in c.fetchall():
+        s = per_object[name]
+        s["bytes"] = size
+        s["unused_bytes"] = unused
+        s["fragmentation_pct"] = round(100.0 * s["out_of_order"] / s["pages"], 1) if s["pages"] > 1 else 0.0
+    return totals, per_object
+
+def explain(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN detail lines for one statement."""
+    c = conn.cursor()
+    c.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [r[3] for r in c.fetchall()]
+
+def is_full_scan(detail):
+    # 'SCAN items' / 'SCAN items USING INDEX x' read every row; 'SEARCH' uses a key,
+    # covering-index scans of a virtual table (FTS) are driven by MATCH; CONSTANT ROW is
+    # the one-row FROM of a SELECT without a table
+    return detail.startswith("SCAN ") and "VIRTUAL TABLE" not in detail and detail != "SCAN CONSTANT ROW"
+
+def full_scans(sql, plan):
+    """Plan lines that read a whole table. An index (or rowid) walk in ORDER BY order that
+    stops at a LIMIT (no temp b-tree sort) only touches LIMIT rows, so it isn't counted."""
+    upper = sql.upper()
+    bounded = " LIMIT " in upper and not any("TEMP B-TREE" in d for d in plan)
+    ordered = lambda d: "USING" in d or " ORDER BY " in upper
+    return [d for d in plan if is_full_scan(d) and not (bounded and ordered(d))]
+
+def query_plans(conn):
+    """[{name, sql, plan, full_scans, expected, error}] for QUERY_CATALOG."""
+    for ddl in CATALOG_SETUP:
+        conn.execute(ddl)
+    out = []
+    for name, sql, params, expect_scan in QUERY_CATALOG:
+        entry = {"name": name, "sql": sql, "plan": [], "full_scans": [], "expected": expect_scan, "error": None}
+        try:
+            entry["plan"] = explain(conn, sql, params)
+            entry["full_scans"] = full_scans(sql, entry["plan"])
+        except sqlite3.Error as e:
+            entry["error"] = str(e)
+        out.append(entry)
+    return out
+
+def index_usage(conn, plans=None):
+    """{index_name: {"table", "columns", "used_by": [query names]}}"""
+    c = conn.cursor()
+    plans = plans if plans is not None else query_plans(conn)
+    usage = {}
+    for t in _tables(c, include_shadow=False):
+        for idx in c.execute(f'PRAGMA index_list("{t}")').fetchall():
+            idx_name = idx[1]
+            cols = [r[2] for r in conn.execute(f'PRAGMA index_info("{idx_name}")').fetchall()]
+            usage[idx_name] = {"table": t, "columns": cols, "used_by": []}
+    for p in plans:
+        for detail in p["plan"]:
+            for idx_name in usage:
+                if f"INDEX {idx_name}" in detail and p["name"] not in usage[idx_name]["used_by"]:
+                    usage[idx_name]["used_by"].append(p["name"])
+    return usage
+
+def time_hot_queries(conn, repeat=20):
+    """Median / p95 / max milliseconds for each HOT_QUERIES statement (rows fully fetched)."""
+    catalog = {name: (sql, params) for name, sql, params, _ in QUERY_CATALOG}
+    results = {}
+    c = conn.cursor()
+    for name in HOT_QUERIES:
+        sql, params = catalog[name]
+        samples = []
+        rows = 0
+        try:
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                c.execute(sql, params)
+                rows = len(c.fetchall())
+                samples.append((time.perf_counter() - t0) * 1000.0)
+        except sqlite3.Error as e:
+            results[name] = {"error": str(e)}
+            continue
+        samples.sort()
+        results[name] = {
+            "rows": rows,
+            "median_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            "max_ms": round(samples[-1], 3),
+        }
+    return results
+
+def print_report(conn, sections, repeat):
+    c = conn.cursor()
+    if "counts" in sections:
+        for t, cnt in row_counts(conn).items():
+            print(f"{t}: {cnt} rows")
+
+        print("\nSample items:")
+        c.execute("SELECT id, name, barcode, quantity, location FROM items LIMIT 10")
+        for row in c.fetchall():
+            print(row)
+
+        print("\nSettings:")
+        c.execute("SELECT key, value FROM settings")
+        for r in c.fetchall():
+            print(r)
+        print(f"\nSchema version: {c.execute('PRAGMA user_version').fetchone()[0]}")
+
+    if "storage" in sections:
+        totals, per_object = storage_stats(conn)
+        print("\n--- STORAGE ---")
+        print(f"{totals['page_count']} pages x {totals['page_size']} B = {totals['bytes'] / 1024:.0f} KB, "
+              f"free pages: {totals['freelist_count']}")
+        if per_object is None:
+            print("(dbstat not available in this SQLite build; per-table sizes skipped)")
+        else:
+            print(f"{'object':<34}{'pages':>8}{'KB':>10}{'unused KB':>11}{'frag %':>8}")
+            for name, s in sorted(per_object.items(), key=lambda kv: -kv[1]["pages"]):
+                print(f"{name:<34}{s['pages']:>8}{s['bytes'] / 1024:>10.0f}{s['unused_bytes'] / 1024:>11.0f}"
+                      f"{s['fragmentation_pct']:>8}")
+
+    plans = query_plans(conn) if ("plans" in sections or "indexes" in sections) else None
+    if "indexes" in sections:
+        print("\n--- INDEXES ---")
+        for idx_name, u in index_usage(conn, plans).items():
+            used = ", ".join(u["used_by"]) if u["used_by"] else "⚠ not used by any app query"
+            print(f"{idx_name} on {u['table']}({', '.join(u['columns'])}): {used}")
+
+    if "plans" in sections:
+        print("\n--- QUERY PLANS ---")
+        for p in plans:
+            if p["error"]:
+                flag = f"❌ error: {p['error']}"
+            elif p["full_scans"] and not p["expected"]:
+                flag = "⚠ FULL SCAN"
+            elif p["full_scans"]:
+                flag = "full scan (expected)"
+            else:
+                flag = "ok"
+            print(f"[{flag}] {p['name']}")
+            for d in p["plan"]:
+                print(f"    {d}")
+
+    if "timings" in sections:
+        print(f"\n--- HOT QUERY TIMINGS (x{repeat}) ---")
+        for name, r in time_hot_queries(conn, repeat).items():
+            if "error" in r:
+                print(f"{name:<24} error: {r['error']}")
+            else:
+                print(f"{name:<24} median {r['median_ms']:>9.3f} ms   p95 {r['p95_ms']:>9.3f} ms   rows {r['rows']}")
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Inspect and profile the inventory database")
+    p.add_argument("--db", default=DB_FILE)
+    p.add_argument("--counts", action="store_true", help="row counts, sample items, settings")
+    p.add_argument("--storage", action="store_true", help="per-table size, pages, fragmentation")
+    p.add_argument("--indexes", action="store_true", help="indexes and which queries use them")
+    p.add_argument("--plans", action="store_true", help="EXPLAIN QUERY PLAN of every app query")
+    p.add_argument("--timings", action="store_true", help="time the hot queries")
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--json", action="store_true", help="machine-readable output")
+    args = p.parse_args(argv)
+
+    sections = {s for s in ("counts", "storage", "indexes", "plans", "timings") if getattr(args, s)}
+    if not sections:
+        sections = {"counts", "storage", "indexes", "plans", "timings"}
+
+    # read-only: diagnostics must never modify the database (the catalog includes writes,
+    # but EXPLAIN QUERY PLAN doesn't execute them)
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        if args.json:
+            report = {}
+            if "counts" in sections:
+                report["counts"] = row_counts(conn)
+            if "storage" in sections:
+                report["storage"] = dict(zip(("totals", "objects"), storage_stats(conn)))
+            plans = query_plans(conn)
+            if "plans" in sections:
+                report["plans"] = plans
+            if "indexes" in sections:
+                report["indexes"] = index_usage(conn, plans)
+            if "timings" in sections:
+                report["timings"] = time_hot_queries(conn, args.repeat)
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(conn, sections, args.repeat)
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,330 @@
 # inventory_cli.py
 import sqlite3
 import hashlib
+import itertools
 import os
 import sys
+import time
 from datetime import datetime
 
 # barcode helper (local file)
 from barcode_generator import generate_barcode_image, generate_unique_barcode
+from search_index import search_items
+import storage
+from log_retention import archive_logs, iter_logs
+from audit_writer import write_log
+import stock
+import change_feed
+import query_stats
+import valuation
+import rollups
+import shards
+import replenishment
+from inventory_snapshot import get_snapshot, snapshot_supported
+import export_jobs
+from export_jobs import HAS_OPENPYXL, HAS_REPORTLAB   # Excel / PDF writers available
 
-# Excel
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font
-    HAS_OPENPYXL = True
-except Exception:
-    HAS_OPENPYXL = False
-
-# PDF
-try:
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-    HAS_REPORTLAB = True
-except Exception:
-    HAS_REPORTLAB = False
-
-DB_FILE = "inventory.db"
+DB_FILE = storage.DEFAULT_TARGET   # SQLite file or postgresql:// URL (--db, INVENTORY_DB)
 
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 def connect_db():
-    return sqlite3.connect(DB_FILE)
+    # every statement is timed (see query_stats.py); a URL gets a pooled PostgreSQL connection
+    return storage.connect(DB_FILE)
+
+def require_sqlite(feature):
+    """True for a SQLite database (or all stores); otherwise says that `feature` is
+    SQLite-only (rollups, change feed, snapshots and archives, see storage.py)."""
+    try:
+        storage.require_sqlite(storage.get_backend(DB_FILE), feature)
+    except ValueError as e:
+        print("❌", e)
+        return False
+    return True
+
+def init_db():
+    # versioned migrations; no DDL runs when the schema is already current
+    conn = connect_db()
+    storage.ensure_schema(conn)
+    conn.close()
+
+# ------------------------
+# Non-interactive operations
+# (shared by the menu, the subcommands and batch mode; they work on an open
+#  cursor and never commit, so callers decide the transaction boundaries)
+# ------------------------
+TRANSACTION_TYPES = ("sale", "purchase", "restock", "adjustment", "damage", "return")
+# commands that work with --store all (read-only; everything else needs one store)
+ALL_STORES_COMMANDS = ("report", "search", "stock", "stores", "stats")
+
+def _find_item(c, barcode):
+    c.execute("SELECT id, name, quantity, sale_price, purchase_price, location FROM items WHERE barcode=?", (barcode,))
+    row = c.fetchone()
+    if not row:
+        raise ValueError(f"Item not found for barcode: {barcode}")
+    return row
+
+def _log(c, user, action, item_id, quantity, location):
+    # written with c: the row commits or rolls back with the change
+    log_action(user, action, item_id, quantity, location, cursor=c)
+
+def add_item_op(c, name, category="", barcode=None, qty=0, supplier="", purchase_price=0.0,
+                sale_price=0.0, location="", user="admin"):
+    """
+    Insert a new item and log it. Returns (item_id, barcode).
+    An auto-generated barcode is regenerated on collision; an explicit one raises.
+    """
+    if not name:
+        raise ValueError("Item name cannot be empty.")
+    auto_barcode = not barcode
+    if auto_barcode:
+        barcode = generate_unique_barcode()
+    attempts = 0
+    while True:
+        try:
+            c.execute("""
+                INSERT INTO items (name, category, barcode, quantity, supplier, purchase_price, sale_price, location)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (name, category, barcode, int(qty), supplier, purchase_price, sale_price, location))
+            break
+        except sqlite3.IntegrityError:
+            attempts += 1
+            if not auto_barcode or attempts >= 5:
+                raise ValueError(f"Barcode already exists: {barcode}")
+            barcode = generate_unique_barcode()
+    item_id = c.lastrowid
+    _log(c, user, "add", item_id, int(qty), location)
+    return item_id, barcode
+
+def update_item_op(c, barcode, qty, user="admin", location=None):
+    """Set the quantity of an item at a location (default: its home location). Returns (item_id, name)."""
+    item = _find_item(c, barcode)
+    loc_id, loc_name = stock.resolve_location(c, item[0], location, home=item[5])
+    stock.set_stock(c, item[0], loc_id, qty)
+    _log(c, user, "update", item[0], int(qty), loc_name)
+    return item[0], item[1]
+
+def sell_item_op(c, barcode, qty, user="admin", location=None):
+    """Reduce stock at a location (default: the item's home location) and record a sale.
+    Returns (item_id, name, new_qty) where new_qty is the item's total across locations."""
+    qty = int(qty)
+    if qty <= 0:
+        raise ValueError("Quantity to sell must be positive.")
+    item = _find_item(c, barcode)
+    loc_id, loc_name = stock.resolve_location(c, item[0], location, create=False, home=item[5])
+    before = stock.get_stock(c, item[0], loc_id)
+    if qty > before:
+        raise ValueError(f"Not enough stock for {barcode} at {loc_name}. Current: {before}")
+    stock.set_stock(c, item[0], loc_id, before - qty)
+    c.execute("INSERT INTO sales (user, item_id, qty_sold, location_id) VALUES (?, ?, ?, ?)",
+              (user, item[0], qty, loc_id))
+    _log(c, user, "sell", item[0], qty, loc_name)
+    return item[0], item[1], item[2] - qty
+
+def remove_item_op(c, barcode, user="admin"):
+    """Delete an item. Returns (item_id, name)."""
+    c.execute("SELECT id, name FROM items WHERE barcode=?", (barcode,))
+    item = c.fetchone()
+    if not item:
+        raise ValueError(f"Item not found for barcode: {barcode}")
+    c.execute("DELETE FROM items WHERE id=?", (item[0],))
+    _log(c, user, "remove", item[0], 0, "N/A")
+    return item[0], item[1]
+
+def quantity_change(ttype, q, sign=None):
+    """
+    Signed stock change for a transaction line (positive always means stock increase).
+    Adjustments take their direction from `sign` ('+' / '-') or from the sign of q.
+    """
+    if ttype in ("purchase", "restock", "return"):
+        return abs(q)
+    if ttype == "adjustment":
+        if sign == "+":
+            return abs(q)
+        if sign == "-":
+            return -abs(q)
+        if sign is None and q != 0:
+            return q
+        raise ValueError("Invalid adjustment sign.")
+    return -abs(q)
+
+def transaction_total(ttype, items_list):
+    total_amount = 0.0
+    for it in items_list:
+        if ttype in ("purchase", "restock"):
+            total_amount += it["quantity_changed"] * (it["unit_price"] or 0.0)
+        else:
+            total_amount += abs(it["quantity_changed"]) * (it["unit_price"] or 0.0)
+    return total_amount
+
+def build_transaction_line(c, ttype, barcode, q, sign=None, pending=None, location=None):
+    """
+    Look up an item and compute its transaction line at a location (default: the
+    item's home location); quantity_before/after are the stock at that location.
+    `pending` maps (item_id, location_id) -> quantity already changed earlier in the
+    same transaction.
+    """
+    item_id, name, _total, sale_price, purchase_price, home = _find_item(c, barcode)
+    change = quantity_change(ttype, int(q), sign)
+    # stock only leaves a location that exists; restocks may name a new one
+    loc_id, loc_name = stock.resolve_location(c, item_id, location, create=change > 0, home=home)
+    quantity_before = stock.get_stock(c, item_id, loc_id) + (pending or {}).get((item_id, loc_id), 0)
+    quantity_after = quantity_before + change
+    if quantity_after < 0:
+        raise ValueError(f"Not enough stock for {barcode} at {loc_name}. Current: {quantity_before}")
+    unit_price = sale_price if (sale_price is not None) else (purchase_price if purchase_price is not None else 0.0)
+    return {
+        "item_id": item_id,
+        "barcode": barcode,
+        "item_name": name,
+        "location_id": loc_id,
+        "location": loc_name,
+        "quantity_changed": change,
+        "quantity_before": quantity_before,
+        "quantity_after": quantity_after,
+        "unit_price": unit_price
+    }
+
+def save_transaction_op(c, ttype, items_list, user="admin", customer="", notes="", location=None):
+    """
+    Persist a prepared transaction (header, lines, stock, sales, logs). Returns the transaction id.
+    `location` is recorded on the header; each line applies its own location_id.
+    """
+    if ttype not in TRANSACTION_TYPES:
+        raise ValueError(f"Invalid transaction type: {ttype}")
+    if not items_list:
+        raise ValueError("No items in transaction.")
+    total_amount = transaction_total(ttype, items_list)
+    header_loc = stock.location_id(c, location) if location else None
+    c.execute("INSERT INTO transactions (user, type, customer, total_amount, notes, location_id) VALUES (?, ?, ?, ?, ?, ?)",
+              (user, ttype, customer, total_amount, notes, header_loc))
+    transaction_id = c.lastrowid
+    for it in items_list:
+        loc_id = it.get("location_id") or stock.home_location_id(c, it["item_id"])
+        stock.set_stock(c, it["item_id"], loc_id, it["quantity_after"])
+        c.execute("""
+            INSERT INTO transaction_items
+            (transaction_id, item_id, barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price, location_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (transaction_id, it["item_id"], it["barcode"], it["item_name"],
+              it["quantity_changed"], it["quantity_before"], it["quantity_after"], it["unit_price"], loc_id))
+        # for compatibility, if this was a sale, insert into sales table (one row per item)
+        if ttype == "sale":
+            c.execute("INSERT INTO sales (user, item_id, qty_sold, transaction_id, location_id) VALUES (?, ?, ?, ?, ?)",
+                      (user, it["item_id"], abs(it["quantity_changed"]), transaction_id, loc_id))
+        _log(c, user, ttype, it["item_id"], it["quantity_changed"], it.get("location") or "N/A")
+    return transaction_id
+
+def transaction_op(c, ttype, items, user="admin", customer="", notes="", location=None):
+    """
+    Build and save a transaction from [{"barcode": ..., "qty": ..., "sign": optional,
+    "location": optional}, ...] at `location` (per-line "location" overrides it; default
+    is each item's home location). Returns the transaction id.
+    """
+    if ttype not in TRANSACTION_TYPES:
+        raise ValueError(f"Invalid transaction type: {ttype}")
+    items_list = []
+    pending = {}
+    for entry in items:
+        line = build_transaction_line(c, ttype, entry["barcode"], entry["qty"], entry.get("sign"), pending,
+                                      entry.get("location") or location)
+        key = (line["item_id"], line["location_id"])
+        pending[key] = pending.get(key, 0) + line["quantity_changed"]
+        items_list.append(line)
+    return save_transaction_op(c, ttype, items_list, user, customer, notes, location)
+
+def apply_operation(c, op):
+    """
+    Apply one scripted operation (a dict, e.g. one JSON line) on cursor c.
+    Returns a short result description.
+    """
+    kind = (op.get("op") or "").lower()
+    user = op.get("user") or "admin"
+    if kind == "add":
+        item_id, barcode = add_item_op(c, op.get("name", "").strip(), op.get("category", ""), op.get("barcode"),
+                                       op.get("qty", op.get("quantity", 0)), op.get("supplier", ""),
+                                       float(op.get("purchase_price") or 0.0), float(op.get("sale_price") or 0.0),
+                                       op.get("location", ""), user)
+        return f"added item {item_id} ({barcode})"
+    if kind == "update":
+        item_id, _name = update_item_op(c, op["barcode"], op.get("qty", op.get("quantity")), user,
+                                        op.get("location"))
+        return f"updated item {item_id}"
+    if kind == "sell":
+        item_id, _name, new_qty = sell_item_op(c, op["barcode"], op.get("qty", op.get("quantity")), user,
+                                               op.get("location"))
+        return f"sold item {item_id}, now {new_qty}"
+    if kind == "remove":
+        item_id, _name = remove_item_op(c, op["barcode"], user)
+        return f"removed item {item_id}"
+    if kind == "transaction":
+        tx_id = transaction_op(c, (op.get("type") or "").lower(), op.get("items") or [], user,
+                               op.get("customer", ""), op.get("notes", ""), op.get("location"))
+        return f"transaction {tx_id}"
+    if kind == "move":
+        item_id = _find_item(c, op["barcode"])[0]
+        stock.move_stock(c, item_id, stock.location_id(c, op["from"], create=False),
+                         stock.location_id(c, op["to"]), op.get("qty", op.get("quantity")))
+        _log(c, user, "move", item_id, int(op.get("qty", op.get("quantity"))), f"{op['from']} -> {op['to']}")
+        return f"moved item {item_id}"
+    raise ValueError(f"Unknown operation: {kind or '(missing op)'}")
+
+def run_batch(lines, batch_size=500, stop_on_error=False, err=sys.stderr):
+    """
+    Apply a stream of JSON-lines operations in batched write transactions.
+    Each operation runs inside a savepoint, so a failing line is rolled back on its own
+    while the rest of its batch still commits. Returns (applied, failed).
+    """
+    import json
+    conn = connect_db()
+    conn.isolation_level = None  # explicit BEGIN/COMMIT
+    c = conn.cursor()
+    applied = failed = in_batch = 0
+    touched_items = set()
+    try:
+        c.execute("BEGIN")
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            c.execute("SAVEPOINT op")
+            try:
+                op = json.loads(line)
+                if not isinstance(op, dict):
+                    raise ValueError("operation must be a JSON object")
+                apply_operation(c, op)
+                c.execute("RELEASE op")
+                applied += 1
+                if (op.get("op") or "").lower() in ("sell", "transaction"):
+                    for b in [op.get("barcode")] + [i.get("barcode") for i in op.get("items") or []]:
+                        if b:
+                            touched_items.add(b)
+            except Exception as e:
+                c.execute("ROLLBACK TO op")
+                c.execute("RELEASE op")
+                failed += 1
+                print(f"❌ line {lineno}: {e}", file=err)
+                if stop_on_error:
+                    break
+            in_batch += 1
+            if in_batch >= batch_size:
+                c.execute("COMMIT")
+                c.execute("BEGIN")
+                in_batch = 0
+        c.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    for barcode in touched_items:
+        check_low_stock_barcode(barcode)
+    return applied, failed
 
 # ------------------------
-# Inventory Core Functions
+# Inventory Core Functions (interactive)
 # ------------------------
 def add_item():
     name = input("Item Name: ").strip()
@@ -44,8 +334,6 @@ def add_item():
 
     category = input("Category: ").strip()
     barcode_input = input("Barcode (leave blank to auto-generate): ").strip()
-    if not barcode_input:
-        barcode_input = generate_unique_barcode()
 
     # quantity
     try:
@@ -65,40 +353,31 @@ def add_item():
         sale_price = 0.0
     location = input("Location: ").strip()
 
+    add_item_with_image(name, category, barcode_input, qty, supplier, purchase_price, sale_price, location)
+
+def add_item_with_image(name, category, barcode, qty, supplier, purchase_price, sale_price, location, user="admin"):
     conn = connect_db()
     c = conn.cursor()
-
-    attempts = 0
-    item_id = None
-    while attempts < 5:
-        try:
-            c.execute("""
-                INSERT INTO items (name, category, barcode, quantity, supplier, purchase_price, sale_price, location)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (name, category, barcode_input, qty, supplier, purchase_price, sale_price, location))
-            conn.commit()
-            item_id = c.lastrowid
-            break
-        except sqlite3.IntegrityError:
-            attempts += 1
-            barcode_input = generate_unique_barcode()
-        except Exception as e:
-            conn.close()
-            print("❌ Error inserting item:", e)
-            return
+    try:
+        item_id, barcode = add_item_op(c, name, category, barcode, qty, supplier,
+                                       purchase_price, sale_price, location, user)
+        conn.commit()
+    except Exception as e:
+        conn.close()
+        print("❌ Error inserting item:", e)
+        return None
+    conn.close()
 
     # generate barcode image if libs available
     try:
-        img_path = generate_barcode_image(barcode_input)
+        img_path = generate_barcode_image(barcode)
         print(f"🖨 Barcode image saved at: {img_path}")
     except Exception as e:
         # non-fatal; proceed even if barcode image generation fails
         print("⚠ Barcode image not created:", e)
 
-    # log
-    log_action("admin", "add", item_id, qty, location)
-    conn.close()
-    print(f"✅ Item '{name}' added successfully with barcode: {barcode_input}")
+    print(f"✅ Item '{name}' added successfully with barcode: {barcode}")
+    return item_id
 
 def update_item():
     barcode = input("Barcode of item to update: ").strip()
@@ -106,22 +385,31 @@ def update_item():
     c = conn.cursor()
     c.execute("SELECT id, name, quantity FROM items WHERE barcode=?", (barcode,))
     item = c.fetchone()
+    conn.close()
     if not item:
         print("❌ Item not found.")
-        conn.close()
         return
     print(f"Current: {item[1]} - Qty: {item[2]}")
     try:
         qty = int(input("New Quantity: ").strip())
     except ValueError:
         print("❌ Quantity must be an integer.")
-        conn.close()
         return
-    c.execute("UPDATE items SET quantity=? WHERE id=?", (qty, item[0]))
-    conn.commit()
-    log_action("admin", "update", item[0], qty, "N/A")
-    conn.close()
+    update_item_qty(barcode, qty)
+
+def update_item_qty(barcode, qty, user="admin", location=None):
+    conn = connect_db()
+    c = conn.cursor()
+    try:
+        update_item_op(c, barcode, qty, user, location)
+        conn.commit()
+    except ValueError as e:
+        print("❌", e)
+        return
+    finally:
+        conn.close()
     print("✅ Item updated.")
+    return True
 
 def sell_item():
     barcode = input("Barcode of item to sell: ").strip()
@@ -130,55 +418,47 @@ def sell_item():
     except ValueError:
         print("❌ Quantity must be an integer.")
         return
+    sell(barcode, qty)
+
+def sell(barcode, qty, user="admin", location=None):
     conn = connect_db()
     c = conn.cursor()
-    c.execute("SELECT id, name, quantity FROM items WHERE barcode=?", (barcode,))
-    item = c.fetchone()
-    if not item:
-        print("❌ Item not found.")
-        conn.close()
+    try:
+        item_id, name, _new_qty = sell_item_op(c, barcode, qty, user, location)
+        conn.commit()
+    except ValueError as e:
+        print("❌", e)
         return
-    if qty > item[2]:
-        print("❌ Not enough stock.")
+    finally:
         conn.close()
-        return
-    new_qty = item[2] - qty
-    c.execute("UPDATE items SET quantity=? WHERE id=?", (new_qty, item[0]))
-    c.execute("INSERT INTO sales (user, item_id, qty_sold) VALUES (?, ?, ?)", ("admin", item[0], qty))
-    conn.commit()
-    log_action("admin", "sell", item[0], qty, "N/A")
-    check_low_stock(item[0])
-    conn.close()
-    print(f"✅ Sold {qty} of {item[1]}.")
+    check_low_stock(item_id)
+    print(f"✅ Sold {qty} of {name}.")
+    return True
 
 def remove_item():
     barcode = input("Barcode of item to remove: ").strip()
+    remove(barcode)
+
+def remove(barcode, user="admin"):
     conn = connect_db()
     c = conn.cursor()
-    c.execute("SELECT id, name FROM items WHERE barcode=?", (barcode,))
-    item = c.fetchone()
-    if not item:
-        print("❌ Item not found.")
-        conn.close()
+    try:
+        _item_id, name = remove_item_op(c, barcode, user)
+        conn.commit()
+    except ValueError as e:
+        print("❌", e)
         return
-    c.execute("DELETE FROM items WHERE id=?", (item[0],))
-    conn.commit()
-    log_action("admin", "remove", item[0], 0, "N/A")
-    conn.close()
-    print(f"✅ Item '{item[1]}' removed.")
+    finally:
+        conn.close()
+    print(f"✅ Item '{name}' removed.")
+    return True
 
 # ------------------------
 # Helper Functions
 # ------------------------
-def log_action(user, action, item_id, quantity, location):
-    conn = connect_db()
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO logs (user, action, item_id, quantity, location)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user, action, item_id, quantity, location))
-    conn.commit()
-    conn.close()
+def log_action(user, action, item_id, quantity, location, cursor):
+    """Audit log row, written with `cursor` so it commits with the change (see audit_writer.py)."""
+    write_log(cursor, user, action, item_id, quantity, location)
 
 def check_low_stock(item_id):
     conn = connect_db()
@@ -192,39 +472,261 @@ def check_low_stock(item_id):
         print(f"⚠ LOW STOCK ALERT: {item[0]} has only {item[1]} left!")
     conn.close()
 
-def view_inventory():
+def check_low_stock_barcode(barcode):
     conn = connect_db()
     c = conn.cursor()
-    c.execute("SELECT id, name, barcode, quantity, sale_price, location FROM items ORDER BY id")
-    items = c.fetchall()
+    c.execute("SELECT id FROM items WHERE barcode=?", (barcode,))
+    row = c.fetchone()
     conn.close()
-    print("\n--- INVENTORY ---")
-    if not items:
-        print("No items found.")
-        return
-    for i in items:
-        print(f"ID:{i[0]} | {i[1]} | Barcode:{i[2]} | Qty:{i[3]} | Price:{i[4]} | Loc:{i[5]}")
+    if row:
+        check_low_stock(row[0])
+
+def inventory_snapshot():
+    """The shared columnar items snapshot (inventory_snapshot.py), brought up to date."""
+    snap = get_snapshot(DB_FILE)
+    snap.refresh()
+    return snap
 
-def view_logs():
+def view_inventory():
+    conn = None
+    if not snapshot_supported(DB_FILE):
+        # the snapshot follows one SQLite database's change feed; read the shards' union
+        # (or the PostgreSQL items table) instead
+        conn = connect_db()
+        t = dict(zip(("items", "units", "cost_value", "retail_value"), conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(quantity * COALESCE(purchase_price, 0)), 0),
+                   COALESCE(SUM(quantity * COALESCE(sale_price, 0)), 0) FROM items
+        """).fetchone()))
+        rows = storage.iter_rows(conn, "SELECT id, name, barcode, quantity, sale_price, location FROM items ORDER BY id")
+    else:
+        snap = inventory_snapshot()
+        t = snap.totals()
+        rows = snap.rows(("id", "name", "barcode", "quantity", "sale_price", "location"))
+    try:
+        print("\n--- INVENTORY ---")
+        if not t["items"]:
+            print("No items found.")
+            return
+        for i in rows:
+            print(f"ID:{i[0]} | {i[1]} | Barcode:{i[2]} | Qty:{i[3]} | Price:{i[4]} | Loc:{i[5]}")
+    finally:
+        if conn is not None:
+            conn.close()
+    print(f"{t['items']} items | {t['units']} units | value {t['cost_value']:.2f} at cost, {t['retail_value']:.2f} retail")
+
+def view_logs(start=None, end=None, limit=20):
+    """Newest logs first; limit 0 lists them all (streamed, see storage.iter_rows)."""
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT timestamp, user, action, item_id, quantity FROM logs ORDER BY timestamp DESC LIMIT 20")
-    logs = c.fetchall()
+    try:
+        if start or end:
+            # may need to reach into archived partitions
+            logs = (r[1:6] for r in itertools.islice(iter_logs(conn, start, end), limit or None))
+        else:
+            sql, params = "SELECT timestamp, user, action, item_id, quantity FROM logs ORDER BY timestamp DESC", ()
+            if limit:   # no limit: no LIMIT clause (SQLite's LIMIT -1 is an error on PostgreSQL)
+                sql += " LIMIT ?"
+                params = (limit,)
+            logs = storage.iter_rows(conn, sql, params)
+        print("\n--- LAST LOGS ---")
+        shown = 0
+        for l in logs:
+            print(l)
+            shown += 1
+        if not shown:
+            print("No logs.")
+    finally:
+        conn.close()
+
+def search_inventory(text, limit=50):
+    conn = connect_db()
+    results = search_items(conn, text, limit)
     conn.close()
-    print("\n--- LAST LOGS ---")
-    if not logs:
-        print("No logs.")
+    print(f"\n--- SEARCH: {text} ---")
+    if not results:
+        print("No matching items.")
+        return results
+    for i in results:
+        print(f"ID:{i['id']} | {i['name']} | Barcode:{i['barcode']} | Qty:{i['quantity']} | "
+              f"Cat:{i['category']} | Supplier:{i['supplier']} | Loc:{i['location']}")
+    return results
+
+def show_stock(barcode=None):
+    """Per-location stock of one item, or totals for every location."""
+    if shards.is_all_stores(DB_FILE):
+        return show_stock_all_stores(barcode)
+    conn = connect_db(); c = conn.cursor()
+    try:
+        if barcode:
+            item = _find_item(c, barcode)
+            rows = stock.stock_by_location(c, item[0])
+            print(f"\n--- STOCK: {item[1]} (total {item[2]}, home {item[5] or stock.DEFAULT_LOCATION}) ---")
+            for name, qty in rows:
+                print(f"{name:<24} {qty:>8}")
+        else:
+            rows = stock.location_totals(c)
+            print("\n--- STOCK BY LOCATION ---")
+            if not rows:
+                print("No stock recorded.")
+            for name, items, qty in rows:
+                print(f"{name:<24} items: {items:>6} | qty: {qty:>8}")
+    except ValueError as e:
+        print("❌", e)
         return
-    for l in logs:
-        print(l)
+    finally:
+        conn.close()
+    return True
 
-def get_all_items():
+def show_stock_all_stores(barcode=None):
+    """show_stock() for every store shard (location names repeat between stores)."""
+    def read(c):
+        if not barcode:
+            return stock.location_totals(c)
+        c.execute("SELECT id FROM items WHERE barcode=?", (barcode,))
+        row = c.fetchone()
+        return stock.stock_by_location(c, row[0]) if row else []
+    try:
+        results = shards.fan_out(read)
+    except ValueError as e:
+        print("❌", e)
+        return
+    print(f"\n--- STOCK{': ' + barcode if barcode else ' BY LOCATION'} (all stores) ---")
+    for store, rows in results:
+        for r in rows:
+            label = f"{store} / {r[0]}"
+            if barcode:
+                print(f"{label:<32} {r[1]:>8}")
+            else:
+                print(f"{label:<32} items: {r[1]:>6} | qty: {r[2]:>8}")
+    return True
+
+def move_item_stock(barcode, from_location, to_location, qty, user="admin"):
+    conn = connect_db(); c = conn.cursor()
+    try:
+        apply_operation(c, {"op": "move", "barcode": barcode, "from": from_location, "to": to_location,
+                            "qty": qty, "user": user})
+        conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        print("❌", e)
+        return
+    finally:
+        conn.close()
+    print(f"✅ Moved {qty} of {barcode} from {from_location} to {to_location}.")
+    return True
+
+def merge_duplicate_item(duplicate_barcode, target_barcode, user="admin"):
+    """Fold an old one-row-per-store duplicate into the item that should carry all locations."""
+    conn = connect_db(); c = conn.cursor()
+    try:
+        source = _find_item(c, duplicate_barcode)
+        target = _find_item(c, target_barcode)
+        stock.merge_items(c, source[0], target[0])
+        if storage.dialect_of(c) == "sqlite":
+            # rollups and replenishment tables are SQLite-only (not in POSTGRES_DDL)
+            rollups.merge_item(c, source[0], target[0])
+            replenishment.merge_item(c, source[0], target[0])
+        _log(c, user, "merge", target[0], source[2], source[5])
+        conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        print("❌", e)
+        return
+    finally:
+        conn.close()
+    print(f"✅ Merged {source[1]} ({duplicate_barcode}) into {target[1]} ({target_barcode}).")
+    return True
+
+def format_event(ev):
+    data = " ".join(f"{k}={v}" for k, v in ev["data"].items())
+    return f"#{ev['seq']} {ev['ts']} {ev['entity']}:{ev['id']} {ev['op']} {data}"
+
+def tail_events(after=None, limit=20, entities=None, follow=False):
+    """Print change-feed events after seq `after` (default: the last `limit`); follow blocks for new ones."""
+    if not require_sqlite("Change feed"):
+        return False
     conn = connect_db()
-    c = conn.cursor()
-    c.execute("SELECT barcode, name, category, quantity, sale_price, location FROM items ORDER BY id")
-    rows = c.fetchall()
+    try:
+        if after is None:
+            after = max(0, change_feed.latest_seq(conn) - limit)
+        events = change_feed.read_events(conn, after, limit if not follow else 10000, entities)
+    finally:
+        conn.close()
+    for ev in events:
+        print(format_event(ev))
+    if follow:
+        last = events[-1]["seq"] if events else after
+        try:
+            for ev in change_feed.subscribe(DB_FILE, last, entities):
+                print(format_event(ev), flush=True)
+        except KeyboardInterrupt:
+            pass
+    return True
+
+def prune_events(days=None):
+    if not require_sqlite("Change feed"):
+        return False
+    conn = connect_db()
+    try:
+        removed = change_feed.prune_events(conn, days)
+    finally:
+        conn.close()
+    print(f"✅ Pruned {removed} change events.")
+    return True
+
+def archive_old_logs(days=None, fmt="sqlite"):
+    if not require_sqlite("Log archiving"):
+        return None
+    conn = connect_db()
+    moved = archive_logs(conn, days, fmt)
     conn.close()
-    return rows
+    if not moved:
+        print("No logs old enough to archive.")
+        return moved
+    for month, n in moved.items():
+        print(f"📦 {month}: {n} log rows archived")
+    print(f"✅ Archived {sum(moved.values())} log rows.")
+    return moved
+
+def show_query_stats(limit=30, sort="total", slow=10, reset=False):
+    query_stats.use_database(DB_FILE)   # the stats files sit next to it (or in INVENTORY_STATS_DIR)
+    if query_stats.stats_path() is None:
+        print("⚠ Stats of earlier runs aren't kept for a PostgreSQL database; set INVENTORY_STATS_DIR.")
+    if reset:
+        query_stats.reset_saved_stats()
+        print("✅ Query stats reset.")
+        return
+    stats = query_stats.merge_stats(query_stats.load_saved_stats(), query_stats.STATS.snapshot())
+    print("\n--- QUERY STATS ---")
+    if not stats:
+        print("No statements recorded yet.")
+    else:
+        print(query_stats.format_stats(stats, limit, sort))
+    lines = query_stats.tail_slow_log(slow)
+    if lines:
+        print(f"\n--- SLOW QUERIES (>= {query_stats.SLOW_QUERY_MS:g} ms, last {len(lines)}) ---")
+        for line in lines:
+            print(line.rstrip())
+
+EXPORT_COLUMNS = ("barcode", "name", "category", "quantity", "sale_price", "location")
+
+def iter_items(columns=EXPORT_COLUMNS):
+    """
+    Items in id order as tuples of `columns`, generated chunk by chunk from the
+    snapshot, or streamed from items where there is none (PostgreSQL, all stores).
+    """
+    if snapshot_supported(DB_FILE):
+        return inventory_snapshot().rows(columns)
+    return _stream_items(columns)
+
+def _stream_items(columns):
+    conn = connect_db()
+    try:
+        yield from storage.iter_rows(conn, f"SELECT {', '.join(columns)} FROM items ORDER BY id")
+    finally:
+        conn.close()
+
+def get_all_items():
+    return list(iter_items())
 
 # ------------------------
 # Phase 3: Transactions (multi-item)
@@ -235,95 +737,61 @@ def create_transaction():
     Types: sale (reduces stock), purchase/restock (increases stock), adjustment, damage, return.
     """
     ttype = input("Transaction Type (sale/purchase/restock/adjustment/damage/return): ").strip().lower()
-    if ttype not in ("sale", "purchase", "restock", "adjustment", "damage", "return"):
+    if ttype not in TRANSACTION_TYPES:
         print("❌ Invalid type.")
         return
 
     performed_by = input("Performed by (username) [default: admin]: ").strip() or "admin"
     customer = input("Customer name (optional): ").strip()
     notes = input("Notes (optional): ").strip()
+    location = input("Location (optional, default: each item's home location): ").strip() or None
 
     items_list = []
+    pending = {}
     while True:
         barcode = input("Scan/Enter barcode (or type 'done' to finish): ").strip()
         if barcode.lower() == "done":
             break
         conn = connect_db(); c = conn.cursor()
-        c.execute("SELECT id, name, quantity, sale_price, purchase_price FROM items WHERE barcode=?", (barcode,))
+        c.execute("SELECT id, name, quantity FROM items WHERE barcode=?", (barcode,))
         row = c.fetchone()
         conn.close()
         if not row:
             print("❌ Item not found for barcode:", barcode)
             continue
-        item_id, name, current_qty, sale_price, purchase_price = row
-        print(f"Found: {name} | Current qty: {current_qty}")
+        print(f"Found: {row[1]} | Current qty (all locations): {row[2] + sum(v for (i, _l), v in pending.items() if i == row[0])}")
         try:
             q = int(input("Quantity (positive integer): ").strip())
         except ValueError:
             print("❌ Invalid quantity.")
             continue
 
-        # determine quantity change sign:
-        if ttype in ("sale", "damage", "return") and ttype != "purchase" and ttype != "restock":
-            # For 'sale' and 'damage', we'll reduce stock (negative change)
-            pass
-
-        # For clarity, define change so that positive always means stock increase.
-        if ttype in ("purchase", "restock"):
-            change = q  # add to stock
-        elif ttype == "sale":
-            change = -q  # reduce stock
-        elif ttype == "damage":
-            change = -q
-        elif ttype == "return":
-            change = q
-        elif ttype == "adjustment":
+        sign = None
+        if ttype == "adjustment":
             # ask whether it's +/- adjustment
-            adj = input("Adjustment + or - ? (enter '+' or '-'): ").strip()
-            if adj == "+":
-                change = q
-            elif adj == "-":
-                change = -q
-            else:
+            sign = input("Adjustment + or - ? (enter '+' or '-'): ").strip()
+            if sign not in ("+", "-"):
                 print("❌ Invalid adjustment sign.")
                 continue
-        else:
-            change = -q
 
-        quantity_before = current_qty
-        quantity_after = current_qty + change
-
-        if quantity_after < 0:
-            print("❌ Not enough stock. Current:", current_qty)
+        conn = connect_db(); c = conn.cursor()
+        try:
+            line = build_transaction_line(c, ttype, barcode, q, sign, pending, location)
+        except ValueError as e:
+            print("❌", e)
             continue
-
-        unit_price = sale_price if (sale_price is not None) else (purchase_price if purchase_price is not None else 0.0)
-        items_list.append({
-            "item_id": item_id,
-            "barcode": barcode,
-            "item_name": name,
-            "quantity_changed": change,
-            "quantity_before": quantity_before,
-            "quantity_after": quantity_after,
-            "unit_price": unit_price
-        })
-        print(f"Added to transaction: {name} | change: {change} | after: {quantity_after}")
+        finally:
+            conn.close()
+        key = (line["item_id"], line["location_id"])
+        pending[key] = pending.get(key, 0) + line["quantity_changed"]
+        items_list.append(line)
+        print(f"Added to transaction: {line['item_name']} | {line['location']} | change: {line['quantity_changed']} | after: {line['quantity_after']}")
 
     if not items_list:
         print("No items in transaction. Aborting.")
         return
 
-    # compute total (for sale type we sum qty_sold * sale_price). For purchases we can sum cost if purchase_price present.
-    total_amount = 0.0
-    for it in items_list:
-        if ttype == "sale":
-            qty_sold = -it["quantity_changed"] if it["quantity_changed"] < 0 else it["quantity_changed"]
-            total_amount += qty_sold * (it["unit_price"] or 0.0)
-        elif ttype in ("purchase", "restock"):
-            total_amount += it["quantity_changed"] * (it["unit_price"] or 0.0)
-        else:
-            # adjustments/damage/return: optional zero or keep computed absolute value
-            total_amount += abs(it["quantity_changed"]) * (it["unit_price"] or 0.0)
+    total_amount = transaction_total(ttype, items_list)
 
     print("\n--- Transaction Summary ---")
     print(f"Type: {ttype} | Items: {len(items_list)} | Total approx: {total_amount:.2f}")
@@ -338,32 +806,7 @@ def create_transaction():
     # Persist transaction atomically
     conn = connect_db(); c = conn.cursor()
     try:
-        c.execute("INSERT INTO transactions (user, type, customer, total_amount, notes) VALUES (?, ?, ?, ?, ?)",
-                  (performed_by, ttype, customer, total_amount, notes))
-        transaction_id = c.lastrowid
-
-        for it in items_list:
-            # update item stock
-            c.execute("UPDATE items SET quantity=? WHERE id=?", (it["quantity_after"], it["item_id"]))
-            # insert into transaction_items
-            c.execute("""
-                INSERT INTO transaction_items
-                (transaction_id, item_id, barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (transaction_id, it["item_id"], it["barcode"], it["item_name"],
-                  it["quantity_changed"], it["quantity_before"], it["quantity_after"], it["unit_price"]))
-
-            # for compatibility, if this was a sale, insert into sales table (one row per item)
-            if ttype == "sale":
-                qty_sold = -it["quantity_changed"] if it["quantity_changed"] < 0 else it["quantity_changed"]
-                c.execute("INSERT INTO sales (user, item_id, qty_sold) VALUES (?, ?, ?)",
-                          (performed_by, it["item_id"], qty_sold))
-
-            # log action
-            action_label = ttype
-            c.execute("INSERT INTO logs (user, action, item_id, quantity, location) VALUES (?, ?, ?, ?, ?)",
-                      (performed_by, action_label, it["item_id"], it["quantity_changed"], "N/A"))
-
+        transaction_id = save_transaction_op(c, ttype, items_list, performed_by, customer, notes, location)
         conn.commit()
         print(f"✅ Transaction saved. ID: {transaction_id}")
     except Exception as e:
@@ -373,16 +816,197 @@ def create_transaction():
         conn.close()
 
 def view_transactions(limit=50):
-    conn = connect_db(); c = conn.cursor()
-    c.execute("SELECT id, timestamp, user, type, customer, total_amount FROM transactions ORDER BY timestamp DESC LIMIT ?", (limit,))
-    rows = c.fetchall()
-    conn.close()
-    print("\n--- TRANSACTIONS (recent) ---")
+    """Most recent transactions; limit 0 lists them all (streamed)."""
+    conn = connect_db()
+    try:
+        print("\n--- TRANSACTIONS (recent) ---")
+        sql, params = "SELECT id, timestamp, user, type, customer, total_amount FROM transactions ORDER BY timestamp DESC", ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        shown = 0
+        for r in storage.iter_rows(conn, sql, params):
+            print(f"ID:{r[0]} | {r[1]} | {r[2]} | {r[3]} | Customer:{r[4]} | Total:{(r[5] or 0):.2f}")
+            shown += 1
+        if not shown:
+            print("No transactions found.")
+    finally:
+        conn.close()
+
+def _valuation_rows(c, kind, by, since, until):
+    if kind == "valuation":
+        return valuation.stock_valuation(c, by)
+    if kind == "losses":
+        return valuation.losses(c, since, until, by or "type")
+    return valuation.sales_margin(c, since, until, by or "category")
+
+def show_valuation(kind="valuation", by=None, since=None, until=None):
+    """Stock valuation, damage/adjustment losses or sales margin (see valuation.py).
+    For all stores each shard is aggregated in parallel and the groups merged."""
+    try:
+        if shards.is_all_stores(DB_FILE):
+            results = shards.fan_out(lambda c: _valuation_rows(c, kind, by, since, until))
+            rows = valuation.merge_rows(r for _store, r in results)
+        else:
+            conn = connect_db()
+            try:
+                rows = _valuation_rows(conn.cursor(), kind, by, since, until)
+            finally:
+                conn.close()
+    except ValueError as e:
+        print("❌", e)
+        return False
+    if kind == "valuation":
+        title = f"STOCK VALUATION{' BY ' + by.upper() if by else ''}"
+    elif kind == "losses":
+        title = f"DAMAGE / ADJUSTMENTS BY {(by or 'type').upper()}"
+    else:
+        title = f"SALES MARGIN BY {(by or 'category').upper()}"
+    period = f" ({since or '...'} to {until or 'now'})" if kind != "valuation" else ""
+    print(f"\n--- {title}{period} ---")
     if not rows:
-        print("No transactions found.")
-        return
+        print("Nothing to report.")
+        return True
+    count_key = "items" if kind == "valuation" else "transactions"
     for r in rows:
-        print(f"ID:{r[0]} | {r[1]} | {r[2]} | {r[3]} | Customer:{r[4]} | Total:{(r[5] or 0):.2f}")
+        pct = f"{r['margin_pct']:.1f}%" if r["margin_pct"] is not None else "-"
+        print(f"{str(r['group'] if r['group'] is not None else '(none)')[:24]:<24} {count_key}: {r[count_key]:>7} | "
+              f"units: {r['units']:>9} | cost: {r['cost_value']:>14.2f} | retail: {r['retail_value']:>14.2f} | "
+              f"margin: {r['margin_value']:>14.2f} ({pct})")
+    return True
+
+def show_sales(since=None, until=None, by="month", barcode=None, category=None, top=0):
+    """Sales and movement over time from the daily rollups (rollups.py). For all
+    stores each shard is read in parallel and the periods merged."""
+    def read(c, limit, missing_ok=False):
+        try:
+            item_id = _find_item(c, barcode)[0] if barcode else None
+        except ValueError:
+            if missing_ok:
+                return [], []   # a store that doesn't stock the item
+            raise
+        best = rollups.top_items(c, since, until, "units_sold", limit) if top and not barcode else []
+        return rollups.series(c, since, until, by, item_id, category), best
+    if not require_sqlite("Sales report"):
+        return False
+    try:
+        if shards.is_all_stores(DB_FILE):
+            # an item is a separate row in every store that stocks it: merge top sellers
+            # by barcode from complete per-store lists (LIMIT -1)
+            results = shards.fan_out(lambda c: read(c, -1, missing_ok=True))
+            rows = shards.merge_series((s, r[0]) for s, r in results)
+            best = shards.merge_top(((s, r[1]) for s, r in results), top)
+        else:
+            conn = connect_db()
+            try:
+                rows, best = read(conn.cursor(), top)
+            finally:
+                conn.close()
+    except ValueError as e:
+        print("❌", e)
+        return False
+    scope = f" for {barcode}" if barcode else (f" in {category}" if category else "")
+    print(f"\n--- SALES BY {by.upper()}{scope} ({since or '...'} to {until or 'now'}) ---")
+    if not rows:
+        print("No sales or movement in this period.")
+        return True
+    for period, sold, revenue, restocked, returned, damaged, adjusted in rows:
+        print(f"{period:<10} sold: {sold:>8} | revenue: {revenue:>14.2f} | restocked: {restocked:>8} | "
+              f"returned: {returned:>6} | damaged: {damaged:>6} | adjusted: {adjusted:>+7}")
+    if best:
+        print("\nTop sellers:")
+        for _item_id, code, name, units in best:
+            print(f"{code} | {name} | {units}")
+    return True
+
+def manage_stores(action, args):
+    """stores list / add / report (see shards.py)."""
+    if action == "add":
+        path = shards.create_store(args.name)
+        print(f"✅ Store '{args.name}' -> {path}")
+        return True
+    if action == "list":
+        stores = shards.list_stores()
+        if not stores:
+            print(f"No store shards in {shards.SHARD_DIR}/. Create one with: stores add NAME")
+        for name, path in stores:
+            print(f"{name:<24} {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        return True
+    try:
+        rows = shards.store_report(args.since, args.until, workers=args.workers)
+    except ValueError as e:
+        print("❌", e)
+        return False
+    print(f"\n--- STORES ({args.since or '...'} to {args.until or 'now'}) ---")
+    for name, t in rows:
+        print(f"{name[:24]:<24} items: {t['items']:>7} | units: {t['units']:>9} | cost: {t['cost_value']:>14.2f} | "
+              f"retail: {t['retail_value']:>14.2f} | sold: {t['units_sold']:>9} | revenue: {t['revenue']:>14.2f}")
+    return True
+
+def manage_purchase_orders(action, args):
+    """po plan / list / show / order / receive / cancel / supplier (see replenishment.py)."""
+    if not require_sqlite("Purchase orders"):
+        return False
+    conn = connect_db(); c = conn.cursor()
+    try:
+        if action == "plan":
+            start = time.perf_counter()
+            drafts = replenishment.plan(c, args.history_days, args.lead_days, args.review_days, args.z, args.supplier)
+            conn.commit()
+            print(f"✅ {len(drafts)} draft purchase orders in {time.perf_counter() - start:.2f}s")
+            for po_id, supplier, lines, units, cost in drafts:
+                print(f"PO {po_id:>6} | {supplier[:30]:<30} | lines: {lines:>6} | units: {units:>8} | cost: {cost:>12.2f}")
+        elif action == "show":
+            (po_id, supplier, status, created, lines, units, cost, tx_id), items = replenishment.get_order(c, args.id)
+            print(f"\n--- PO {po_id}: {supplier} ({status}, {created}) ---")
+            print(f"{'Barcode':<16} {'Name':<30} {'Qty':>6} {'Cost':>9} {'On hand':>8} {'Ordered':>8} "
+                  f"{'Per day':>8} {'ROP':>7} {'Up to':>7}")
+            for barcode, name, qty, unit_cost, on_hand, on_order, velocity, rop, up_to in items:
+                print(f"{barcode or '':<16} {(name or '')[:30]:<30} {qty:>6} {unit_cost or 0:>9.2f} {on_hand:>8} "
+                      f"{on_order:>8} {velocity or 0:>8.2f} {rop or 0:>7.1f} {up_to or 0:>7.1f}")
+            print(f"{lines} lines, {units} units, cost {cost:.2f}" + (f", received in transaction {tx_id}" if tx_id else ""))
+        elif action == "order":
+            replenishment.order(c, args.id)
+            conn.commit()
+            print(f"✅ PO {args.id} marked as ordered.")
+        elif action == "cancel":
+            replenishment.cancel(c, args.id)
+            conn.commit()
+            print(f"✅ PO {args.id} cancelled.")
+        elif action == "receive":
+            tx_id = replenishment.receive(c, args.id, args.location, args.user)
+            conn.commit()
+            print(f"✅ PO {args.id} received. Purchase transaction ID: {tx_id}")
+        elif action == "supplier":
+            replenishment.set_supplier(c, args.name, args.lead_days, args.review_days)
+            conn.commit()
+            print(f"✅ Supplier '{args.name}' saved.")
+        else:
+            rows = replenishment.list_orders(c, getattr(args, "status", None), getattr(args, "limit", 50))
+            if not rows:
+                print("No purchase orders. Create drafts with: po plan")
+            for po_id, supplier, status, created, lines, units, cost, tx_id in rows:
+                print(f"PO {po_id:>6} | {created} | {status:<9} | {supplier[:30]:<30} | lines: {lines:>6} | "
+                      f"units: {units:>8} | cost: {cost:>12.2f}")
+    except ValueError as e:
+        conn.rollback()
+        print("❌", e)
+        return False
+    finally:
+        conn.close()
+    return True
+
+def rebuild_rollups(since=None, until=None):
+    if not require_sqlite("Rollup rebuild"):
+        return False
+    conn = connect_db(); c = conn.cursor()
+    try:
+        written = rollups.rebuild(c, since, until)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"✅ Rebuilt {written} item-day rollup rows.")
+    return True
 
 def view_transaction_details():
     tid = input("Enter transaction ID to view details: ").strip()
@@ -391,6 +1015,9 @@ def view_transaction_details():
     except ValueError:
         print("❌ Invalid ID.")
         return
+    print_transaction_details(tid)
+
+def print_transaction_details(tid):
     conn = connect_db(); c = conn.cursor()
     c.execute("SELECT id, timestamp, user, type, customer, total_amount, notes FROM transactions WHERE id=?", (tid,))
     tx = c.fetchone()
@@ -401,114 +1028,69 @@ def view_transaction_details():
     print(f"\nTransaction {tx[0]} | {tx[1]} | {tx[2]} | {tx[3]} | customer: {tx[4]} | total: {(tx[5] or 0):.2f}")
     if tx[6]:
         print("Notes:", tx[6])
-    c.execute("SELECT barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price FROM transaction_items WHERE transaction_id=?", (tid,))
+    c.execute("""
+        SELECT t.barcode, t.item_name, t.quantity_changed, t.quantity_before, t.quantity_after, t.unit_price, l.name
+        FROM transaction_items t LEFT JOIN locations l ON l.id = t.location_id
+        WHERE t.transaction_id=?
+    """, (tid,))
     items = c.fetchall()
     conn.close()
     print("\nItems:")
     for it in items:
-        print(f"{it[1]} | barcode:{it[0]} | change:{it[2]} | before:{it[3]} | after:{it[4]} | unit_price:{it[5]}")
+        loc = f" | location:{it[6]}" if it[6] else ""
+        print(f"{it[1]} | barcode:{it[0]} | change:{it[2]} | before:{it[3]} | after:{it[4]} | unit_price:{it[5]}{loc}")
 
 def export_transactions_csv(filename=None):
-    import csv
-    rows = []
     conn = connect_db(); c = conn.cursor()
-    c.execute("SELECT id, timestamp, user, type, customer, total_amount FROM transactions ORDER BY timestamp DESC")
-    txs = c.fetchall()
-    if not txs:
+    c.execute("SELECT 1 FROM transactions LIMIT 1")
+    if not c.fetchone():
         print("No transactions to export.")
         conn.close(); return
     if not filename:
         filename = f"transactions_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    with open(filename, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["transaction_id", "timestamp", "user", "type", "customer", "total_amount", "item_barcode", "item_name", "qty_changed", "qty_before", "qty_after", "unit_price"])
-        for tx in txs:
-            tx_id = tx[0]
-            c.execute("SELECT barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price FROM transaction_items WHERE transaction_id=?", (tx_id,))
-            items = c.fetchall()
-            if items:
-                for it in items:
-                    writer.writerow([tx[0], tx[1], tx[2], tx[3], tx[4], tx[5], it[0], it[1], it[2], it[3], it[4], it[5]])
-            else:
-                writer.writerow([tx[0], tx[1], tx[2], tx[3], tx[4], tx[5], "", "", "", "", "", ""])
-    conn.close()
+    # one joined query streamed into the file (see export_jobs.DATASETS)
+    sql, params = export_jobs.dataset_query("transactions")
+    try:
+        export_jobs.write_transactions_csv(c.execute(sql, params), filename)
+    finally:
+        conn.close()
     print(f"✅ Transactions exported to {filename}")
 
 # ------------------------
 # Export Functions
 # ------------------------
-def export_inventory_to_excel():
+def export_inventory_to_excel(filename=None):
     if not HAS_OPENPYXL:
         print("❌ openpyxl is not installed. Run: pip install openpyxl")
         return
 
-    rows = get_all_items()
-    if not rows:
+    rows = iter_items(EXPORT_COLUMNS)
+    first = next(rows, None)
+    if first is None:
         print("❌ No items to export.")
         return
+    rows = itertools.chain([first], rows)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"inventory_export_{timestamp}.xlsx"
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Inventory"
-
-    headers = ["Barcode", "Name", "Category", "Quantity", "Sale Price", "Location"]
-    ws.append(headers)
-    for col in range(1, len(headers) + 1):
-        ws.cell(row=1, column=col).font = Font(bold=True)
-
-    for r in rows:
-        ws.append([
-            r[0] or "",
-            r[1] or "",
-            r[2] or "",
-            r[3] if r[3] is not None else 0,
-            float(r[4]) if r[4] is not None else 0.0,
-            r[5] or ""
-        ])
-
-    wb.save(filename)
+    if not filename:
+        filename = f"inventory_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    export_jobs.write_inventory_xlsx(rows, filename)
     print(f"✅ Excel exported: {os.path.abspath(filename)}")
 
-def export_inventory_to_pdf():
+def export_inventory_to_pdf(filename=None):
     if not HAS_REPORTLAB:
         print("❌ reportlab is not installed. Run: pip install reportlab")
         return
 
-    rows = get_all_items()
-    if not rows:
+    rows = iter_items(EXPORT_COLUMNS)
+    first = next(rows, None)
+    if first is None:
         print("❌ No items to export.")
         return
+    rows = itertools.chain([first], rows)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"inventory_report_{timestamp}.pdf"
-
-    data = [["Barcode", "Name", "Category", "Quantity", "Sale Price", "Location"]]
-    for r in rows:
-        data.append([
-            r[0] or "",
-            r[1] or "",
-            r[2] or "",
-            str(r[3] if r[3] is not None else 0),
-            f"{(r[4] if r[4] is not None else 0):.2f}",
-            r[5] or ""
-        ])
-
-    doc = SimpleDocTemplate(filename, pagesize=letter)
-    table = Table(data, repeatRows=1)
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ])
-    table.setStyle(style)
-    elements = [table]
-    doc.build(elements)
+    if not filename:
+        filename = f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    export_jobs.write_inventory_pdf(rows, filename)
     print(f"✅ PDF exported: {os.path.abspath(filename)}")
 
 # ------------------------
@@ -529,6 +1111,10 @@ def menu():
         print("10. View Transactions (recent)")
         print("11. View Transaction Details")
         print("12. Export Transactions to CSV")
+        print("13. Search Items")
+        print("14. Query Stats")
+        print("15. Stock by Location")
+        print("16. Stock Valuation by Category")
         print("0. Exit")
         choice = input("Select: ").strip()
         if choice == "1":
@@ -555,23 +1141,370 @@ def menu():
             view_transaction_details()
         elif choice == "12":
             export_transactions_csv()
+        elif choice == "13":
+            search_inventory(input("Search (name, category, supplier, location or barcode): ").strip())
+        elif choice == "14":
+            show_query_stats()
+        elif choice == "15":
+            show_stock(input("Barcode (leave empty for location totals): ").strip() or None)
+        elif choice == "16":
+            show_valuation("valuation", "category")
         elif choice == "0":
             break
         else:
             print("❌ Invalid choice.")
 
-def run_cli_or_args():
-    # Usage: python inventory_cli.py export_excel
-    if len(sys.argv) > 1:
-        cmd = sys.argv[1].lower()
-        if cmd in ("export_excel", "export-excel", "xlsx"):
-            export_inventory_to_excel(); return
-        if cmd in ("export_pdf", "export-pdf", "pdf"):
-            export_inventory_to_pdf(); return
-        if cmd in ("view", "list"):
-            view_inventory(); return
-        print("Unknown argument. Running interactive menu.")
-    menu()
+def import_file(path, batch_size=500, stop_on_error=False):
+    """
+    Import operations from a JSON-lines file ('-' reads stdin).
+    A .csv file is treated as a list of items to add (columns named like the items table).
+    """
+    import csv
+    import json
+    if path == "-":
+        lines = sys.stdin
+        applied, failed = run_batch(lines, batch_size, stop_on_error)
+    elif path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            lines = (json.dumps(dict(row, op="add")) for row in csv.DictReader(f))
+            applied, failed = run_batch(lines, batch_size, stop_on_error)
+    else:
+        with open(path, encoding="utf-8") as f:
+            applied, failed = run_batch(f, batch_size, stop_on_error)
+    print(f"✅ Applied {applied} operations ({failed} failed).")
+    return 0 if failed == 0 else 1
+
+def parse_item_spec(spec):
+    """'BARCODE:QTY' (QTY may be signed for adjustments) -> {"barcode", "qty", "sign"}."""
+    barcode, sep, qty = spec.rpartition(":")
+    if not sep or not barcode:
+        raise ValueError(f"Invalid item '{spec}', expected BARCODE:QTY")
+    sign = qty[0] if qty[:1] in ("+", "-") else None
+    return {"barcode": barcode, "qty": abs(int(qty)), "sign": sign}
+
+def build_arg_parser():
+    import argparse
+    p = argparse.ArgumentParser(prog="inventory_cli.py",
+                                description="Inventory CLI. Run without arguments for the interactive menu.")
+    p.add_argument("--user", default="admin", help="username recorded in logs (default: admin)")
+    p.add_argument("--db", default=None, help="SQLite file or postgresql:// URL (default: $INVENTORY_DB or inventory.db)")
+    p.add_argument("--store", default=None,
+                   help="one store's shard (shards/<store>.db, created if new), or 'all' for read-only cross-store reports")
+    sub = p.add_subparsers(dest="command")
+
+    a = sub.add_parser("add", help="add a new item")
+    a.add_argument("--name", required=True)
+    a.add_argument("--category", default="")
+    a.add_argument("--barcode", default="", help="leave empty to auto-generate")
+    a.add_argument("--qty", type=int, default=0)
+    a.add_argument("--supplier", default="")
+    a.add_argument("--purchase-price", type=float, default=0.0)
+    a.add_argument("--sale-price", type=float, default=0.0)
+    a.add_argument("--location", default="")
+
+    s = sub.add_parser("sell", help="sell a quantity of an item")
+    s.add_argument("barcode")
+    s.add_argument("qty", type=int)
+    s.add_argument("--location", default=None, help="sell from this location (default: item's home location)")
+
+    u = sub.add_parser("update", help="set the quantity of an item")
+    u.add_argument("barcode")
+    u.add_argument("qty", type=int)
+    u.add_argument("--location", default=None, help="set the quantity at this location (default: home)")
+
+    r = sub.add_parser("remove", help="remove an item")
+    r.add_argument("barcode")
+
+    t = sub.add_parser("transaction", help="create a multi-item transaction")
+    t.add_argument("type", choices=TRANSACTION_TYPES)
+    t.add_argument("--item", action="append", required=True, metavar="BARCODE:QTY",
+                   help="repeat for each item; adjustments take a signed QTY (e.g. ABC:-2)")
+    t.add_argument("--customer", default="")
+    t.add_argument("--notes", default="")
+    t.add_argument("--location", default=None, help="location stock is taken from / put into (default: home)")
+
+    sk = sub.add_parser("stock", help="stock by location")
+    sk_sub = sk.add_subparsers(dest="stock_action")
+    sk_show = sk_sub.add_parser("show", help="per-location stock of an item, or totals per location")
+    sk_show.add_argument("barcode", nargs="?")
+    sk_set = sk_sub.add_parser("set", help="set an item's quantity at a location")
+    sk_set.add_argument("barcode")
+    sk_set.add_argument("location")
+    sk_set.add_argument("qty", type=int)
+    sk_move = sk_sub.add_parser("move", help="move stock between locations")
+    sk_move.add_argument("barcode")
+    sk_move.add_argument("from_location")
+    sk_move.add_argument("to_location")
+    sk_move.add_argument("qty", type=int)
+    sk_merge = sk_sub.add_parser("merge", help="fold a duplicate per-store item row into another item")
+    sk_merge.add_argument("duplicate_barcode")
+    sk_merge.add_argument("target_barcode")
+
+    ct = sub.add_parser("stocktake", help="count a location by scanning and post the differences (see stocktake.py)")
+    ct.add_argument("file", nargs="?", default="-", help="scanned barcodes, one per line (BARCODE or BARCODE:QTY); '-' for stdin")
+    ct.add_argument("--location", required=True)
+    ct.add_argument("--full", action="store_true", help="full count: stock at the location that wasn't scanned goes to zero")
+    ct.add_argument("--dry-run", action="store_true", help="only print the differences")
+    ct.add_argument("--listen", nargs="?", type=int, const=8000, default=None, metavar="PORT",
+                    help="also count scans POSTed to /scan on PORT (default 8000) until the input ends")
+
+    po = sub.add_parser("po", help="replenishment planner and purchase orders (see replenishment.py)")
+    po_sub = po.add_subparsers(dest="po_action")
+    po_plan = po_sub.add_parser("plan", help="suggest reorder quantities; replaces the draft POs (one per supplier)")
+    po_plan.add_argument("--supplier", action="append", help="plan only this supplier (repeatable)")
+    po_plan.add_argument("--history-days", type=int, default=None, help="sales history used for velocity (default: settings, 28)")
+    po_plan.add_argument("--lead-days", type=int, default=None, help="lead time of suppliers without their own (default: settings, 7)")
+    po_plan.add_argument("--review-days", type=int, default=None, help="days between orders (default: settings, 7)")
+    po_plan.add_argument("--z", type=float, default=None, help="safety factor (default: settings, 1.65)")
+    po_list = po_sub.add_parser("list", help="list purchase orders (default)")
+    po_list.add_argument("--status", choices=replenishment.PO_STATUSES)
+    po_list.add_argument("--limit", type=int, default=50)
+    for action, text in (("show", "lines of a purchase order"), ("order", "mark a draft as sent to the supplier"),
+                         ("cancel", "cancel a draft or ordered PO"), ("receive", "book an ordered PO in as a purchase")):
+        po_action = po_sub.add_parser(action, help=text)
+        po_action.add_argument("id", type=int)
+        if action == "receive":
+            po_action.add_argument("--location", default=None, help="where the goods arrive (default: each item's home)")
+    po_sup = po_sub.add_parser("supplier", help="set a supplier's lead time / review period")
+    po_sup.add_argument("name")
+    po_sup.add_argument("--lead-days", type=int, default=None)
+    po_sup.add_argument("--review-days", type=int, default=None)
+
+    e = sub.add_parser("export", help="export inventory, transactions or logs (several formats: see export_jobs.py)")
+    e.add_argument("format", nargs="+", choices=("excel", "pdf", "csv", "all") + tuple(export_jobs.FORMATS),
+                   help="one of excel/pdf/csv writes a single file; several formats (or --dest) run one snapshot job")
+    e.add_argument("-o", "--output", default=None, help="file name for a single excel/pdf/csv export")
+    e.add_argument("--dest", default=None, help=f"output folder of a job (default {export_jobs.EXPORT_DIR})")
+    e.add_argument("--workers", type=int, default=export_jobs.DEFAULT_WORKERS)
+    e.add_argument("--logs-since", default=None)
+    e.add_argument("--keep", type=int, default=0, help="files to keep per format (0 = keep all)")
+    e.add_argument("--nightly", metavar="HH:MM", default=None, help="stay running and export every day at this time")
+
+    i = sub.add_parser("import", help="apply JSON-lines operations (or a CSV of items) in batched transactions")
+    i.add_argument("file", nargs="?", default="-", help="path, or '-' for stdin (default)")
+    i.add_argument("--batch-size", type=int, default=500, help="operations per write transaction")
+    i.add_argument("--stop-on-error", action="store_true")
+
+    q = sub.add_parser("search", help="search items by name, category, supplier, location or barcode")
+    q.add_argument("query", nargs="+")
+    q.add_argument("--limit", type=int, default=50)
+
+    rp = sub.add_parser("report", help="print inventory, logs, transactions or valuation reports")
+    rp.add_argument("kind", choices=("inventory", "logs", "transactions", "transaction",
+                                     "valuation", "losses", "margin", "sales"))
+    rp.add_argument("--id", type=int, help="transaction id (for 'transaction')")
+    rp.add_argument("--limit", type=int, default=50, help="logs/transactions: rows to list (0: all, streamed)")
+    rp.add_argument("--since", help="logs/losses/margin/sales: start timestamp, e.g. 2025-01-01")
+    rp.add_argument("--until", help="logs/losses/margin/sales: end timestamp (exclusive)")
+    rp.add_argument("--by", help="valuation: category, supplier, location or item; "
+                                 "losses/margin: also type, day or month; sales: day, week, month or year")
+    rp.add_argument("--barcode", help="sales: one item")
+    rp.add_argument("--category", help="sales: one category")
+    rp.add_argument("--top", type=int, default=0, help="sales: also list the N best sellers (reads item-days)")
+
+    ru = sub.add_parser("rollup", help="daily sales/movement rollups")
+    ru_sub = ru.add_subparsers(dest="rollup_action", required=True)
+    ru_rebuild = ru_sub.add_parser("rebuild", help="recompute the rollups from sales and transactions")
+    ru_rebuild.add_argument("--since", help="first day to rebuild (default: all history)")
+    ru_rebuild.add_argument("--until", help="day after the last one to rebuild")
+
+    al = sub.add_parser("archive-logs", help="move old logs into monthly archive partitions")
+    al.add_argument("--days", type=int, default=None,
+                    help="archive logs older than this (default: settings.log_retention_days or 90)")
+    al.add_argument("--format", choices=("sqlite", "jsonl"), default="sqlite")
+
+    b = sub.add_parser("backup", help="online snapshot of the database (see backup_tool.py)")
+    b.add_argument("--dest", default="backups")
+    b.add_argument("--keep", type=int, default=7, help="snapshots to keep (0 = keep all)")
+    b.add_argument("--no-compress", action="store_true")
+    b.add_argument("--verify", metavar="SNAPSHOT", help="only verify an existing snapshot")
+
+    an = sub.add_parser("analytics", help="typed columnar export for analytics: Parquet or .npz (see analytics_export.py)")
+    an.add_argument("--dest", default="analytics")
+    an.add_argument("--tables", nargs="+", default=None)
+    an.add_argument("--format", choices=("auto", "parquet", "npz"), default="auto")
+    an.add_argument("--full", action="store_true", help="export everything again, ignoring the watermarks")
+
+    sh = sub.add_parser("stores", help="per-store shard databases (shards.py)")
+    sh_sub = sh.add_subparsers(dest="stores_action")
+    sh_sub.add_parser("list", help="list the store shards (default)")
+    sh_add = sh_sub.add_parser("add", help="create a store's shard")
+    sh_add.add_argument("name")
+    sh_rep = sh_sub.add_parser("report", help="stock and sales per store, read in parallel")
+    sh_rep.add_argument("--since", help="sales from this day")
+    sh_rep.add_argument("--until", help="sales before this day")
+    sh_rep.add_argument("--workers", type=int, default=shards.DEFAULT_WORKERS)
+
+    st = sub.add_parser("stats", help="per-statement call counts, latency and slow queries")
+    st.add_argument("--limit", type=int, default=30)
+    st.add_argument("--sort", choices=("total", "calls", "mean", "max"), default="total")
+    st.add_argument("--slow", type=int, default=10, help="slow-query log lines to show")
+    st.add_argument("--reset", action="store_true", help="clear the saved stats")
+
+    ev = sub.add_parser("events", help="change feed of item, stock and transaction mutations")
+    ev_sub = ev.add_subparsers(dest="events_action")
+    ev_tail = ev_sub.add_parser("tail", help="print recent events (default)")
+    ev_tail.add_argument("--after", type=int, default=None, help="print events after this seq")
+    ev_tail.add_argument("--limit", type=int, default=20)
+    ev_tail.add_argument("--entity", action="append", choices=change_feed.ENTITIES)
+    ev_tail.add_argument("-f", "--follow", action="store_true", help="keep printing new events")
+    ev_prune = ev_sub.add_parser("prune", help="delete old events")
+    ev_prune.add_argument("--days", type=int, default=None,
+                          help="keep this many days (default: settings.change_feed_retention_days or 7)")
+
+    sub.add_parser("menu", help="interactive menu")
+    return p
+
+# legacy single-word arguments kept working
+LEGACY_COMMANDS = {
+    "export_excel": ["export", "excel"], "export-excel": ["export", "excel"], "xlsx": ["export", "excel"],
+    "export_pdf": ["export", "pdf"], "export-pdf": ["export", "pdf"], "pdf": ["export", "pdf"],
+    "view": ["report", "inventory"], "list": ["report", "inventory"],
+}
+
+def run_command(args):
+    cmd = args.command
+    if cmd == "add":
+        ok = add_item_with_image(args.name, args.category, args.barcode, args.qty, args.supplier,
+                                 args.purchase_price, args.sale_price, args.location, args.user)
+        return 0 if ok else 1
+    if cmd == "sell":
+        return 0 if sell(args.barcode, args.qty, args.user, args.location) else 1
+    if cmd == "update":
+        return 0 if update_item_qty(args.barcode, args.qty, args.user, args.location) else 1
+    if cmd == "stock":
+        if args.stock_action == "set":
+            ok = update_item_qty(args.barcode, args.qty, args.user, args.location)
+        elif args.stock_action == "move":
+            ok = move_item_stock(args.barcode, args.from_location, args.to_location, args.qty, args.user)
+        elif args.stock_action == "merge":
+            ok = merge_duplicate_item(args.duplicate_barcode, args.target_barcode, args.user)
+        else:
+            ok = show_stock(getattr(args, "barcode", None))
+        return 0 if ok else 1
+    if cmd == "remove":
+        return 0 if remove(args.barcode, args.user) else 1
+    if cmd == "transaction":
+        conn = connect_db(); c = conn.cursor()
+        try:
+            tx_id = transaction_op(c, args.type, [parse_item_spec(s) for s in args.item],
+                                   args.user, args.customer, args.notes, args.location)
+            conn.commit()
+        except ValueError as e:
+            conn.rollback()
+            print("❌", e)
+            return 1
+        finally:
+            conn.close()
+        print(f"✅ Transaction saved. ID: {tx_id}")
+    elif cmd == "export":
+        single = {"excel": export_inventory_to_excel, "pdf": export_inventory_to_pdf, "csv": export_transactions_csv}
+        if len(args.format) == 1 and args.format[0] in single and not (args.dest or args.nightly):
+            single[args.format[0]](args.output)
+            return 0
+        if not require_sqlite("Export jobs"):
+            return 1
+        legacy = {"excel": "inventory-xlsx", "pdf": "inventory-pdf", "csv": "transactions-csv"}
+        argv = [legacy.get(f, f) for f in args.format]
+        argv += ["--db", DB_FILE, "--dest", args.dest or export_jobs.EXPORT_DIR,
+                 "--workers", str(args.workers), "--keep", str(args.keep)]
+        if args.logs_since:
+            argv += ["--logs-since", args.logs_since]
+        if args.nightly:
+            argv += ["--nightly", args.nightly]
+        return export_jobs.main(argv)
+    elif cmd == "import":
+        return import_file(args.file, args.batch_size, args.stop_on_error)
+    elif cmd == "backup":
+        if not require_sqlite("Backup"):
+            return 1
+        import backup_tool
+        argv = ["--db", DB_FILE, "--dest", args.dest, "--keep", str(args.keep)]
+        if args.no_compress:
+            argv.append("--no-compress")
+        if args.verify:
+            argv += ["--verify", args.verify]
+        return backup_tool.main(argv)
+    elif cmd == "stocktake":
+        import stocktake
+        argv = [args.file, "--db", DB_FILE, "--user", args.user, "--location", args.location]
+        if args.full:
+            argv.append("--full")
+        if args.dry_run:
+            argv.append("--dry-run")
+        if args.listen is not None:
+            argv += ["--listen", str(args.listen)]
+        return stocktake.main(argv)
+    elif cmd == "analytics":
+        if not require_sqlite("Analytics export"):
+            return 1
+        import analytics_export
+        argv = ["--db", DB_FILE, "--dest", args.dest, "--format", args.format]
+        if args.tables:
+            argv += ["--tables"] + args.tables
+        if args.full:
+            argv.append("--full")
+        return analytics_export.main(argv)
+    elif cmd == "po":
+        return 0 if manage_purchase_orders(args.po_action or "list", args) else 1
+    elif cmd == "stores":
+        return 0 if manage_stores(args.stores_action or "list", args) else 1
+    elif cmd == "stats":
+        show_query_stats(args.limit, args.sort, args.slow, args.reset)
+    elif cmd == "events":
+        if args.events_action == "prune":
+            ok = prune_events(args.days)
+        else:
+            ok = tail_events(getattr(args, "after", None), getattr(args, "limit", 20),
+                             getattr(args, "entity", None), getattr(args, "follow", False))
+        return 0 if ok else 1
+    elif cmd == "rollup":
+        return 0 if rebuild_rollups(args.since, args.until) else 1
+    elif cmd == "archive-logs":
+        return 0 if archive_old_logs(args.days, args.format) is not None else 1
+    elif cmd == "search":
+        search_inventory(" ".join(args.query), args.limit)
+    elif cmd == "report":
+        if args.kind == "inventory":
+            view_inventory()
+        elif args.kind == "logs":
+            view_logs(args.since, args.until, args.limit)
+        elif args.kind == "transactions":
+            view_transactions(args.limit)
+        elif args.kind in ("valuation", "losses", "margin"):
+            return 0 if show_valuation(args.kind, args.by, args.since, args.until) else 1
+        elif args.kind == "sales":
+            return 0 if show_sales(args.since, args.until, args.by or "month", args.barcode, args.category, args.top) else 1
+        else:
+            if args.id is None:
+                print("❌ --id is required for a transaction report.")
+                return 1
+            print_transaction_details(args.id)
+    else:
+        menu()
+    return 0
+
+def run_cli_or_args(argv=None):
+    # Usage: python inventory_cli.py <command> [options]   (see --help)
+    #        echo '{"op": "sell", "barcode": "111111111111", "qty": 1}' | python inventory_cli.py import
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if len(argv) == 1 and argv[0].lower() in LEGACY_COMMANDS:
+        argv = LEGACY_COMMANDS[argv[0].lower()]
+    args = build_arg_parser().parse_args(argv)
+    global DB_FILE
+    if args.db:
+        DB_FILE = storage.resolve_target(args.db)
+    if args.store:
+        DB_FILE = shards.ALL_STORES if args.store.lower() == "all" else shards.create_store(args.store)
+    if shards.is_all_stores(DB_FILE):
+        # the union of the shards is read-only; writes go to one --store
+        if args.command not in ALL_STORES_COMMANDS or (args.command == "stock" and args.stock_action not in (None, "show")):
+            print(f"❌ '{args.command or 'menu'}' needs a single store (--store NAME); "
+                  f"all stores supports: {', '.join(ALL_STORES_COMMANDS)}")
+            return 1
+        return run_command(args)
+    init_db()
+    return run_command(args)
 
 if __name__ == "__main__":
-    run_cli_or_args()
+    sys.exit(run_cli_or_args())
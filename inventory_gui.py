@@ -1,87 +1,28 @@
 # inventory_gui.py
-import sqlite3
 import threading
 import queue
-import json
 import os
 import socket
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import parse_qs
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import A4
+from search_index import search_items
+import storage
+import stock
+import inventory_cli
+import query_stats
+from audit_writer import write_log
+# HTTP scan endpoint lives in its own module so it can run headless (tests, load tools)
+from scan_server import SCAN_PORT, scan_queue, start_scan_server
+from scan_journal import get_journal, journal_path
+from inventory_snapshot import get_snapshot, snapshot_supported
+import export_jobs
+from stocktake import StocktakeSession
 
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    # Create tables if they don't exist
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        category TEXT,
-        barcode TEXT UNIQUE,
-        quantity INTEGER,
-        supplier TEXT,
-        purchase_price REAL,
-        sale_price REAL,
-        location TEXT
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user TEXT,
-        action TEXT,
-        item_id INTEGER,
-        quantity INTEGER,
-        location TEXT
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS transactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user TEXT,
-        type TEXT,
-        customer TEXT,
-        total_amount REAL,
-        notes TEXT
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS transaction_items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        transaction_id INTEGER,
-        item_id INTEGER,
-        barcode TEXT,
-        item_name TEXT,
-        quantity_changed INTEGER,
-        quantity_before INTEGER,
-        quantity_after INTEGER,
-        unit_price REAL
-    )
-    """)
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS sales (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        user TEXT,
-        item_id INTEGER,
-        qty_Removed INTEGER
-    )
-    """)
-
-    conn.commit()
+    # versioned migrations; no DDL runs when the schema is already current
+    conn = connect_db()
+    storage.ensure_schema(conn)
     conn.close()
 
 
@@ -93,71 +34,14 @@ try:
 except Exception:
     HAS_CAMERA_LIBS = False
 
-DB_FILE = "inventory.db"
-SCAN_PORT = 8000               # HTTP POST endpoint: http://<PC_IP>:8000/scan
-scan_queue = queue.Queue()     # thread-safe queue for incoming scans
-
-# -----------------------
-# Lightweight HTTP server to accept POST scan data
-# -----------------------
-class ScanHandler(BaseHTTPRequestHandler):
-    def _send_ok(self, text="OK"):
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(text.encode('utf-8'))
-
-    def do_POST(self):
-        if self.path != "/scan":
-            self.send_response(404)
-            self.end_headers()
-            return
-        content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length)
-        code = None
-        # try JSON
-        try:
-            data = json.loads(body.decode('utf-8'))
-            if isinstance(data, dict):
-                code = data.get("code") or data.get("barcode") or data.get("value")
-        except Exception:
-            pass
-        # try form-encoded
-        if not code:
-            try:
-                qs = parse_qs(body.decode('utf-8'))
-                if 'code' in qs:
-                    code = qs['code'][0]
-                elif 'barcode' in qs:
-                    code = qs['barcode'][0]
-            except Exception:
-                pass
-        if code:
-            scan_queue.put(code.strip())
-            self._send_ok("scanned")
-        else:
-            self._send_ok("no_code")
-
-    # silence logging
-    def log_message(self, format, *args):
-        return
-
-def start_scan_server(host="0.0.0.0", port=SCAN_PORT):
-    def server_thread():
-        try:
-            httpd = HTTPServer((host, port), ScanHandler)
-            httpd.serve_forever()
-        except Exception as e:
-            print("Scan server stopped/error:", e)
-    t = threading.Thread(target=server_thread, daemon=True)
-    t.start()
-    return t
+DB_FILE = storage.DEFAULT_TARGET   # SQLite file or postgresql:// URL (INVENTORY_DB)
 
 # -----------------------
 # DB helpers
 # -----------------------
 def connect_db():
-    return sqlite3.connect(DB_FILE)
+    # every statement is timed (see query_stats.py); a URL gets a pooled PostgreSQL connection
+    return storage.connect(DB_FILE)
 
 def fetch_item_by_barcode(barcode):
     conn = connect_db(); c = conn.cursor()
@@ -176,11 +60,9 @@ def add_item_db(name, category, barcode, qty, supplier, purchase_price, sale_pri
             INSERT INTO items (name, category, barcode, quantity, supplier, purchase_price, sale_price, location)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (name, category, barcode, qty, supplier, purchase_price, sale_price, location))
-        conn.commit()
         item_id = c.lastrowid
-        # log
-        c.execute("INSERT INTO logs (user, action, item_id, quantity, location) VALUES (?, ?, ?, ?, ?)",
-                  ("admin", "add", item_id, qty, location or "N/A"))
+        # log (written with c, so it commits with the item)
+        write_log(c, "admin", "add", item_id, qty, location)
         conn.commit()
     except Exception as e:
         conn.rollback()
@@ -189,35 +71,31 @@ def add_item_db(name, category, barcode, qty, supplier, purchase_price, sale_pri
     conn.close()
     return item_id
 
-def update_item_qty_db(item_id, new_qty):
+def restock_item_db(item_id, qty, location=None, user="admin"):
+    """Add qty (negative to take stock out) at a location (blank: the item's home
+    location). Returns (location name, quantity there afterwards)."""
     conn = connect_db(); c = conn.cursor()
-    c.execute("UPDATE items SET quantity=? WHERE id=?", (new_qty, item_id))
-    conn.commit()
+    try:
+        loc_id, loc_name = stock.resolve_location(c, item_id, location or None)
+        _before, after = stock.adjust_stock(c, item_id, loc_id, qty)
+        write_log(c, user, "update", item_id, qty, loc_name)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
     conn.close()
+    return loc_name, after
 
-def create_transaction_db(performed_by, ttype, items_list, customer=None, notes=None):
+def create_transaction_db(performed_by, ttype, items, customer=None, notes=None, location=None):
+    """Save a transaction through inventory_cli.transaction_op, so stock changes at
+    `location` (default: each item's home location) and the lines record it.
+    `items` is [{"barcode": ..., "qty": ...}, ...]. Returns the transaction id."""
     conn = connect_db(); c = conn.cursor()
     try:
-        total_amount = 0.0
-        for it in items_list:
-            total_amount += abs(it.get("quantity_changed", 0)) * (it.get("unit_price") or 0.0)
-        c.execute("INSERT INTO transactions (user, type, customer, total_amount, notes) VALUES (?, ?, ?, ?, ?)",
-                  (performed_by, ttype, customer, total_amount, notes))
-        tx_id = c.lastrowid
-        for it in items_list:
-            c.execute("UPDATE items SET quantity=? WHERE id=?", (it["quantity_after"], it["item_id"]))
-            c.execute("""INSERT INTO transaction_items
-                (transaction_id, item_id, barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                      (tx_id, it["item_id"], it["barcode"], it["item_name"], it["quantity_changed"],
-                       it["quantity_before"], it["quantity_after"], it.get("unit_price") or 0.0))
-            if ttype == "sale":
-                qty_Removed = -it["quantity_changed"] if it["quantity_changed"] < 0 else it["quantity_changed"]
-                c.execute("INSERT INTO sales (user, item_id, qty_Removed) VALUES (?, ?, ?)", (performed_by, it["item_id"], qty_Removed))
-            c.execute("INSERT INTO logs (user, action, item_id, quantity, location) VALUES (?, ?, ?, ?, ?)",
-                      (performed_by, ttype, it["item_id"], it["quantity_changed"], it.get("location","N/A")))
+        tx_id = inventory_cli.transaction_op(c, ttype, items, performed_by, customer or "", notes or "", location)
         conn.commit()
-    except Exception as e:
+    except Exception:
         conn.rollback()
         conn.close()
         raise
@@ -293,22 +171,52 @@ class InventoryGUI:
         # active_entry and active_lookup used by HTTP scan-injection
         self.active_entry = None
         self.active_lookup = None
+        self.stocktake = None       # open StocktakeSession: every scan is counted into it
+        self.stocktake_scans = []   # journal ids counted into it; consumed once its adjustment commits
+        self.hold_scans = False     # leave scan_queue alone until the user picks what replayed scans are for
 
         self.setup_main()
 
         # start HTTP scan server (receives scans from phone / other tools) - optional
         try:
-            start_scan_server()
+            start_scan_server(db_file=DB_FILE)
         except Exception as e:
             print("Could not start scan server:", e)
 
+        # scans left unconsumed by the last run (e.g. a stocktake that was never posted)
+        try:
+            pending = get_journal(journal_path(DB_FILE), scan_queue).pending_count()
+        except Exception:
+            pending = 0
+        if pending:
+            self.hold_scans = True
+            self.root.after(0, lambda: self.offer_pending_scans(pending))
+
         # start polling for scans from network (POST -> scan_queue)
         self.root.after(150, self.poll_scan_queue)
 
+    def offer_pending_scans(self, pending):
+        if messagebox.askyesno("Scans", f"{pending} scans received before the last shutdown were not handled "
+                                        "(an unposted stocktake, for example).\n\nCount them in a stocktake?"):
+            self.open_stocktake_window()    # they are counted once the stocktake is started
+        else:
+            self.hold_scans = False
+
     def poll_scan_queue(self):
+        if self.hold_scans:
+            self.root.after(150, self.poll_scan_queue)
+            return
+        handled = []
         try:
             while True:
-                code = scan_queue.get_nowait()
+                entry = scan_queue.get_nowait()
+                code = entry.code
+                if self.stocktake:
+                    # a stocktake is open: scans are counted, not looked up, and stay
+                    # unconsumed (replayed after a crash) until its adjustment is posted
+                    self.stocktake.add(code)
+                    self.stocktake_scans.append(entry.journal_id)
+                    continue
                 try:
                     ent = getattr(self, "active_entry", None)
                     lookup_fn = getattr(self, "active_lookup", None)
@@ -324,8 +232,12 @@ class InventoryGUI:
                             messagebox.showinfo("Scan received", f"Barcode {code} (not found)")
                 except Exception as e:
                     print("Error handling scan:", e)
+                handled.append(entry.journal_id)
         except queue.Empty:
             pass
+        if handled:
+            # journaled scans not marked here are replayed after a restart
+            get_journal(journal_path(DB_FILE), scan_queue).mark_consumed(handled)
         self.root.after(150, self.poll_scan_queue)
 
     def setup_main(self):
@@ -350,8 +262,14 @@ class InventoryGUI:
         btn_Remove.grid(row=3, column=1, padx=6, pady=6)
         btn_export = ttk.Button(frame, text="Export Transactions CSV", command=self.export_transactions_csv, width=20)
         btn_export.grid(row=4, column=0, padx=6, pady=6)
+        btn_diag = ttk.Button(frame, text="Diagnostics", command=self.open_diagnostics_window, width=20)
+        btn_diag.grid(row=4, column=1, padx=6, pady=6)
+        btn_export_all = ttk.Button(frame, text="Export All", command=self.export_all, width=20)
+        btn_export_all.grid(row=5, column=0, padx=6, pady=6)
         btn_exit = ttk.Button(frame, text="Exit", command=self.root.quit, width=20)
-        btn_exit.grid(row=4, column=1, padx=6, pady=6)
+        btn_exit.grid(row=5, column=1, padx=6, pady=6)
+        btn_count = ttk.Button(frame, text="Stocktake (scan)", command=self.open_stocktake_window, width=20)
+        btn_count.grid(row=6, column=0, padx=6, pady=6)
 
     # -----------------------
     # Inventory window
@@ -363,14 +281,37 @@ class InventoryGUI:
         tree = ttk.Treeview(w, columns=("id","name","barcode","qty","price","location"), show="headings")
         for col, text in [("id","ID"),("name","Name"),("barcode","Barcode"),("qty","Qty"),("price","Price"),("location","Location")]:
             tree.heading(col, text=text); tree.column(col, width=120)
+        search_var = tk.StringVar()
+        search_frm = ttk.Frame(w); search_frm.pack(fill="x", padx=6, pady=(6, 0))
+        ttk.Label(search_frm, text="Search:").pack(side="left")
+        search_entry = ttk.Entry(search_frm, textvariable=search_var, width=40)
+        search_entry.pack(side="left", padx=6)
         tree.pack(fill="both", expand=True)
         def refresh():
             for r in tree.get_children(): tree.delete(r)
-            conn = connect_db(); c = conn.cursor()
-            c.execute("SELECT id, name, barcode, quantity, sale_price, location FROM items ORDER BY id")
-            for row in c.fetchall():
-                tree.insert("", "end", values=(row[0], row[1], row[2], row[3], row[4], row[5]))
-            conn.close()
+            text = search_var.get().strip()
+            if text:
+                conn = connect_db()
+                for it in search_items(conn, text, limit=500):
+                    tree.insert("", "end", values=(it["id"], it["name"], it["barcode"], it["quantity"], it["sale_price"], it["location"]))
+                conn.close()
+            elif snapshot_supported(DB_FILE):
+                # columnar snapshot, caught up from the change feed (only changed items are re-read)
+                snap = get_snapshot(DB_FILE); snap.refresh()
+                for row in snap.rows(("id", "name", "barcode", "quantity", "sale_price", "location")):
+                    tree.insert("", "end", values=row)
+            else:
+                # PostgreSQL has no change feed to follow: stream the items table
+                conn = connect_db()
+                try:
+                    for row in storage.iter_rows(conn, "SELECT id, name, barcode, quantity, sale_price, location "
+                                                       "FROM items ORDER BY id"):
+                        tree.insert("", "end", values=row)
+                finally:
+                    conn.close()
+        search_entry.bind("<Return>", lambda e: refresh())
+        ttk.Button(search_frm, text="Search", command=refresh).pack(side="left")
+        ttk.Button(search_frm, text="Clear", command=lambda: (search_var.set(""), refresh())).pack(side="left", padx=6)
         btns = ttk.Frame(w); btns.pack(fill="x", pady=6)
         ttk.Button(btns, text="Refresh", command=refresh).pack(side="left", padx=6)
         ttk.Button(btns, text="Close", command=w.destroy).pack(side="right", padx=6)
@@ -391,12 +332,15 @@ class InventoryGUI:
         def refresh_logs():
             for r in tree.get_children():
                 tree.delete(r)
-            conn = connect_db(); c = conn.cursor()
-            c.execute("SELECT timestamp, user, action, item_id, quantity FROM logs ORDER BY timestamp DESC LIMIT 200")
-            rows = c.fetchall()
-            conn.close()
-            for r in rows:
-                tree.insert("", "end", values=(r[0], r[1], r[2], r[3], r[4]))
+            conn = connect_db()
+            rows = []
+            try:
+                for r in storage.iter_rows(conn, "SELECT timestamp, user, action, item_id, quantity FROM logs "
+                                                 "ORDER BY timestamp DESC LIMIT 200"):
+                    tree.insert("", "end", values=(r[0], r[1], r[2], r[3], r[4]))
+                    rows.append(r)   # kept for the PDF export below
+            finally:
+                conn.close()
             return rows
 
         rows = refresh_logs()
@@ -405,17 +349,11 @@ class InventoryGUI:
             if not rows:
                 messagebox.showinfo("No logs", "No logs to export.")
                 return
+            if not export_jobs.HAS_REPORTLAB:
+                messagebox.showerror("Export", "reportlab is not installed. Run: pip install reportlab")
+                return
             filename = f"logs_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            styles = getSampleStyleSheet()
-            doc = SimpleDocTemplate(filename, pagesize=A4)
-            elements = []
-            elements.append(Paragraph("Inventory Logs", styles['Title']))
-            elements.append(Spacer(1, 12))
-            for row in rows:
-                log_line = f"Time: {row[0]}, User: {row[1]}, Action: {row[2]}, ItemID: {row[3]}, Qty: {row[4]}"
-                elements.append(Paragraph(log_line, styles['Normal']))
-                elements.append(Spacer(1, 6))
-            doc.build(elements)
+            export_jobs.write_logs_pdf(rows, filename)
             messagebox.showinfo("Exported", f"Logs exported to {os.path.abspath(filename)}")
 
         btns = ttk.Frame(w)
@@ -426,6 +364,176 @@ class InventoryGUI:
 
 
 
+    # -----------------------
+    # Diagnostics window (query stats + slow-query log)
+    # -----------------------
+    def open_diagnostics_window(self):
+        w = tk.Toplevel(self.root)
+        w.title("Diagnostics — query stats")
+        w.geometry("1000x520")
+        cols = ("calls", "total", "mean", "p50", "p95", "max", "slow", "sql")
+        tree = ttk.Treeview(w, columns=cols, show="headings", height=14)
+        for col, text, width in [("calls","Calls",60),("total","Total ms",80),("mean","Mean ms",70),("p50","p50 <=",60),
+                                 ("p95","p95 <=",60),("max","Max ms",70),("slow","Slow",50),("sql","Statement",520)]:
+            tree.heading(col, text=text); tree.column(col, width=width, anchor="w" if col == "sql" else "e")
+        tree.pack(fill="both", expand=True)
+        ttk.Label(w, text=f"Slow queries (>= {query_stats.SLOW_QUERY_MS:g} ms):").pack(anchor="w", padx=6)
+        slow_txt = tk.Text(w, height=7, wrap="none")
+        slow_txt.pack(fill="x", padx=6)
+
+        def refresh():
+            for r in tree.get_children(): tree.delete(r)
+            # this session's live stats only; earlier sessions are in query_stats.json next to the database
+            for sql, calls, total, mean, p50, p95, mx, slow in query_stats.stats_rows(query_stats.STATS.snapshot()):
+                tree.insert("", "end", values=(calls, f"{total:.1f}", f"{mean:.3f}", f"{p50:g}", f"{p95:g}", f"{mx:.3f}", slow, sql))
+            slow_txt.delete("1.0", tk.END)
+            slow_txt.insert(tk.END, "".join(query_stats.tail_slow_log(50)) or "(none)")
+
+        def dump():
+            filename = f"query_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(query_stats.format_stats(query_stats.STATS.snapshot(), limit=1000) + "\n")
+            messagebox.showinfo("Exported", f"Query stats written to {os.path.abspath(filename)}")
+
+        def reset():
+            query_stats.STATS.reset()
+            refresh()
+
+        btns = ttk.Frame(w); btns.pack(fill="x", pady=6)
+        ttk.Button(btns, text="Refresh", command=refresh).pack(side="left", padx=6)
+        ttk.Button(btns, text="Dump to file", command=dump).pack(side="left", padx=6)
+        ttk.Button(btns, text="Reset", command=reset).pack(side="left", padx=6)
+        ttk.Button(btns, text="Close", command=w.destroy).pack(side="right", padx=6)
+        refresh()
+
+    # -----------------------
+    # Stocktake window: scans (HTTP, camera, barcode field) are counted in memory,
+    # then posted as one adjustment transaction (stocktake.py)
+    # -----------------------
+    def open_stocktake_window(self):
+        if self.stocktake:
+            messagebox.showinfo("Stocktake", f"A stocktake of {self.stocktake.location} is already open.")
+            return
+        w = tk.Toplevel(self.root)
+        w.title("Stocktake")
+        w.geometry("760x460")
+        top = ttk.Frame(w, padding=6); top.pack(fill="x")
+        ttk.Label(top, text="Location:").grid(row=0, column=0, sticky="w")
+        ent_loc = ttk.Entry(top, width=30); ent_loc.grid(row=0, column=1, padx=6)
+        full_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(top, text="Full count (unscanned stock goes to zero)", variable=full_var).grid(row=0, column=2, padx=6)
+        ttk.Label(top, text="Barcode:").grid(row=1, column=0, sticky="w", pady=(6, 0))
+        ent_code = ttk.Entry(top, width=30); ent_code.grid(row=1, column=1, padx=6, pady=(6, 0))
+        status = ttk.Label(top, text="Enter the location and press Start.")
+        status.grid(row=2, column=0, columnspan=4, sticky="w", pady=(6, 0))
+        tree = ttk.Treeview(w, columns=("barcode", "name", "expected", "counted", "change"), show="headings")
+        for col, text, width in [("barcode", "Barcode", 140), ("name", "Name", 300), ("expected", "Expected", 90),
+                                 ("counted", "Counted", 90), ("change", "Change", 90)]:
+            tree.heading(col, text=text); tree.column(col, width=width)
+        tree.pack(fill="both", expand=True)
+        cameras = {"on": False}
+
+        def start():
+            if self.stocktake:
+                return
+            session = StocktakeSession(ent_loc.get(), user="gui", full=full_var.get(), db_file=DB_FILE)
+            try:
+                session.check_location()
+            except ValueError as e:
+                messagebox.showerror("Stocktake", str(e))
+                return
+            self.stocktake = session
+            self.stocktake_scans = []
+            self.hold_scans = False
+            ent_loc.configure(state="disabled")
+            ent_code.focus_set()
+            update_status()
+
+        def update_status():
+            if not w.winfo_exists():
+                return
+            if self.stocktake:
+                session = self.stocktake
+                status.configure(text=f"Counting {session.location}: {session.scans} scans, "
+                                      f"{len(session.counts())} barcodes")
+            w.after(500, update_status)
+
+        def add_typed(event=None):
+            # keyboard-wedge scanners type the code and press Enter
+            if self.stocktake and ent_code.get().strip():
+                self.stocktake.add(ent_code.get())
+            ent_code.delete(0, tk.END)
+
+        def camera():
+            if not HAS_CAMERA_LIBS:
+                messagebox.showerror("Camera libs missing", "Camera scanning requires 'opencv-python' and 'pyzbar'.\nInstall with:\n\npip install opencv-python pyzbar")
+                return
+            if not self.stocktake or cameras["on"]:
+                return
+            cameras["on"] = True
+            session = self.stocktake
+            def run():
+                # one code per camera scan, until it is cancelled ('q') or finds nothing
+                while self.stocktake is session:
+                    code = scan_barcode_from_camera()
+                    if not code:
+                        break
+                    session.add(code)
+                cameras["on"] = False
+            threading.Thread(target=run, daemon=True).start()
+
+        def reconcile(apply):
+            if not self.stocktake:
+                return
+            if apply and not messagebox.askyesno("Stocktake", f"Post the differences at {self.stocktake.location} "
+                                                              "as one adjustment transaction?"):
+                return
+            try:
+                result = self.stocktake.reconcile(apply=apply)
+            except Exception as e:
+                messagebox.showerror("Stocktake", str(e))
+                return
+            for r in tree.get_children(): tree.delete(r)
+            for barcode, name, expected, counted in result["lines"]:
+                tree.insert("", "end", values=(barcode, name, expected, counted, f"{counted - expected:+}"))
+            msg = f"{len(result['lines'])} items differ (net {result['units']:+} units, value {result['value']:.2f})."
+            if result["unknown"]:
+                msg += f"\n{len(result['unknown'])} unknown barcodes were not adjusted: " + \
+                       ", ".join(b for b, _n in result["unknown"][:10])
+            if result["clamped"]:
+                msg += f"\n{len(result['clamped'])} changes were cut short at zero stock: " + \
+                       ", ".join(f"{b} ({change:+} of {wanted:+})" for b, _n, wanted, change in result["clamped"][:10])
+            if result["transaction_id"]:
+                msg = f"Adjustment transaction {result['transaction_id']} saved.\n" + msg
+                self.stocktake = None
+                consume_scans()
+                ent_loc.configure(state="normal")
+            messagebox.showinfo("Stocktake", msg)
+
+        def consume_scans():
+            if self.stocktake_scans:
+                get_journal(journal_path(DB_FILE), scan_queue).mark_consumed(self.stocktake_scans)
+            self.stocktake_scans = []
+
+        def close():
+            if self.stocktake and self.stocktake_scans and not messagebox.askyesno(
+                    "Stocktake", f"Discard the {len(self.stocktake_scans)} scans counted but not posted?"):
+                return
+            self.stocktake = None
+            consume_scans()
+            self.hold_scans = False
+            w.destroy()
+
+        ent_code.bind("<Return>", add_typed)
+        btns = ttk.Frame(w); btns.pack(fill="x", pady=6)
+        ttk.Button(btns, text="Start", command=start).pack(side="left", padx=6)
+        ttk.Button(btns, text="Scan (Camera)", command=camera).pack(side="left", padx=6)
+        ttk.Button(btns, text="Preview differences", command=lambda: reconcile(False)).pack(side="left", padx=6)
+        ttk.Button(btns, text="Post adjustments", command=lambda: reconcile(True)).pack(side="left", padx=6)
+        ttk.Button(btns, text="Close", command=close).pack(side="right", padx=6)
+        w.protocol("WM_DELETE_WINDOW", close)
+        ent_loc.focus_set()
+
     # -----------------------
     # Add item popup (scan first)
     # -----------------------
@@ -543,9 +651,8 @@ class InventoryGUI:
             existing = fetch_item_by_barcode(barcode)
             try:
                 if existing:
-                    new_qty = existing["quantity"] + qty
-                    update_item_qty_db(existing["id"], new_qty)
-                    messagebox.showinfo("Updated", f"Updated {existing['name']} quantity to {new_qty}")
+                    loc_name, new_qty = restock_item_db(existing["id"], qty, location)
+                    messagebox.showinfo("Updated", f"Updated {existing['name']} quantity at {loc_name} to {new_qty}")
                 else:
                     add_item_db(name, category, barcode, qty, supplier, purchase_price, sale_price, location, create_barcode_image=False)
                     messagebox.showinfo("Added", f"Added new item: {name}")
@@ -594,6 +701,7 @@ class InventoryGUI:
         self.Remove_cur_qty_var = tk.IntVar()
         self.Remove_price_var = tk.DoubleVar()
         self.Remove_id_var = tk.IntVar()
+        self.Remove_location_var = tk.StringVar()
 
         # Show item details
         details_frame = ttk.Frame(w)
@@ -630,6 +738,7 @@ class InventoryGUI:
             self.Remove_cur_qty_var.set(item["quantity"])
             self.Remove_price_var.set(item.get("sale_price", 0.0))
             self.Remove_id_var.set(item["id"])
+            self.Remove_location_var.set(item.get("location") or "")
             info_lbl.config(text="Item found. Enter quantity to Remove and click Remove.")
 
         def on_Remove():
@@ -656,21 +765,12 @@ class InventoryGUI:
             if Remove_qty > current_qty:
                 messagebox.showerror("Insufficient quantity", "Not enough stock to Remove.")
                 return
-            item_id = self.Remove_id_var.get()
             try:
+                # sold from the item's home location (items.location)
+                create_transaction_db("admin", "sale",
+                                      [{"barcode": self.Remove_barcode_var.get().strip(), "qty": Remove_qty}],
+                                      notes="Removed via GUI", location=self.Remove_location_var.get() or None)
                 new_qty = current_qty - Remove_qty
-                update_item_qty_db(item_id, new_qty)
-                # create transaction record
-                it = {
-                    "item_id": item_id,
-                    "barcode": self.Remove_barcode_var.get().strip(),
-                    "item_name": self.Remove_name_var.get(),
-                    "quantity_changed": -Remove_qty,
-                    "quantity_before": current_qty,
-                    "quantity_after": new_qty,
-                    "unit_price": self.Remove_price_var.get()
-                }
-                create_transaction_db("admin", "sale", [it], customer=None, notes="Removed via GUI")
                 messagebox.showinfo("Removed", f"Removed {Remove_qty} units of {self.Remove_name_var.get()}. New quantity: {new_qty}")
                 w.destroy()
             except Exception as e:
@@ -688,29 +788,39 @@ class InventoryGUI:
     # Export transactions CSV (simple wrapper)
     # -----------------------
     def export_transactions_csv(self):
-        import csv
         filename = f"transactions_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         conn = connect_db(); c = conn.cursor()
-        c.execute("SELECT id, timestamp, user, type, customer, total_amount FROM transactions ORDER BY timestamp DESC")
-        txs = c.fetchall()
-        if not txs:
+        c.execute("SELECT 1 FROM transactions LIMIT 1")
+        if not c.fetchone():
             messagebox.showinfo("No transactions", "There are no transactions to export.")
             conn.close(); return
-        with open(filename, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["transaction_id","timestamp","user","type","customer","total_amount","item_barcode","item_name","qty_changed","qty_before","qty_after","unit_price"])
-            for tx in txs:
-                tx_id = tx[0]
-                c.execute("SELECT barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price FROM transaction_items WHERE transaction_id=?", (tx_id,))
-                items = c.fetchall()
-                if items:
-                    for it in items:
-                        writer.writerow([tx[0], tx[1], tx[2], tx[3], tx[4], tx[5], it[0], it[1], it[2], it[3], it[4], it[5]])
-                else:
-                    writer.writerow([tx[0], tx[1], tx[2], tx[3], tx[4], tx[5], "", "", "", "", "", ""])
-        conn.close()
+        sql, params = export_jobs.dataset_query("transactions")
+        try:
+            export_jobs.write_transactions_csv(c.execute(sql, params), filename)
+        finally:
+            conn.close()
         messagebox.showinfo("Exported", f"Transactions exported to {os.path.abspath(filename)}")
 
+    # -----------------------
+    # Export every available format (worker processes, see export_jobs.py)
+    # -----------------------
+    def export_all(self):
+        if storage.get_backend(DB_FILE).dialect != "sqlite":
+            messagebox.showerror("Export", "Export All reads a SQLite snapshot; the configured database is PostgreSQL.")
+            return
+        def run():
+            try:
+                stats = export_jobs.run_exports(["all"], export_jobs.EXPORT_DIR, DB_FILE)
+            except Exception as e:
+                # bind the text now: `e` is unset once the except block ends
+                err = f"Export failed: {e}"
+                self.root.after(0, lambda err=err: messagebox.showerror("Export", err))
+                return
+            lines = [f"{job['format']}: " + (job["error"] or f"{job['rows']} rows") for job in stats["jobs"]]
+            msg = f"Exported to {os.path.abspath(export_jobs.EXPORT_DIR)} in {stats['seconds']:.1f}s\n\n" + "\n".join(lines)
+            self.root.after(0, lambda: messagebox.showinfo("Export", msg))
+        threading.Thread(target=run, daemon=True).start()
+
     # -----------------------
     # Helper: start camera scan for add/Remove (runs scan in background thread)
     # -----------------------
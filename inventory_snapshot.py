@@ -0,0 +1,360 @@
+# inventory_snapshot.py
+"""
+Columnar in-memory snapshot of the items table for listings, reports and exports.
+
+Rows are kept as columns instead of one tuple per row from fetchall(): ids,
+quantities and prices in typed arrays (8 bytes a value), category / location /
+supplier as small integer codes into a table of distinct strings (each distinct
+string stored once), names and barcodes packed into one string per column. That
+is about a quarter of the memory of the same rows as tuples, and the snapshot is
+built once and kept, not re-queried on every report.
+
+refresh() brings it up to date incrementally: it reads the 'item' events of the
+change feed (change_feed.py) after the seq it was built at and reloads just those
+items. A snapshot that fell behind the feed's retention (or a database without
+the feed) is rebuilt in full. Snapshots follow one SQLite database; PostgreSQL
+and the federated `stores:` target are listed straight from items instead
+(snapshot_supported()). Totals and filters run over the arrays; with NumPy
+installed they are vectorized over zero-copy views of the same arrays.
+
+    snap = get_snapshot("inventory.db")
+    snap.refresh()
+    for barcode, name, qty in snap.rows(("barcode", "name", "quantity"), category="Cables"):
+        ...
+"""
+import sys
+import math
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+
+import query_stats
+import storage
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except Exception:
+    HAS_NUMPY = False
+
+COLUMNS = ("id", "name", "category", "barcode", "quantity", "supplier",
+           "purchase_price", "sale_price", "location")
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM items"
+REBUILD_FRACTION = 0.25        # more changed items than this share of the snapshot: rebuild instead
+_ID_CHUNK = 500                # ids per "WHERE id IN (...)" reload query
+_ROW_CHUNK = 1000              # rows materialized at a time by rows()
+
+class _Strings:
+    """Distinct strings and their codes; code 0 is NULL."""
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values[1:])
+
+class _Text:
+    """
+    One text column packed into a single str with start offsets (a few bytes a row
+    instead of a str object each). Values written after the bulk load (changed or
+    new items, NULLs) live in a side dict until the next rebuild.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._data = ""
+        self._starts = array("q", [0])
+        self._side = {}
+
+    def load(self, value):
+        if value is None:
+            self._side[len(self._starts) - 1] = None
+            value = ""
+        self._parts.append(value)
+        self._starts.append(self._starts[-1] + len(value))
+
+    def finish_load(self):
+        self._data = "".join(self._parts)
+        self._parts = []
+
+    def append(self, value):
+        self._side[len(self._starts) - 1] = value
+        self._starts.append(self._starts[-1])
+
+    def __setitem__(self, pos, value):
+        self._side[pos] = value
+
+    def __getitem__(self, pos):
+        side = self._side
+        if side and pos in side:
+            return side[pos]
+        return self._data[self._starts[pos]:self._starts[pos + 1]]
+
+    def nbytes(self):
+        return (sys.getsizeof(self._data) + self._starts.itemsize * len(self._starts)
+                + sys.getsizeof(self._side) + sum(sys.getsizeof(v) for v in self._side.values()))
+
+def _price(value):
+    return float("nan") if value is None else float(value)
+
+def _unprice(value):
+    return None if math.isnan(value) else value
+
+class InventorySnapshot:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.seq = None            # change-feed seq the snapshot reflects (None = never loaded)
+        self.rebuilds = 0
+        self.updates = 0
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._ids = array("q")     # ascending, so an id's row is found by bisection
+        self._qty = array("q")
+        self._cost = array("d")
+        self._price = array("d")
+        self._category = array("i")
+        self._location = array("i")
+        self._supplier = array("i")
+        self._alive = bytearray()
+        self._names = _Text()
+        self._barcodes = _Text()
+        self._live = 0
+        self.categories = _Strings()
+        self.locations = _Strings()
+        self.suppliers = _Strings()
+
+    def __len__(self):
+        return self._live
+
+    def _find(self, item_id):
+        pos = bisect_left(self._ids, item_id)
+        if pos < len(self._ids) and self._ids[pos] == item_id and self._alive[pos]:
+            return pos
+        return None
+
+    # ------------------------
+    # Loading
+    # ------------------------
+    def refresh(self):
+        """Catch up with the database. Returns the number of items reloaded (-1 after a full rebuild)."""
+        with self._lock:
+            conn = query_stats.connect(self.db_file, timeout=30)
+            try:
+                conn.execute("BEGIN")   # the seq and the rows read below come from one read snapshot
+                try:
+                    latest = conn.execute("SELECT MAX(seq) FROM change_events").fetchone()[0] or 0
+                    oldest = conn.execute("SELECT MIN(seq) FROM change_events").fetchone()[0]
+                except sqlite3.OperationalError:
+                    latest = oldest = None    # no change feed: always a full load
+                if latest is not None and self.seq is not None:
+                    if latest == self.seq:
+                        return 0
+                    # an empty feed at a different seq was pruned past changes we never saw
+                    if oldest is not None and oldest <= self.seq + 1:
+                        ids = [r[0] for r in conn.execute(
+                            "SELECT DISTINCT entity_id FROM change_events WHERE seq > ? AND entity = 'item'",
+                            (self.seq,))]
+                        if len(ids) <= max(100, len(self) * REBUILD_FRACTION):
+                            self._apply_changes(conn, ids)
+                            self.seq = latest
+                            self.updates += 1
+                            return len(ids)
+                self._load_all(conn)
+                self.seq = latest
+                self.rebuilds += 1
+                return -1
+            finally:
+                conn.rollback()
+                conn.close()
+
+    def _load_all(self, conn):
+        self._clear()
+        cur = conn.execute(_SELECT + " ORDER BY id")
+        while True:
+            rows = cur.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                self._append(row, loading=True)
+        self._names.finish_load()
+        self._barcodes.finish_load()
+
+    def _append(self, row, loading=False):
+        item_id, name, category, barcode, qty, supplier, cost, price, location = row
+        self._ids.append(item_id)
+        if loading:
+            self._names.load(name)
+            self._barcodes.load(barcode)
+        else:
+            self._names.append(name)
+            self._barcodes.append(barcode)
+        self._qty.append(qty or 0)
+        self._cost.append(_price(cost))
+        self._price.append(_price(price))
+        self._category.append(self.categories.code(category))
+        self._location.append(self.locations.code(location))
+        self._supplier.append(self.suppliers.code(supplier))
+        self._alive.append(1)
+        self._live += 1
+
+    def _apply_changes(self, conn, ids):
+        found = {}
+        for i in range(0, len(ids), _ID_CHUNK):
+            chunk = ids[i:i + _ID_CHUNK]
+            for row in conn.execute(f"{_SELECT} WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                found[row[0]] = row
+        new_rows = []
+        for item_id in ids:
+            row = found.get(item_id)
+            pos = self._find(item_id)
+            if row is None:
+                if pos is not None:
+                    self._alive[pos] = 0
+                    self._live -= 1
+            elif pos is None:
+                new_rows.append(row)
+            else:
+                _id, name, category, barcode, qty, supplier, cost, price, location = row
+                self._names[pos] = name
+                self._barcodes[pos] = barcode
+                self._qty[pos] = qty or 0
+                self._cost[pos] = _price(cost)
+                self._price[pos] = _price(price)
+                self._category[pos] = self.categories.code(category)
+                self._location[pos] = self.locations.code(location)
+                self._supplier[pos] = self.suppliers.code(supplier)
+        if new_rows and self._ids and min(r[0] for r in new_rows) <= self._ids[-1]:
+            # an id below the last one (explicit ids, or a deleted id reused): rebuild to keep id order
+            self._load_all(conn)
+            return
+        for row in sorted(new_rows):
+            self._append(row)
+        if len(self._ids) - self._live > len(self._ids) * REBUILD_FRACTION:
+            self._load_all(conn)
+
+    # ------------------------
+    # Reading
+    # ------------------------
+    def _positions(self, category=None, location=None, supplier=None, max_qty=None):
+        """Row positions (id order) of live items matching every given filter."""
+        codes = []
+        for strings, col, value in ((self.categories, self._category, category),
+                                    (self.locations, self._location, location),
+                                    (self.suppliers, self._supplier, supplier)):
+            if value is not None:
+                code = strings.codes.get(value)
+                if code is None:
+                    return []
+                codes.append((col, code))
+        n = len(self._ids)
+        if not codes and max_qty is None and self._live == n:
+            return range(n)
+        if HAS_NUMPY and n:
+            mask = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+            for col, code in codes:
+                mask &= np.frombuffer(col, dtype=np.int32) == code
+            if max_qty is not None:
+                mask &= np.frombuffer(self._qty, dtype=np.int64) <= max_qty
+            return np.flatnonzero(mask).tolist()
+        alive = self._alive
+        qty = self._qty
+        return [p for p in range(n)
+                if alive[p] and all(col[p] == code for col, code in codes)
+                and (max_qty is None or qty[p] <= max_qty)]
+
+    def _column(self, column, positions):
+        """Values of one column at `positions` (a list, built column-wise)."""
+        if column in ("category", "location", "supplier"):
+            strings, codes = {"category": (self.categories, self._category),
+                              "location": (self.locations, self._location),
+                              "supplier": (self.suppliers, self._supplier)}[column]
+            values = strings.values
+            return [values[codes[p]] for p in positions]
+        if column in ("purchase_price", "sale_price"):
+            col = self._cost if column == "purchase_price" else self._price
+            return [None if v != v else v for v in (col[p] for p in positions)]   # NaN marks NULL
+        col = {"id": self._ids, "quantity": self._qty, "name": self._names, "barcode": self._barcodes}[column]
+        return [col[p] for p in positions]
+
+    def rows(self, columns=COLUMNS, category=None, location=None, supplier=None, max_qty=None):
+        """Tuples of `columns` for matching items in id order, built _ROW_CHUNK rows at a time."""
+        unknown = [c for c in columns if c not in COLUMNS]
+        if unknown:
+            raise ValueError(f"unknown column(s) {unknown}")
+        with self._lock:
+            positions = self._positions(category, location, supplier, max_qty)
+        for i in range(0, len(positions), _ROW_CHUNK):
+            chunk = positions[i:i + _ROW_CHUNK]
+            with self._lock:
+                cols = [self._column(c, chunk) for c in columns]
+            yield from zip(*cols)
+
+    def totals(self, category=None, location=None, supplier=None):
+        """{"items", "units", "cost_value", "retail_value"} for matching items (NULL prices count as 0)."""
+        with self._lock:
+            positions = self._positions(category, location, supplier)
+            if HAS_NUMPY and len(positions):
+                idx = np.asarray(positions)
+                qty = np.frombuffer(self._qty, dtype=np.int64)[idx]
+                cost = np.nan_to_num(np.frombuffer(self._cost, dtype=np.float64)[idx])
+                price = np.nan_to_num(np.frombuffer(self._price, dtype=np.float64)[idx])
+                return {"items": len(positions), "units": int(qty.sum()),
+                        "cost_value": round(float((qty * cost).sum()), 2),
+                        "retail_value": round(float((qty * price).sum()), 2)}
+            units = cost_value = retail_value = 0
+            for p in positions:
+                q = self._qty[p]
+                units += q
+                cost_value += q * (0.0 if math.isnan(self._cost[p]) else self._cost[p])
+                retail_value += q * (0.0 if math.isnan(self._price[p]) else self._price[p])
+            return {"items": len(positions), "units": units,
+                    "cost_value": round(cost_value, 2), "retail_value": round(retail_value, 2)}
+
+    def group_totals(self, by="category"):
+        """[(value, items, units)] per distinct category / location / supplier, by value."""
+        strings, col = {"category": (self.categories, self._category),
+                        "location": (self.locations, self._location),
+                        "supplier": (self.suppliers, self._supplier)}[by]
+        with self._lock:
+            items = [0] * len(strings.values)
+            units = [0] * len(strings.values)
+            for p in range(len(self._ids)):
+                if self._alive[p]:
+                    items[col[p]] += 1
+                    units[col[p]] += self._qty[p]
+            return sorted(((strings.values[code], items[code], units[code])
+                           for code in range(len(strings.values)) if items[code]),
+                          key=lambda r: (r[0] is None, r[0] or ""))
+
+    def nbytes(self):
+        """Approximate memory held by the snapshot."""
+        arrays = (self._ids, self._qty, self._cost, self._price, self._category, self._location, self._supplier)
+        total = sum(a.itemsize * len(a) for a in arrays) + len(self._alive)
+        total += self._names.nbytes() + self._barcodes.nbytes()
+        return total + sum(s.nbytes() for s in (self.categories, self.locations, self.suppliers))
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def snapshot_supported(target):
+    """True when `target` is a single SQLite database, the only kind with a change feed to follow."""
+    return isinstance(storage.get_backend(target), storage.SQLiteBackend)
+
+def get_snapshot(db_file):
+    """Shared snapshot per database file (loaded on its first refresh())."""
+    with _snapshots_lock:
+        snap = _snapshots.get(db_file)
+        if snap is None:
+            snap = _snapshots[db_file] = InventorySnapshot(db_file)
+        return snap
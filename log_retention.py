@@ -0,0 +1,207 @@
+# log_retention.py
+"""
+Log retention: move old rows out of the hot `logs` table into monthly archive
+partitions, and read across hot + archived partitions when a date range needs it.
+
+Partitions live in ARCHIVE_DIR next to the database file (archive_dir_of()), so
+archiving and reading find the same ones wherever the process was started, as either
+    logs_YYYY_MM.db        (SQLite, same columns as `logs`; default)
+    logs_YYYY_MM.jsonl.gz  (gzip-compressed JSON lines)
+"""
+import os
+import re
+import glob
+import gzip
+import json
+import itertools
+import sqlite3
+
+import storage
+
+ARCHIVE_DIR = "log_archive"    # directory name, next to the database
+DEFAULT_RETENTION_DAYS = 90
+LOG_COLUMNS = ("id", "timestamp", "user", "action", "item_id", "quantity", "location")
+
+_PARTITION_RE = re.compile(r"logs_(\d{4})_(\d{2})\.(db|jsonl\.gz)$")
+
+def ensure_log_indexes(conn):
+    """Index used by every 'latest logs' view and by range queries/archiving."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+    conn.commit()
+
+def archive_dir_of(conn):
+    """ARCHIVE_DIR beside the database file of a SQLite connection (the working directory for an in-memory one)."""
+    path = next((r[2] for r in conn.execute("PRAGMA database_list") if r[1] == "main"), "")
+    return os.path.join(os.path.dirname(path) if path else os.getcwd(), ARCHIVE_DIR)
+
+def get_retention_days(conn):
+    try:
+        row = conn.execute("SELECT value FROM settings WHERE key='log_retention_days'").fetchone()
+    except sqlite3.OperationalError:  # settings table missing (GUI-only databases)
+        row = None
+    try:
+        return int(row[0]) if row else DEFAULT_RETENTION_DAYS
+    except ValueError:
+        return DEFAULT_RETENTION_DAYS
+
+def _month_bounds(month):
+    """'2025-08' -> ('2025-08-01 00:00:00', '2025-09-01 00:00:00')"""
+    year, mon = int(month[:4]), int(month[5:7])
+    nyear, nmon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}-01 00:00:00", f"{nyear:04d}-{nmon:02d}-01 00:00:00"
+
+def partition_path(month, fmt, archive_dir):
+    ext = "db" if fmt == "sqlite" else "jsonl.gz"
+    return os.path.join(archive_dir, f"logs_{month.replace('-', '_')}.{ext}")
+
+def _archive_month_sqlite(conn, month, cutoff, archive_dir):
+    start, end = _month_bounds(month)
+    path = partition_path(month, "sqlite", archive_dir)
+    conn.execute("ATTACH DATABASE ? AS arc", (path,))
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS arc.logs (
+                id INTEGER PRIMARY KEY,
+                timestamp TIMESTAMP,
+                user TEXT,
+                action TEXT,
+                item_id INTEGER,
+                quantity INTEGER,
+                location TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS arc.idx_logs_timestamp ON logs(timestamp)")
+        # copy + delete in one transaction spanning both files
+        with conn:
+            cur = conn.execute(f"""
+                INSERT OR IGNORE INTO arc.logs ({', '.join(LOG_COLUMNS)})
+                SELECT {', '.join(LOG_COLUMNS)} FROM main.logs
+                WHERE timestamp >= ? AND timestamp < ? AND timestamp < ?
+            """, (start, end, cutoff))
+            moved = cur.rowcount
+            conn.execute("DELETE FROM main.logs WHERE timestamp >= ? AND timestamp < ? AND timestamp < ?",
+                         (start, end, cutoff))
+    finally:
+        conn.execute("DETACH DATABASE arc")
+    return moved
+
+def _archive_month_jsonl(conn, month, cutoff, archive_dir, chunk_size=5000):
+    start, end = _month_bounds(month)
+    path = partition_path(month, "jsonl", archive_dir)
+    c = conn.cursor()
+    c.execute(f"""
+        SELECT {', '.join(LOG_COLUMNS)} FROM logs
+        WHERE timestamp >= ? AND timestamp < ? AND timestamp < ?
+        ORDER BY timestamp, id
+    """, (start, end, cutoff))
+    moved = 0
+    # appending adds a new gzip member; readers see one continuous stream
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if not rows:
+                break
+            for r in rows:
+                f.write(json.dumps(dict(zip(LOG_COLUMNS, r))) + "\n")
+            moved += len(rows)
+    # rows are only deleted once the archive file is safely closed; a crash in between
+    # leaves duplicates, which read_partition() drops by id
+    with conn:
+        conn.execute("DELETE FROM logs WHERE timestamp >= ? AND timestamp < ? AND timestamp < ?",
+                     (start, end, cutoff))
+    return moved
+
+def archive_logs(conn, older_than_days=None, fmt="sqlite", archive_dir=None):
+    """
+    Move logs older than `older_than_days` (default: settings.log_retention_days or 90)
+    into monthly partitions in `archive_dir` (default archive_dir_of(conn)).
+    Returns {month: rows_moved}.
+    """
+    if fmt not in ("sqlite", "jsonl"):
+        raise ValueError("fmt must be 'sqlite' or 'jsonl'")
+    if older_than_days is None:
+        older_than_days = get_retention_days(conn)
+    ensure_log_indexes(conn)
+    archive_dir = archive_dir or archive_dir_of(conn)
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{int(older_than_days)} days",)).fetchone()[0]
+    months = [r[0] for r in conn.execute(
+        "SELECT DISTINCT strftime('%Y-%m', timestamp) FROM logs WHERE timestamp < ? ORDER BY 1", (cutoff,))]
+    result = {}
+    for month in months:
+        if not month:
+            continue
+        if fmt == "sqlite":
+            result[month] = _archive_month_sqlite(conn, month, cutoff, archive_dir)
+        else:
+            result[month] = _archive_month_jsonl(conn, month, cutoff, archive_dir)
+    return result
+
+def list_partitions(archive_dir):
+    """[(month 'YYYY-MM', path), ...] sorted newest first."""
+    parts = []
+    for path in glob.glob(os.path.join(archive_dir, "logs_*")):
+        m = _PARTITION_RE.search(os.path.basename(path))
+        if m:
+            parts.append((f"{m.group(1)}-{m.group(2)}", path))
+    return sorted(parts, reverse=True)
+
+def _range_sql(start, end):
+    sql = f"SELECT {', '.join(LOG_COLUMNS)} FROM logs WHERE 1=1"
+    params = []
+    if start:
+        sql += " AND timestamp >= ?"; params.append(start)
+    if end:
+        sql += " AND timestamp < ?"; params.append(end)
+    return sql + " ORDER BY timestamp DESC, id DESC", params
+
+def read_partition(path, start=None, end=None):
+    """Rows of one archive partition within [start, end), newest first."""
+    return list(_iter_partition(path, start, end))
+
+def _read_jsonl_partition(path, start, end):
+    # ids can repeat after an interrupted archive run: the last copy wins, so a
+    # .jsonl.gz month is deduplicated and sorted in memory (one month at a time)
+    rows = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            d = json.loads(line)
+            ts = d.get("timestamp") or ""
+            if (start and ts < start) or (end and ts >= end):
+                continue
+            rows[d["id"]] = tuple(d.get(col) for col in LOG_COLUMNS)
+    return sorted(rows.values(), key=lambda r: (r[1] or "", r[0]), reverse=True)
+
+def _iter_partition(path, start, end):
+    # generator, so a partition is only opened once the caller reads that far back
+    if not path.endswith(".db"):
+        yield from _read_jsonl_partition(path, start, end)
+        return
+    conn = sqlite3.connect(path)
+    try:
+        yield from storage.iter_rows(conn, *_range_sql(start, end))
+    finally:
+        conn.close()
+
+def iter_logs(conn, start=None, end=None, archive_dir=None):
+    """
+    Logs with start <= timestamp < end (either bound may be None), newest first,
+    as LOG_COLUMNS tuples, streamed. Archive partitions are opened only when the
+    caller reads back past the oldest row still in the hot table; they are read
+    from `archive_dir` (default archive_dir_of(conn)).
+    archive_logs() always moves everything before a cutoff, so archived rows are
+    older than hot rows and the partitions can simply follow the hot table newest-first.
+    """
+    streams = [storage.iter_rows(conn, *_range_sql(start, end))]
+    oldest_hot = conn.execute("SELECT MIN(timestamp) FROM logs").fetchone()[0]
+    if oldest_hot is None or start is None or start < oldest_hot:
+        for month, path in list_partitions(archive_dir or archive_dir_of(conn)):
+            m_start, m_end = _month_bounds(month)
+            if (end and m_start >= end) or (start and m_end <= start):
+                continue
+            streams.append(_iter_partition(path, start, end))
+    return itertools.chain(*streams)
+
+def query_logs(conn, start=None, end=None, limit=None, archive_dir=None):
+    """iter_logs() as a list of at most `limit` rows (all when limit is falsy)."""
+    return list(itertools.islice(iter_logs(conn, start, end, archive_dir), limit or None))
@@ -0,0 +1,622 @@
+# migrations.py
+"""
+Schema migrations driven by PRAGMA user_version.
+
+Every front-end calls ensure_schema(conn) at startup. When the database is already
+at LATEST_VERSION this is a single PRAGMA read and no DDL runs; otherwise each
+pending migration runs once, in order, in its own transaction, and bumps
+user_version. Databases created by the old db_setup.py / migrate_phase3.py /
+GUI init_db() start at version 0 and are reconciled to the same schema.
+
+To change the schema, append a new (version, description, function) entry to
+MIGRATIONS; never edit one that has shipped. Each migration carries its own copy
+of the DDL and data SQL it ran when it shipped (the _M<n>_* lists below), not the
+feature modules' current constants: changing SEARCH_INDEX_DDL, STOCK_DDL,
+CHANGE_FEED_DDL, ROLLUP_DDL or REPLENISHMENT_DDL needs a new migration that
+drops / recreates what changed, or existing databases won't get it.
+"""
+import sqlite3
+
+from search_index import has_fts5
+
+def _columns(c, table):
+    c.execute(f"PRAGMA table_info({table})")
+    return [r[1] for r in c.fetchall()]
+
+def _m1_base_schema(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT,
+        barcode TEXT UNIQUE,
+        quantity INTEGER DEFAULT 0,
+        supplier TEXT,
+        purchase_price REAL,
+        sale_price REAL,
+        location TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        user TEXT,
+        action TEXT,
+        item_id INTEGER,
+        quantity INTEGER,
+        location TEXT,
+        FOREIGN KEY (item_id) REFERENCES items (id)
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        role TEXT,
+        password TEXT
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        user TEXT,
+        item_id INTEGER,
+        qty_sold INTEGER,
+        FOREIGN KEY (item_id) REFERENCES items (id)
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('low_stock_threshold', '5')")
+
+def _m2_transactions(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        user TEXT,
+        type TEXT,            -- 'sale', 'purchase', 'restock', 'adjustment', 'damage', 'return'
+        customer TEXT,
+        total_amount REAL,
+        notes TEXT
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS transaction_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id INTEGER,
+        item_id INTEGER,
+        barcode TEXT,
+        item_name TEXT,
+        quantity_changed INTEGER,
+        quantity_before INTEGER,
+        quantity_after INTEGER,
+        unit_price REAL,
+        FOREIGN KEY(transaction_id) REFERENCES transactions(id),
+        FOREIGN KEY(item_id) REFERENCES items(id)
+    )
+    """)
+
+def _m3_reconcile_gui_schema(c):
+    # sales: the GUI created the quantity column as qty_Removed
+    cols = _columns(c, "sales")
+    if "qty_Removed" in cols and "qty_sold" not in cols:
+        c.execute("ALTER TABLE sales RENAME COLUMN qty_Removed TO qty_sold")
+    elif "qty_Removed" in cols:
+        c.execute("UPDATE sales SET qty_sold = qty_Removed WHERE qty_sold IS NULL")
+
+    # items: the GUI version lacks created_at (and NOT NULL / defaults). ALTER TABLE can't
+    # add a CURRENT_TIMESTAMP default, so rebuild the table with the canonical definition.
+    if "created_at" not in _columns(c, "items"):
+        # create-copy-drop-rename (not rename-first: renaming items would rewrite the
+        # FOREIGN KEY references in logs and sales to point at the old table)
+        c.execute("""
+        CREATE TABLE items_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            category TEXT,
+            barcode TEXT UNIQUE,
+            quantity INTEGER DEFAULT 0,
+            supplier TEXT,
+            purchase_price REAL,
+            sale_price REAL,
+            location TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        c.execute("""
+        INSERT INTO items_new (id, name, category, barcode, quantity, supplier, purchase_price, sale_price, location)
+        SELECT id, COALESCE(name, ''), category, barcode, COALESCE(quantity, 0), supplier, purchase_price, sale_price, location
+        FROM items
+        """)
+        c.execute("DROP TABLE items")
+        c.execute("ALTER TABLE items_new RENAME TO items")
+
+def _m4_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transaction_items_tx ON transaction_items(transaction_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_item ON sales(item_id)")
+
+_M5_SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        name, category, supplier, location,
+        content='items', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts_vocab USING fts5vocab(items_fts, 'row')",
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, name, category, supplier, location)
+        VALUES (new.id, new.name, new.category, new.supplier, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, category, supplier, location)
+        VALUES ('delete', old.id, old.name, old.category, old.supplier, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, category, supplier, location ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, category, supplier, location)
+        VALUES ('delete', old.id, old.name, old.category, old.supplier, old.location);
+        INSERT INTO items_fts(rowid, name, category, supplier, location)
+        VALUES (new.id, new.name, new.category, new.supplier, new.location);
+    END
+    """,
+]
+
+def _m5_search_index(c):
+    if not has_fts5():
+        return
+    # the items rebuild in migration 3 drops any sync triggers attached to the old table
+    for ddl in _M5_SEARCH_INDEX_DDL:
+        c.execute(ddl)
+    c.execute("INSERT INTO items_fts(items_fts) VALUES ('rebuild')")
+    c.execute("INSERT INTO items_fts(items_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 2.0, 1.0)')")
+
+def _m6_transactions_timestamp_index(c):
+    # recent-transactions views and exports sort by timestamp (found with inspect_db.py --plans)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp)")
+
+_M7_STOCK_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS locations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS item_stock (
+        item_id INTEGER NOT NULL,
+        location_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, location_id),
+        FOREIGN KEY (item_id) REFERENCES items (id),
+        FOREIGN KEY (location_id) REFERENCES locations (id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_item_stock_location ON item_stock(location_id, qty)",
+    """
+    CREATE TRIGGER IF NOT EXISTS item_stock_ai AFTER INSERT ON item_stock BEGIN
+        UPDATE items SET quantity = (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = NEW.item_id) WHERE id = NEW.item_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_stock_au AFTER UPDATE ON item_stock BEGIN
+        UPDATE items SET quantity = (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = items.id) WHERE id IN (OLD.item_id, NEW.item_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS item_stock_ad AFTER DELETE ON item_stock BEGIN
+        UPDATE items SET quantity = (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = OLD.item_id) WHERE id = OLD.item_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_stock_ai AFTER INSERT ON items BEGIN
+        INSERT OR IGNORE INTO locations (name) VALUES (COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main'));
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        VALUES (NEW.id, (SELECT id FROM locations WHERE name = COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main')), COALESCE(NEW.quantity, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_stock_au AFTER UPDATE OF quantity ON items
+    WHEN NEW.quantity IS NOT (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = NEW.id)
+    BEGIN
+        INSERT OR IGNORE INTO locations (name) VALUES (COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main'));
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        VALUES (NEW.id, (SELECT id FROM locations WHERE name = COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main')), 0);
+        UPDATE item_stock SET qty = qty + (COALESCE(NEW.quantity, 0) - (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = NEW.id))
+        WHERE item_id = NEW.id AND location_id = (SELECT id FROM locations WHERE name = COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_stock_ad AFTER DELETE ON items BEGIN
+        DELETE FROM item_stock WHERE item_id = OLD.id;
+    END
+    """,
+]
+
+def _m7_stock_by_location(c):
+    # per-location quantities; items.quantity becomes the trigger-maintained total
+    for ddl in _M7_STOCK_DDL:
+        c.execute(ddl)
+    # seed from the single items.location / items.quantity columns (blank location -> 'Main')
+    c.execute("INSERT OR IGNORE INTO locations (name) SELECT DISTINCT COALESCE(NULLIF(TRIM(location), ''), 'Main') FROM items")
+    c.execute("""
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        SELECT i.id, l.id, COALESCE(i.quantity, 0)
+        FROM items i JOIN locations l ON l.name = COALESCE(NULLIF(TRIM(i.location), ''), 'Main')
+    """)
+    # where a transaction (and each of its lines) took or put stock; NULL on older rows
+    if "location_id" not in _columns(c, "transactions"):
+        c.execute("ALTER TABLE transactions ADD COLUMN location_id INTEGER REFERENCES locations(id)")
+    if "location_id" not in _columns(c, "transaction_items"):
+        c.execute("ALTER TABLE transaction_items ADD COLUMN location_id INTEGER REFERENCES locations(id)")
+
+_M8_CHANGE_FEED_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS change_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        entity TEXT NOT NULL,
+        entity_id INTEGER,
+        op TEXT NOT NULL,
+        data TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_change_events_ts ON change_events(ts)",
+    """
+    CREATE TRIGGER IF NOT EXISTS change_items_ai AFTER INSERT ON items BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('item', NEW.id, 'insert', json_object(
+            'barcode', NEW.barcode, 'name', NEW.name, 'category', NEW.category,
+            'quantity', NEW.quantity, 'location', NEW.location));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS change_items_au AFTER UPDATE ON items
+    WHEN OLD.quantity IS NOT NEW.quantity OR OLD.name IS NOT NEW.name OR OLD.barcode IS NOT NEW.barcode
+      OR OLD.category IS NOT NEW.category OR OLD.supplier IS NOT NEW.supplier
+      OR OLD.purchase_price IS NOT NEW.purchase_price OR OLD.sale_price IS NOT NEW.sale_price
+      OR OLD.location IS NOT NEW.location
+    BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('item', NEW.id, 'update', json_object(
+            'barcode', NEW.barcode, 'name', NEW.name, 'quantity', NEW.quantity,
+            'old_quantity', OLD.quantity, 'sale_price', NEW.sale_price, 'location', NEW.location));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS change_items_ad AFTER DELETE ON items BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('item', OLD.id, 'delete', json_object('barcode', OLD.barcode, 'name', OLD.name));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS change_stock_ai AFTER INSERT ON item_stock BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('stock', NEW.item_id, 'insert', json_object(
+            'location_id', NEW.location_id, 'qty', NEW.qty, 'old_qty', 0));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS change_stock_au AFTER UPDATE ON item_stock WHEN OLD.qty IS NOT NEW.qty BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('stock', NEW.item_id, 'update', json_object(
+            'location_id', NEW.location_id, 'qty', NEW.qty, 'old_qty', OLD.qty));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS change_stock_ad AFTER DELETE ON item_stock BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('stock', OLD.item_id, 'delete', json_object(
+            'location_id', OLD.location_id, 'qty', 0, 'old_qty', OLD.qty));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS change_transactions_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO change_events (entity, entity_id, op, data) VALUES ('transaction', NEW.id, 'insert', json_object(
+            'type', NEW.type, 'user', NEW.user, 'total_amount', NEW.total_amount,
+            'location_id', NEW.location_id));
+    END
+    """,
+]
+
+def _m8_change_feed(c):
+    # outbox of item / stock / transaction mutations, written by triggers
+    for ddl in _M8_CHANGE_FEED_DDL:
+        c.execute(ddl)
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('change_feed_retention_days', '7')")
+
+def _m9_idempotency_keys(c):
+    # POST /transactions: a key is recorded in the same transaction that applies it (transaction_api.py)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        request_hash TEXT NOT NULL,
+        transaction_id INTEGER,
+        total_amount REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(transaction_id) REFERENCES transactions(id)
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at)")
+    c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('idempotency_retention_days', '30')")
+
+def _m10_transactions_type_index(c):
+    # valuation reports select one or two transaction types over a period (valuation.py)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_type_timestamp ON transactions(type, timestamp)")
+
+_M11_ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_item_stats (
+        item_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        units_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        restocked INTEGER NOT NULL DEFAULT 0,
+        returned INTEGER NOT NULL DEFAULT 0,
+        damaged INTEGER NOT NULL DEFAULT 0,
+        adjusted INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, day)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_daily_item_stats_day ON daily_item_stats(day)",
+    """
+    CREATE TABLE IF NOT EXISTS daily_category_stats (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        units_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        restocked INTEGER NOT NULL DEFAULT 0,
+        returned INTEGER NOT NULL DEFAULT 0,
+        damaged INTEGER NOT NULL DEFAULT 0,
+        adjusted INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, category)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS rollup_sales_ai AFTER INSERT ON sales BEGIN
+        INSERT INTO daily_item_stats (item_id, day, units_sold, revenue)
+        SELECT NEW.item_id, date(COALESCE(NEW.timestamp, CURRENT_TIMESTAMP)), COALESCE(NEW.qty_sold, 0),
+               COALESCE(NEW.qty_sold, 0) * COALESCE((SELECT sale_price FROM items WHERE id = NEW.item_id), 0)
+        WHERE true
+        ON CONFLICT (item_id, day) DO UPDATE SET units_sold = units_sold + excluded.units_sold, revenue = revenue + excluded.revenue, restocked = restocked + excluded.restocked, returned = returned + excluded.returned, damaged = damaged + excluded.damaged, adjusted = adjusted + excluded.adjusted;
+        INSERT INTO daily_category_stats (day, category, units_sold, revenue)
+        SELECT date(COALESCE(NEW.timestamp, CURRENT_TIMESTAMP)), COALESCE(i.category, ''), COALESCE(NEW.qty_sold, 0),
+               COALESCE(NEW.qty_sold, 0) * COALESCE(i.sale_price, 0)
+        FROM (SELECT NULL) LEFT JOIN items i ON i.id = NEW.item_id
+        WHERE true
+        ON CONFLICT (day, category) DO UPDATE SET units_sold = units_sold + excluded.units_sold, revenue = revenue + excluded.revenue, restocked = restocked + excluded.restocked, returned = returned + excluded.returned, damaged = damaged + excluded.damaged, adjusted = adjusted + excluded.adjusted;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS rollup_transaction_items_ai AFTER INSERT ON transaction_items
+    WHEN (SELECT type FROM transactions WHERE id = NEW.transaction_id) <> 'sale'
+    BEGIN
+        INSERT INTO daily_item_stats (item_id, day, restocked, returned, damaged, adjusted)
+        SELECT NEW.item_id, date(t.timestamp),
+               CASE WHEN t.type IN ('purchase', 'restock') THEN NEW.quantity_changed ELSE 0 END,
+               CASE WHEN t.type = 'return' THEN NEW.quantity_changed ELSE 0 END,
+               CASE WHEN t.type = 'damage' THEN -NEW.quantity_changed ELSE 0 END,
+               CASE WHEN t.type = 'adjustment' THEN NEW.quantity_changed ELSE 0 END
+        FROM transactions t WHERE t.id = NEW.transaction_id
+        ON CONFLICT (item_id, day) DO UPDATE SET units_sold = units_sold + excluded.units_sold, revenue = revenue + excluded.revenue, restocked = restocked + excluded.restocked, returned = returned + excluded.returned, damaged = damaged + excluded.damaged, adjusted = adjusted + excluded.adjusted;
+        INSERT INTO daily_category_stats (day, category, restocked, returned, damaged, adjusted)
+        SELECT date(t.timestamp), COALESCE(i.category, ''),
+               CASE WHEN t.type IN ('purchase', 'restock') THEN NEW.quantity_changed ELSE 0 END,
+               CASE WHEN t.type = 'return' THEN NEW.quantity_changed ELSE 0 END,
+               CASE WHEN t.type = 'damage' THEN -NEW.quantity_changed ELSE 0 END,
+               CASE WHEN t.type = 'adjustment' THEN NEW.quantity_changed ELSE 0 END
+        FROM transactions t LEFT JOIN items i ON i.id = NEW.item_id WHERE t.id = NEW.transaction_id
+        ON CONFLICT (day, category) DO UPDATE SET units_sold = units_sold + excluded.units_sold, revenue = revenue + excluded.revenue, restocked = restocked + excluded.restocked, returned = returned + excluded.returned, damaged = damaged + excluded.damaged, adjusted = adjusted + excluded.adjusted;
+    END
+    """,
+]
+
+def _m11_daily_rollups(c):
+    # per-item and per-category daily sales/movement, kept current by triggers
+    for ddl in _M11_ROLLUP_DDL:
+        c.execute(ddl)
+    # backfill from existing sales and transaction lines (rollups.rebuild as it shipped)
+    c.execute("""
+        INSERT INTO daily_item_stats (item_id, day, units_sold, revenue)
+        SELECT s.item_id, date(s.timestamp), SUM(s.qty_sold), SUM(s.qty_sold * COALESCE(i.sale_price, 0))
+        FROM sales s LEFT JOIN items i ON i.id = s.item_id
+        GROUP BY s.item_id, date(s.timestamp)
+    """)
+    c.execute("""
+        INSERT INTO daily_item_stats (item_id, day, restocked, returned, damaged, adjusted)
+        SELECT ti.item_id, date(t.timestamp),
+               SUM(CASE WHEN t.type IN ('purchase', 'restock') THEN ti.quantity_changed ELSE 0 END),
+               SUM(CASE WHEN t.type = 'return' THEN ti.quantity_changed ELSE 0 END),
+               SUM(CASE WHEN t.type = 'damage' THEN -ti.quantity_changed ELSE 0 END),
+               SUM(CASE WHEN t.type = 'adjustment' THEN ti.quantity_changed ELSE 0 END)
+        FROM transactions t JOIN transaction_items ti ON ti.transaction_id = t.id
+        WHERE t.type <> 'sale'
+        GROUP BY ti.item_id, date(t.timestamp)
+        ON CONFLICT (item_id, day) DO UPDATE SET restocked = restocked + excluded.restocked,
+            returned = returned + excluded.returned, damaged = damaged + excluded.damaged,
+            adjusted = adjusted + excluded.adjusted
+    """)
+    c.execute("""
+        INSERT INTO daily_category_stats (day, category, units_sold, revenue, restocked, returned, damaged, adjusted)
+        SELECT d.day, COALESCE(i.category, ''), SUM(d.units_sold), SUM(d.revenue),
+               SUM(d.restocked), SUM(d.returned), SUM(d.damaged), SUM(d.adjusted)
+        FROM daily_item_stats d LEFT JOIN items i ON i.id = d.item_id
+        GROUP BY d.day, COALESCE(i.category, '')
+    """)
+
+_M12_PURCHASE_ORDERS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS suppliers (
+        name TEXT PRIMARY KEY,
+        lead_time_days INTEGER,
+        review_days INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS purchase_orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        supplier TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'draft',   -- draft, ordered, received, cancelled
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        lines INTEGER NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        total_cost REAL NOT NULL DEFAULT 0,
+        transaction_id INTEGER REFERENCES transactions (id),   -- the purchase that received it
+        notes TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_purchase_orders_status ON purchase_orders(status, supplier)",
+    """
+    CREATE TABLE IF NOT EXISTS purchase_order_items (
+        po_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        barcode TEXT,
+        item_name TEXT,
+        quantity INTEGER NOT NULL,
+        unit_cost REAL,
+        on_hand INTEGER,
+        on_order INTEGER,
+        velocity REAL,
+        reorder_point REAL,
+        order_up_to REAL,
+        PRIMARY KEY (po_id, item_id),
+        FOREIGN KEY (po_id) REFERENCES purchase_orders (id),
+        FOREIGN KEY (item_id) REFERENCES items (id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_purchase_order_items_item ON purchase_order_items(item_id)",
+]
+
+def _m12_purchase_orders(c):
+    # suppliers' lead times, purchase orders and the planner's settings (replenishment.py)
+    for ddl in _M12_PURCHASE_ORDERS_DDL:
+        c.execute(ddl)
+    c.executemany("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)", [
+        ("replenish_history_days", "28"),
+        ("replenish_lead_time_days", "7"),
+        ("replenish_review_days", "7"),
+        ("replenish_service_z", "1.65"),
+    ])
+
+def _m13_sales_transaction_link(c):
+    # sales rows written with a sale transaction point at it; plain sells (sell_item_op) keep
+    # NULL and record their location, so margin reports can add them (valuation.py)
+    cols = _columns(c, "sales")
+    if "transaction_id" not in cols:
+        c.execute("ALTER TABLE sales ADD COLUMN transaction_id INTEGER REFERENCES transactions(id)")
+    if "location_id" not in cols:
+        c.execute("ALTER TABLE sales ADD COLUMN location_id INTEGER REFERENCES locations(id)")
+    # older rows carry no link: take the sale transaction of the same user with a line for
+    # the same item and quantity, stamped up to a few seconds before the sales row
+    c.execute("""
+        UPDATE sales SET transaction_id = (
+            SELECT t.id FROM transactions t
+            JOIN transaction_items ti ON ti.transaction_id = t.id
+            WHERE t.type = 'sale'
+              AND t.timestamp BETWEEN datetime(sales.timestamp, '-5 seconds') AND sales.timestamp
+              AND t.user IS sales.user
+              AND ti.item_id = sales.item_id AND abs(ti.quantity_changed) = sales.qty_sold
+            ORDER BY t.id DESC LIMIT 1)
+        WHERE transaction_id IS NULL
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sales_plain ON sales(timestamp) WHERE transaction_id IS NULL")
+
+_M14_HOME_STOCK_FLOOR_DDL = [
+    "DROP TRIGGER IF EXISTS items_stock_au",
+    """
+    CREATE TRIGGER IF NOT EXISTS items_stock_au AFTER UPDATE OF quantity ON items
+    WHEN NEW.quantity IS NOT (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = NEW.id)
+    BEGIN
+        INSERT OR IGNORE INTO locations (name) VALUES (COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main'));
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        VALUES (NEW.id, (SELECT id FROM locations WHERE name = COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main')), 0);
+        SELECT RAISE(ABORT, 'Not enough stock at the home location')
+        WHERE (SELECT qty FROM item_stock
+               WHERE item_id = NEW.id AND location_id = (SELECT id FROM locations WHERE name = COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main')))
+              + (COALESCE(NEW.quantity, 0) - (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = NEW.id)) < 0;
+        UPDATE item_stock SET qty = qty + (COALESCE(NEW.quantity, 0) - (SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = NEW.id))
+        WHERE item_id = NEW.id AND location_id = (SELECT id FROM locations WHERE name = COALESCE(NULLIF(TRIM(NEW.location), ''), 'Main'));
+    END
+    """,
+]
+
+def _m14_home_stock_floor(c):
+    # a legacy items.quantity write that would take the home location negative aborts
+    for ddl in _M14_HOME_STOCK_FLOOR_DDL:
+        c.execute(ddl)
+
+MIGRATIONS = [
+    (1, "base tables (items, logs, users, sales, settings)", _m1_base_schema),
+    (2, "transactions and transaction_items", _m2_transactions),
+    (3, "reconcile GUI schema (sales.qty_sold, items.created_at)", _m3_reconcile_gui_schema),
+    (4, "indexes for logs, transaction items and sales", _m4_indexes),
+    (5, "FTS5 item search index", _m5_search_index),
+    (6, "index on transactions(timestamp)", _m6_transactions_timestamp_index),
+    (7, "stock by location (locations, item_stock)", _m7_stock_by_location),
+    (8, "change feed (change_events outbox)", _m8_change_feed),
+    (9, "idempotency keys for submitted transactions", _m9_idempotency_keys),
+    (10, "index on transactions(type, timestamp)", _m10_transactions_type_index),
+    (11, "daily sales and movement rollups", _m11_daily_rollups),
+    (12, "suppliers and purchase orders", _m12_purchase_orders),
+    (13, "sales rows linked to their transaction", _m13_sales_transaction_link),
+    (14, "legacy quantity writes can't take the home location below zero", _m14_home_stock_floor),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def ensure_schema(conn, verbose=False):
+    """
+    Bring the database up to LATEST_VERSION. Returns the list of applied versions
+    (empty, and no DDL executed, when the database is already current).
+    """
+    if get_version(conn) >= LATEST_VERSION:
+        return []
+    applied = []
+    old_isolation = conn.isolation_level
+    conn.isolation_level = None  # explicit transactions; DDL is transactional in SQLite
+    c = conn.cursor()
+    try:
+        for version, description, migrate in MIGRATIONS:
+            # IMMEDIATE takes the write lock first, so two processes starting together
+            # can't both apply the same migration
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                if get_version(conn) >= version:
+                    c.execute("COMMIT")
+                    continue
+                migrate(c)
+                c.execute(f"PRAGMA user_version = {int(version)}")
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+            applied.append(version)
+            if verbose:
+                print(f"✅ Migration {version}: {description}")
+    finally:
+        conn.isolation_level = old_isolation
+    return applied
+
+def migrate(db_file="inventory.db", verbose=True):
+    conn = sqlite3.connect(db_file)
+    try:
+        applied = ensure_schema(conn, verbose)
+        if verbose and not applied:
+            print(f"Database already at schema version {get_version(conn)}.")
+        return applied
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,223 @@
+# query_api.py
+"""
+Read-only queries behind the GET endpoints of scan_server.py (dashboards, handhelds).
+
+    GET /items?limit=50&fields=barcode,name,quantity&after=<next>
+    GET /items/<barcode>
+    GET /stock?location=Store%20A                     item quantities per location
+    GET /logs?limit=100                               most recent audit rows first
+    GET /transactions?type=sale                       most recent first
+    GET /transactions/<id>                            header and lines
+
+/logs and /transactions need the API token (scan_server.PROTECTED_RESOURCES).
+
+Lists use keyset pagination: every page ends with "next", an opaque cursor made from
+the last row's key, and the following page is a primary-key range read from there
+(no OFFSET, so deep pages cost the same as the first). `fields` selects columns.
+
+Responses carry an ETag built from a data version: the change feed's latest seq
+for items/stock/transactions and the logs id range for logs. The version is only
+recomputed when PRAGMA data_version (on one long-lived connection) says another
+connection has committed, so an unchanged If-None-Match poll is answered 304
+without reading any table. PostgreSQL has neither, so its responses carry no ETag.
+"""
+import os
+import threading
+
+import query_stats
+import storage
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# ------------------------
+# Data versions (ETags)
+# ------------------------
+class DataVersion:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.boot = os.urandom(4).hex()     # a restarted server never reuses an old ETag
+        self.refreshes = 0
+        self._conn = None
+        self._seen = None
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def tokens(self):
+        """
+        {"inventory": ..., "logs": ...}, re-read only after another connection committed;
+        None on PostgreSQL (no data_version or change feed to build them from).
+        """
+        if storage.get_backend(self.db_file).dialect != "sqlite":
+            return None
+        with self._lock:
+            if self._conn is None:
+                self._conn = query_stats.connect(self.db_file, timeout=30, check_same_thread=False)
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._seen:
+                seq = self._conn.execute("SELECT MAX(seq) FROM change_events").fetchone()[0] or 0
+                # two subqueries: SQLite only reads MIN or MAX off the key when it is alone
+                lo, hi = self._conn.execute("SELECT (SELECT MIN(id) FROM logs), (SELECT MAX(id) FROM logs)").fetchone()
+                self._tokens = {"inventory": str(seq), "logs": f"{lo or 0}-{hi or 0}"}
+                self._seen = version
+                self.refreshes += 1
+            return self._tokens
+
+    def etag(self, kind):
+        tokens = self.tokens()
+        return None if tokens is None else f'W/"{self.boot}-{kind[0]}{tokens[kind]}"'
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag[2:] in tags   # weak comparison
+
+# ------------------------
+# Resources
+# ------------------------
+# fields: name -> SQL expression; key: the columns the cursor is made of (in ORDER BY order)
+RESOURCES = {
+    "items": {
+        "version": "inventory",
+        "from": "items i",
+        "fields": {"id": "i.id", "barcode": "i.barcode", "name": "i.name", "category": "i.category",
+                   "quantity": "i.quantity", "supplier": "i.supplier", "purchase_price": "i.purchase_price",
+                   "sale_price": "i.sale_price", "location": "i.location", "created_at": "i.created_at"},
+        "filters": {"category": "i.category = ?", "location": "i.location = ?"},
+        "key": ["i.id"],
+        "desc": False,
+    },
+    "stock": {
+        "version": "inventory",
+        "from": "item_stock s JOIN items i ON i.id = s.item_id JOIN locations l ON l.id = s.location_id",
+        "fields": {"item_id": "s.item_id", "barcode": "i.barcode", "name": "i.name",
+                   "location": "l.name", "qty": "s.qty"},
+        "filters": {"location": "l.name = ?", "barcode": "i.barcode = ?"},
+        "key": ["s.item_id", "s.location_id"],
+        "desc": False,
+    },
+    "logs": {
+        "version": "logs",
+        "from": "logs g",
+        "fields": {"id": "g.id", "timestamp": "g.timestamp", "user": "g.user", "action": "g.action",
+                   "item_id": "g.item_id", "quantity": "g.quantity", "location": "g.location"},
+        "filters": {},
+        "key": ["g.id"],
+        "desc": True,
+    },
+    "transactions": {
+        "version": "inventory",
+        "from": "transactions t LEFT JOIN locations l ON l.id = t.location_id",
+        "fields": {"id": "t.id", "timestamp": "t.timestamp", "user": "t.user", "type": "t.type",
+                   "customer": "t.customer", "total_amount": "t.total_amount", "notes": "t.notes",
+                   "location": "l.name"},
+        "filters": {"type": "t.type = ?"},
+        "key": ["t.id"],
+        "desc": True,
+    },
+}
+
+def select_fields(resource, fields=None):
+    """Requested field names (comma-separated or a list), validated; all fields when empty."""
+    known = RESOURCES[resource]["fields"]
+    if not fields:
+        return list(known)
+    if isinstance(fields, str):
+        fields = [f for f in fields.split(",") if f.strip()]
+    fields = [f.strip() for f in fields]
+    unknown = [f for f in fields if f not in known]
+    if unknown:
+        raise ValueError(f"unknown field(s) {unknown}; choose from {list(known)}")
+    return fields
+
+def _cursor_values(cursor, n):
+    parts = str(cursor).split(":")
+    if len(parts) != n:
+        raise ValueError("invalid cursor")
+    try:
+        return [int(p) for p in parts]
+    except ValueError:
+        raise ValueError("invalid cursor")
+
+def list_rows(conn, resource, after=None, limit=DEFAULT_LIMIT, fields=None, filters=None):
+    """
+    One keyset page of a resource: {"<resource>": [row dicts], "next": cursor or None}.
+    `after` is the "next" value of the previous page; filters maps filter name -> value.
+    """
+    spec = RESOURCES[resource]
+    names = select_fields(resource, fields)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    key = spec["key"]
+    where, params = [], []
+    for name, value in (filters or {}).items():
+        if name not in spec["filters"]:
+            raise ValueError(f"unknown filter {name!r} for {resource}")
+        where.append(spec["filters"][name])
+        params.append(value)
+    if after not in (None, ""):
+        # row-value comparison: a range seek on the key, however deep the page
+        op = "<" if spec["desc"] else ">"
+        where.append(f"({', '.join(key)}) {op} ({', '.join('?' * len(key))})")
+        params += _cursor_values(after, len(key))
+    order = ", ".join(f"{k} DESC" if spec["desc"] else k for k in key)
+    cols = [spec["fields"][n] for n in names] + key
+    sql = f"SELECT {', '.join(cols)} FROM {spec['from']}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT ?"
+    rows = conn.execute(sql, params + [limit]).fetchall()
+    n = len(names)
+    result = [dict(zip(names, r[:n])) for r in rows]
+    nxt = ":".join(str(v) for v in rows[-1][n:]) if len(rows) == limit else None
+    return {resource: result, "next": nxt}
+
+def get_item(conn, barcode, fields=None):
+    names = select_fields("items", fields)
+    spec = RESOURCES["items"]
+    row = conn.execute(f"SELECT {', '.join(spec['fields'][n] for n in names)} FROM items i WHERE i.barcode = ?",
+                       (barcode,)).fetchone()
+    if not row:
+        return None
+    item = dict(zip(names, row))
+    item["stock"] = [{"location": loc, "qty": qty} for loc, qty in conn.execute("""
+        SELECT l.name, s.qty FROM item_stock s JOIN items i ON i.id = s.item_id
+        JOIN locations l ON l.id = s.location_id WHERE i.barcode = ? ORDER BY l.name
+    """, (barcode,)).fetchall()]
+    return item
+
+def get_transaction(conn, tid, fields=None):
+    names = select_fields("transactions", fields)
+    spec = RESOURCES["transactions"]
+    row = conn.execute(f"SELECT {', '.join(spec['fields'][n] for n in names)} FROM {spec['from']} WHERE t.id = ?",
+                       (tid,)).fetchone()
+    if not row:
+        return None
+    tx = dict(zip(names, row))
+    cols = ("item_id", "barcode", "item_name", "quantity_changed", "quantity_before", "quantity_after",
+            "unit_price", "location")
+    tx["lines"] = [dict(zip(cols, r)) for r in conn.execute("""
+        SELECT ti.item_id, ti.barcode, ti.item_name, ti.quantity_changed, ti.quantity_before,
+               ti.quantity_after, ti.unit_price, l.name
+        FROM transaction_items ti LEFT JOIN locations l ON l.id = ti.location_id
+        WHERE ti.transaction_id = ? ORDER BY ti.id
+    """, (tid,)).fetchall()]
+    return tx
+
+def route(path):
+    """
+    (resource, key) for a GET path, key being the barcode / transaction id of a
+    single-object path and None for a list; None when the path isn't a query endpoint.
+    """
+    parts = [p for p in path.split("/") if p]
+    if not parts or parts[0] not in RESOURCES or len(parts) > 2:
+        return None
+    if len(parts) == 2 and parts[0] not in ("items", "transactions"):
+        return None
+    return parts[0], (parts[1] if len(parts) == 2 else None)
@@ -0,0 +1,346 @@
+# query_stats.py
+"""
+Query timing instrumentation for every SQL statement the front-ends run.
+
+connect() returns an sqlite3 connection whose cursors time each statement
+(execute plus the fetches that read its rows) and record, per normalized
+statement: call count, total/min/max milliseconds and a latency histogram.
+Statements slower than SLOW_QUERY_MS are appended to SLOW_QUERY_LOG.
+
+Stats live in memory per process and are merged into STATS_FILE at exit, so
+short CLI runs accumulate. Both files go in the stats directory: INVENTORY_STATS_DIR,
+or else the directory of the first SQLite database the process opens (nothing is
+saved for a PostgreSQL-only process without INVENTORY_STATS_DIR). The merge runs
+under an exclusive lock on STATS_FILE + ".lock" and replaces the file atomically,
+so processes exiting together don't lose each other's counts. Show them with
+`python inventory_cli.py stats` or the GUI's Diagnostics window.
+
+Environment:
+    INVENTORY_SLOW_QUERY_MS   slow-query threshold in ms (default 100)
+    INVENTORY_STATS_DIR       directory of the stats files (default: next to the database)
+    INVENTORY_QUERY_STATS=0   disable instrumentation (plain sqlite3 connections)
+"""
+import os
+import re
+import json
+import time
+import atexit
+import sqlite3
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+SLOW_QUERY_MS = float(os.environ.get("INVENTORY_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = "slow_queries.log"   # file names inside the stats directory
+STATS_FILE = "query_stats.json"
+ENABLED = os.environ.get("INVENTORY_QUERY_STATS", "1") != "0"
+
+_stats_dir = os.environ.get("INVENTORY_STATS_DIR") or None
+
+# histogram bucket upper bounds in ms; the last bucket is everything above
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_sql(sql):
+    return _WS_RE.sub(" ", sql).strip()
+
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, sql, ms, params=None):
+        key = normalize_sql(sql)
+        bucket = len(BUCKETS_MS)
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                bucket = i
+                break
+        with self._lock:
+            s = self._stats.get(key)
+            if s is None:
+                s = self._stats[key] = {"calls": 0, "total_ms": 0.0, "min_ms": ms, "max_ms": 0.0,
+                                        "hist": [0] * (len(BUCKETS_MS) + 1), "slow": 0}
+            s["calls"] += 1
+            s["total_ms"] += ms
+            s["min_ms"] = min(s["min_ms"], ms)
+            s["max_ms"] = max(s["max_ms"], ms)
+            s["hist"][bucket] += 1
+            if ms >= SLOW_QUERY_MS:
+                s["slow"] += 1
+        if ms >= SLOW_QUERY_MS:
+            _log_slow(key, ms, params)
+
+    def snapshot(self):
+        with self._lock:
+            return {k: dict(v, hist=list(v["hist"])) for k, v in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+STATS = QueryStats()
+
+# ------------------------
+# Stats directory
+# ------------------------
+def database_dir(db_file):
+    """Absolute directory of a SQLite database file; None for targets that have none."""
+    # URLs, URIs, ":memory:" and the all-stores target ("stores:") have no directory
+    target = str(db_file or "")
+    if not target or "://" in target or target.startswith(("file:", ":memory:")) or target.endswith(":"):
+        return None
+    return os.path.dirname(os.path.abspath(target))
+
+def use_database(db_file):
+    """Keep the stats files next to db_file unless INVENTORY_STATS_DIR or an earlier database set the directory."""
+    global _stats_dir
+    if _stats_dir is None:
+        _stats_dir = database_dir(db_file)
+
+def stats_path(name=STATS_FILE, db_file=None):
+    """Path of a stats file (STATS_FILE / SLOW_QUERY_LOG); None when there is no stats directory."""
+    directory = _stats_dir or database_dir(db_file)
+    return os.path.join(directory, name) if directory else None
+
+@contextmanager
+def _locked(path):
+    """Exclusive lock on path + ".lock", held by one process at a time."""
+    with open(path + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _log_slow(sql, ms, params):
+    path = stats_path(SLOW_QUERY_LOG)
+    if path is None:
+        return
+    try:
+        p = repr(params)
+        if len(p) > 200:
+            p = p[:200] + "..."
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"{datetime.now().isoformat(timespec='seconds')}\t{ms:.1f} ms\t{sql}\t{p}\n")
+    except OSError:
+        pass
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times execute() plus every fetch of its rows; one sample per statement execution."""
+    _pending = None
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            STATS.record(pending[0], pending[1], pending[2])
+
+    def _start(self, sql, params, fn, *args):
+        self._finish()
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._pending = [sql, (time.perf_counter() - t0) * 1000.0, params]
+
+    def execute(self, sql, params=()):
+        return self._start(sql, params, super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._start(sql, "<many>", super().executemany, sql, seq_of_params)
+
+    def executescript(self, script):
+        return self._start(script, None, super().executescript, script)
+
+    def _timed_fetch(self, fn, *args):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        if self._pending is not None:
+            self._pending[1] += (time.perf_counter() - t0) * 1000.0
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed_fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = weakref.WeakSet()
+
+    def cursor(self, factory=InstrumentedCursor):
+        cur = super().cursor(factory)
+        if isinstance(cur, InstrumentedCursor):
+            self._cursors.add(cur)
+        return cur
+
+    # Connection.execute() would create a plain C cursor; route it through ours
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def close(self):
+        for cur in list(self._cursors):
+            cur._finish()
+        super().close()
+
+def connect(db_file, **kwargs):
+    """sqlite3.connect() with statement timing (plain connection when disabled)."""
+    use_database(db_file)
+    if not ENABLED:
+        return sqlite3.connect(db_file, **kwargs)
+    return sqlite3.connect(db_file, factory=InstrumentedConnection, **kwargs)
+
+# ------------------------
+# Reporting / persistence
+# ------------------------
+def percentile_ms(hist, pct):
+    """Approximate percentile: upper bound of the bucket containing it."""
+    total = sum(hist)
+    if not total:
+        return 0.0
+    target = total * pct / 100.0
+    seen = 0
+    for i, n in enumerate(hist):
+        seen += n
+        if seen >= target:
+            return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+    return float("inf")
+
+def merge_stats(into, other):
+    for key, s in other.items():
+        d = into.get(key)
+        if d is None:
+            into[key] = dict(s, hist=list(s["hist"]))
+            continue
+        d["calls"] += s["calls"]
+        d["total_ms"] += s["total_ms"]
+        d["min_ms"] = min(d["min_ms"], s["min_ms"])
+        d["max_ms"] = max(d["max_ms"], s["max_ms"])
+        d["slow"] = d.get("slow", 0) + s.get("slow", 0)
+        d["hist"] = [a + b for a, b in zip(d["hist"], s["hist"])]
+    return into
+
+def load_saved_stats(path=None):
+    path = path or stats_path()
+    if path is None:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("buckets_ms") == list(BUCKETS_MS):
+            return data.get("statements", {})
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def save_stats(path=None):
+    """Merge this process's stats into the stats file and clear them."""
+    path = path or stats_path()
+    current = STATS.snapshot()
+    if not current or path is None:
+        return
+    try:
+        with _locked(path):
+            merged = merge_stats(load_saved_stats(path), current)
+            fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                       dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"buckets_ms": list(BUCKETS_MS), "statements": merged}, f)
+                os.replace(tmp, path)
+            except OSError:
+                os.remove(tmp)
+                raise
+        STATS.reset()
+    except OSError:
+        pass
+
+def reset_saved_stats(path=None):
+    STATS.reset()
+    path = path or stats_path()
+    if path is None:
+        return
+    with _locked(path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def stats_rows(stats, sort="total"):
+    """[(sql, calls, total_ms, mean_ms, p50_ms, p95_ms, max_ms, slow)], most expensive first."""
+    rows = []
+    for sql, s in stats.items():
+        rows.append((sql, s["calls"], s["total_ms"], s["total_ms"] / s["calls"] if s["calls"] else 0.0,
+                     percentile_ms(s["hist"], 50), percentile_ms(s["hist"], 95), s["max_ms"], s.get("slow", 0)))
+    key = {"total": 2, "calls": 1, "mean": 3, "max": 6}.get(sort, 2)
+    return sorted(rows, key=lambda r: r[key], reverse=True)
+
+def format_stats(stats, limit=30, sort="total"):
+    lines = [f"{'calls':>8} {'total ms':>10} {'mean':>8} {'p50<=':>7} {'p95<=':>7} {'max':>9} {'slow':>5}  statement"]
+    for sql, calls, total, mean, p50, p95, mx, slow in stats_rows(stats, sort)[:limit]:
+        lines.append(f"{calls:>8} {total:>10.1f} {mean:>8.3f} {p50:>7g} {p95:>7g} {mx:>9.3f} {slow:>5}  {sql[:100]}")
+    return "\n".join(lines)
+
+def tail_slow_log(n=50, path=None):
+    path = path or stats_path(SLOW_QUERY_LOG)
+    if path is None:
+        return []
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.readlines()[-n:]
+    except OSError:
+        return []
+
+if ENABLED:
+    atexit.register(save_stats)
@@ -0,0 +1,292 @@
+# replenishment.py
+"""
+Replenishment planning: suggested reorder quantities and draft purchase orders.
+
+plan() computes, for every item that has a supplier and sold in the last
+`history_days`, in one set-based pass (INSERT ... SELECT over the daily rollups;
+no per-item queries):
+
+    velocity        units sold per day (daily_item_stats, days without sales count as 0)
+    safety stock    z * standard deviation of daily sales * sqrt(lead time)
+    reorder point   velocity * lead time + safety stock
+    order-up-to     velocity * (lead time + review period) + safety stock
+    position        stock on hand (items.quantity, all locations) + quantity on
+                    purchase orders already sent ('ordered')
+
+and suggests ceil(order-up-to - position) units when position <= reorder point.
+Lead time and review period (how often the supplier is ordered from) come from
+the suppliers table, falling back to the replenish_* settings; z comes from
+replenish_service_z (1.65 ~ 95% of lead times without a stock-out).
+
+The suggestions become one draft purchase order per supplier. Planning again
+replaces the drafts (of the planned suppliers); only ordered POs count as on order.
+
+    draft --order()--> ordered --receive()--> received   (a 'purchase' transaction)
+    draft or ordered --cancel()--> cancelled
+
+The tables are created by migration 12 (migrations.py). The planner reads the
+daily rollups, so like them it is SQLite-only.
+"""
+import math
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import storage
+
+PO_STATUSES = ("draft", "ordered", "received", "cancelled")
+DEFAULTS = {
+    "replenish_history_days": "28",
+    "replenish_lead_time_days": "7",
+    "replenish_review_days": "7",
+    "replenish_service_z": "1.65",
+}
+
+REPLENISHMENT_DDL = [
+    # lead time and review period per supplier (name as in items.supplier); NULL -> settings
+    """
+    CREATE TABLE IF NOT EXISTS suppliers (
+        name TEXT PRIMARY KEY,
+        lead_time_days INTEGER,
+        review_days INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS purchase_orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        supplier TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'draft',   -- draft, ordered, received, cancelled
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        lines INTEGER NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        total_cost REAL NOT NULL DEFAULT 0,
+        transaction_id INTEGER REFERENCES transactions (id),   -- the purchase that received it
+        notes TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_purchase_orders_status ON purchase_orders(status, supplier)",
+    # the planner's inputs are kept on each line, so a PO shows why it ordered what it did
+    """
+    CREATE TABLE IF NOT EXISTS purchase_order_items (
+        po_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        barcode TEXT,
+        item_name TEXT,
+        quantity INTEGER NOT NULL,
+        unit_cost REAL,
+        on_hand INTEGER,
+        on_order INTEGER,
+        velocity REAL,
+        reorder_point REAL,
+        order_up_to REAL,
+        PRIMARY KEY (po_id, item_id),
+        FOREIGN KEY (po_id) REFERENCES purchase_orders (id),
+        FOREIGN KEY (item_id) REFERENCES items (id)
+    ) WITHOUT ROWID
+    """,
+    # quantity on order per item
+    "CREATE INDEX IF NOT EXISTS idx_purchase_order_items_item ON purchase_order_items(item_id)",
+]
+
+PLAN_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS replenish_plan (
+        item_id INTEGER PRIMARY KEY, supplier TEXT NOT NULL, barcode TEXT, item_name TEXT,
+        on_hand INTEGER, on_order INTEGER, velocity REAL, reorder_point REAL, order_up_to REAL,
+        quantity INTEGER NOT NULL, unit_cost REAL
+    )
+"""
+
+PLAN_SQL = """
+    INSERT INTO replenish_plan (item_id, supplier, barcode, item_name, on_hand, on_order,
+                                velocity, reorder_point, order_up_to, quantity, unit_cost)
+    WITH demand AS (
+        SELECT item_id, SUM(units_sold) * 1.0 / :days AS velocity,
+               SUM(units_sold * units_sold) * 1.0 / :days AS mean_sq
+        FROM daily_item_stats
+        WHERE day >= :since AND day < :until AND units_sold > 0
+        GROUP BY item_id
+    ),
+    on_order AS (
+        SELECT poi.item_id, SUM(poi.quantity) AS qty
+        FROM purchase_orders po JOIN purchase_order_items poi ON poi.po_id = po.id
+        WHERE po.status = 'ordered'
+        GROUP BY poi.item_id
+    ),
+    inputs AS (
+        SELECT i.id AS item_id, TRIM(i.supplier) AS supplier, i.barcode, i.name,
+               COALESCE(i.quantity, 0) AS on_hand, COALESCE(o.qty, 0) AS on_order,
+               COALESCE(i.purchase_price, 0) AS unit_cost, d.velocity,
+               sqrt(max(d.mean_sq - d.velocity * d.velocity, 0)) AS sigma,
+               COALESCE(s.lead_time_days, :lead) AS lead, COALESCE(s.review_days, :review) AS review
+        FROM demand d
+        JOIN items i ON i.id = d.item_id
+        LEFT JOIN suppliers s ON s.name = TRIM(i.supplier)
+        LEFT JOIN on_order o ON o.item_id = i.id
+        WHERE COALESCE(TRIM(i.supplier), '') <> ''{scope}
+    ),
+    targets AS (
+        SELECT *, velocity * lead + :z * sigma * sqrt(lead) AS reorder_point,
+               velocity * (lead + review) + :z * sigma * sqrt(lead) AS order_up_to
+        FROM inputs
+    )
+    SELECT item_id, supplier, barcode, name, on_hand, on_order, velocity, reorder_point, order_up_to,
+           CAST(ceil(order_up_to - on_hand - on_order) AS INTEGER), unit_cost
+    FROM targets
+    WHERE on_hand + on_order <= reorder_point AND order_up_to > on_hand + on_order
+"""
+
+def _settings(c):
+    values = dict(DEFAULTS)
+    c.execute("SELECT key, value FROM settings WHERE key LIKE 'replenish_%'")
+    values.update((k, v) for k, v in c.fetchall() if v not in (None, ""))
+    return values
+
+def _math_functions(c):
+    """sqrt()/ceil() are built into most SQLite builds (3.35+ with math functions);
+    register Python ones where they are missing."""
+    try:
+        c.execute("SELECT sqrt(4), ceil(1.5)")
+        c.fetchone()
+    except sqlite3.OperationalError:
+        c.connection.create_function("sqrt", 1, math.sqrt, deterministic=True)
+        c.connection.create_function("ceil", 1, math.ceil, deterministic=True)
+
+def _scope(column, suppliers):
+    """(" AND column IN (:s0, ...)", {"s0": ...}) limiting a statement to some suppliers."""
+    if not suppliers:
+        return "", {}
+    names = {f"s{n}": name.strip() for n, name in enumerate(suppliers)}
+    return f" AND {column} IN ({', '.join(':' + k for k in names)})", names
+
+def plan(c, history_days=None, lead_days=None, review_days=None, z=None, suppliers=None, notes="", today=None):
+    """
+    Replace the draft purchase orders (of `suppliers`, default all) with the current
+    suggestions. Arguments left None come from settings. Returns [(po_id, supplier,
+    lines, units, total_cost)] of the new drafts. Doesn't commit.
+    """
+    # it reads the daily rollups
+    storage.require_sqlite(c, "Replenishment planning")
+    _math_functions(c)
+    cfg = _settings(c)
+    days = int(history_days or cfg["replenish_history_days"])
+    if days <= 0:
+        raise ValueError("history_days must be positive.")
+    until = (today or datetime.now(timezone.utc).date()) + timedelta(days=1)
+    params = {
+        "days": days,
+        "since": (until - timedelta(days=days)).isoformat(),
+        "until": until.isoformat(),
+        "lead": int(cfg["replenish_lead_time_days"] if lead_days is None else lead_days),
+        "review": int(cfg["replenish_review_days"] if review_days is None else review_days),
+        "z": float(cfg["replenish_service_z"] if z is None else z),
+    }
+    c.execute(PLAN_DDL)
+    c.execute("DELETE FROM replenish_plan")
+    scope, args = _scope("TRIM(i.supplier)", suppliers)
+    c.execute(PLAN_SQL.format(scope=scope), dict(params, **args))
+
+    where, args = _scope("supplier", suppliers)
+    drafts = f"SELECT id FROM purchase_orders WHERE status = 'draft'{where}"
+    c.execute(f"DELETE FROM purchase_order_items WHERE po_id IN ({drafts})", args)
+    c.execute(f"DELETE FROM purchase_orders WHERE status = 'draft'{where}", args)
+
+    c.execute("""
+        INSERT INTO purchase_orders (supplier, status, lines, units, total_cost, notes)
+        SELECT supplier, 'draft', COUNT(*), SUM(quantity), ROUND(SUM(quantity * unit_cost), 2), ?
+        FROM replenish_plan GROUP BY supplier ORDER BY supplier
+    """, (notes or f"Planned from {days} days of sales",))
+    c.execute("""
+        INSERT INTO purchase_order_items (po_id, item_id, barcode, item_name, quantity, unit_cost,
+                                          on_hand, on_order, velocity, reorder_point, order_up_to)
+        SELECT po.id, p.item_id, p.barcode, p.item_name, p.quantity, p.unit_cost,
+               p.on_hand, p.on_order, ROUND(p.velocity, 3), ROUND(p.reorder_point, 1), ROUND(p.order_up_to, 1)
+        FROM replenish_plan p JOIN purchase_orders po ON po.supplier = p.supplier AND po.status = 'draft'
+        ORDER BY po.id, p.item_id
+    """)
+    c.execute(f"SELECT id, supplier, lines, units, total_cost FROM purchase_orders "
+              f"WHERE status = 'draft'{where} ORDER BY supplier", args)
+    return c.fetchall()
+
+# ------------------------
+# Purchase orders
+# ------------------------
+def list_orders(c, status=None, limit=50):
+    """[(id, supplier, status, created_at, lines, units, total_cost, transaction_id)], newest first."""
+    where, args = ("WHERE status = ?", [status]) if status else ("", [])
+    sql = (f"SELECT id, supplier, status, created_at, lines, units, total_cost, transaction_id "
+           f"FROM purchase_orders {where} ORDER BY id DESC")
+    if limit:   # none: every order (no LIMIT -1, which only SQLite accepts)
+        sql += " LIMIT ?"
+        args.append(int(limit))
+    c.execute(sql, args)
+    return c.fetchall()
+
+def get_order(c, po_id):
+    """(header row as list_orders, [(barcode, item_name, quantity, unit_cost, on_hand, on_order,
+    velocity, reorder_point, order_up_to)]). Raises ValueError for an unknown id."""
+    c.execute("SELECT id, supplier, status, created_at, lines, units, total_cost, transaction_id "
+              "FROM purchase_orders WHERE id = ?", (po_id,))
+    header = c.fetchone()
+    if not header:
+        raise ValueError(f"Purchase order not found: {po_id}")
+    c.execute("SELECT barcode, item_name, quantity, unit_cost, on_hand, on_order, velocity, reorder_point, "
+              "order_up_to FROM purchase_order_items WHERE po_id = ? ORDER BY item_name", (po_id,))
+    return header, c.fetchall()
+
+def _check_status(c, po_id, expected):
+    """The PO's supplier; ValueError unless it exists and is in one of the `expected` statuses."""
+    c.execute("SELECT status, supplier FROM purchase_orders WHERE id = ?", (po_id,))
+    row = c.fetchone()
+    if not row:
+        raise ValueError(f"Purchase order not found: {po_id}")
+    if row[0] not in expected:
+        raise ValueError(f"Purchase order {po_id} is {row[0]}; expected {' or '.join(expected)}.")
+    return row[1]
+
+def set_status(c, po_id, status, expected, transaction_id=None):
+    """Move a PO from one of the `expected` statuses to `status`. Doesn't commit."""
+    _check_status(c, po_id, expected)
+    c.execute("UPDATE purchase_orders SET status = ?, transaction_id = COALESCE(?, transaction_id), "
+              "updated_at = CURRENT_TIMESTAMP WHERE id = ?", (status, transaction_id, po_id))
+
+def order(c, po_id):
+    """draft -> ordered: from now on its quantities count as on order. Doesn't commit."""
+    set_status(c, po_id, "ordered", ("draft",))
+
+def cancel(c, po_id):
+    set_status(c, po_id, "cancelled", ("draft", "ordered"))
+
+def receive(c, po_id, location=None, user="admin"):
+    """
+    ordered -> received: one 'purchase' transaction (inventory_cli.transaction_op) adds
+    the ordered quantities at `location` (default: each item's home location).
+    Returns the transaction id. Doesn't commit.
+    """
+    from inventory_cli import transaction_op
+    supplier = _check_status(c, po_id, ("ordered",))
+    c.execute("SELECT barcode, quantity FROM purchase_order_items WHERE po_id = ? AND quantity > 0 "
+              "ORDER BY item_id", (po_id,))
+    lines = [{"barcode": barcode, "qty": qty} for barcode, qty in c.fetchall()]
+    tx_id = transaction_op(c, "purchase", lines, user, customer=supplier, notes=f"PO {po_id}", location=location)
+    set_status(c, po_id, "received", ("ordered",), tx_id)
+    return tx_id
+
+def set_supplier(c, name, lead_time_days=None, review_days=None):
+    """Create or update a supplier's lead time / review period (None keeps the current value)."""
+    c.execute("""
+        INSERT INTO suppliers (name, lead_time_days, review_days) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            lead_time_days = COALESCE(excluded.lead_time_days, lead_time_days),
+            review_days = COALESCE(excluded.review_days, review_days)
+    """, (name.strip(), lead_time_days, review_days))
+
+def merge_item(c, source_id, target_id):
+    """Fold one item's PO lines into another's (see stock.merge_items). Doesn't commit."""
+    c.execute("""
+        UPDATE purchase_order_items SET quantity = quantity +
+            (SELECT s.quantity FROM purchase_order_items s WHERE s.po_id = purchase_order_items.po_id AND s.item_id = ?)
+        WHERE item_id = ? AND po_id IN (SELECT po_id FROM purchase_order_items WHERE item_id = ?)
+    """, (source_id, target_id, source_id))
+    c.execute("DELETE FROM purchase_order_items WHERE item_id = ? AND po_id IN "
+              "(SELECT po_id FROM purchase_order_items WHERE item_id = ?)", (source_id, target_id))
+    c.execute("UPDATE purchase_order_items SET item_id = ? WHERE item_id = ?", (target_id, source_id))
@@ -0,0 +1,203 @@
+# rollups.py
+"""
+Daily rollups of sales and stock movement.
+
+daily_item_stats keeps one row per (item, day) and daily_category_stats one per
+(day, category). Each holds units sold, revenue, units restocked (purchase and
+restock), returned and damaged, and the net of adjustments. Triggers (migration
+11) update both in the same transaction as the sale or transaction line that
+causes the change:
+
+    sales insert                     -> units_sold, revenue (qty * the item's sale price then)
+    transaction_items insert         -> restocked / returned / damaged / adjusted
+                                        (sale lines are counted through their sales row)
+
+Range questions read the rollups instead of raw sales and transaction_items: a
+year of daily totals is at most 365 x categories rows. Rows are keyed by the UTC
+day of the sale / transaction timestamp, and by the item's category at the time.
+
+rebuild() recomputes everything (or a date range) from history with the items'
+current prices and categories. Run it after editing history by hand:
+`inventory_cli.py rollup rebuild`.
+"""
+DAY_GROUPS = {
+    "day": "day",
+    "week": "strftime('%Y-W%W', day)",
+    "month": "substr(day, 1, 7)",
+    "year": "substr(day, 1, 4)",
+}
+MEASURES = ("units_sold", "revenue", "restocked", "returned", "damaged", "adjusted")
+
+_MOVEMENT = """
+    CASE WHEN t.type IN ('purchase', 'restock') THEN NEW.quantity_changed ELSE 0 END,
+    CASE WHEN t.type = 'return' THEN NEW.quantity_changed ELSE 0 END,
+    CASE WHEN t.type = 'damage' THEN -NEW.quantity_changed ELSE 0 END,
+    CASE WHEN t.type = 'adjustment' THEN NEW.quantity_changed ELSE 0 END
+"""
+_ADD = ", ".join(f"{m} = {m} + excluded.{m}" for m in MEASURES)
+
+ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_item_stats (
+        item_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        units_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        restocked INTEGER NOT NULL DEFAULT 0,
+        returned INTEGER NOT NULL DEFAULT 0,
+        damaged INTEGER NOT NULL DEFAULT 0,
+        adjusted INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, day)
+    ) WITHOUT ROWID
+    """,
+    # date-range reads over all items (top_items, rebuild of a range)
+    "CREATE INDEX IF NOT EXISTS idx_daily_item_stats_day ON daily_item_stats(day)",
+    """
+    CREATE TABLE IF NOT EXISTS daily_category_stats (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        units_sold INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        restocked INTEGER NOT NULL DEFAULT 0,
+        returned INTEGER NOT NULL DEFAULT 0,
+        damaged INTEGER NOT NULL DEFAULT 0,
+        adjusted INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, category)
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS rollup_sales_ai AFTER INSERT ON sales BEGIN
+        INSERT INTO daily_item_stats (item_id, day, units_sold, revenue)
+        SELECT NEW.item_id, date(COALESCE(NEW.timestamp, CURRENT_TIMESTAMP)), COALESCE(NEW.qty_sold, 0),
+               COALESCE(NEW.qty_sold, 0) * COALESCE((SELECT sale_price FROM items WHERE id = NEW.item_id), 0)
+        WHERE true
+        ON CONFLICT (item_id, day) DO UPDATE SET {_ADD};
+        INSERT INTO daily_category_stats (day, category, units_sold, revenue)
+        SELECT date(COALESCE(NEW.timestamp, CURRENT_TIMESTAMP)), COALESCE(i.category, ''), COALESCE(NEW.qty_sold, 0),
+               COALESCE(NEW.qty_sold, 0) * COALESCE(i.sale_price, 0)
+        FROM (SELECT NULL) LEFT JOIN items i ON i.id = NEW.item_id
+        WHERE true
+        ON CONFLICT (day, category) DO UPDATE SET {_ADD};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS rollup_transaction_items_ai AFTER INSERT ON transaction_items
+    WHEN (SELECT type FROM transactions WHERE id = NEW.transaction_id) <> 'sale'
+    BEGIN
+        INSERT INTO daily_item_stats (item_id, day, restocked, returned, damaged, adjusted)
+        SELECT NEW.item_id, date(t.timestamp), {_MOVEMENT}
+        FROM transactions t WHERE t.id = NEW.transaction_id
+        ON CONFLICT (item_id, day) DO UPDATE SET {_ADD};
+        INSERT INTO daily_category_stats (day, category, restocked, returned, damaged, adjusted)
+        SELECT date(t.timestamp), COALESCE(i.category, ''), {_MOVEMENT}
+        FROM transactions t LEFT JOIN items i ON i.id = NEW.item_id WHERE t.id = NEW.transaction_id
+        ON CONFLICT (day, category) DO UPDATE SET {_ADD};
+    END
+    """,
+]
+
+def _range(column, since, until):
+    where, params = [], []
+    if since:
+        where.append(f"{column} >= ?")
+        params.append(since[:10])
+    if until:
+        where.append(f"{column} < ?")
+        params.append(until[:10])
+    return where, params
+
+def rebuild(c, since=None, until=None):
+    """
+    Recompute the rollups for days in [since, until) (everything by default) from
+    sales and transaction_items. Returns the number of item-day rows written.
+    Doesn't commit.
+    """
+    where, params = _range("day", since, until)
+    cond = f" WHERE {' AND '.join(where)}" if where else ""
+    c.execute(f"DELETE FROM daily_item_stats{cond}", params)
+    c.execute(f"DELETE FROM daily_category_stats{cond}", params)
+
+    s_where, s_params = _range("date(s.timestamp)", since, until)
+    t_where, t_params = _range("date(t.timestamp)", since, until)
+    c.execute(f"""
+        INSERT INTO daily_item_stats (item_id, day, units_sold, revenue)
+        SELECT s.item_id, date(s.timestamp), SUM(s.qty_sold), SUM(s.qty_sold * COALESCE(i.sale_price, 0))
+        FROM sales s LEFT JOIN items i ON i.id = s.item_id
+        {"WHERE " + " AND ".join(s_where) if s_where else ""}
+        GROUP BY s.item_id, date(s.timestamp)
+    """, s_params)
+    t_where.append("t.type <> 'sale'")
+    c.execute(f"""
+        INSERT INTO daily_item_stats (item_id, day, restocked, returned, damaged, adjusted)
+        SELECT ti.item_id, date(t.timestamp),
+               SUM(CASE WHEN t.type IN ('purchase', 'restock') THEN ti.quantity_changed ELSE 0 END),
+               SUM(CASE WHEN t.type = 'return' THEN ti.quantity_changed ELSE 0 END),
+               SUM(CASE WHEN t.type = 'damage' THEN -ti.quantity_changed ELSE 0 END),
+               SUM(CASE WHEN t.type = 'adjustment' THEN ti.quantity_changed ELSE 0 END)
+        FROM transactions t JOIN transaction_items ti ON ti.transaction_id = t.id
+        WHERE {" AND ".join(t_where)}
+        GROUP BY ti.item_id, date(t.timestamp)
+        ON CONFLICT (item_id, day) DO UPDATE SET {_ADD}
+    """, t_params)
+    written = c.execute(f"SELECT COUNT(*) FROM daily_item_stats{cond}", params).fetchone()[0]
+    d_where = [w.replace("day", "d.day") for w in where]
+    c.execute(f"""
+        INSERT INTO daily_category_stats (day, category, {', '.join(MEASURES)})
+        SELECT d.day, COALESCE(i.category, ''), {', '.join(f'SUM(d.{m})' for m in MEASURES)}
+        FROM daily_item_stats d LEFT JOIN items i ON i.id = d.item_id
+        {"WHERE " + " AND ".join(d_where) if d_where else ""}
+        GROUP BY d.day, COALESCE(i.category, '')
+    """, params)
+    return written
+
+def merge_item(c, source_id, target_id):
+    """Fold one item's rollup rows into another's (see stock.merge_items). Doesn't commit."""
+    c.execute(f"""
+        INSERT INTO daily_item_stats (item_id, day, {', '.join(MEASURES)})
+        SELECT ?, day, {', '.join(MEASURES)} FROM daily_item_stats WHERE item_id = ?
+        ON CONFLICT (item_id, day) DO UPDATE SET {_ADD}
+    """, (target_id, source_id))
+    c.execute("DELETE FROM daily_item_stats WHERE item_id = ?", (source_id,))
+
+def series(c, since=None, until=None, by="day", item_id=None, category=None, measures=MEASURES):
+    """
+    [(period, measure...)] for days in [since, until), summed per day / week / month / year.
+    With item_id it reads that item's rows (a primary-key range), otherwise the
+    per-category table (optionally one category).
+    """
+    if by not in DAY_GROUPS:
+        raise ValueError(f"by must be one of {list(DAY_GROUPS)}")
+    unknown = [m for m in measures if m not in MEASURES]
+    if unknown:
+        raise ValueError(f"unknown measure(s) {unknown}")
+    where, params = _range("day", since, until)
+    if item_id is not None:
+        table = "daily_item_stats"
+        where.insert(0, "item_id = ?")
+        params.insert(0, item_id)
+    else:
+        table = "daily_category_stats"
+        if category is not None:
+            where.append("category = ?")
+            params.append(category)
+    sums = ", ".join(f"SUM({m})" for m in measures)
+    c.execute(f"""
+        SELECT {DAY_GROUPS[by]} AS period, {sums} FROM {table}
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY period ORDER BY period
+    """, params)
+    return c.fetchall()
+
+def top_items(c, since=None, until=None, measure="units_sold", limit=10):
+    """[(item_id, barcode, name, total)] with the largest `measure` over the range.
+    Reads one row per item and day in the range (seconds for a year of a large catalogue)."""
+    if measure not in MEASURES:
+        raise ValueError(f"measure must be one of {list(MEASURES)}")
+    where, params = _range("d.day", since, until)
+    c.execute(f"""
+        SELECT d.item_id, i.barcode, i.name, SUM(d.{measure}) AS total
+        FROM daily_item_stats d LEFT JOIN items i ON i.id = d.item_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        GROUP BY d.item_id ORDER BY total DESC LIMIT ?
+    """, params + [int(limit)])
+    return c.fetchall()
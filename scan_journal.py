@@ -0,0 +1,243 @@
+# scan_journal.py
+"""
+Durable journal for scans received over HTTP (scan_server.py).
+
+Every scan is written to scan_journal.db (next to the database, see
+journal_path()) before the scanner gets its "scanned" answer, so a crash, restart or busy GUI never loses one. A writer thread
+group-commits everything that arrived while the previous commit was in flight:
+a burst of N concurrent POSTs costs one fsync, not N. Each request runs in its
+own savepoint, so one that fails gets its error while the rest of the group
+still commits.
+
+Handhelds send a client_id and a per-client sequence number with each scan (or
+a batch of them). (client_id, seq) is unique, so a retried POST whose answer
+was lost is acknowledged again without being queued twice. Scans without a
+client_id (old clients) are journaled but can't be deduplicated: their seq is
+not stored, since two such handhelds may well both send seq=1.
+
+Journaled scans are put on scan_queue after their commit. The consumer (the GUI)
+marks them consumed; replay_pending() re-queues whatever was not consumed when
+the process stopped. Consumed scans are pruned after RETENTION_DAYS; a client
+retrying a sequence number older than that would be accepted again.
+"""
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import storage
+
+SCAN_JOURNAL_DB = "scan_journal.db"   # file name, next to the database
+RETENTION_DAYS = 7
+MAX_BATCH = 1000               # requests (single scans or client batches) per commit
+
+ScanEntry = namedtuple("ScanEntry", "journal_id client_id seq code")
+
+JOURNAL_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS scans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id TEXT NOT NULL,
+        client_seq INTEGER,
+        code TEXT NOT NULL,
+        received_at TEXT NOT NULL,
+        consumed_at TEXT,
+        UNIQUE (client_id, client_seq)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_scans_pending ON scans(id) WHERE consumed_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_scans_consumed ON scans(consumed_at) WHERE consumed_at IS NOT NULL",
+]
+
+ANONYMOUS_CLIENT = "anon"      # client_id stored for scans sent without one
+
+def journal_path(db_file=None):
+    """The scan journal of a database (default storage.DEFAULT_TARGET): SCAN_JOURNAL_DB in its directory."""
+    return storage.local_path(SCAN_JOURNAL_DB, db_file)
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+class _Request:
+    __slots__ = ("kind", "client_id", "rows", "done", "result", "error")
+
+    def __init__(self, kind, client_id=None, rows=None):
+        self.kind = kind
+        self.client_id = client_id
+        self.rows = rows
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class ScanJournal:
+    def __init__(self, path=None, out_queue=None):
+        self.path = path or journal_path()
+        self.out_queue = out_queue
+        self.commits = 0
+        self.scans_written = 0
+        self._replayed = False
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")   # a scan acknowledged to a client must survive power loss
+        for ddl in JOURNAL_DDL:
+            self._conn.execute(ddl)
+        self._thread = threading.Thread(target=self._run, name="scan-journal", daemon=True)
+        self._thread.start()
+
+    # ------------------------
+    # Producer side (HTTP handlers)
+    # ------------------------
+    def append(self, client_id, scans, timeout=30):
+        """
+        Journal [(seq, code), ...] from one client; returns [(seq, code, ScanEntry or None)]
+        where None marks a duplicate (already journaled earlier). Blocks until committed.
+        """
+        req = _Request("append", client_id or None, list(scans))
+        self._submit(req)
+        if not req.done.wait(timeout):
+            raise TimeoutError("scan journal commit timed out")
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    # ------------------------
+    # Consumer side
+    # ------------------------
+    def mark_consumed(self, journal_ids):
+        """Record scans as handled (batched with the next commit; doesn't wait)."""
+        ids = [i for i in journal_ids if i is not None]
+        if ids:
+            self._submit(_Request("consume", rows=ids))
+
+    def replay_pending(self):
+        """Queue every journaled scan not yet consumed, oldest first (once per journal).
+        Runs on the writer thread, so a scan arriving meanwhile is queued exactly once."""
+        if self._replayed or self.out_queue is None:
+            return 0
+        self._replayed = True
+        req = _Request("replay")
+        self._submit(req)
+        req.done.wait(30)
+        return req.result or 0
+
+    def pending_count(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM scans WHERE consumed_at IS NULL").fetchone()[0]
+        finally:
+            conn.close()
+
+    def prune(self, older_than_days=RETENTION_DAYS):
+        req = _Request("prune", rows=int(older_than_days))
+        self._submit(req)
+        req.done.wait(30)
+        return req.result
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=10)
+        self._conn.close()
+
+    # ------------------------
+    # Writer thread
+    # ------------------------
+    def _submit(self, req):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scan journal is closed")
+            self._pending.append(req)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                batch, self._pending = self._pending[:MAX_BATCH], self._pending[MAX_BATCH:]
+                done = self._closed and not batch
+            if done:
+                return
+            self._commit(batch)
+
+    def _apply(self, c, req, now):
+        """Write one request; returns the entries it makes visible to the consumer."""
+        if req.kind == "append":
+            req.result, entries = [], []
+            # only a client's own sequence numbers identify a retry; without a client_id
+            # client_seq stays NULL, which UNIQUE never treats as a duplicate
+            client_id = req.client_id or ANONYMOUS_CLIENT
+            for seq, code in req.rows:
+                c.execute("INSERT OR IGNORE INTO scans (client_id, client_seq, code, received_at) VALUES (?, ?, ?, ?)",
+                          (client_id, seq if req.client_id else None, code, now))
+                entry = ScanEntry(c.lastrowid, client_id, seq, code) if c.rowcount == 1 else None
+                req.result.append((seq, code, entry))
+                if entry:
+                    entries.append(entry)
+            return entries
+        if req.kind == "consume":
+            c.executemany("UPDATE scans SET consumed_at=? WHERE id=? AND consumed_at IS NULL",
+                          [(now, i) for i in req.rows])
+        elif req.kind == "replay":
+            c.execute("SELECT id, client_id, client_seq, code FROM scans WHERE consumed_at IS NULL ORDER BY id")
+            pending = [ScanEntry(*r) for r in c.fetchall()]
+            req.result = len(pending)
+            return pending
+        elif req.kind == "prune":
+            c.execute("DELETE FROM scans WHERE consumed_at IS NOT NULL AND consumed_at < datetime('now', ?)",
+                      (f"-{req.rows} days",))
+            req.result = c.rowcount
+        return []
+
+    def _commit(self, batch):
+        c = self._conn.cursor()
+        now = _utc_now()
+        queued = []
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            for req in batch:
+                # each request in its own savepoint: a bad one fails alone, not its whole group
+                c.execute("SAVEPOINT request")
+                try:
+                    queued.extend(self._apply(c, req, now))
+                except (sqlite3.Error, ValueError, TypeError, OverflowError) as e:
+                    c.execute("ROLLBACK TO request")
+                    req.result = None
+                    req.error = e
+                c.execute("RELEASE request")
+            c.execute("COMMIT")
+        except Exception as e:
+            if self._conn.in_transaction:
+                c.execute("ROLLBACK")
+            for req in batch:
+                req.result = None
+                req.error = e
+            queued = []
+        self.commits += 1
+        self.scans_written += sum(len(r.rows) for r in batch if r.kind == "append" and r.error is None)
+        # only committed scans become visible to the consumer
+        if self.out_queue is not None:
+            for entry in queued:
+                self.out_queue.put(entry)
+        for req in batch:
+            req.done.set()
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+def get_journal(path=None, out_queue=None):
+    """Shared journal per file (the GUI and its scan server use the same one);
+    default: the journal of storage.DEFAULT_TARGET."""
+    path = os.path.abspath(path or journal_path())
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = _journals[path] = ScanJournal(path, out_queue)
+        return journal
@@ -0,0 +1,308 @@
+# scan_loadtest.py
+"""
+Load generator and latency harness for the scan endpoint (scan_server.py).
+
+Starts a ScanHandler server in-process (or targets a running one with --url),
+fires concurrent JSON and form-encoded POSTs at /scan from N client threads,
+and measures throughput plus latency from the start of each POST until a
+consumer thread takes that code off scan_queue. Runs headless (no Tk).
+Scans carry a client_id and seq like a handheld's, go through a throwaway scan
+journal (or --journal PATH, to measure fsync cost on a real disk), and
+--resend-every N re-posts every Nth scan to check retries are not queued twice.
+
+Usage:
+    python scan_loadtest.py                           # 8 clients x 500 scans, mixed bodies
+    python scan_loadtest.py --clients 32 --requests 200 --mix form --keepalive
+    python scan_loadtest.py --poll-ms 150             # consume like the GUI (poll every 150 ms)
+    python scan_loadtest.py --single-threaded         # compare with a plain HTTPServer
+    python scan_loadtest.py --batch-size 20 --resend-every 10   # batched acks, simulated retries
+    python scan_loadtest.py --min-rps 500 --max-p99-ms 50 --json   # exit 1 if below target
+"""
+import os
+import sys
+import json
+import math
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlencode, urlparse
+
+import scan_server
+from scan_journal import ScanJournal
+
+DEFAULT_CLIENTS = 8
+DEFAULT_REQUESTS = 500    # per client
+BODY_MIXES = ("json", "form", "both")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def build_body(scans, kind, client_id):
+    """scans: [(seq, code)]; more than one is sent in the JSON batch format."""
+    if len(scans) > 1:
+        body = {"client_id": client_id, "scans": [{"seq": seq, "code": code} for seq, code in scans]}
+        return json.dumps(body).encode("utf-8"), "application/json"
+    seq, code = scans[0]
+    fields = {"code": code, "client_id": client_id, "seq": seq}
+    if kind == "json":
+        return json.dumps(fields).encode("utf-8"), "application/json"
+    return urlencode(fields).encode("utf-8"), "application/x-www-form-urlencoded"
+
+class _Consumer(threading.Thread):
+    """Drains scan_queue and stamps when each code was consumed.
+    poll_ms=0 blocks on the queue; poll_ms>0 drains in bursts like the GUI's after() loop."""
+    def __init__(self, q, journal=None, poll_ms=0):
+        super().__init__(name="scan-consumer", daemon=True)
+        self.q = q
+        self.journal = journal
+        self.poll_ms = poll_ms
+        self.consumed = {}
+        self.repeats = 0
+        self.stop = threading.Event()
+
+    def _take(self, entry):
+        if entry.code in self.consumed:
+            self.repeats += 1
+            return
+        self.consumed[entry.code] = time.perf_counter()
+
+    def run(self):
+        while not self.stop.is_set():
+            handled = []
+            if self.poll_ms:
+                time.sleep(self.poll_ms / 1000.0)
+                try:
+                    while True:
+                        entry = self.q.get_nowait()
+                        self._take(entry)
+                        handled.append(entry.journal_id)
+                except queue.Empty:
+                    pass
+            else:
+                try:
+                    entry = self.q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                # stamp after get() returns (the subscript form would read the clock first)
+                self._take(entry)
+                handled.append(entry.journal_id)
+            if self.journal is not None and handled:
+                self.journal.mark_consumed(handled)
+
+def _accepted(resp_status, text, scans):
+    if resp_status != 200:
+        return False
+    if len(scans) == 1:
+        return text == "scanned"
+    try:
+        return len(json.loads(text).get("acked", [])) == len(scans)
+    except ValueError:
+        return False
+
+def _client(idx, host, port, path, n, mix, keepalive, batch_size, resend_every,
+            sent, round_trips, errors, start_evt):
+    conn = None
+    client_id = f"loadtest-{idx:03d}"
+    requests = [[(i, f"LT{idx:03d}{i:07d}") for i in range(b, min(n, b + batch_size))]
+                for b in range(0, n, batch_size)]
+    if resend_every:
+        # a lost acknowledgement: the same scans are posted again
+        requests = [r for k, r in enumerate(requests) for _ in range(2 if (k + 1) % resend_every == 0 else 1)]
+    start_evt.wait()
+    for k, scans in enumerate(requests):
+        kind = mix if mix != "both" else ("json" if k % 2 == 0 else "form")
+        body, ctype = build_body(scans, kind, client_id)
+        headers = {"Content-Type": ctype}
+        if not keepalive:
+            headers["Connection"] = "close"
+        label = scans[0][1]
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+            t0 = time.perf_counter()
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            text = resp.read().decode("utf-8", "replace")
+            if not _accepted(resp.status, text, scans):
+                errors.append(f"{label}: HTTP {resp.status} {text[:80]!r}")
+            else:
+                for _seq, code in scans:
+                    sent.setdefault(code, t0)
+                round_trips.append((time.perf_counter() - t0) * 1000.0)
+            if not keepalive or resp.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(f"{label}: {e}")
+            if conn is not None:
+                conn.close()
+                conn = None
+    if conn is not None:
+        conn.close()
+
+def run_load_test(clients=DEFAULT_CLIENTS, requests=DEFAULT_REQUESTS, mix="both", keepalive=False,
+                  poll_ms=0, threaded=True, url=None, drain_timeout=10.0, batch_size=1,
+                  resend_every=0, journal_path=None):
+    """
+    Run one load test and return a results dict (throughput, latency percentiles, errors).
+    Without url an in-process server is started on a free local port; with url the
+    scans go to that server, whose queue this process can't see, so only the
+    HTTP round-trip latency is reported.
+    """
+    if mix not in BODY_MIXES:
+        raise ValueError(f"mix must be one of {BODY_MIXES}")
+    httpd = journal = tmp_dir = None
+    if url:
+        u = urlparse(url)
+        host, port, path = u.hostname, u.port or 80, u.path or "/scan"
+        consumer = None
+    else:
+        while not scan_server.scan_queue.empty():
+            scan_server.scan_queue.get_nowait()
+        if journal_path is None:
+            tmp_dir = tempfile.mkdtemp(prefix="scan_loadtest_")
+            journal_path = os.path.join(tmp_dir, "scan_journal.db")
+        journal = ScanJournal(journal_path, scan_server.scan_queue)
+        httpd = scan_server.create_scan_server("127.0.0.1", 0, threaded=threaded, journal=journal)
+        host, port, path = "127.0.0.1", httpd.server_address[1], "/scan"
+        threading.Thread(target=httpd.serve_forever, name="scan-server", daemon=True).start()
+        consumer = _Consumer(scan_server.scan_queue, journal, poll_ms)
+        consumer.start()
+
+    sent, round_trips, errors = {}, [], []
+    start_evt = threading.Event()
+    threads = [threading.Thread(target=_client, args=(i, host, port, path, requests, mix, keepalive,
+                                                      max(1, batch_size), resend_every,
+                                                      sent, round_trips, errors, start_evt), daemon=True)
+               for i in range(clients)]
+    for t in threads:
+        t.start()
+    t_start = time.perf_counter()
+    start_evt.set()
+    for t in threads:
+        t.join()
+    t_sent = time.perf_counter()
+
+    latencies = []
+    lost = 0
+    if consumer is not None:
+        deadline = time.perf_counter() + drain_timeout
+        while len(consumer.consumed) < len(sent) and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        consumer.stop.set()
+        consumer.join()
+        for code, t0 in sent.items():
+            t1 = consumer.consumed.get(code)
+            if t1 is None:
+                lost += 1
+            else:
+                latencies.append((t1 - t0) * 1000.0)
+        t_done = max(consumer.consumed.values(), default=t_sent)
+    else:
+        t_done = t_sent
+    commits = 0
+    if httpd is not None:
+        httpd.shutdown()
+        httpd.server_close()
+        commits = journal.commits
+        journal.close()
+    if tmp_dir:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    latencies.sort()
+    round_trips.sort()
+    elapsed = max(t_done - t_start, 1e-9)
+    return {
+        "clients": clients,
+        "requests_per_client": requests,
+        "mix": mix,
+        "keepalive": keepalive,
+        "server": "external" if url else ("threaded" if threaded else "single-threaded"),
+        "poll_ms": poll_ms,
+        "batch_size": batch_size,
+        "resend_every": resend_every,
+        "ok": len(sent),
+        "errors": len(errors),
+        "lost": lost,
+        "queued_twice": consumer.repeats if consumer is not None else None,
+        "journal_commits": commits,
+        "seconds": round(elapsed, 3),
+        "scans_per_s": round(len(sent) / elapsed, 1),
+        "latency_ms": {
+            "p50": _r(percentile(latencies, 50)),
+            "p90": _r(percentile(latencies, 90)),
+            "p99": _r(percentile(latencies, 99)),
+            "max": _r(latencies[-1] if latencies else None),
+        },
+        "round_trip_ms": {
+            "p50": _r(percentile(round_trips, 50)),
+            "p99": _r(percentile(round_trips, 99)),
+        },
+        "error_samples": errors[:5],
+    }
+
+def _r(v):
+    return round(v, 3) if v is not None else None
+
+def print_results(r):
+    lat = r["latency_ms"]
+    print(f"Scan load test: {r['clients']} clients x {r['requests_per_client']} scans "
+          f"({r['mix']}, {'keep-alive' if r['keepalive'] else 'new connection per scan'}, {r['server']} server)")
+    print(f"   {r['ok']} scans in {r['seconds']:.3f}s -> {r['scans_per_s']} scans/s")
+    if lat["p50"] is not None:
+        print(f"   POST -> consumed latency: p50 {lat['p50']} ms, p90 {lat['p90']} ms, "
+              f"p99 {lat['p99']} ms, max {lat['max']} ms")
+    if r["round_trip_ms"]["p50"] is not None:
+        print(f"   HTTP round trip: p50 {r['round_trip_ms']['p50']} ms, p99 {r['round_trip_ms']['p99']} ms")
+    if r["journal_commits"]:
+        print(f"   journal: {r['journal_commits']} commits ({r['ok'] / r['journal_commits']:.1f} scans per commit)")
+    if r["errors"] or r["lost"] or r["queued_twice"]:
+        print(f"⚠ {r['errors']} failed requests, {r['lost']} scans never reached the queue, "
+              f"{r['queued_twice']} queued twice")
+        for e in r["error_samples"]:
+            print("   ", e)
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Load test the /scan endpoint")
+    p.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help="concurrent scanner threads")
+    p.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="scans per client")
+    p.add_argument("--mix", choices=BODY_MIXES, default="both", help="request body encoding")
+    p.add_argument("--keepalive", action="store_true", help="reuse one connection per client")
+    p.add_argument("--poll-ms", type=int, default=0, help="consumer polling interval (0 = blocking get)")
+    p.add_argument("--single-threaded", action="store_true", help="use a plain HTTPServer")
+    p.add_argument("--batch-size", type=int, default=1, help="scans per POST (JSON batch format when > 1)")
+    p.add_argument("--resend-every", type=int, default=0, help="post every Nth request twice (lost-ack retry)")
+    p.add_argument("--journal", help="scan journal file (default: a throwaway temp file)")
+    p.add_argument("--url", help="target a running server instead (round-trips only)")
+    p.add_argument("--json", action="store_true", help="print results as JSON")
+    p.add_argument("--min-rps", type=float, help="exit 1 if throughput is below this")
+    p.add_argument("--max-p99-ms", type=float, help="exit 1 if p99 latency is above this")
+    args = p.parse_args(argv)
+
+    r = run_load_test(args.clients, args.requests, args.mix, args.keepalive, args.poll_ms,
+                      threaded=not args.single_threaded, url=args.url, batch_size=args.batch_size,
+                      resend_every=args.resend_every, journal_path=args.journal)
+    if args.json:
+        print(json.dumps(r, indent=2))
+    else:
+        print_results(r)
+    failed = bool(r["errors"] or r["lost"] or r["queued_twice"])
+    if args.min_rps is not None and r["scans_per_s"] < args.min_rps:
+        print(f"❌ throughput {r['scans_per_s']} scans/s is below {args.min_rps}", file=sys.stderr)
+        failed = True
+    p99 = r["latency_ms"]["p99"] if r["latency_ms"]["p99"] is not None else r["round_trip_ms"]["p99"]
+    if args.max_p99_ms is not None and p99 is not None and p99 > args.max_p99_ms:
+        print(f"❌ p99 latency {p99} ms is above {args.max_p99_ms} ms", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# scan_server.py
+# Lightweight HTTP endpoint for phone / handheld scanners. POSTed codes land in
+# scan_queue; the GUI polls that queue. No Tk dependency, so it also runs headless.
+# GET /events long-polls the change feed (change_feed.py) for dashboards.
+#
+# Scans are journaled to disk (scan_journal.py) before they are acknowledged.
+# Handhelds should send a client_id and an increasing seq so retries are deduplicated:
+#   {"code": "111111111111", "client_id": "phone-7", "seq": 42}              -> "scanned"
+#   {"client_id": "phone-7", "scans": [{"seq": 43, "code": "..."}, ...]}     -> {"acked": [...], ...}
+# A scanner that buffers while the PC is unreachable resends everything not yet acked.
+#
+# POST /transactions takes complete transactions from POS terminals (transaction_api.py):
+#   {"idempotency_key": "till3-000123", "type": "sale", "items": [{"barcode": "...", "qty": 2}]}
+#       -> 201 {"transaction_id": 57, "status": "created", ...}; a retry -> 200 "replayed"
+#   {"transactions": [{...}, {...}]} -> 200 {"results": [...]} (one result per transaction)
+#
+# POST /transactions changes stock, and GET /logs, /transactions and /events expose the
+# audit trail and transaction details (users, customers, notes), so they need the shared
+# API token (INVENTORY_API_TOKEN, or the settings key api_token) as
+# "Authorization: Bearer <token>". Without a token configured they are only served to
+# clients on this machine (loopback).
+#
+# GET /items, /items/<barcode>, /stock, /logs, /transactions, /transactions/<id> are
+# read-only queries (query_api.py) with keyset pagination (?after=<next>&limit=N),
+# field selection (?fields=barcode,name) and ETags: send If-None-Match to get a 304
+# while nothing has changed.
+import os
+import hmac
+import json
+import queue
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import query_api
+import storage
+from change_feed import ENTITIES, latest_seq, wait_for_events
+from scan_journal import get_journal, journal_path
+
+SCAN_PORT = 8000               # HTTP POST endpoint: http://<PC_IP>:8000/scan
+LISTEN_BACKLOG = 128           # socketserver's default of 5 drops connects from bursts of scanners
+scan_queue = queue.Queue()     # thread-safe queue for incoming scans
+DB_FILE = storage.DEFAULT_TARGET   # default database of GET and /transactions (INVENTORY_DB)
+EVENTS_MAX_TIMEOUT = 60        # seconds a long-poll may hold a connection
+EVENTS_MAX_LIMIT = 1000
+API_TOKEN_ENV = "INVENTORY_API_TOKEN"   # shared token of the protected endpoints (else settings.api_token)
+PROTECTED_RESOURCES = ("logs", "transactions")   # GET resources behind the token
+
+def _code_of(d):
+    return d.get("code") or d.get("barcode") or d.get("value")
+
+SEQ_MAX = 2 ** 63 - 1          # client_seq is a SQLite INTEGER (signed 64-bit)
+
+def _seq(value):
+    if value in (None, ""):
+        return None
+    seq = int(value)
+    if not -SEQ_MAX - 1 <= seq <= SEQ_MAX:
+        raise ValueError(f"seq out of range: {seq}")
+    return seq
+
+def parse_scan_body(body):
+    """
+    (client_id, [(seq, code), ...], is_batch) from a JSON or form-encoded /scan body.
+    Raises ValueError for a malformed or out-of-range seq (TypeError for a list or object).
+    """
+    text = body.decode('utf-8', 'replace')
+    # try JSON
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        if isinstance(data.get("scans"), list):
+            scans = []
+            for s in data["scans"]:
+                if isinstance(s, dict) and _code_of(s):
+                    scans.append((_seq(s.get("seq")), str(_code_of(s)).strip()))
+                elif isinstance(s, str) and s.strip():
+                    scans.append((None, s.strip()))
+            return data.get("client_id"), scans, True
+        code = _code_of(data)
+        if code:
+            return data.get("client_id"), [(_seq(data.get("seq")), str(code).strip())], False
+    # try form-encoded
+    qs = parse_qs(text)
+    code = (qs.get('code') or qs.get('barcode') or [None])[0]
+    if code:
+        return (qs.get('client_id') or [None])[0], [(_seq((qs.get('seq') or [None])[0]), code.strip())], False
+    return None, [], False
+
+# -----------------------
+# Lightweight HTTP server to accept POST scan data
+# -----------------------
+class ScanHandler(BaseHTTPRequestHandler):
+    # keep-alive: a handheld can send a burst of scans over one connection
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; with Nagle on, the body waits for the
+    # client's delayed ACK (~40 ms per scan on a keep-alive connection)
+    disable_nagle_algorithm = True
+
+    def _send_ok(self, text="OK"):
+        payload = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, obj, status=200, headers=None):
+        payload = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self):
+        """True for a request carrying the API token, or, when none is configured, one from
+        this machine; otherwise answers 401/403 and returns False. The body must have been read."""
+        token = self.server.api_token
+        if not token:
+            if self.client_address[0] in ("127.0.0.1", "::1") or self.client_address[0].startswith("::ffff:127."):
+                return True
+            self._send_json({"error": f"set {API_TOKEN_ENV} (or settings.api_token) to serve this "
+                                      "endpoint to other machines"}, 403)
+            return False
+        scheme, _, sent = (self.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(sent.strip().encode(), token.encode()):
+            return True
+        self._send_json({"error": "missing or wrong API token"}, 401, {"WWW-Authenticate": "Bearer"})
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/events":
+            if self._authorized():
+                self._events(parse_qs(url.query))
+            return
+        target = query_api.route(url.path)
+        if target:
+            if target[0] not in PROTECTED_RESOURCES or self._authorized():
+                self._query(target[0], target[1], parse_qs(url.query))
+            return
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _events(self, qs):
+        # /events?after=SEQ&timeout=S&limit=N&entity=stock,item ; no 'after' = only new events
+        try:
+            after = int(qs["after"][0]) if "after" in qs else None
+            timeout = min(float(qs.get("timeout", ["25"])[0]), EVENTS_MAX_TIMEOUT)
+            limit = max(1, min(int(qs.get("limit", ["100"])[0]), EVENTS_MAX_LIMIT))
+        except ValueError:
+            self._send_json({"error": "after, timeout and limit must be numbers"}, 400)
+            return
+        entities = [e for v in qs.get("entity", []) for e in v.split(",") if e]
+        if any(e not in ENTITIES for e in entities):
+            self._send_json({"error": f"entity must be one of {list(ENTITIES)}"}, 400)
+            return
+        conn = storage.connect(self.server.db_file, timeout=30)
+        try:
+            if after is None:
+                after = latest_seq(conn)
+            events = wait_for_events(conn, after, timeout, limit, entities or None)
+        except sqlite3.OperationalError as e:
+            self._send_json({"error": f"change feed unavailable: {e}"}, 503)
+            return
+        finally:
+            conn.close()
+        self._send_json({"events": events, "last_seq": events[-1]["seq"] if events else after})
+
+    def _query(self, resource, key, qs):
+        versions = self.server.versions
+        try:
+            etag = versions.etag(query_api.RESOURCES[resource]["version"])
+        except sqlite3.OperationalError as e:
+            self._send_json({"error": f"database unavailable: {e}"}, 503)
+            return
+        if etag and query_api.etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        fields = qs.get("fields", [None])[0]
+        conn = storage.connect(self.server.db_file, timeout=30)
+        try:
+            if key is not None:
+                if resource == "items":
+                    obj = query_api.get_item(conn, unquote(key), fields)
+                else:
+                    obj = query_api.get_transaction(conn, int(key), fields)
+                if obj is None:
+                    self._send_json({"error": f"{resource[:-1]} not found"}, 404)
+                    return
+            else:
+                filters = {name: qs[name][0] for name in query_api.RESOURCES[resource]["filters"] if name in qs}
+                obj = query_api.list_rows(conn, resource, qs.get("after", [None])[0],
+                                          qs.get("limit", [query_api.DEFAULT_LIMIT])[0], fields, filters)
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+            return
+        except sqlite3.OperationalError as e:
+            self._send_json({"error": f"database unavailable: {e}"}, 503)
+            return
+        finally:
+            conn.close()
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'} if etag else {'Cache-Control': 'no-cache'}
+        self._send_json(obj, headers=headers)
+
+    def do_POST(self):
+        if self.path not in ("/scan", "/transactions"):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        if self.path == "/transactions":
+            if self._authorized():
+                self._transactions(body)
+            return
+        try:
+            client_id, scans, is_batch = parse_scan_body(body)
+        except (TypeError, ValueError):
+            self._send_json({"error": "seq must be a 64-bit integer"}, 400)
+            return
+        if not scans:
+            self._send_ok("no_code")
+            return
+        try:
+            # returns once the scans are committed to the journal (and queued)
+            results = self.server.journal.append(client_id, scans)
+        except Exception as e:
+            # not acknowledged: the scanner keeps the scan and retries
+            self._send_json({"error": f"scan journal unavailable: {e}"}, 503)
+            return
+        if not is_batch:
+            self._send_ok("scanned")
+            return
+        acked = [seq for seq, _code, _entry in results if seq is not None]
+        self._send_json({
+            "acked": acked,
+            "duplicates": [seq for seq, _code, entry in results if entry is None],
+            "ack_seq": max(acked) if acked else None,
+            "count": len(results),
+        })
+
+    def _transactions(self, body):
+        # imported here: the scan endpoint alone shouldn't need the inventory modules
+        from transaction_api import (CREATED, REPLAYED, CONFLICT, REJECTED,
+                                     get_transaction_service, parse_submission)
+        try:
+            data = json.loads(body.decode('utf-8', 'replace'))
+            is_batch = isinstance(data, dict) and isinstance(data.get("transactions"), list)
+            if not is_batch and isinstance(data, dict) and self.headers.get("Idempotency-Key"):
+                # a single transaction may carry its key in the Idempotency-Key header instead
+                data.setdefault("idempotency_key", self.headers["Idempotency-Key"])
+            submissions = [parse_submission(d) for d in (data["transactions"] if is_batch else [data])]
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+            return
+        service = self.server.transactions or get_transaction_service(self.server.db_file)
+        try:
+            results = service.submit(submissions)
+        except Exception as e:
+            self._send_json({"error": f"transactions unavailable: {e}"}, 503)
+            return
+        if is_batch:
+            self._send_json({"results": results})
+            return
+        result = results[0]
+        status = {CREATED: 201, REPLAYED: 200, CONFLICT: 409, REJECTED: 422}.get(result["status"], 503)
+        self._send_json(result, status)
+
+    # silence logging
+    def log_message(self, format, *args):
+        return
+
+def _settings_token(db_file):
+    try:
+        conn = storage.connect(db_file, timeout=30)
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE key='api_token'").fetchone()
+        finally:
+            conn.close()
+    except Exception:       # no settings table yet, or the database is unreachable
+        return None
+    return row[0] if row and row[0] else None
+
+def create_scan_server(host="0.0.0.0", port=SCAN_PORT, threaded=True, journal=None, transactions=None,
+                       db_file=None, api_token=None):
+    """
+    Bound server without a thread; callers run serve_forever() and shutdown() themselves.
+    threaded=True handles each connection in its own thread, so one slow or idle
+    keep-alive scanner doesn't hold up the others (measure with scan_loadtest.py).
+    Scans go through `journal` (default: the shared scan_journal.db next to `db_file`,
+    feeding scan_queue); scans left unconsumed by a previous run are queued again
+    first. POST /transactions uses `transactions` (default: the shared
+    TransactionService for the database, started on the first request). GET and
+    POST /transactions use `db_file`: a SQLite path, `store:NAME` or postgresql://
+    URL (default DB_FILE). `api_token` (default: INVENTORY_API_TOKEN, else
+    settings.api_token) protects POST /transactions, /events and the GET
+    PROTECTED_RESOURCES.
+    """
+    cls = ThreadingHTTPServer if threaded else HTTPServer
+    httpd = cls((host, port), ScanHandler, bind_and_activate=False)
+    httpd.request_queue_size = LISTEN_BACKLOG
+    try:
+        httpd.server_bind()
+        httpd.server_activate()
+    except Exception:
+        httpd.server_close()
+        raise
+    httpd.db_file = storage.resolve_target(db_file or DB_FILE)
+    httpd.journal = journal or get_journal(journal_path(httpd.db_file), scan_queue)
+    httpd.journal.replay_pending()
+    httpd.journal.prune()
+    httpd.transactions = transactions
+    httpd.api_token = api_token or os.environ.get(API_TOKEN_ENV) or _settings_token(httpd.db_file)
+    httpd.versions = query_api.DataVersion(httpd.db_file)
+    return httpd
+
+def start_scan_server(host="0.0.0.0", port=SCAN_PORT, db_file=None):
+    def server_thread():
+        try:
+            httpd = create_scan_server(host, port, db_file=db_file)
+            httpd.serve_forever()
+        except Exception as e:
+            print("Scan server stopped/error:", e)
+    t = threading.Thread(target=server_thread, daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,193 @@
+# search_index.py
+"""
+Item search backed by an SQLite FTS5 index over name, category, supplier and location.
+
+The index is an external-content FTS5 table (it stores no copy of the text) kept
+in sync with `items` by triggers, so every writer (CLI, GUI, scripts) updates it
+without code changes. Queries use prefix matching and bm25 ranking; when a query
+finds nothing, misspelled words are corrected against the index vocabulary.
+"""
+import re
+import sqlite3
+import difflib
+
+SEARCH_COLUMNS = ("name", "category", "supplier", "location")
+# bm25 weights, same order as SEARCH_COLUMNS: a hit in the name counts most
+RANK_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+RESULT_COLUMNS = ("id", "name", "category", "barcode", "quantity", "supplier", "sale_price", "location")
+
+_has_fts5 = None
+
+def has_fts5():
+    """True if the sqlite3 library was compiled with FTS5."""
+    global _has_fts5
+    if _has_fts5 is None:
+        try:
+            conn = sqlite3.connect(":memory:")
+            conn.execute("CREATE VIRTUAL TABLE t USING fts5(a)")
+            conn.close()
+            _has_fts5 = True
+        except sqlite3.OperationalError:
+            _has_fts5 = False
+    return _has_fts5
+
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        name, category, supplier, location,
+        content='items', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts_vocab USING fts5vocab(items_fts, 'row')",
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, name, category, supplier, location)
+        VALUES (new.id, new.name, new.category, new.supplier, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, category, supplier, location)
+        VALUES ('delete', old.id, old.name, old.category, old.supplier, old.location);
+    END
+    """,
+    # only the indexed columns: quantity updates must not churn the index
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, category, supplier, location ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, category, supplier, location)
+        VALUES ('delete', old.id, old.name, old.category, old.supplier, old.location);
+        INSERT INTO items_fts(rowid, name, category, supplier, location)
+        VALUES (new.id, new.name, new.category, new.supplier, new.location);
+    END
+    """,
+]
+
+def ensure_search_index(conn):
+    """
+    Create the FTS index and its sync triggers if missing (and fill it from `items`).
+    Returns False when FTS5 is unavailable; search then falls back to LIKE scans.
+    """
+    if not has_fts5():
+        return False
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='items_fts'")
+    if c.fetchone():
+        return True
+    for ddl in SEARCH_INDEX_DDL:
+        c.execute(ddl)
+    rebuild_search_index(conn)
+    return True
+
+def rebuild_search_index(conn):
+    """Re-index every item (use after bulk loads done with the triggers absent)."""
+    c = conn.cursor()
+    c.execute("INSERT INTO items_fts(items_fts) VALUES ('rebuild')")
+    c.execute("INSERT INTO items_fts(items_fts, rank) VALUES ('rank', ?)",
+              ("bm25(%s)" % ", ".join(str(w) for w in RANK_WEIGHTS),))
+    conn.commit()
+
+def _index_exists(conn):
+    if getattr(conn, "dialect", "sqlite") != "sqlite":
+        return False   # FTS5 is SQLite-only; other engines use the LIKE fallback
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='items_fts'")
+    return c.fetchone() is not None
+
+def parse_query(text):
+    """
+    Split user input into (column, term) pairs. `column:term` restricts a term to
+    one of SEARCH_COLUMNS, e.g. "mouse supplier:logi".
+    """
+    terms = []
+    for part in text.split():
+        column = None
+        if ":" in part:
+            head, _, tail = part.partition(":")
+            if head.lower() in SEARCH_COLUMNS:
+                column, part = head.lower(), tail
+        for word in re.findall(r"\w+", part.lower()):
+            terms.append((column, word))
+    return terms
+
+def build_match_expression(terms):
+    """All terms must match (implicit AND); every term is a prefix query."""
+    parts = []
+    for column, word in terms:
+        expr = '"%s"*' % word.replace('"', '""')
+        parts.append(f"{column} : {expr}" if column else expr)
+    return " ".join(parts)
+
+def _correct_terms(conn, terms):
+    """Replace words that are not in the index vocabulary by their closest known term."""
+    c = conn.cursor()
+    corrected = []
+    changed = False
+    for column, word in terms:
+        # a prefix of some indexed term is already a valid query word
+        c.execute("SELECT 1 FROM items_fts_vocab WHERE term >= ? AND term < ? LIMIT 1", (word, word + "\uffff"))
+        if c.fetchone():
+            corrected.append((column, word))
+            continue
+        # only compare against terms sharing the first letter; keeps this fast on big vocabularies
+        c.execute("SELECT term FROM items_fts_vocab WHERE term >= ? AND term < ?", (word[0], word[0] + "\uffff"))
+        candidates = [r[0] for r in c.fetchall()]
+        match = difflib.get_close_matches(word, candidates, n=1, cutoff=0.7)
+        if match:
+            corrected.append((column, match[0]))
+            changed = True
+        else:
+            corrected.append((column, word))
+    return corrected, changed
+
+def _like_search(conn, terms, limit):
+    where = []
+    params = []
+    for column, word in terms:
+        cols = [column] if column else list(SEARCH_COLUMNS)
+        where.append("(" + " OR ".join(f"{col} LIKE ?" for col in cols) + ")")
+        params.extend([f"%{word}%"] * len(cols))
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM items WHERE {' AND '.join(where)} ORDER BY id LIMIT ?",
+              params + [limit])
+    return c.fetchall()
+
+def search_items(conn, text, limit=50, fuzzy=True):
+    """
+    Search items. Returns a list of dicts (RESULT_COLUMNS), best match first.
+    An exact barcode is always returned first; with `fuzzy`, a query with no hits
+    is retried with misspelled words corrected against the index vocabulary.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    c = conn.cursor()
+    rows = []
+    c.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM items WHERE barcode=?", (text,))
+    row = c.fetchone()
+    if row:
+        rows.append(row)
+
+    terms = parse_query(text)
+    if terms:
+        if _index_exists(conn):
+            sql = f"""
+                SELECT {', '.join('i.' + col for col in RESULT_COLUMNS)}
+                FROM items_fts f JOIN items i ON i.id = f.rowid
+                WHERE items_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ?
+            """
+            c.execute(sql, (build_match_expression(terms), limit))
+            hits = c.fetchall()
+            if not hits and fuzzy:
+                terms, changed = _correct_terms(conn, terms)
+                if changed:
+                    c.execute(sql, (build_match_expression(terms), limit))
+                    hits = c.fetchall()
+        else:
+            hits = _like_search(conn, terms, limit)
+        seen = {r[0] for r in rows}
+        rows.extend(r for r in hits if r[0] not in seen)
+    return [dict(zip(RESULT_COLUMNS, r)) for r in rows[:limit]]
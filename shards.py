@@ -0,0 +1,216 @@
+# shards.py
+"""
+Per-store shards: one SQLite inventory file per store, and a federation over them.
+
+Each store's database is shards/<store>.db, a complete inventory database (same
+migrations) holding that store's items, stock, transactions and logs. Files
+stay small, and stores write in parallel since each has its own write lock.
+
+Shard k reserves the id range k * ID_SPAN upwards for every AUTOINCREMENT table
+(through sqlite_sequence), so ids are unique across stores and rows from
+different shards can be combined and joined without clashes.
+
+Targets (inventory_cli.py --store, or INVENTORY_DB):
+
+    store:Store A    that store's file, created on first use
+    stores:          all stores, read-only: one connection with every shard
+                     ATTACHed and TEMP views (items, transactions, ...) over their
+                     union, so the existing queries run unchanged. SQLite attaches
+                     at most MAX_ATTACHED databases.
+
+Cross-store reports don't need ATTACH: fan_out() runs a function on every shard
+in a thread pool, each on its own connection (sqlite3 releases the GIL while a
+statement runs, so shards are read in parallel), and the per-store results are
+merged (valuation.merge_rows, merge_series, merge_top).
+"""
+import os
+import re
+import glob
+import sqlite3
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+import query_stats
+import valuation
+import rollups
+from migrations import ensure_schema
+
+SHARD_DIR = os.environ.get("INVENTORY_SHARDS", "shards")
+ALL_STORES = "stores:"
+ID_SPAN = 10 ** 12          # ids per shard; shard k starts at k * ID_SPAN + 1
+DEFAULT_WORKERS = 4
+MAX_ATTACHED = 10           # SQLITE_MAX_ATTACHED of a default SQLite build
+
+# tables the all-stores connection exposes as views over every shard
+FEDERATED_TABLES = ("items", "locations", "item_stock", "transactions", "transaction_items",
+                    "sales", "logs", "settings", "daily_item_stats", "daily_category_stats")
+
+def is_all_stores(target):
+    return str(target).startswith(ALL_STORES)
+
+def store_slug(name):
+    slug = re.sub(r"[^a-z0-9_-]+", "_", (name or "").strip().lower()).strip("_")
+    if not slug:
+        raise ValueError(f"Invalid store name: {name!r}")
+    return slug
+
+def shard_path(name):
+    return os.path.join(SHARD_DIR, f"{store_slug(name)}.db")
+
+def _shard_info(path):
+    """(store name, shard index) recorded in a shard's settings."""
+    conn = sqlite3.connect(path)
+    try:
+        info = dict(conn.execute("SELECT key, value FROM settings WHERE key IN ('shard_store', 'shard_index')"))
+    except sqlite3.Error:
+        info = {}
+    finally:
+        conn.close()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return info.get("shard_store", stem), int(info.get("shard_index", 0))
+
+def list_stores():
+    """[(store name, shard path)] in shard-index order."""
+    shards = []
+    for path in glob.glob(os.path.join(SHARD_DIR, "*.db")):
+        name, index = _shard_info(path)
+        shards.append((index, name, path))
+    return [(name, path) for _index, name, path in sorted(shards)]
+
+def _reserve_ids(c, index):
+    """Start every AUTOINCREMENT sequence of the shard at index * ID_SPAN."""
+    base = int(index) * ID_SPAN
+    c.execute("SELECT name FROM sqlite_master WHERE type='table' AND sql LIKE '%AUTOINCREMENT%'")
+    for (table,) in c.fetchall():
+        c.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?", (base, table, base))
+        c.execute("INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS "
+                  "(SELECT 1 FROM sqlite_sequence WHERE name = ?)", (table, base, table))
+
+def create_store(name):
+    """Path of a store's shard, creating it (schema, id range) if it doesn't exist yet."""
+    path = shard_path(name)
+    if os.path.exists(path):
+        return path
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    index = max((_shard_info(p)[1] for p in glob.glob(os.path.join(SHARD_DIR, "*.db"))), default=0) + 1
+    conn = query_stats.connect(path, timeout=30)
+    try:
+        ensure_schema(conn)
+        c = conn.cursor()
+        _reserve_ids(c, index)
+        c.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                      [("shard_store", name.strip()), ("shard_index", str(index))])
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+def _select(stores):
+    """[(name, path)] for the given store names (all stores when None)."""
+    shards = list_stores()
+    if stores:
+        wanted = {store_slug(s) for s in stores}
+        shards = [(n, p) for n, p in shards if store_slug(n) in wanted]
+    if not shards:
+        raise ValueError(f"No store shards found in {SHARD_DIR}/")
+    return shards
+
+class FederatedConnection(query_stats.InstrumentedConnection):
+    """Connection returned by connect_all(). Its own (in-memory) main database holds
+    nothing, so storage.ensure_schema() leaves it alone; each shard is migrated itself."""
+    federated = True
+
+def connect_all(stores=None, **kwargs):
+    """Read-only connection over every shard (or the named ones): each is ATTACHed
+    read-only and FEDERATED_TABLES become TEMP views over the union."""
+    shards = _select(stores)
+    if len(shards) > MAX_ATTACHED:
+        raise ValueError(f"{len(shards)} stores is more than SQLite can attach ({MAX_ATTACHED}); "
+                         "use the fan-out reports (inventory_cli.py stores report)")
+    for _name, path in shards:
+        conn = query_stats.connect(path, timeout=30)
+        try:
+            ensure_schema(conn)
+        finally:
+            conn.close()
+    conn = sqlite3.connect(":memory:", uri=True, factory=FederatedConnection, **kwargs)
+    c = conn.cursor()
+    for n, (_name, path) in enumerate(shards):
+        c.execute("ATTACH DATABASE ? AS ?", (pathlib.Path(path).resolve().as_uri() + "?mode=ro", f"s{n}"))
+    c.execute("SELECT name FROM s0.sqlite_master WHERE type='table'")
+    present = {r[0] for r in c.fetchall()}
+    for table in FEDERATED_TABLES:
+        if table in present:
+            union = " UNION ALL ".join(f"SELECT * FROM s{n}.{table}" for n in range(len(shards)))
+            c.execute(f"CREATE TEMP VIEW {table} AS {union}")
+    return conn
+
+class FederationBackend:
+    """storage.py backend for the `stores:` target (optionally `stores:Store A,Store B`)."""
+    dialect = "sqlite"
+
+    def __init__(self, target):
+        self.target = target
+        names = target[len(ALL_STORES):]
+        self.stores = [s for s in names.split(",") if s.strip()] or None
+
+    def connect(self, **kwargs):
+        return connect_all(self.stores, **kwargs)
+
+    def close(self):
+        pass
+
+# ------------------------
+# Fan-out
+# ------------------------
+def fan_out(fn, stores=None, workers=DEFAULT_WORKERS):
+    """[(store name, fn(cursor))] for every shard, run in parallel threads."""
+    def run(shard):
+        name, path = shard
+        conn = query_stats.connect(path, timeout=30, check_same_thread=False)
+        try:
+            ensure_schema(conn)
+            return name, fn(conn.cursor())
+        finally:
+            conn.close()
+    shards = _select(stores)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(shards)))) as pool:
+        return list(pool.map(run, shards))
+
+def merge_series(results):
+    """Sum rollups.series() rows from several stores by period."""
+    merged = {}
+    for _store, rows in results:
+        for period, *values in rows:
+            acc = merged.setdefault(period, [0] * len(values))
+            for n, v in enumerate(values):
+                acc[n] += v or 0
+    return [(period, *values) for period, values in sorted(merged.items())]
+
+def merge_top(results, limit):
+    """Combine rollups.top_items() rows (fetched without a limit) by barcode; best `limit`."""
+    merged = {}
+    for _store, rows in results:
+        for item_id, barcode, name, total in rows:
+            key = barcode or item_id
+            prev = merged.get(key)
+            merged[key] = (item_id, barcode, name, (prev[3] if prev else 0) + (total or 0))
+    return sorted(merged.values(), key=lambda r: r[3], reverse=True)[:limit]
+
+def _store_totals(c, since, until):
+    stock_row = (valuation.stock_valuation(c) or [{}])[0]
+    sales = rollups.series(c, since, until, "year", measures=("units_sold", "revenue"))
+    return {"items": stock_row.get("items", 0), "units": stock_row.get("units", 0),
+            "cost_value": stock_row.get("cost_value", 0.0), "retail_value": stock_row.get("retail_value", 0.0),
+            "units_sold": sum(r[1] or 0 for r in sales), "revenue": round(sum(r[2] or 0 for r in sales), 2)}
+
+def store_report(since=None, until=None, stores=None, workers=DEFAULT_WORKERS):
+    """[(store, totals)] per store (stock on hand and its value, sales in [since, until))
+    plus an "ALL STORES" row, each store read in parallel."""
+    rows = fan_out(lambda c: _store_totals(c, since, until), stores, workers)
+    total = {}
+    for _store, totals in rows:
+        for k, v in totals.items():
+            total[k] = total.get(k, 0) + (v or 0)
+    total = {k: round(v, 2) if isinstance(v, float) else v for k, v in total.items()}
+    return rows + [("ALL STORES", total)]
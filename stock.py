@@ -0,0 +1,242 @@
+# stock.py
+"""
+Stock by location.
+
+item_stock holds one (item_id, location_id, qty) row per place an item is kept;
+locations names the stores and warehouses. items.quantity stays as the item's
+total across locations and is maintained by triggers (it is recomputed from the
+item's item_stock rows, a primary-key range read), so every existing reader of
+items.quantity keeps working and totals never need a SUM over the table.
+
+items.location is the item's home location. Writers that still set
+items.quantity directly (old scripts) have the difference applied to the home
+location by a trigger, which aborts the statement rather than take the home
+location below zero; new code should call adjust_stock()/set_stock() with an
+explicit location.
+
+The tables and triggers are created by migration 7 (migrations.py); migration 14
+added the home-location floor.
+"""
+DEFAULT_LOCATION = "Main"
+
+def home_location_sql(col):
+    """SQL expression for the home location name of an items row (blank -> DEFAULT_LOCATION)."""
+    return f"COALESCE(NULLIF(TRIM({col}), ''), '{DEFAULT_LOCATION}')"
+
+_HOME_NEW = home_location_sql("NEW.location")
+_SUM_FOR = "(SELECT COALESCE(SUM(qty), 0) FROM item_stock WHERE item_id = {})"
+
+STOCK_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS locations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    # WITHOUT ROWID: the table is its primary key, so an item's rows are contiguous
+    """
+    CREATE TABLE IF NOT EXISTS item_stock (
+        item_id INTEGER NOT NULL,
+        location_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, location_id),
+        FOREIGN KEY (item_id) REFERENCES items (id),
+        FOREIGN KEY (location_id) REFERENCES locations (id)
+    ) WITHOUT ROWID
+    """,
+    # covering index for per-location totals and "what is at location X"
+    "CREATE INDEX IF NOT EXISTS idx_item_stock_location ON item_stock(location_id, qty)",
+    # item_stock -> items.quantity (recomputed, so repeated firing can't double count)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS item_stock_ai AFTER INSERT ON item_stock BEGIN
+        UPDATE items SET quantity = {_SUM_FOR.format("NEW.item_id")} WHERE id = NEW.item_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS item_stock_au AFTER UPDATE ON item_stock BEGIN
+        UPDATE items SET quantity = {_SUM_FOR.format("items.id")} WHERE id IN (OLD.item_id, NEW.item_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS item_stock_ad AFTER DELETE ON item_stock BEGIN
+        UPDATE items SET quantity = {_SUM_FOR.format("OLD.item_id")} WHERE id = OLD.item_id;
+    END
+    """,
+    # items -> item_stock: a new item's opening quantity goes to its home location
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_stock_ai AFTER INSERT ON items BEGIN
+        INSERT OR IGNORE INTO locations (name) VALUES ({_HOME_NEW});
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        VALUES (NEW.id, (SELECT id FROM locations WHERE name = {_HOME_NEW}), COALESCE(NEW.quantity, 0));
+    END
+    """,
+    # legacy writers setting items.quantity: apply the difference at the home location,
+    # refusing a difference that would take the home location below zero
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_stock_au AFTER UPDATE OF quantity ON items
+    WHEN NEW.quantity IS NOT {_SUM_FOR.format("NEW.id")}
+    BEGIN
+        INSERT OR IGNORE INTO locations (name) VALUES ({_HOME_NEW});
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        VALUES (NEW.id, (SELECT id FROM locations WHERE name = {_HOME_NEW}), 0);
+        SELECT RAISE(ABORT, 'Not enough stock at the home location')
+        WHERE (SELECT qty FROM item_stock
+               WHERE item_id = NEW.id AND location_id = (SELECT id FROM locations WHERE name = {_HOME_NEW}))
+              + (COALESCE(NEW.quantity, 0) - {_SUM_FOR.format("NEW.id")}) < 0;
+        UPDATE item_stock SET qty = qty + (COALESCE(NEW.quantity, 0) - {_SUM_FOR.format("NEW.id")})
+        WHERE item_id = NEW.id AND location_id = (SELECT id FROM locations WHERE name = {_HOME_NEW});
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_stock_ad AFTER DELETE ON items BEGIN
+        DELETE FROM item_stock WHERE item_id = OLD.id;
+    END
+    """,
+]
+
+def populate_stock(c):
+    """Seed locations and item_stock from the single items.location / items.quantity columns."""
+    home = home_location_sql("location")
+    c.execute(f"INSERT OR IGNORE INTO locations (name) SELECT DISTINCT {home} FROM items")
+    c.execute(f"""
+        INSERT OR IGNORE INTO item_stock (item_id, location_id, qty)
+        SELECT i.id, l.id, COALESCE(i.quantity, 0)
+        FROM items i JOIN locations l ON l.name = {home_location_sql("i.location")}
+    """)
+
+# ------------------------
+# Locations
+# ------------------------
+def normalize_location(name):
+    return (name or "").strip() or DEFAULT_LOCATION
+
+def location_id(c, name, create=True):
+    """Id of a location by name (blank -> DEFAULT_LOCATION). Unknown names are created
+    unless create=False, which raises ValueError instead."""
+    name = normalize_location(name)
+    c.execute("SELECT id FROM locations WHERE name=?", (name,))
+    row = c.fetchone()
+    if row:
+        return row[0]
+    if not create:
+        raise ValueError(f"Unknown location: {name}")
+    c.execute("INSERT INTO locations (name) VALUES (?)", (name,))
+    return c.lastrowid
+
+def location_name(c, loc_id):
+    c.execute("SELECT name FROM locations WHERE id=?", (loc_id,))
+    row = c.fetchone()
+    return row[0] if row else None
+
+def home_location_id(c, item_id):
+    c.execute("SELECT location FROM items WHERE id=?", (item_id,))
+    row = c.fetchone()
+    if not row:
+        raise ValueError(f"Item not found: {item_id}")
+    return location_id(c, row[0])
+
+def resolve_location(c, item_id, location=None, create=True, home=None):
+    """
+    (location_id, name) for an explicit location, else for the item's home location.
+    Pass the item's items.location as `home` when it is already at hand to save a lookup.
+    """
+    if location:
+        return location_id(c, location, create), normalize_location(location)
+    if home is None:
+        loc_id = home_location_id(c, item_id)
+        return loc_id, location_name(c, loc_id)
+    # the home location always exists (the items triggers create it)
+    return location_id(c, home), normalize_location(home)
+
+# ------------------------
+# Stock levels
+# ------------------------
+def get_stock(c, item_id, loc_id):
+    """Quantity of an item at one location. On PostgreSQL this also locks the pair until
+    the transaction ends, so read-modify-write callers (adjust_stock, transaction lines)
+    running at the same time can't lose an update; SQLite writers hold the database lock."""
+    if getattr(c, "dialect", "sqlite") == "postgresql":
+        # one bigint key hashed from the pair: ids are BIGINT (shard ranges start at k * 10^12),
+        # and a rare collision only makes two pairs wait for each other
+        c.execute("SELECT pg_advisory_xact_lock(hashtextextended(?, 0))", (f"item_stock:{item_id}:{loc_id}",))
+    c.execute("SELECT qty FROM item_stock WHERE item_id=? AND location_id=?", (item_id, loc_id))
+    row = c.fetchone()
+    return row[0] if row else 0
+
+def set_stock(c, item_id, loc_id, qty):
+    """Set an item's quantity at one location (the triggers update items.quantity)."""
+    qty = int(qty)
+    if qty < 0:
+        raise ValueError("Quantity cannot be negative.")
+    c.execute("""
+        INSERT INTO item_stock (item_id, location_id, qty) VALUES (?, ?, ?)
+        ON CONFLICT (item_id, location_id) DO UPDATE SET qty = excluded.qty
+    """, (item_id, loc_id, qty))
+
+def adjust_stock(c, item_id, loc_id, delta):
+    """Add delta (negative to take stock out) at one location. Returns (before, after);
+    raises ValueError rather than going below zero."""
+    before = get_stock(c, item_id, loc_id)
+    after = before + int(delta)
+    if after < 0:
+        raise ValueError(f"Not enough stock at {location_name(c, loc_id)}. Current: {before}")
+    set_stock(c, item_id, loc_id, after)
+    return before, after
+
+def move_stock(c, item_id, from_loc_id, to_loc_id, qty):
+    """Transfer qty between two locations; the item total is unchanged."""
+    qty = int(qty)
+    if qty <= 0:
+        raise ValueError("Quantity to move must be positive.")
+    adjust_stock(c, item_id, from_loc_id, -qty)
+    adjust_stock(c, item_id, to_loc_id, qty)
+
+def stock_by_location(c, item_id):
+    """[(location, qty)] for one item (primary-key range read)."""
+    c.execute("""
+        SELECT l.name, s.qty FROM item_stock s JOIN locations l ON l.id = s.location_id
+        WHERE s.item_id=? ORDER BY l.name
+    """, (item_id,))
+    return c.fetchall()
+
+def location_totals(c):
+    """[(location, items_stocked, total_qty)] from the covering location index."""
+    c.execute("""
+        SELECT l.name, t.items, t.qty
+        FROM (SELECT location_id, COUNT(*) AS items, SUM(qty) AS qty FROM item_stock
+              WHERE qty <> 0 GROUP BY location_id) t
+        JOIN locations l ON l.id = t.location_id
+        ORDER BY l.name
+    """)
+    return c.fetchall()
+
+def items_at_location(c, loc_id, limit=None):
+    """[(barcode, name, qty)] of items with stock at one location."""
+    sql = """
+        SELECT i.barcode, i.name, s.qty FROM item_stock s JOIN items i ON i.id = s.item_id
+        WHERE s.location_id=? AND s.qty <> 0 ORDER BY i.name
+    """
+    params = (loc_id,)
+    if limit:
+        sql += " LIMIT ?"
+        params += (int(limit),)
+    c.execute(sql, params)
+    return c.fetchall()
+
+def merge_items(c, source_id, target_id):
+    """
+    Fold a duplicate item row (the old one-row-per-store model) into target_id:
+    stock is added location by location and history rows are repointed, then
+    the source item is deleted.
+    """
+    if source_id == target_id:
+        raise ValueError("Cannot merge an item into itself.")
+    c.execute("""
+        INSERT INTO item_stock (item_id, location_id, qty)
+        SELECT ?, location_id, qty FROM item_stock WHERE item_id=?
+        ON CONFLICT (item_id, location_id) DO UPDATE SET qty = item_stock.qty + excluded.qty
+    """, (target_id, source_id))
+    for table in ("sales", "logs", "transaction_items"):
+        c.execute(f"UPDATE {table} SET item_id=? WHERE item_id=?", (target_id, source_id))
+    c.execute("DELETE FROM item_stock WHERE item_id=?", (source_id,))
+    c.execute("DELETE FROM items WHERE id=?", (source_id,))
@@ -0,0 +1,478 @@
+# stocktake.py
+"""
+Stocktake (cycle count) sessions.
+
+A session counts one location. Scans arrive from any number of sources at once
+(HTTP scanners through scan_queue, the GUI's camera, barcodes typed or piped into
+the CLI) and are tallied in memory: a Counter per barcode behind one lock. The
+first scan of a barcode queues it for its expected quantity at the location;
+a resolver thread looks up everything queued while its previous query ran in one
+IN (...) query, so adding a scan never waits on the database, whichever thread
+(the Tk main loop included) it comes from. Later scans of a barcode are only a
+dict increment.
+
+reconcile() then compares the counts with those expected quantities in one
+set-based pass: the counts are loaded into a TEMP table, joined against items
+and item_stock, and every difference is written at once as a single 'adjustment'
+transaction (one header, its transaction_items via INSERT ... SELECT, item_stock
+updated in two statements; the existing triggers keep items.quantity, the
+rollups and the change feed in step). The change written is counted minus
+expected-at-first-scan, applied to the stock as it is at reconcile time, so a
+sale made after an item was counted stays booked. Stock never goes below zero:
+where more was sold since the count than the count left, the change is clamped
+to the stock at reconcile time and the line is reported as clamped. A barcode
+whose expected quantity could not be recorded falls back to the stock at
+reconcile time.
+
+A cycle count (the default) only adjusts the barcodes that were scanned; a full
+count (full=True) also sets everything else held at the location to zero.
+Items without a barcode can't be scanned and are never adjusted. Scanned
+barcodes that match no item are reported, not adjusted.
+
+Usage:
+    python stocktake.py --location "Store A" < scans.txt     # BARCODE or BARCODE:QTY per line
+    python stocktake.py --location "Store A" --full --listen  # also count HTTP scans (scan_server.py)
+    python stocktake.py --location "Store A" --dry-run scans.txt
+"""
+import sys
+import queue
+import sqlite3
+import threading
+from collections import Counter
+
+import stock
+import storage
+import scan_server
+from audit_writer import write_log
+
+DB_FILE = storage.DEFAULT_TARGET
+QUEUE_POLL = 0.2            # seconds the scan_queue consumer waits between checks
+
+BATCH_SIZE = 500            # barcodes per expected-quantity lookup
+
+# expected quantity at the location (by name: a lookup must not create it) of new barcodes
+EXPECTED_SQL = """
+    SELECT i.barcode, COALESCE((SELECT s.qty FROM item_stock s JOIN locations l ON l.id = s.location_id
+                                WHERE s.item_id = i.id AND l.name = ?), 0)
+    FROM items i WHERE i.barcode IN ({marks})
+"""
+
+COUNTS_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS stocktake_counts (
+        barcode TEXT PRIMARY KEY, counted INTEGER NOT NULL, expected INTEGER
+    )
+"""
+DIFF_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS stocktake_diff (
+        item_id INTEGER PRIMARY KEY, barcode TEXT, item_name TEXT, expected INTEGER NOT NULL,
+        counted INTEGER NOT NULL, current INTEGER NOT NULL, unit_price REAL, change INTEGER
+    )
+"""
+
+# counted barcodes whose count differs from the quantity expected when first scanned
+DIFF_COUNTED_SQL = """
+    INSERT INTO stocktake_diff (item_id, barcode, item_name, expected, counted, current, unit_price)
+    SELECT i.id, i.barcode, i.name, COALESCE(k.expected, s.qty, 0), k.counted, COALESCE(s.qty, 0),
+           COALESCE(i.sale_price, i.purchase_price, 0)
+    FROM stocktake_counts k
+    CROSS JOIN items i   -- SQLite: counts outermost, so a small cycle count doesn't scan items
+    LEFT JOIN item_stock s ON s.item_id = i.id AND s.location_id = ?
+    WHERE i.barcode = k.barcode AND COALESCE(k.expected, s.qty, 0) <> k.counted
+"""
+# full count: stock held at the location that nobody scanned
+DIFF_UNCOUNTED_SQL = """
+    INSERT INTO stocktake_diff (item_id, barcode, item_name, expected, counted, current, unit_price)
+    SELECT i.id, i.barcode, i.name, s.qty, 0, s.qty, COALESCE(i.sale_price, i.purchase_price, 0)
+    FROM item_stock s
+    JOIN items i ON i.id = s.item_id
+    WHERE s.location_id = ? AND s.qty <> 0 AND COALESCE(i.barcode, '') <> ''
+      AND NOT EXISTS (SELECT 1 FROM stocktake_counts k WHERE k.barcode = i.barcode)
+"""
+UNKNOWN_SQL = """
+    SELECT k.barcode, k.counted FROM stocktake_counts k
+    WHERE NOT EXISTS (SELECT 1 FROM items i WHERE i.barcode = k.barcode)
+    ORDER BY k.barcode
+"""
+
+def _count(qty):
+    qty = int(qty)
+    if qty < 0:
+        raise ValueError(f"Counted quantity can't be negative: {qty}")
+    return qty
+
+class StocktakeSession:
+    """In-memory counts for one location. add()/add_many()/consume() are thread-safe."""
+
+    def __init__(self, location, user="admin", full=False, db_file=None):
+        self.location = stock.normalize_location(location)
+        self.user = user
+        self.full = full
+        self.db_file = db_file or DB_FILE
+        self.scans = 0
+        self._counts = Counter()
+        self._expected = {}        # barcode -> quantity at the location when first scanned
+        self._unresolved = []      # new barcodes waiting for the resolver thread
+        self._resolver = None
+        self._journal = None       # scan_journal the HTTP scans came from ...
+        self._journal_ids = []     # ... and their ids: consumed once the count is posted
+        self._lock = threading.Lock()
+
+    def add(self, code, qty=1):
+        """Count `qty` of a barcode. Raises ValueError for a negative quantity."""
+        code = (code or "").strip()
+        if not code:
+            return
+        qty = _count(qty)
+        with self._lock:
+            if code not in self._counts:
+                self._queue_expected([code])
+            self._counts[code] += qty
+            self.scans += 1
+
+    def add_many(self, codes):
+        """Count a batch of barcodes (or (barcode, qty) pairs) under one lock. A negative
+        quantity raises ValueError before anything in the batch is counted."""
+        batch = []
+        for code in codes:
+            code, qty = code if isinstance(code, tuple) else (code, 1)
+            code = (code or "").strip()
+            if code:
+                batch.append((code, _count(qty)))
+        with self._lock:
+            new = {code for code, _qty in batch if code not in self._counts}
+            if new:
+                self._queue_expected(list(new))
+            for code, qty in batch:
+                self._counts[code] += qty
+                self.scans += 1
+
+    def _queue_expected(self, codes):
+        """Hand barcodes counted for the first time to the resolver (caller holds the lock)."""
+        self._unresolved.extend(codes)
+        if self._resolver is None:
+            self._resolver = threading.Thread(target=self._resolve_expected, name="stocktake-expected", daemon=True)
+            self._resolver.start()
+
+    def _resolve_expected(self):
+        # everything queued while the previous lookup ran goes into the next one; the
+        # thread ends when the queue is empty and the next new barcode starts another
+        while True:
+            with self._lock:
+                codes, self._unresolved = self._unresolved, []
+                if not codes:
+                    self._resolver = None
+                    return
+            self._record_expected(codes)
+
+    def wait_expected(self):
+        """Block until the barcodes counted so far have their expected quantity looked up."""
+        while True:
+            with self._lock:
+                thread = self._resolver
+            if thread is None:
+                return
+            thread.join()
+
+    def _record_expected(self, codes):
+        """Remember the quantity at the location of barcodes just counted for the first time."""
+        found = {}
+        try:
+            conn = storage.connect(self.db_file, timeout=30)
+            try:
+                for i in range(0, len(codes), BATCH_SIZE):
+                    chunk = codes[i:i + BATCH_SIZE]
+                    sql = EXPECTED_SQL.format(marks=", ".join("?" * len(chunk)))
+                    found.update(conn.execute(sql, [self.location] + chunk).fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # reconcile() falls back to the stock at reconcile time for these
+            print(f"⚠ Expected quantity of {len(codes)} barcodes not recorded: {e}")
+            return
+        with self._lock:
+            for code, qty in found.items():
+                if code in self._counts:       # not forgotten by reset() meanwhile
+                    self._expected.setdefault(code, qty)
+
+    def check_location(self):
+        """Raise ValueError unless the location exists: a mistyped name must not start a
+        count that reconcile() would book at a new, empty location."""
+        conn = storage.connect(self.db_file, timeout=30)
+        try:
+            storage.ensure_schema(conn)
+            stock.location_id(conn.cursor(), self.location, create=False)
+        finally:
+            conn.close()
+
+    def counts(self):
+        """Snapshot {barcode: counted}."""
+        with self._lock:
+            return dict(self._counts)
+
+    def expected(self):
+        """Snapshot {barcode: quantity at the location when first scanned} (known items only)."""
+        with self._lock:
+            return dict(self._expected)
+
+    def reset(self):
+        """Forget the counts. Journaled scans counted so far stay unconsumed (replayed on the next start)."""
+        with self._lock:
+            self._counts.clear()
+            self._expected.clear()
+            self._unresolved = []
+            self._journal_ids = []
+            self.scans = 0
+
+    # ------------------------
+    # Scan sources
+    # ------------------------
+    def _count_entries(self, batch, journal):
+        self.add_many(getattr(e, "code", e) for e in batch)
+        if journal is not None:
+            # not consumed yet: a dry run, an error or a crash before reconcile() posts
+            # the count leaves them in the journal, to be replayed on the next start
+            with self._lock:
+                self._journal = journal
+                self._journal_ids.extend(getattr(e, "journal_id", None) for e in batch)
+
+    def _consume_journal(self):
+        with self._lock:
+            journal, ids, self._journal_ids = self._journal, self._journal_ids, []
+        if journal is not None and ids:
+            journal.mark_consumed(ids)
+
+    def drain(self, scan_queue, journal=None):
+        """Count everything queued in scan_queue right now. Returns the number of scans."""
+        batch = []
+        try:
+            while True:
+                batch.append(scan_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            self._count_entries(batch, journal)
+        return len(batch)
+
+    def consume(self, scan_queue, journal=None, stop=None):
+        """Count entries from scan_queue (scan_server.scan_queue) until `stop` is set,
+        taking whatever has queued up on each wake-up as one batch. Counted scans are
+        marked consumed in `journal` (scan_journal.py) once reconcile() posts the count."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                first = scan_queue.get(timeout=QUEUE_POLL)
+            except queue.Empty:
+                continue
+            self._count_entries([first], journal)
+            self.drain(scan_queue, journal)
+
+    def start_consumer(self, scan_queue, journal=None):
+        """consume() in a daemon thread. Returns (stop Event, thread)."""
+        stop = threading.Event()
+        thread = threading.Thread(target=self.consume, args=(scan_queue, journal, stop), daemon=True)
+        thread.start()
+        return stop, thread
+
+    # ------------------------
+    # Reconciliation
+    # ------------------------
+    def reconcile(self, apply=True, conn=None):
+        """
+        Compare the counts with the quantities expected when each barcode was first
+        scanned and, when `apply`, add the differences to item_stock at the location as
+        one 'adjustment' transaction. Returns a dict: transaction_id (None without
+        changes or when not applied), location, scans, counted (distinct barcodes),
+        lines [(barcode, name, expected, counted)], units (net change), value (sum of
+        |change| * price), unknown [(barcode, counted)] and clamped [(barcode, name,
+        counted change, applied change)] for changes cut short at zero stock. Journaled scans counted so
+        far are marked consumed only after an applied count commits.
+        """
+        self.wait_expected()
+        counts, expected = self.counts(), self.expected()
+        own = conn is None
+        if own:
+            conn = storage.connect(self.db_file, timeout=30)
+            storage.ensure_schema(conn)
+        isolation, conn.isolation_level = conn.isolation_level, None  # explicit BEGIN/COMMIT
+        c = conn.cursor()
+        try:
+            c.execute(COUNTS_DDL)
+            c.execute(DIFF_DDL)
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                result = self._reconcile(c, counts, expected, apply)
+                c.execute("COMMIT" if apply else "ROLLBACK")
+            except Exception:
+                if conn.in_transaction:
+                    c.execute("ROLLBACK")
+                raise
+        finally:
+            conn.isolation_level = isolation
+            if own:
+                conn.close()
+        if apply:
+            self._consume_journal()
+        return result
+
+    def _reconcile(self, c, counts, expected_qty, apply):
+        negative = sorted(code for code, qty in counts.items() if qty < 0)
+        if negative:
+            raise ValueError(f"Negative counts for {', '.join(negative[:10])}; nothing reconciled")
+        c.execute("DELETE FROM stocktake_counts")
+        c.execute("DELETE FROM stocktake_diff")
+        c.executemany("INSERT INTO stocktake_counts (barcode, counted, expected) VALUES (?, ?, ?)",
+                      [(code, qty, expected_qty.get(code)) for code, qty in counts.items()])
+        loc_id = stock.location_id(c, self.location, create=False)
+        c.execute(DIFF_COUNTED_SQL, (loc_id,))
+        if self.full:
+            c.execute(DIFF_UNCOUNTED_SQL, (loc_id,))
+        c.execute(UNKNOWN_SQL)
+        unknown = c.fetchall()
+        # never below zero: a change larger than the stock left takes the stock to 0
+        c.execute("UPDATE stocktake_diff SET change = MAX(counted - expected, -current)")
+        c.execute("SELECT barcode, item_name, counted - expected, change FROM stocktake_diff "
+                  "WHERE change <> counted - expected ORDER BY barcode")
+        clamped = c.fetchall()
+        c.execute("DELETE FROM stocktake_diff WHERE change = 0")
+        c.execute("SELECT item_id, barcode, item_name, expected, counted, change FROM stocktake_diff ORDER BY barcode")
+        diff = c.fetchall()
+        c.execute("SELECT COALESCE(SUM(change), 0), COALESCE(SUM(ABS(change) * unit_price), 0) FROM stocktake_diff")
+        units, value = c.fetchone()
+        result = {"transaction_id": None, "location": self.location, "scans": self.scans,
+                  "counted": len(counts), "lines": [r[1:5] for r in diff], "units": units,
+                  "value": round(value, 2), "unknown": unknown, "clamped": clamped}
+        if not (apply and diff):
+            return result
+
+        kind = "Full stocktake" if self.full else "Cycle count"
+        notes = f"{kind}: {len(counts)} barcodes counted, {len(diff)} adjusted"
+        c.execute("INSERT INTO transactions (user, type, customer, total_amount, notes, location_id) "
+                  "VALUES (?, 'adjustment', '', ?, ?, ?)", (self.user, round(value, 2), notes, loc_id))
+        tx_id = c.lastrowid
+        c.execute("""
+            INSERT INTO transaction_items
+            (transaction_id, item_id, barcode, item_name, quantity_changed, quantity_before, quantity_after, unit_price, location_id)
+            SELECT ?, item_id, barcode, item_name, change, current, current + change, unit_price, ?
+            FROM stocktake_diff ORDER BY item_id
+        """, (tx_id, loc_id))
+        c.execute("""
+            UPDATE item_stock SET qty = qty + (SELECT d.change FROM stocktake_diff d
+                                               WHERE d.item_id = item_stock.item_id)
+            WHERE location_id = ? AND item_id IN (SELECT item_id FROM stocktake_diff)
+        """, (loc_id,))
+        c.execute("""
+            INSERT INTO item_stock (item_id, location_id, qty)
+            SELECT d.item_id, ?, d.change FROM stocktake_diff d
+            WHERE NOT EXISTS (SELECT 1 FROM item_stock s WHERE s.item_id = d.item_id AND s.location_id = ?)
+        """, (loc_id, loc_id))
+        for item_id, _barcode, _name, _expected, _counted, change in diff:
+            write_log(c, self.user, "adjustment", item_id, change, self.location)
+        result["transaction_id"] = tx_id
+        return result
+
+# ------------------------
+# CLI
+# ------------------------
+def parse_scan_line(line):
+    """'BARCODE' or 'BARCODE:QTY' -> (barcode, qty); None for a blank line.
+    Raises ValueError for a negative QTY."""
+    line = line.strip()
+    if not line:
+        return None
+    code, sep, qty = line.rpartition(":")
+    if sep and code and qty.lstrip("-").isdigit():
+        return code, _count(qty)
+    return line, 1
+
+def print_result(result, limit=50):
+    applied = result["transaction_id"] is not None
+    print(f"Stocktake at {result['location']}: {result['scans']} scans, {result['counted']} barcodes counted")
+    if result["lines"]:
+        print(f"{'Barcode':<16} {'Name':<30} {'Expected':>9} {'Counted':>8} {'Change':>7}")
+        for barcode, name, expected, counted in result["lines"][:limit]:
+            print(f"{barcode or '':<16} {(name or '')[:30]:<30} {expected:>9} {counted:>8} {counted - expected:>+7}")
+        if len(result["lines"]) > limit:
+            print(f"... {len(result['lines']) - limit} more")
+    for barcode, counted in result["unknown"]:
+        print(f"⚠ Unknown barcode {barcode} (counted {counted}), not adjusted")
+    for barcode, _name, wanted, change in result["clamped"]:
+        print(f"⚠ {barcode}: change {wanted:+} clamped to {change:+} (stock can't go below zero)")
+    if not result["lines"]:
+        print("✅ Counts match the expected stock.")
+    elif applied:
+        print(f"✅ Adjustment transaction {result['transaction_id']}: {len(result['lines'])} items, "
+              f"net {result['units']:+} units, value {result['value']:.2f}")
+    else:
+        print(f"Dry run: {len(result['lines'])} items would change, net {result['units']:+} units, "
+              f"value {result['value']:.2f}")
+
+def _listen(session, port):
+    """Serve /scan on `port` and count what arrives. Returns (server, stop Event, consumer thread)."""
+    httpd = scan_server.create_scan_server(port=port, db_file=session.db_file)
+    # scans journaled before the session started are not part of this count; they stay
+    # unconsumed in the journal and are replayed on the next start
+    try:
+        while True:
+            scan_server.scan_queue.get_nowait()
+    except queue.Empty:
+        pass
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return (httpd,) + session.start_consumer(scan_server.scan_queue, httpd.journal)
+
+def main(argv=None):
+    import argparse
+    p = argparse.ArgumentParser(description="Stocktake / cycle count of one location")
+    p.add_argument("file", nargs="?", default="-", help="scanned barcodes, one per line (BARCODE or BARCODE:QTY); '-' for stdin")
+    p.add_argument("--db", default=DB_FILE)
+    p.add_argument("--location", required=True)
+    p.add_argument("--user", default="admin")
+    p.add_argument("--full", action="store_true", help="full count: stock at the location that wasn't scanned goes to zero")
+    p.add_argument("--dry-run", action="store_true", help="only print the differences")
+    p.add_argument("--listen", nargs="?", type=int, const=scan_server.SCAN_PORT, default=None,
+                   metavar="PORT", help=f"also count scans POSTed to /scan on PORT (default {scan_server.SCAN_PORT}) until the input ends")
+    args = p.parse_args(argv)
+
+    session = StocktakeSession(args.location, args.user, args.full, args.db)
+    try:
+        session.check_location()
+    except ValueError as e:
+        print("❌", e)
+        return 1
+    httpd = None
+    if args.listen is not None:
+        httpd, stop, consumer = _listen(session, args.listen)
+        print(f"Counting scans on port {args.listen}; end the input (Ctrl-D) to reconcile.")
+    f = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+    error = None
+    try:
+        for n, line in enumerate(f, 1):
+            try:
+                scan = parse_scan_line(line)
+            except ValueError as e:
+                error = f"line {n}: {e}"
+                break
+            if scan:
+                session.add(*scan)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    if httpd is not None:
+        httpd.shutdown()
+        stop.set()
+        consumer.join()
+        # count what the server had queued before it stopped
+        session.drain(scan_server.scan_queue, httpd.journal)
+        httpd.server_close()
+    if error:
+        print("❌", error)
+        return 1
+    try:
+        result = session.reconcile(apply=not args.dry_run)
+    except ValueError as e:
+        print("❌", e)
+        return 1
+    print_result(result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
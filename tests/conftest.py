@@ -0,0 +1,33 @@
+# tests/conftest.py
+# The modules live in the repository root; make them importable however pytest is started.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def make_db(tmp_path, monkeypatch):
+    """
+    make_db(items) -> path of a migrated SQLite database in tmp_path holding `items`
+    (add_item_op arguments: name, category, barcode, qty, supplier, cost, price, location).
+    The working directory and inventory_cli.DB_FILE point at it for the test.
+    """
+    import inventory_cli
+    import storage
+
+    def make(items=()):
+        monkeypatch.chdir(tmp_path)
+        path = str(tmp_path / "inventory.db")
+        monkeypatch.setattr(inventory_cli, "DB_FILE", path)
+        conn = storage.connect(path)
+        try:
+            storage.ensure_schema(conn)
+            for item in items:
+                inventory_cli.add_item_op(conn.cursor(), *item)
+            conn.commit()
+        finally:
+            conn.close()
+        return path
+    return make
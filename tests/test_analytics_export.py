@@ -0,0 +1,30 @@
+# tests/test_analytics_export.py
+import json
+import os
+
+import analytics_export
+import inventory_cli
+
+def _sell(n):
+    for _ in range(n):
+        inventory_cli.sell("111", 1)
+
+def _files(dest, table):
+    return sorted(os.listdir(os.path.join(dest, table)))
+
+def test_full_export_replaces_earlier_files(make_db, tmp_path):
+    path = make_db([("Widget", "Test", "111", 10, "", 1.0, 2.0, "Main")])
+    dest = str(tmp_path / "analytics")
+
+    _sell(2)
+    analytics_export.export_tables(path, dest, ["sales"], "npz")
+    _sell(3)
+    analytics_export.export_tables(path, dest, ["sales"], "npz")
+    assert len(_files(dest, "sales")) == 2
+
+    stats = analytics_export.export_tables(path, dest, ["sales"], "npz", full=True)
+    assert stats["tables"][0]["rows"] == 5
+    with open(os.path.join(dest, analytics_export.MANIFEST), encoding="utf-8") as f:
+        entry = json.load(f)["tables"]["sales"]
+    assert [e["rows"] for e in entry["files"]] == [5]
+    assert _files(dest, "sales") == [os.path.basename(entry["files"][0]["file"])]
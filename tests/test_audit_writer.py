@@ -0,0 +1,15 @@
+# tests/test_audit_writer.py
+from audit_writer import write_log
+import storage
+
+def test_log_rows_commit_and_roll_back_with_the_change(tmp_path):
+    conn = storage.connect(str(tmp_path / "audit.db"))
+    storage.ensure_schema(conn)
+    try:
+        write_log(conn.cursor(), "test", "sell", 1, 1, "Main")
+        conn.rollback()
+        write_log(conn.cursor(), "test", "sell", 2, 1, None)
+        conn.commit()
+        assert conn.execute("SELECT item_id, location FROM logs").fetchall() == [(2, "N/A")]
+    finally:
+        conn.close()
@@ -0,0 +1,96 @@
+# tests/test_change_feed.py
+import threading
+import time
+
+import pytest
+
+import change_feed
+import inventory_cli
+import storage
+from change_feed import latest_seq, prune_events, read_events, subscribe, wait_for_events
+
+@pytest.fixture
+def db(make_db):
+    return make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A")])
+
+def _connect(db):
+    return storage.connect(db, timeout=30, check_same_thread=False)
+
+def _sale(db, qty):
+    conn = _connect(db)
+    try:
+        inventory_cli.transaction_op(conn.cursor(), "sale", [{"barcode": "111", "qty": qty}])
+        conn.commit()
+    finally:
+        conn.close()
+
+def test_triggers_record_item_stock_and_transaction_changes(db):
+    conn = _connect(db)
+    try:
+        events = read_events(conn)
+        assert [(e["entity"], e["op"]) for e in events] == [("item", "insert"), ("stock", "insert")]
+        assert events[0]["data"]["barcode"] == "111"
+        seq = latest_seq(conn)
+        _sale(db, 2)
+        new = read_events(conn, seq)
+        kinds = {(e["entity"], e["op"]) for e in new}
+        assert {("transaction", "insert"), ("stock", "update"), ("item", "update")} <= kinds
+        moved = next(e for e in new if e["entity"] == "stock")
+        assert (moved["data"]["old_qty"], moved["data"]["qty"]) == (5, 3)
+        assert [e["entity"] for e in read_events(conn, seq, entities=["transaction"])] == ["transaction"]
+    finally:
+        conn.close()
+
+def test_wait_for_events_wakes_on_another_connections_commit(db):
+    conn = _connect(db)
+    try:
+        seq = latest_seq(conn)
+        start = time.monotonic()
+        assert wait_for_events(conn, seq, timeout=0.3, poll_interval=0.05) == []
+        assert time.monotonic() - start >= 0.3
+        timer = threading.Timer(0.2, _sale, (db, 1))
+        timer.start()
+        events = wait_for_events(conn, seq, timeout=10, poll_interval=0.05)
+        timer.join()
+        assert events and all(e["seq"] > seq for e in events)
+    finally:
+        conn.close()
+
+def test_subscribe_replays_then_stops_when_idle(db):
+    _sale(db, 1)
+    events = list(subscribe(db, after_seq=0, entities=["transaction"], poll_interval=0.05, idle_timeout=0.2))
+    assert [(e["entity"], e["op"]) for e in events] == [("transaction", "insert")]
+    assert list(subscribe(db, poll_interval=0.05, idle_timeout=0.1)) == []   # default: only new events
+
+def test_prune_events_uses_the_utc_cutoff(db):
+    conn = _connect(db)
+    try:
+        conn.execute("INSERT INTO change_events (ts, entity, entity_id, op) VALUES (?, 'item', 1, 'update')",
+                     (storage.utc_cutoff(8),))
+        conn.commit()
+        before = len(read_events(conn, limit=1000))
+        assert prune_events(conn) == 1          # settings default: 7 days
+        assert len(read_events(conn, limit=1000)) == before - 1
+    finally:
+        conn.close()
+
+def test_wait_for_events_sees_a_commit_between_its_first_read_and_version(db, monkeypatch):
+    conn = _connect(db)
+    try:
+        seq = latest_seq(conn)
+        read = change_feed.read_events
+        first = []
+
+        def read_then_commit(*args):
+            events = read(*args)
+            if not first:                   # another connection commits right after the first read
+                first.append(events)
+                _sale(db, 1)
+            return events
+        monkeypatch.setattr(change_feed, "read_events", read_then_commit)
+        start = time.monotonic()
+        events = wait_for_events(conn, seq, timeout=5, poll_interval=0.05)
+        assert first == [[]] and events
+        assert time.monotonic() - start < 2
+    finally:
+        conn.close()
@@ -0,0 +1,106 @@
+# tests/test_export_jobs.py
+import csv
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import export_jobs
+import inventory_cli
+import storage
+
+def test_snapshot_failure_keeps_its_error(tmp_path):
+    missing = str(tmp_path / "no_such_dir" / "inventory.db")
+    with pytest.raises(sqlite3.OperationalError):
+        export_jobs.run_exports(["inventory-csv"], dest_dir=str(tmp_path), db_file=missing, workers=1)
+    assert not [f for f in os.listdir(tmp_path) if f.startswith(".export_snapshot_")]
+
+@pytest.fixture
+def db(make_db):
+    """Widget (111): 5 in stock, then a sale of 2."""
+    path = make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A")])
+    conn = storage.connect(path)
+    try:
+        inventory_cli.transaction_op(conn.cursor(), "sale", [{"barcode": "111", "qty": 2}])
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+def _csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def test_formats_from_one_snapshot_agree_despite_a_write(db, tmp_path, monkeypatch):
+    run_job = export_jobs._run_job
+    def sell_then_run(fmt, snapshot_path, path):
+        if fmt == "inventory-csv":    # the first job: the snapshot is taken, the files aren't
+            conn = storage.connect(db)
+            try:
+                inventory_cli.transaction_op(conn.cursor(), "sale", [{"barcode": "111", "qty": 1}])
+                conn.commit()
+            finally:
+                conn.close()
+        return run_job(fmt, snapshot_path, path)
+    monkeypatch.setattr(export_jobs, "_run_job", sell_then_run)
+    stats = export_jobs.run_exports(["inventory-csv", "transactions-csv", "logs-csv"],
+                                    dest_dir=str(tmp_path / "out"), db_file=db, workers=1)
+    jobs = {j["format"]: j for j in stats["jobs"]}
+    assert all(j["error"] is None for j in jobs.values())
+    inventory = _csv(jobs["inventory-csv"]["path"])
+    lines = _csv(jobs["transactions-csv"]["path"])
+    logs = _csv(jobs["logs-csv"]["path"])
+    assert [r["Quantity"] for r in inventory] == ["3"]
+    assert [(r["type"], r["qty_after"]) for r in lines] == [("sale", "3")]
+    assert [r["action"] for r in logs].count("sale") == 1
+    conn = storage.connect(db)
+    try:
+        assert conn.execute("SELECT quantity FROM items").fetchone()[0] == 2   # the write did land
+    finally:
+        conn.close()
+
+def test_atomic_path_renames_on_success_and_cleans_up_on_failure(tmp_path):
+    path = str(tmp_path / "report.csv")
+    with export_jobs.atomic_path(path) as tmp:
+        assert tmp.endswith(".report.csv.partial")
+        with open(tmp, "w") as f:
+            f.write("ok")
+    with pytest.raises(RuntimeError):
+        with export_jobs.atomic_path(str(tmp_path / "broken.csv")) as tmp:
+            with open(tmp, "w") as f:
+                f.write("half")
+            raise RuntimeError("disk full")
+    assert sorted(os.listdir(tmp_path)) == ["report.csv"]
+
+def test_failed_job_leaves_no_partial_file(db, tmp_path, monkeypatch):
+    def broken_writer(rows, path):
+        with export_jobs.atomic_path(path) as tmp:
+            with open(tmp, "w") as f:
+                f.write(str(next(iter(rows))))
+            raise RuntimeError("disk full")
+    dataset, prefix, ext, _writer, lib = export_jobs.FORMATS["logs-csv"]
+    monkeypatch.setitem(export_jobs.FORMATS, "logs-csv", (dataset, prefix, ext, broken_writer, lib))
+    out = tmp_path / "out"
+    stats = export_jobs.run_exports(["inventory-csv", "logs-csv"], dest_dir=str(out), db_file=db, workers=1)
+    assert [(j["format"], j["error"]) for j in stats["jobs"]] == [("inventory-csv", None), ("logs-csv", "disk full")]
+    assert os.listdir(out) == [os.path.basename(stats["jobs"][0]["path"])]
+
+def test_rotate_exports_keeps_the_newest_files_of_one_format(tmp_path):
+    names = [f"inventory_export_2026101{d}_020000.csv" for d in range(5)]
+    others = ["inventory_export_20261010_020000.xlsx", "transactions_export_20261010_020000.csv"]
+    for i, name in enumerate(names + others):
+        (tmp_path / name).write_text("x")
+        os.utime(tmp_path / name, (1_700_000_000 + i * 86400,) * 2)
+    removed = export_jobs.rotate_exports(str(tmp_path), "inventory-csv", keep=2)
+    assert sorted(os.path.basename(p) for p in removed) == names[:3]
+    assert sorted(os.listdir(tmp_path)) == sorted(names[3:] + others)
+    assert export_jobs.rotate_exports(str(tmp_path), "inventory-csv", keep=2) == []
+
+@pytest.mark.parametrize("at, expected", [
+    ("02:00", datetime(2026, 10, 19, 2, 0)),      # later today
+    ("01:30", datetime(2026, 10, 20, 1, 30)),     # exactly now: strictly after, so tomorrow
+    ("00:15", datetime(2026, 10, 20, 0, 15)),     # already passed today
+])
+def test_next_run(at, expected):
+    assert export_jobs.next_run(at, now=datetime(2026, 10, 19, 1, 30)) == expected
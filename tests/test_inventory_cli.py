@@ -0,0 +1,80 @@
+# tests/test_inventory_cli.py
+import io
+import json
+
+import pytest
+
+import inventory_cli
+import storage
+
+@pytest.fixture
+def db(make_db):
+    return make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A")])
+
+def _rows(db, sql, params=()):
+    conn = storage.connect(db)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+def _ops(*ops):
+    return [json.dumps(op) for op in ops]
+
+def test_run_batch_rolls_back_only_the_failing_operation(db):
+    err = io.StringIO()
+    applied, failed = inventory_cli.run_batch(_ops(
+        {"op": "add", "name": "Gadget", "barcode": "222", "qty": 3, "location": "Store A"},
+        {"op": "sell", "barcode": "111", "qty": 99},          # not enough stock
+        {"op": "sell", "barcode": "111", "qty": 2},
+    ), batch_size=10, err=err)
+    assert (applied, failed) == (2, 1)
+    assert "line 2" in err.getvalue()
+    assert _rows(db, "SELECT barcode, quantity FROM items ORDER BY barcode") == [("111", 3), ("222", 3)]
+    # the failed sell left nothing behind, not even its sales row
+    assert _rows(db, "SELECT qty_sold FROM sales") == [(2,)]
+
+def test_run_batch_commits_every_batch_size_operations(db):
+    seen = []
+    def lines():
+        for i in range(5):
+            # what another connection sees before each line is read
+            seen.append(_rows(db, "SELECT COUNT(*) FROM items WHERE category = 'batch'")[0][0])
+            yield json.dumps({"op": "add", "name": f"Item {i}", "category": "batch", "barcode": f"b{i}"})
+    assert inventory_cli.run_batch(lines(), batch_size=2, err=io.StringIO()) == (5, 0)
+    assert seen == [0, 0, 2, 2, 4]
+    assert _rows(db, "SELECT COUNT(*) FROM items WHERE category = 'batch'") == [(5,)]
+
+def test_import_csv_adds_items(db, tmp_path, capsys):
+    path = tmp_path / "items.csv"
+    path.write_text("name,category,barcode,qty,sale_price,location\n"
+                    "Gadget,Test,222,3,4.5,Store B\n"
+                    "Gizmo,Test,333,1,1.0,\n", encoding="utf-8")
+    assert inventory_cli.import_file(str(path)) == 0
+    assert "Applied 2 operations (0 failed)" in capsys.readouterr().out
+    assert _rows(db, "SELECT barcode, quantity, sale_price, location FROM items ORDER BY barcode") == [
+        ("111", 5, 2.0, "Store A"), ("222", 3, 4.5, "Store B"), ("333", 1, 1.0, "")]
+
+def test_import_json_lines_applies_operations(db, tmp_path):
+    path = tmp_path / "ops.jsonl"
+    path.write_text("\n".join(["# restock and sell"] + _ops(
+        {"op": "transaction", "type": "purchase", "items": [{"barcode": "111", "qty": 4}]},
+        {"op": "sell", "barcode": "111", "qty": 1, "location": "Store A"},
+        {"op": "remove", "barcode": "999"},                   # unknown: fails alone
+    )) + "\n", encoding="utf-8")
+    assert inventory_cli.import_file(str(path), stop_on_error=False) == 1
+    assert _rows(db, "SELECT quantity FROM items WHERE barcode = '111'") == [(8,)]
+    assert _rows(db, "SELECT type FROM transactions") == [("purchase",)]
+
+@pytest.mark.parametrize("word, command, detail", [
+    ("view", "report", ("kind", "inventory")),
+    ("LIST", "report", ("kind", "inventory")),
+    ("export_excel", "export", ("format", ["excel"])),
+    ("pdf", "export", ("format", ["pdf"])),
+])
+def test_legacy_commands_map_to_subcommands(db, monkeypatch, word, command, detail):
+    calls = []
+    monkeypatch.setattr(inventory_cli, "run_command", lambda args: calls.append(args) or 0)
+    assert inventory_cli.run_cli_or_args([word]) == 0
+    assert calls[0].command == command
+    assert getattr(calls[0], detail[0]) == detail[1]
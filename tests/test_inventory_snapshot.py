@@ -0,0 +1,17 @@
+# tests/test_inventory_snapshot.py
+import inventory_cli
+import storage
+from inventory_snapshot import InventorySnapshot
+
+def test_refresh_rebuilds_after_the_feed_is_pruned(make_db):
+    path = make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A")])
+    conn = storage.connect(path)
+    snapshot = InventorySnapshot(path)
+    assert snapshot.refresh() == -1
+    # a change the snapshot never saw, then a prune that empties the feed
+    inventory_cli.update_item_op(conn.cursor(), "111", 9)
+    conn.execute("DELETE FROM change_events")
+    conn.commit()
+    conn.close()
+    assert snapshot.refresh() == -1
+    assert list(snapshot.rows(("barcode", "quantity"))) == [("111", 9)]
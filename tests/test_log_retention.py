@@ -0,0 +1,44 @@
+# tests/test_log_retention.py
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage
+from log_retention import archive_logs, list_partitions, query_logs
+
+OLD = ["2024-01-10 08:00:00", "2024-01-20 09:30:00", "2024-02-03 12:00:00"]
+
+@pytest.fixture
+def conn(make_db):
+    conn = storage.connect(make_db())
+    recent = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany("INSERT INTO logs (timestamp, user, action, item_id, quantity, location) "
+                     "VALUES (?, 'test', 'sell', ?, 1, 'Main')",
+                     [(ts, n) for n, ts in enumerate(OLD + [recent], 1)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+def _hot(conn):
+    return [r[0] for r in conn.execute("SELECT item_id FROM logs ORDER BY id")]
+
+@pytest.mark.parametrize("fmt", ["sqlite", "jsonl"])
+def test_archived_logs_are_read_back_with_the_hot_ones(conn, tmp_path, monkeypatch, fmt):
+    assert archive_logs(conn, 90, fmt) == {"2024-01": 2, "2024-02": 1}
+    assert _hot(conn) == [4]
+    assert [m for m, _path in list_partitions(str(tmp_path / "log_archive"))] == ["2024-02", "2024-01"]
+    # read from another working directory: the archive is found next to the database
+    (tmp_path / "elsewhere").mkdir()
+    monkeypatch.chdir(tmp_path / "elsewhere")
+    rows = query_logs(conn, "2024-01-15")
+    assert [r[4] for r in rows] == [4, 3, 2]           # hot row first, then the archives, newest first
+    assert rows[1][1] == "2024-02-03 12:00:00"
+    assert [r[4] for r in query_logs(conn, "2024-01-01", "2024-02-01")] == [2, 1]
+    assert [r[4] for r in query_logs(conn, "2024-01-01", limit=2)] == [4, 3]
+    assert not os.path.exists("log_archive")
+
+def test_archiving_twice_moves_nothing_more(conn):
+    archive_logs(conn, 90)
+    assert archive_logs(conn, 90) == {}
+    assert [r[4] for r in query_logs(conn, "2024-01-01")] == [4, 3, 2, 1]
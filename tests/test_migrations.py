@@ -0,0 +1,29 @@
+# tests/test_migrations.py
+import re
+import sqlite3
+
+import pytest
+
+import migrations
+from change_feed import CHANGE_FEED_DDL
+from replenishment import REPLENISHMENT_DDL
+from rollups import ROLLUP_DDL
+from search_index import SEARCH_INDEX_DDL, has_fts5
+from stock import STOCK_DDL
+
+def _normalized(sql):
+    return re.sub(r"\s+", " ", sql.replace("IF NOT EXISTS ", "")).strip()
+
+@pytest.mark.parametrize("ddl", [STOCK_DDL, CHANGE_FEED_DDL, ROLLUP_DDL, REPLENISHMENT_DDL,
+                                 SEARCH_INDEX_DDL if has_fts5() else []],
+                         ids=["stock", "change_feed", "rollups", "replenishment", "search_index"])
+def test_feature_ddl_matches_the_migrated_schema(ddl):
+    # the migrations carry frozen copies: a feature module's DDL that no longer matches
+    # them needs a new migration, or existing databases never get the change
+    conn = sqlite3.connect(":memory:")
+    migrations.ensure_schema(conn)
+    schema = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL"))
+    for statement in ddl:
+        name = re.search(r"IF NOT EXISTS (\w+)", statement).group(1)
+        assert _normalized(schema.get(name) or "") == _normalized(statement), name
+    conn.close()
@@ -0,0 +1,172 @@
+# tests/test_postgres.py
+"""
+The PostgreSQL backend (storage.py) against a real server. The server comes from
+INVENTORY_TEST_PG (a postgresql:// URL of a database we may create databases from);
+otherwise a throwaway cluster is started with initdb / pg_ctl from PATH, or with the
+pgserver package when that is installed. Skipped when none of these is available.
+"""
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import uuid
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+import inventory_cli
+import storage
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _start_cluster(tmp):
+    """Admin URL of a new cluster under `tmp` and a function that stops it, or None."""
+    if shutil.which("initdb") and shutil.which("pg_ctl") and hasattr(os, "geteuid") and os.geteuid() != 0:
+        data, port = os.path.join(tmp, "data"), _free_port()
+        subprocess.run(["initdb", "-D", data, "-U", "postgres", "-A", "trust"],
+                       check=True, capture_output=True)
+        subprocess.run(["pg_ctl", "-D", data, "-w", "-l", os.path.join(tmp, "server.log"),
+                        "-o", f"-p {port} -k {tmp} -c listen_addresses=''", "start"],
+                       check=True, capture_output=True)
+        stop = lambda: subprocess.run(["pg_ctl", "-D", data, "-m", "fast", "stop"], capture_output=True)
+        return f"postgresql://postgres@/postgres?host={tmp}&port={port}", stop
+    try:
+        import pgserver
+    except ImportError:
+        return None
+    server = pgserver.get_server(os.path.join(tmp, "pgserver"), cleanup_mode="stop")
+    return server.get_uri(), server.cleanup
+
+@pytest.fixture(scope="module")
+def pg_url(tmp_path_factory):
+    admin, stop = os.environ.get("INVENTORY_TEST_PG"), None
+    if not admin:
+        try:
+            started = _start_cluster(str(tmp_path_factory.mktemp("pg")))
+        except (OSError, subprocess.CalledProcessError) as e:
+            pytest.skip(f"could not start a PostgreSQL server: {e}")
+        if started is None:
+            pytest.skip("no PostgreSQL server: set INVENTORY_TEST_PG or put initdb/pg_ctl on PATH")
+        admin, stop = started
+    name = f"inventory_test_{uuid.uuid4().hex[:12]}"
+    try:
+        with psycopg.connect(admin, autocommit=True) as conn:
+            conn.execute(f"CREATE DATABASE {name}")
+    except psycopg.Error as e:
+        if stop:
+            stop()
+        pytest.skip(f"PostgreSQL server unavailable: {e}")
+    base, _, query = admin.partition("?")
+    url = f"{base.rsplit('/', 1)[0]}/{name}" + (f"?{query}" if query else "")
+    conn = storage.connect(url)
+    storage.ensure_schema(conn)
+    conn.close()
+    yield url
+    storage.get_backend(url).close()
+    with psycopg.connect(admin, autocommit=True) as conn:
+        conn.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+    if stop:
+        stop()
+
+@pytest.fixture
+def cli(pg_url, tmp_path, monkeypatch):
+    """inventory_cli pointed at the test database (barcode images go to tmp_path)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(inventory_cli, "DB_FILE", pg_url)
+    return inventory_cli
+
+def _add(cli, name, barcode, qty, location="Main"):
+    conn = cli.connect_db()
+    try:
+        item_id, _ = cli.add_item_op(conn.cursor(), name, "Test", barcode, qty, "Acme", 1.0, 2.5, location)
+        conn.commit()
+    finally:
+        conn.close()
+    return item_id
+
+def test_inventory_listing(cli, capsys):
+    _add(cli, "Listed widget", "PG-LIST-1", 4)
+    _add(cli, "Listed gadget", "PG-LIST-2", 1)
+    rows = {r[0]: r for r in cli.iter_items(("barcode", "name", "quantity"))}
+    assert rows["PG-LIST-1"] == ("PG-LIST-1", "Listed widget", 4)
+    assert rows["PG-LIST-2"][2] == 1
+    cli.view_inventory()
+    out = capsys.readouterr().out
+    assert "Listed widget" in out and "Barcode:PG-LIST-2" in out
+
+def test_sell_moves_stock(cli):
+    item_id = _add(cli, "Sold widget", "PG-SELL-1", 5)
+    cli.sell("PG-SELL-1", 2)
+    conn = cli.connect_db()
+    try:
+        assert conn.execute("SELECT quantity FROM items WHERE id = ?", (item_id,)).fetchone()[0] == 3
+        assert conn.execute("SELECT SUM(qty) FROM item_stock WHERE item_id = ?", (item_id,)).fetchone()[0] == 3
+    finally:
+        conn.close()
+
+def test_sell_with_shard_range_ids(cli):
+    item_id = 10 ** 12 + 1      # past 32-bit, as shard k's ids start at k * 10^12
+    conn = cli.connect_db()
+    try:
+        conn.execute("INSERT INTO items (id, name, barcode, quantity, location) VALUES (?, 'Big id', 'PG-BIGID', 3, 'Main')",
+                     (item_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    assert cli.sell("PG-BIGID", 1)
+    conn = cli.connect_db()
+    try:
+        assert conn.execute("SELECT quantity FROM items WHERE id = ?", (item_id,)).fetchone()[0] == 2
+    finally:
+        conn.close()
+
+def test_list_all_logs_and_transactions(cli, capsys):
+    _add(cli, "Logged widget", "PG-LOGS-1", 2)
+    conn = cli.connect_db()
+    try:
+        cli.transaction_op(conn.cursor(), "sale", [{"barcode": "PG-LOGS-1", "qty": 1}], customer="PG-LOGS")
+        conn.commit()
+    finally:
+        conn.close()
+    cli.view_logs(limit=0)          # limit 0: every row, no LIMIT clause
+    cli.view_transactions(limit=0)
+    out = capsys.readouterr().out
+    assert "No logs." not in out and "Customer:PG-LOGS" in out
+
+def test_merge_duplicate_item(cli):
+    _add(cli, "Old store row", "PG-MERGE-OLD", 2, "Store B")
+    target = _add(cli, "Merged item", "PG-MERGE-NEW", 3, "Store A")
+    assert cli.merge_duplicate_item("PG-MERGE-OLD", "PG-MERGE-NEW")
+    conn = cli.connect_db()
+    try:
+        assert conn.execute("SELECT quantity FROM items WHERE id = ?", (target,)).fetchone()[0] == 5
+        assert conn.execute("SELECT id FROM items WHERE barcode = 'PG-MERGE-OLD'").fetchone() is None
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("command", [["export", "all"], ["report", "sales"], ["rollup", "rebuild"],
+                                     ["archive-logs"], ["backup", "--dest", "bk"], ["events"], ["po"]])
+def test_sqlite_only_commands_fail_cleanly(cli, capsys, command):
+    assert cli.run_cli_or_args(["--db", cli.DB_FILE] + command) == 1
+    assert "SQLite only" in capsys.readouterr().out
+
+def test_errors_are_sqlite3_errors(pg_url):
+    conn = storage.connect(pg_url)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("SELECT no_such_column FROM items")
+        conn._raw.close()   # a dropped connection fails rollback() too
+        with pytest.raises(sqlite3.OperationalError):
+            conn.rollback()
+    finally:
+        conn.close()
+
+def test_concurrent_sales_stay_consistent(pg_url, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(inventory_cli, "DB_FILE", pg_url)
+    assert storage.concurrency_check(pg_url, stores=4, sales=25)
@@ -0,0 +1,87 @@
+# tests/test_query_api.py
+import pytest
+
+import query_api
+import storage
+from audit_writer import write_log
+
+@pytest.fixture
+def db(make_db):
+    """Twelve items (barcodes 100-111), alternating between "Store A" and "Store B"."""
+    return make_db([(f"Item {i}", "Test", str(100 + i), i, "", 1.0, 2.0, "Store " + "AB"[i % 2])
+                    for i in range(12)])
+
+@pytest.fixture
+def conn(db):
+    conn = storage.connect(db)
+    yield conn
+    conn.close()
+
+def _pages(conn, resource, limit, **kwargs):
+    pages, after = [], None
+    while True:
+        page = query_api.list_rows(conn, resource, after, limit, **kwargs)
+        pages.append(page[resource])
+        after = page["next"]
+        if after is None:
+            return pages
+
+@pytest.mark.parametrize("resource, key", [("items", ("id",)), ("stock", ("item_id", "location"))])
+def test_keyset_pages_cover_every_row_once(conn, resource, key):
+    everything = query_api.list_rows(conn, resource, limit=query_api.MAX_LIMIT)[resource]
+    assert len(everything) == 12
+    pages = _pages(conn, resource, 5)
+    assert [len(p) for p in pages] == [5, 5, 2]
+    keys = [tuple(r[k] for k in key) for p in pages for r in p]
+    assert keys == [tuple(r[k] for k in key) for r in everything]
+    assert len(set(keys)) == 12
+
+def test_rows_added_between_pages_are_not_skipped_or_repeated(conn):
+    first = query_api.list_rows(conn, "logs", limit=2)
+    write_log(conn.cursor(), "admin", "late", None, 1, "Store A")   # newest first: lands before the cursor
+    conn.commit()
+    ids = [r["id"] for r in first["logs"]]
+    after = first["next"]
+    while after:
+        page = query_api.list_rows(conn, "logs", after, 2)
+        ids += [r["id"] for r in page["logs"]]
+        after = page["next"]
+    assert ids == sorted(ids, reverse=True) and len(ids) == len(set(ids)) == 12
+
+def test_filters_and_exact_last_page(conn):
+    page = query_api.list_rows(conn, "items", limit=6, filters={"location": "Store A"})
+    assert [r["location"] for r in page["items"]] == ["Store A"] * 6
+    # a full last page still hands out a cursor; the page after it is empty
+    assert query_api.list_rows(conn, "items", page["next"], 6, filters={"location": "Store A"}) == \
+        {"items": [], "next": None}
+    with pytest.raises(ValueError):
+        query_api.list_rows(conn, "items", filters={"supplier": "x"})
+
+def test_fields_select_columns_and_keep_the_cursor(conn):
+    page = query_api.list_rows(conn, "items", limit=3, fields="barcode, name")
+    assert page["items"][0] == {"barcode": "100", "name": "Item 0"}
+    nxt = query_api.list_rows(conn, "items", page["next"], 3, fields=["barcode"])
+    assert [r["barcode"] for r in nxt["items"]] == ["103", "104", "105"]
+    with pytest.raises(ValueError, match="unknown field"):
+        query_api.list_rows(conn, "items", fields="barcode,password")
+    with pytest.raises(ValueError, match="invalid cursor"):
+        query_api.list_rows(conn, "stock", after="7")
+
+def test_etag_changes_only_after_a_write(db, conn):
+    versions = query_api.DataVersion(db)
+    try:
+        inventory, logs = versions.etag("inventory"), versions.etag("logs")
+        assert versions.etag("inventory") == inventory and versions.refreshes == 1
+        assert query_api.etag_matches(f'"x", {inventory}', inventory)
+        assert query_api.etag_matches(inventory[2:], inventory)       # weak comparison
+        assert not query_api.etag_matches(None, inventory)
+        write_log(conn.cursor(), "admin", "note", None, 0, "Store A")
+        conn.commit()
+        assert versions.etag("inventory") == inventory                # no change event
+        assert versions.etag("logs") != logs
+        conn.execute("UPDATE items SET name = 'Renamed' WHERE barcode = '100'")
+        conn.commit()
+        assert versions.etag("inventory") != inventory
+        assert versions.refreshes == 3
+    finally:
+        versions.close()
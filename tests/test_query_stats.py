@@ -0,0 +1,34 @@
+# tests/test_query_stats.py
+import os
+import subprocess
+import sys
+
+import query_stats
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_stats_are_saved_next_to_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_stats, "_stats_dir", None)
+    monkeypatch.setattr(query_stats, "STATS", query_stats.QueryStats())
+    (tmp_path / "db").mkdir()
+    (tmp_path / "cwd").mkdir()
+    monkeypatch.chdir(tmp_path / "cwd")
+    conn = query_stats.connect(str(tmp_path / "db" / "inventory.db"))
+    query_stats.STATS.record("SELECT 1", 1.0)
+    conn.close()
+    query_stats.save_stats()
+    assert os.listdir(tmp_path / "cwd") == []
+    saved = query_stats.load_saved_stats(str(tmp_path / "db" / query_stats.STATS_FILE))
+    assert saved["SELECT 1"]["calls"] == 1
+
+def test_concurrent_saves_keep_every_count(tmp_path):
+    script = ("import query_stats\n"
+              "for _ in range(25):\n"
+              "    query_stats.STATS.record('SELECT 1', 1.0)\n"
+              "    query_stats.save_stats()\n")
+    env = dict(os.environ, INVENTORY_STATS_DIR=str(tmp_path), INVENTORY_QUERY_STATS="1")
+    procs = [subprocess.Popen([sys.executable, "-c", script], cwd=REPO, env=env) for _ in range(4)]
+    assert all(p.wait(timeout=60) == 0 for p in procs)
+    saved = query_stats.load_saved_stats(str(tmp_path / query_stats.STATS_FILE))
+    assert saved["SELECT 1"]["calls"] == 100
+    assert sorted(os.listdir(tmp_path)) == [query_stats.STATS_FILE, query_stats.STATS_FILE + ".lock"]
@@ -0,0 +1,61 @@
+# tests/test_replenishment.py
+from datetime import date, timedelta
+
+import pytest
+
+import replenishment
+import storage
+
+TODAY = date(2026, 3, 28)
+ITEMS = [("Steady", "Test", "111", 10, "Acme", 1.5, 3.0, "Main"),     # sells 2 a day
+         ("Lumpy", "Test", "222", 10, "Acme", 1.0, 2.0, "Main"),      # sells 4 every other day
+         ("Stocked", "Test", "333", 100, "Acme", 1.0, 2.0, "Main"),   # sells 2 a day, plenty left
+         ("Loose", "Test", "444", 0, "", 1.0, 2.0, "Main")]           # no supplier: never planned
+
+@pytest.fixture
+def c(make_db):
+    conn = storage.connect(make_db(ITEMS))
+    c = conn.cursor()
+    ids = dict(c.execute("SELECT barcode, id FROM items").fetchall())
+    rows = []
+    for n in range(28):
+        ts = f"{TODAY - timedelta(days=n)} 12:00:00"
+        rows += [(ts, ids["111"], 2), (ts, ids["333"], 2), (ts, ids["444"], 2)]
+        if n % 2 == 0:
+            rows.append((ts, ids["222"], 4))
+    c.executemany("INSERT INTO sales (timestamp, user, item_id, qty_sold) VALUES (?, 'test', ?, ?)", rows)
+    conn.commit()
+    yield c
+    conn.close()
+
+def _lines(c, po_id):
+    return {r[0]: r for r in replenishment.get_order(c, po_id)[1]}
+
+def test_plan_orders_up_to_the_target(c):
+    (po_id, supplier, lines, units, cost), = replenishment.plan(c, 28, lead_days=7, review_days=7, z=1.65, today=TODAY)
+    assert (supplier, lines) == ("Acme", 2)
+    got = _lines(c, po_id)
+    # velocity 2, no variation: reorder at 14, order up to 28 - 10 on hand
+    assert got["111"][2] == 18 and got["111"][6] == 2.0 and got["111"][7] == 14.0
+    # velocity 2, sigma 2: safety stock 1.65 * 2 * sqrt(7) = 8.73 -> up to 36.73
+    assert got["222"][2] == 27 and got["222"][7] == 22.7
+    assert units == 45 and cost == 18 * 1.5 + 27 * 1.0
+
+def test_purchase_order_lifecycle(c):
+    (po_id, *_rest), = replenishment.plan(c, 28, lead_days=7, review_days=7, z=1.65, today=TODAY)
+    replenishment.order(c, po_id)
+    # the ordered quantities now count as on order: nothing left to suggest
+    assert replenishment.plan(c, 28, lead_days=7, review_days=7, z=1.65, today=TODAY) == []
+    tx_id = replenishment.receive(c, po_id, user="test")
+    header, _items = replenishment.get_order(c, po_id)
+    assert header[2] == "received" and header[7] == tx_id
+    assert c.execute("SELECT type, customer FROM transactions WHERE id = ?", (tx_id,)).fetchone() == ("purchase", "Acme")
+    on_hand = dict(c.execute("SELECT barcode, quantity FROM items").fetchall())
+    assert on_hand["111"] == 28 and on_hand["222"] == 37
+    with pytest.raises(ValueError):
+        replenishment.cancel(c, po_id)
+
+def test_supplier_lead_time_overrides_the_default(c):
+    replenishment.set_supplier(c, "Acme", lead_time_days=14)
+    (po_id, *_rest), = replenishment.plan(c, 28, lead_days=7, review_days=7, z=1.65, today=TODAY)
+    assert _lines(c, po_id)["111"][2] == 2 * (14 + 7) - 10
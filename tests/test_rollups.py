@@ -0,0 +1,35 @@
+# tests/test_rollups.py
+import inventory_cli
+import rollups
+import storage
+
+ITEMS = [("Widget", "Tools", "111", 20, "Acme", 1.0, 2.5, "Main"),
+         ("Gadget", "Toys", "222", 20, "Acme", 2.0, 4.0, "Main")]
+
+def _tables(c):
+    return [c.execute(f"SELECT * FROM {t} ORDER BY 1, 2").fetchall()
+            for t in ("daily_item_stats", "daily_category_stats")]
+
+def test_triggers_match_rebuild(make_db):
+    conn = storage.connect(make_db(ITEMS))
+    c = conn.cursor()
+    try:
+        inventory_cli.sell_item_op(c, "111", 2)
+        inventory_cli.transaction_op(c, "sale", [{"barcode": "111", "qty": 1}, {"barcode": "222", "qty": 3}])
+        inventory_cli.transaction_op(c, "purchase", [{"barcode": "222", "qty": 10}])
+        inventory_cli.transaction_op(c, "damage", [{"barcode": "111", "qty": 1}])
+        inventory_cli.transaction_op(c, "return", [{"barcode": "222", "qty": 1}])
+        inventory_cli.transaction_op(c, "adjustment", [{"barcode": "111", "qty": 4, "sign": "-"}])
+        conn.commit()
+
+        (_period, sold, revenue, restocked, returned, damaged, adjusted), = rollups.series(c, by="year")
+        assert (sold, revenue) == (6, 3 * 2.5 + 3 * 4.0)
+        assert (restocked, returned, damaged, adjusted) == (10, 1, 1, -4)
+        by_item = {code: units for _id, code, _name, units in rollups.top_items(c)}
+        assert by_item == {"111": 3, "222": 3}
+
+        from_triggers = _tables(c)
+        assert rollups.rebuild(c) == 2
+        assert _tables(c) == from_triggers
+    finally:
+        conn.close()
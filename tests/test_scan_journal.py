@@ -0,0 +1,51 @@
+# tests/test_scan_journal.py
+import queue
+
+import storage
+from scan_journal import ScanJournal, _Request, journal_path
+
+def test_a_bad_request_fails_alone(tmp_path):
+    out = queue.Queue()
+    journal = ScanJournal(str(tmp_path / "scan_journal.db"), out)
+    try:
+        bad = _Request("append", "bad", [(2 ** 63, "222")])
+        good = _Request("append", "good", [(1, "111")])
+        journal._commit([bad, good])    # one group commit, as the writer thread makes it
+        assert isinstance(bad.error, OverflowError) and bad.result is None
+        assert good.error is None and good.result[0][2].code == "111"
+        assert out.get_nowait().client_id == "good" and out.empty()
+        assert journal.pending_count() == 1
+    finally:
+        journal.close()
+
+def test_scans_without_a_client_id_are_not_deduplicated(tmp_path):
+    out = queue.Queue()
+    journal = ScanJournal(str(tmp_path / "scan_journal.db"), out)
+    try:
+        first = journal.append(None, [(1, "111")])     # two handhelds, neither sends a client_id
+        second = journal.append("", [(1, "222")])
+        retry = journal.append("phone-7", [(1, "333")])
+        again = journal.append("phone-7", [(1, "333")])
+        assert first[0][2] is not None and second[0][2] is not None
+        assert retry[0][2] is not None and again[0][2] is None
+        assert [out.get_nowait().code for _ in range(3)] == ["111", "222", "333"] and out.empty()
+    finally:
+        journal.close()
+
+def test_journal_sits_next_to_the_database(tmp_path, monkeypatch):
+    db = tmp_path / "data" / "inventory.db"
+    monkeypatch.chdir(tmp_path)
+    assert journal_path("data/inventory.db") == str(tmp_path / "data" / "scan_journal.db")
+    (tmp_path / "elsewhere").mkdir()
+    monkeypatch.chdir(tmp_path / "elsewhere")
+    assert journal_path(str(db)) == str(tmp_path / "data" / "scan_journal.db")
+
+def test_default_journal_is_the_databases(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DEFAULT_TARGET", str(tmp_path / "inventory.db"))
+    journal = ScanJournal()
+    try:
+        assert journal.path == str(tmp_path / "scan_journal.db")
+        assert journal.append("h1", [(1, "111")])[0][2] is not None
+    finally:
+        journal.close()
+    assert (tmp_path / "scan_journal.db").exists()
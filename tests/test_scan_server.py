@@ -0,0 +1,105 @@
+# tests/test_scan_server.py
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import storage
+from scan_journal import ScanJournal
+from scan_server import create_scan_server
+from transaction_api import TransactionService
+
+@pytest.fixture
+def server(tmp_path):
+    journal = ScanJournal(str(tmp_path / "scan_journal.db"), queue.Queue())
+    httpd = create_scan_server("127.0.0.1", 0, journal=journal, db_file=str(tmp_path / "inventory.db"))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    journal.close()
+
+@pytest.fixture
+def secured(tmp_path, make_db):
+    """A server with an API token over a database holding one item (barcode 111, qty 5)."""
+    db = make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A")])
+    journal = ScanJournal(str(tmp_path / "scan_journal.db"), queue.Queue())
+    service = TransactionService(db, workers=1)
+    httpd = create_scan_server("127.0.0.1", 0, journal=journal, transactions=service, db_file=db,
+                               api_token="s3cret")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", db
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+    journal.close()
+
+def _get(url, path, token=None):
+    req = urllib.request.Request(url + path, headers={"Authorization": f"Bearer {token}"} if token else {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def _post(url, payload, path="/scan", token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(url + path, data=json.dumps(payload).encode(), headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+@pytest.mark.parametrize("seq", ["x", [1], {"n": 1}, 2 ** 63])
+def test_malformed_seq_is_a_bad_request(server, seq):
+    assert _post(server, {"code": "111", "seq": seq}) == 400
+    assert _post(server, {"scans": [{"code": "111", "seq": seq}]}) == 400
+
+def test_scan_is_accepted(server):
+    assert _post(server, {"code": "111", "seq": 1}) == 200
+
+def test_transactions_need_the_api_token(secured):
+    url, db = secured
+    sale = {"idempotency_key": "till1-1", "type": "sale", "items": [{"barcode": "111", "qty": 2}]}
+    assert _post(url, sale, "/transactions") == 401
+    assert _post(url, sale, "/transactions", token="guess") == 401
+    conn = storage.connect(db)
+    try:
+        assert conn.execute("SELECT quantity FROM items WHERE barcode = '111'").fetchone()[0] == 5
+    finally:
+        conn.close()
+    assert _post(url, sale, "/transactions", token="s3cret") == 201
+    assert _post(url, {"code": "111"}) == 200        # scanning stays open
+
+@pytest.mark.parametrize("path", ["/logs", "/transactions", "/transactions/1", "/events?timeout=0"])
+def test_audit_and_transaction_reads_need_the_api_token(secured, path):
+    url, _db = secured
+    assert _get(url, path) == 401
+    assert _get(url, path, token="s3cret") in (200, 404)
+    assert _get(url, "/items/111") == 200             # item and stock queries stay open
+
+def _fetch(url, path, headers=None):
+    req = urllib.request.Request(url + path, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.headers.get("ETag"), json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("ETag"), None
+
+def test_unchanged_list_is_not_modified_until_a_write(secured):
+    url, db = secured
+    status, etag, body = _fetch(url, "/items?fields=barcode,quantity")
+    assert status == 200 and etag and body["items"] == [{"barcode": "111", "quantity": 5}]
+    assert _fetch(url, "/items?fields=barcode,quantity", {"If-None-Match": etag})[:2] == (304, etag)
+    sale = {"idempotency_key": "till1-2", "type": "sale", "items": [{"barcode": "111", "qty": 1}]}
+    assert _post(url, sale, "/transactions", token="s3cret") == 201
+    status, new_etag, body = _fetch(url, "/items?fields=barcode,quantity", {"If-None-Match": etag})
+    assert status == 200 and new_etag != etag and body["items"][0]["quantity"] == 4
@@ -0,0 +1,55 @@
+# tests/test_search_index.py
+import pytest
+
+import search_index
+import storage
+from search_index import has_fts5, search_items
+
+needs_fts5 = pytest.mark.skipif(not has_fts5(), reason="sqlite3 built without FTS5")
+
+@pytest.fixture
+def conn(make_db):
+    conn = storage.connect(make_db([
+        ("Wireless Mouse", "Peripherals", "111", 5, "Logitech", 10.0, 20.0, "Store A"),
+        ("Keyboard", "Peripherals", "222", 3, "Mouser Supply", 15.0, 30.0, "Store A"),
+        ("Monitor Stand", "Furniture", "333", 2, "Generic", 5.0, 12.0, "Store B"),
+    ]))
+    yield conn
+    conn.close()
+
+def _names(conn, text, **kwargs):
+    return [r["name"] for r in search_items(conn, text, **kwargs)]
+
+@needs_fts5
+def test_prefix_matches_rank_name_hits_first(conn):
+    assert _names(conn, "mous") == ["Wireless Mouse", "Keyboard"]    # name beats supplier
+    assert _names(conn, "periph key") == ["Keyboard"]                 # every term must match
+    assert _names(conn, "supplier:logi") == ["Wireless Mouse"]
+    assert _names(conn, "333") == ["Monitor Stand"]                   # exact barcode
+
+@needs_fts5
+def test_typos_are_corrected_against_the_index(conn):
+    assert _names(conn, "keybaord") == ["Keyboard"]
+    assert _names(conn, "keybaord", fuzzy=False) == []
+
+@needs_fts5
+def test_triggers_keep_the_index_in_sync(conn):
+    c = conn.cursor()
+    c.execute("INSERT INTO items (name, category, barcode, quantity, supplier, location) "
+              "VALUES ('Gaming Mouse', 'Peripherals', '444', 1, 'Razer', 'Store A')")
+    c.execute("UPDATE items SET name = 'Trackball' WHERE barcode = '111'")
+    c.execute("DELETE FROM items WHERE barcode = '222'")
+    c.execute("UPDATE items SET quantity = 9 WHERE barcode = '333'")   # not an indexed column
+    conn.commit()
+    assert _names(conn, "mouse") == ["Gaming Mouse"]
+    assert _names(conn, "trackball") == ["Trackball"]
+    assert _names(conn, "keyboard", fuzzy=False) == []
+    assert _names(conn, "mouser", fuzzy=False) == []
+    assert _names(conn, "monitor") == ["Monitor Stand"]
+
+def test_like_fallback_without_the_index(conn, monkeypatch):
+    monkeypatch.setattr(search_index, "_index_exists", lambda conn: False)
+    assert _names(conn, "mouse") == ["Wireless Mouse", "Keyboard"]    # substring, in id order
+    assert _names(conn, "name:mouse") == ["Wireless Mouse"]
+    assert _names(conn, "stand furn") == ["Monitor Stand"]
+    assert _names(conn, "nothing") == []
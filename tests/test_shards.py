@@ -0,0 +1,60 @@
+# tests/test_shards.py
+import sqlite3
+
+import pytest
+
+import inventory_cli
+import shards
+import storage
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """Two store shards, each with its own "111" item (5 in Store A, 7 in Store B) and one sale."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(shards, "SHARD_DIR", str(tmp_path / "shards"))
+    paths = {}
+    for name, qty in (("Store A", 5), ("Store B", 7)):
+        path = paths[name] = shards.create_store(name)
+        monkeypatch.setattr(inventory_cli, "DB_FILE", path)
+        conn = storage.connect(path)
+        try:
+            c = conn.cursor()
+            inventory_cli.add_item_op(c, "Widget", "Test", "111", qty, "", 1.0, 2.0, name)
+            inventory_cli.transaction_op(c, "sale", [{"barcode": "111", "qty": 1}])
+            conn.commit()
+        finally:
+            conn.close()
+    return paths
+
+def test_id_ranges_do_not_clash(stores):
+    ids = {}
+    for n, path in enumerate(stores.values(), start=1):
+        conn = sqlite3.connect(path)
+        try:
+            for table in ("items", "transactions", "transaction_items", "sales"):
+                (row_id,), = conn.execute(f"SELECT id FROM {table}").fetchall()
+                assert n * shards.ID_SPAN < row_id < (n + 1) * shards.ID_SPAN
+                ids.setdefault(table, set()).add(row_id)
+        finally:
+            conn.close()
+    assert all(len(v) == 2 for v in ids.values())
+
+def test_federated_views_union_the_stores(stores):
+    assert [name for name, _path in shards.list_stores()] == ["Store A", "Store B"]
+    conn = storage.connect(shards.ALL_STORES)
+    try:
+        rows = conn.execute("""
+            SELECT l.name, s.qty FROM item_stock s JOIN items i ON i.id = s.item_id
+            JOIN locations l ON l.id = s.location_id ORDER BY l.name
+        """).fetchall()
+        assert rows == [("Store A", 4), ("Store B", 6)]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM s0.items")     # shards are attached read-only
+    finally:
+        conn.close()
+
+def test_store_report_adds_up_the_stores(stores):
+    report = dict(shards.store_report(workers=2))
+    assert report["Store A"]["units"] == 4 and report["Store B"]["units"] == 6
+    assert report["ALL STORES"]["units"] == 10
+    assert report["ALL STORES"]["units_sold"] == 2 and report["ALL STORES"]["revenue"] == 4.0
@@ -0,0 +1,96 @@
+# tests/test_stock.py
+import sqlite3
+
+import pytest
+
+import migrations
+import stock
+import storage
+
+@pytest.fixture
+def conn(make_db):
+    """Widget (111): 5 at "Store A"; Gadget (222): 3 at "Store B"."""
+    conn = storage.connect(make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A"),
+                                    ("Gadget", "Test", "222", 3, "", 1.0, 4.0, "Store B")]))
+    yield conn
+    conn.close()
+
+def _item(c, barcode):
+    return c.execute("SELECT id FROM items WHERE barcode = ?", (barcode,)).fetchone()[0]
+
+def _total(c, item_id):
+    return c.execute("SELECT quantity FROM items WHERE id = ?", (item_id,)).fetchone()[0]
+
+def test_adjust_stock_keeps_the_item_total(conn):
+    c = conn.cursor()
+    widget = _item(c, "111")
+    store_a, store_c = stock.location_id(c, "Store A"), stock.location_id(c, "Store C")
+    assert stock.adjust_stock(c, widget, store_c, 4) == (0, 4)
+    assert stock.adjust_stock(c, widget, store_a, -2) == (5, 3)
+    with pytest.raises(ValueError):
+        stock.adjust_stock(c, widget, store_a, -4)          # never below zero
+    assert stock.stock_by_location(c, widget) == [("Store A", 3), ("Store C", 4)]
+    assert _total(c, widget) == 7
+    assert stock.location_totals(c) == [("Store A", 1, 3), ("Store B", 1, 3), ("Store C", 1, 4)]
+
+def test_move_stock_leaves_the_total_unchanged(conn):
+    c = conn.cursor()
+    widget = _item(c, "111")
+    store_a, store_b = stock.location_id(c, "Store A"), stock.location_id(c, "Store B")
+    stock.move_stock(c, widget, store_a, store_b, 2)
+    assert stock.stock_by_location(c, widget) == [("Store A", 3), ("Store B", 2)]
+    assert _total(c, widget) == 5
+    with pytest.raises(ValueError):
+        stock.move_stock(c, widget, store_a, store_b, 4)
+    with pytest.raises(ValueError):
+        stock.move_stock(c, widget, store_a, store_b, 0)
+    assert _total(c, widget) == 5
+
+def test_legacy_quantity_writes_go_to_the_home_location(conn):
+    c = conn.cursor()
+    widget = _item(c, "111")
+    stock.set_stock(c, widget, stock.location_id(c, "Store B"), 2)
+    c.execute("UPDATE items SET quantity = 10 WHERE id = ?", (widget,))   # as old scripts do
+    assert stock.stock_by_location(c, widget) == [("Store A", 8), ("Store B", 2)]
+    assert _total(c, widget) == 10
+
+def test_legacy_quantity_writes_cannot_take_the_home_location_negative(conn):
+    c = conn.cursor()
+    widget = _item(c, "111")
+    stock.set_stock(c, widget, stock.location_id(c, "Store B"), 4)
+    with pytest.raises(sqlite3.IntegrityError, match="home location"):
+        c.execute("UPDATE items SET quantity = 3 WHERE id = ?", (widget,))   # Store A would be -1
+    assert stock.stock_by_location(c, widget) == [("Store A", 5), ("Store B", 4)]
+    c.execute("UPDATE items SET quantity = 4 WHERE id = ?", (widget,))       # Store A to exactly 0
+    assert stock.stock_by_location(c, widget) == [("Store A", 0), ("Store B", 4)]
+
+def test_merge_items_adds_stock_per_location(conn):
+    c = conn.cursor()
+    widget, gadget = _item(c, "111"), _item(c, "222")
+    stock.set_stock(c, gadget, stock.location_id(c, "Store A"), 1)
+    stock.merge_items(c, gadget, widget)
+    assert stock.stock_by_location(c, widget) == [("Store A", 6), ("Store B", 3)]
+    assert _total(c, widget) == 9
+    assert c.execute("SELECT COUNT(*) FROM items WHERE id = ?", (gadget,)).fetchone()[0] == 0
+    assert c.execute("SELECT COUNT(*) FROM item_stock WHERE item_id = ?", (gadget,)).fetchone()[0] == 0
+    with pytest.raises(ValueError):
+        stock.merge_items(c, widget, widget)
+
+def test_migration_7_backfills_stock_from_items():
+    conn = sqlite3.connect(":memory:")
+    conn.isolation_level = None
+    c = conn.cursor()
+    for version, _description, migrate in migrations.MIGRATIONS:
+        if version >= 7:
+            break
+        migrate(c)
+    c.execute("PRAGMA user_version = 6")
+    c.executemany("INSERT INTO items (name, barcode, quantity, location) VALUES (?, ?, ?, ?)",
+                  [("Widget", "111", 5, "Store A"), ("Gadget", "222", 3, "  "), ("Gizmo", "333", None, "Store A")])
+    migrations.ensure_schema(conn)
+    rows = c.execute("""
+        SELECT i.barcode, l.name, s.qty, i.quantity FROM item_stock s
+        JOIN items i ON i.id = s.item_id JOIN locations l ON l.id = s.location_id ORDER BY i.barcode
+    """).fetchall()
+    assert rows == [("111", "Store A", 5, 5), ("222", stock.DEFAULT_LOCATION, 3, 3), ("333", "Store A", 0, 0)]
+    conn.close()
@@ -0,0 +1,135 @@
+# tests/test_stocktake.py
+import queue
+import threading
+
+import pytest
+
+import inventory_cli
+import storage
+import stocktake
+from scan_journal import ScanJournal
+from stocktake import StocktakeSession, parse_scan_line
+
+@pytest.fixture
+def db(make_db):
+    """A SQLite database with two items at "Store A" (barcodes 111: 5, 222: 3)."""
+    return make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A"),
+                    ("Gadget", "Test", "222", 3, "", 1.0, 4.0, "Store A")])
+
+def _qty(path, barcode):
+    conn = storage.connect(path)
+    try:
+        return conn.execute("""
+            SELECT s.qty FROM item_stock s JOIN items i ON i.id = s.item_id
+            JOIN locations l ON l.id = s.location_id WHERE i.barcode = ? AND l.name = 'Store A'
+        """, (barcode,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def test_parse_scan_line():
+    assert parse_scan_line("111:4") == ("111", 4)
+    assert parse_scan_line("111") == ("111", 1)
+    assert parse_scan_line("  ") is None
+    with pytest.raises(ValueError):
+        parse_scan_line("111:-2")
+
+def test_negative_counts_are_rejected(db):
+    session = StocktakeSession("Store A", db_file=db)
+    with pytest.raises(ValueError):
+        session.add("111", -1)
+    with pytest.raises(ValueError):
+        session.add_many(["222", ("111", -3)])
+    assert session.counts() == {}      # nothing from the rejected batch was counted
+    session._counts["111"] = -1        # however it got there, it is never written
+    with pytest.raises(ValueError):
+        session.reconcile()
+    assert _qty(db, "111") == 5
+
+def test_cycle_count_adjusts_scanned_items(db):
+    session = StocktakeSession("Store A", db_file=db)
+    session.add_many(["111", "111", ("111", 2), "999"])
+    result = session.reconcile()
+    assert result["lines"] == [("111", "Widget", 5, 4)]
+    assert result["unknown"] == [("999", 1)]
+    assert _qty(db, "111") == 4 and _qty(db, "222") == 3
+    assert stocktake.StocktakeSession("Store A", full=True, db_file=db).reconcile(apply=False)["units"] == -7
+
+def test_sale_after_scan_stays_booked(db):
+    session = StocktakeSession("Store A", db_file=db)
+    session.add("111", 5)                          # counted 5 of the expected 5 ...
+    session.add("222", 2)                          # ... and 2 of the expected 3
+    session.wait_expected()                        # looked up off the scanning thread
+    inventory_cli.sell("111", 2, location="Store A")
+    inventory_cli.sell("222", 1, location="Store A")
+    result = session.reconcile()
+    assert result["lines"] == [("222", "Gadget", 3, 2)]
+    assert _qty(db, "111") == 3                    # the sale made after the count is kept
+    assert _qty(db, "222") == 1                    # 3 - 1 sold - 1 missing
+
+def test_change_is_clamped_at_zero_stock(db):
+    session = StocktakeSession("Store A", db_file=db)
+    session.add("111", 1)                          # counted 1 of the expected 5 ...
+    session.add("222", 1)                          # ... and 1 of the expected 3
+    session.wait_expected()
+    inventory_cli.sell("111", 3, location="Store A")   # 2 left, the count says take 4
+    inventory_cli.sell("222", 3, location="Store A")   # 0 left, the count says take 2
+    result = session.reconcile()
+    assert result["clamped"] == [("111", "Widget", -4, -2), ("222", "Gadget", -2, 0)]
+    assert result["lines"] == [("111", "Widget", 5, 1)]    # nothing to write for 222
+    assert result["units"] == -2
+    assert _qty(db, "111") == 0 and _qty(db, "222") == 0
+
+def test_listened_scans_stay_journaled_until_posted(db, tmp_path):
+    out = queue.Queue()
+    path = str(tmp_path / "scan_journal.db")
+    journal = ScanJournal(path, out)
+    journal.append("h1", [(1, "111"), (2, "111")])
+    session = StocktakeSession("Store A", db_file=db)
+    assert session.drain(out, journal) == 2
+    assert session.reconcile(apply=False)["lines"] == [("111", "Widget", 5, 2)]
+    journal.close()                                # as if the dry run ended or the process died
+    out = queue.Queue()
+    journal = ScanJournal(path, out)
+    try:
+        assert journal.replay_pending() == 2       # nothing was lost
+        session = StocktakeSession("Store A", db_file=db)
+        session.drain(out, journal)
+        assert session.reconcile()["transaction_id"]
+    finally:
+        journal.close()                            # writes the queued mark_consumed
+    assert journal.pending_count() == 0
+
+def test_unknown_location_is_rejected(db):
+    session = StocktakeSession("Stroe A", db_file=db)
+    with pytest.raises(ValueError):
+        session.check_location()
+    session.add("111", 5)
+    with pytest.raises(ValueError):
+        session.reconcile()
+    assert stocktake.main(["--db", db, "--location", "Stroe A", "--dry-run", "missing.txt"]) == 1
+    conn = storage.connect(db)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM locations WHERE name = 'Stroe A'").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+def test_new_barcodes_are_looked_up_in_batches_off_the_scanning_thread(db, monkeypatch):
+    session = StocktakeSession("Store A", db_file=db)
+    started, release, lookups = threading.Event(), threading.Event(), []
+    record = session._record_expected
+
+    def slow_record(codes):
+        lookups.append(sorted(codes))
+        started.set()
+        release.wait(5)
+        record(codes)
+    monkeypatch.setattr(session, "_record_expected", slow_record)
+    session.add("111")                             # returns while its lookup is still running
+    assert started.wait(5)
+    session.add_many(["222", "111", "333"])
+    session.add("222")
+    release.set()
+    session.wait_expected()
+    assert lookups == [["111"], ["222", "333"]]    # one query for everything queued meanwhile
+    assert session.expected() == {"111": 5, "222": 3}
+    assert session.counts() == {"111": 2, "222": 2, "333": 1}
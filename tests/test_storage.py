@@ -0,0 +1,9 @@
+# tests/test_storage.py
+import inventory_cli
+import storage
+
+def test_concurrency_check_leaves_the_cli_database_alone(make_db, tmp_path):
+    db = make_db()
+    check = str(tmp_path / "check.db")
+    assert storage.concurrency_check(check, stores=2, sales=5)
+    assert inventory_cli.DB_FILE == db
@@ -0,0 +1,13 @@
+# tests/test_streaming.py
+import os
+
+import pytest
+
+import benchmark
+
+ROWS = 300_000      # benchmark.py --streaming-check uses 5M; the ratio is checked the same way
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="needs os.wait4 (Unix)")
+def test_listing_all_logs_keeps_peak_rss_flat():
+    result = benchmark.streaming_rss_check(ROWS)
+    assert result["flat"], result
@@ -0,0 +1,33 @@
+# tests/test_transaction_api.py
+import pytest
+
+import storage
+from transaction_api import CREATED, REJECTED, TransactionService, _Submission, parse_submission
+
+@pytest.fixture
+def db(make_db):
+    return make_db([("Widget", "Test", "111", 5, "", 1.0, 2.0, "Store A")])
+
+def _submission(key, ttype, qty):
+    return {"idempotency_key": key, "type": ttype, "items": [{"barcode": "111", "qty": qty}]}
+
+def test_qty_is_bounded():
+    with pytest.raises(ValueError):
+        parse_submission(_submission("k1", "purchase", 2 ** 63))
+
+def test_a_failing_submission_is_rejected_alone(db):
+    service = TransactionService(db, workers=1)
+    conn = storage.connect(db, timeout=30)
+    conn.isolation_level = None
+    try:
+        # past parse_submission's bound: transaction_op fails with OverflowError
+        bad = _Submission("bad", dict(parse_submission(_submission("bad", "purchase", 1))[1],
+                                      items=[{"barcode": "111", "qty": 2 ** 63}]))
+        good = _Submission("good", parse_submission(_submission("good", "sale", 2))[1])
+        service._apply(conn, [bad, good])
+        assert bad.result["status"] == REJECTED
+        assert good.result["status"] == CREATED
+        assert conn.execute("SELECT quantity FROM items WHERE barcode = '111'").fetchone()[0] == 3
+    finally:
+        conn.close()
+        service.close()
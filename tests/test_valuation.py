@@ -0,0 +1,23 @@
+# tests/test_valuation.py
+import pytest
+
+import inventory_cli
+import storage
+import valuation
+
+@pytest.fixture
+def c(make_db):
+    """A cursor on a SQLite database with one item (cost 1.0, price 2.5) at "Store A"."""
+    conn = storage.connect(make_db([("Widget", "Test", "111", 10, "Acme", 1.0, 2.5, "Store A")]))
+    yield conn.cursor()
+    conn.close()
+
+def test_sales_margin_counts_plain_sells(c):
+    inventory_cli.sell_item_op(c, "111", 2)
+    inventory_cli.transaction_op(c, "sale", [{"barcode": "111", "qty": 3}])
+    rows = valuation.sales_margin(c, by="type")
+    assert len(rows) == 1
+    assert rows[0]["transactions"] == 2 and rows[0]["units"] == 5
+    assert rows[0]["retail_value"] == 12.5 and rows[0]["cost_value"] == 5.0
+    by_location = valuation.sales_margin(c, by="location")
+    assert [(r["group"], r["units"]) for r in by_location] == [("Store A", 5)]
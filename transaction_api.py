@@ -0,0 +1,241 @@
+# transaction_api.py
+"""
+Idempotent transaction submission for POS terminals (POST /transactions, see
+scan_server.py).
+
+A submission is a complete multi-item transaction plus an idempotency key:
+
+    {"idempotency_key": "till3-000123", "type": "sale", "user": "till3",
+     "location": "Store A", "customer": "", "notes": "",
+     "items": [{"barcode": "111111111111", "qty": 2}, {"barcode": "222222222222", "qty": 1}]}
+
+Submissions go to a small pool of worker threads. A worker takes everything
+that is waiting (up to max_batch) and applies it in ONE write transaction, each
+submission inside its own savepoint, so a rejected sale (not enough stock, unknown
+barcode) doesn't affect the others in the batch. Applying a submission and
+recording its key in idempotency_keys (migration 9) happen in that same
+transaction. A retried key therefore gets the original transaction id back and
+never deducts stock twice; if the body differs from the first submission, the
+retry is rejected as a conflict. Only applied transactions are remembered. A
+rejected one may be retried under the same key once the problem is fixed.
+Keys are pruned after KEY_RETENTION_DAYS (settings key idempotency_retention_days).
+"""
+import json
+import queue
+import hashlib
+import threading
+
+import storage
+import inventory_cli
+from inventory_cli import TRANSACTION_TYPES, transaction_op
+
+DEFAULT_WORKERS = 2            # SQLite has one writer at a time; a second worker gathers the next batch meanwhile
+DEFAULT_MAX_BATCH = 100        # submissions per write transaction
+KEY_RETENTION_DAYS = 30
+MAX_KEY_LENGTH = 200
+MAX_QTY = 1_000_000_000        # per line; keeps stock arithmetic far inside SQLite's 64-bit INTEGER
+
+# outcome of one submission
+CREATED, REPLAYED, CONFLICT, REJECTED, FAILED = "created", "replayed", "conflict", "rejected", "failed"
+
+def parse_submission(data):
+    """
+    Validate one submission (a dict from the request body) and return
+    (key, normalized transaction dict). Raises ValueError for a malformed one.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("transaction must be a JSON object")
+    key = str(data.get("idempotency_key") or "").strip()
+    if not key:
+        raise ValueError("idempotency_key is required")
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"idempotency_key longer than {MAX_KEY_LENGTH} characters")
+    ttype = str(data.get("type") or "").lower()
+    if ttype not in TRANSACTION_TYPES:
+        raise ValueError(f"type must be one of {list(TRANSACTION_TYPES)}")
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    lines = []
+    for entry in items:
+        if not isinstance(entry, dict) or not entry.get("barcode"):
+            raise ValueError("each item needs a barcode")
+        try:
+            qty = int(entry.get("qty", entry.get("quantity")))
+        except (TypeError, ValueError):
+            raise ValueError(f"qty for {entry['barcode']} must be an integer")
+        if abs(qty) > MAX_QTY:
+            raise ValueError(f"qty for {entry['barcode']} must be at most {MAX_QTY}")
+        line = {"barcode": str(entry["barcode"]).strip(), "qty": qty}
+        if entry.get("sign") in ("+", "-"):
+            line["sign"] = entry["sign"]
+        if entry.get("location"):
+            line["location"] = str(entry["location"])
+        lines.append(line)
+    return key, {
+        "type": ttype,
+        "items": lines,
+        "user": str(data.get("user") or "pos"),
+        "customer": str(data.get("customer") or ""),
+        "notes": str(data.get("notes") or ""),
+        "location": data.get("location") or None,
+    }
+
+def request_hash(tx):
+    # what a retry must repeat exactly for its key to be accepted
+    return hashlib.sha256(json.dumps(tx, sort_keys=True).encode("utf-8")).hexdigest()
+
+class _Submission:
+    __slots__ = ("key", "tx", "hash", "done", "result")
+
+    def __init__(self, key, tx):
+        self.key = key
+        self.tx = tx
+        self.hash = request_hash(tx)
+        self.done = threading.Event()
+        self.result = None
+
+class TransactionService:
+    def __init__(self, db_file=None, workers=DEFAULT_WORKERS, max_batch=DEFAULT_MAX_BATCH):
+        self.db_file = db_file or inventory_cli.DB_FILE
+        self.max_batch = max(1, int(max_batch))
+        self.batches = 0             # committed batches and transactions created, across workers
+        self.applied = 0
+        self._stats_lock = threading.Lock()
+        conn = storage.connect(self.db_file, timeout=30)
+        try:
+            storage.ensure_schema(conn)
+            prune_keys(conn)
+        finally:
+            conn.close()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, name=f"tx-worker-{i}", daemon=True)
+                         for i in range(max(1, int(workers)))]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, submissions, timeout=30):
+        """
+        Apply [(key, tx), ...] (from parse_submission) and wait for the outcome.
+        Returns one result dict per submission, in order:
+            {"idempotency_key", "status", "transaction_id", "total_amount", "error"}
+        """
+        if self._closed:
+            raise RuntimeError("transaction service is closed")
+        subs = [_Submission(key, tx) for key, tx in submissions]
+        for sub in subs:
+            self._queue.put(sub)
+        for sub in subs:
+            if not sub.done.wait(timeout):
+                raise TimeoutError("transaction submission timed out")
+        return [sub.result for sub in subs]
+
+    def close(self):
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout=10)
+
+    # ------------------------
+    # Workers
+    # ------------------------
+    def _run(self):
+        conn = storage.connect(self.db_file, timeout=30, check_same_thread=False)
+        conn.isolation_level = None  # explicit BEGIN/COMMIT
+        try:
+            while True:
+                sub = self._queue.get()
+                if sub is None:
+                    return
+                batch = [sub]
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        stop = True
+                        break
+                    batch.append(nxt)
+                self._apply(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _apply(self, conn, batch):
+        c = conn.cursor()
+        try:
+            # IMMEDIATE: the key lookups below must see every earlier commit
+            c.execute("BEGIN IMMEDIATE")
+            for sub in batch:
+                sub.result = self._apply_one(c, sub)
+            c.execute("COMMIT")
+            created = sum(1 for sub in batch if sub.result["status"] == CREATED)
+            with self._stats_lock:
+                self.batches += 1
+                self.applied += created
+        except Exception as e:
+            if conn.in_transaction:
+                c.execute("ROLLBACK")
+            # nothing in the batch was applied; the terminals may retry with the same keys
+            for sub in batch:
+                sub.result = _result(sub.key, FAILED, error=f"not applied: {e}")
+        for sub in batch:
+            sub.done.set()
+
+    def _apply_one(self, c, sub):
+        c.execute("SELECT request_hash, transaction_id, total_amount FROM idempotency_keys WHERE key=?", (sub.key,))
+        row = c.fetchone()
+        if row:
+            if row[0] != sub.hash:
+                return _result(sub.key, CONFLICT, row[1],
+                               error="idempotency_key was already used for a different transaction")
+            return _result(sub.key, REPLAYED, row[1], row[2])
+        tx = sub.tx
+        c.execute("SAVEPOINT submission")
+        try:
+            tx_id = transaction_op(c, tx["type"], tx["items"], tx["user"], tx["customer"], tx["notes"], tx["location"])
+            c.execute("SELECT total_amount FROM transactions WHERE id=?", (tx_id,))
+            total = c.fetchone()[0]
+            c.execute("INSERT INTO idempotency_keys (key, request_hash, transaction_id, total_amount) VALUES (?, ?, ?, ?)",
+                      (sub.key, sub.hash, tx_id, total))
+            c.execute("RELEASE submission")
+        except Exception as e:
+            # whatever went wrong, only this submission is undone; the rest of the batch commits
+            c.execute("ROLLBACK TO submission")
+            c.execute("RELEASE submission")
+            return _result(sub.key, REJECTED, error=str(e))
+        return _result(sub.key, CREATED, tx_id, total)
+
+def _result(key, status, transaction_id=None, total_amount=None, error=None):
+    return {"idempotency_key": key, "status": status, "transaction_id": transaction_id,
+            "total_amount": total_amount, "error": error}
+
+def prune_keys(conn, older_than_days=None):
+    """Forget idempotency keys older than the retention period. Returns rows removed; commits."""
+    if older_than_days is None:
+        row = conn.execute("SELECT value FROM settings WHERE key='idempotency_retention_days'").fetchone()
+        try:
+            older_than_days = int(row[0]) if row else KEY_RETENTION_DAYS
+        except ValueError:
+            older_than_days = KEY_RETENTION_DAYS
+    cur = conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?",
+                       (storage.utc_cutoff(int(older_than_days)),))
+    conn.commit()
+    return cur.rowcount
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_transaction_service(db_file=None, **kwargs):
+    """Shared service per database file, started on first use."""
+    db_file = db_file or inventory_cli.DB_FILE
+    with _services_lock:
+        service = _services.get(db_file)
+        if service is None:
+            service = _services[db_file] = TransactionService(db_file, **kwargs)
+        return service
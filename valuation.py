@@ -0,0 +1,186 @@
+# valuation.py
+"""
+Inventory valuation and margin reports, computed by SQLite aggregates.
+
+    stock_valuation(c, by="category")           stock value at cost and at retail, potential margin
+    transaction_value(c, ("damage", "adjustment"), "2025-01-01", "2025-04-01", by="type")
+    sales_margin(c, since, until, by="supplier")                    realized sales margin
+
+Stock valuation reads items (or item_stock for by="location", so an item kept in
+two stores counts in both at its per-location quantity). Transaction reports
+start from transactions(type, timestamp) (index from migration 10) and join
+only the lines of the matching transactions, so their cost follows the number of
+transactions in the period, not the size of transaction_items.
+
+Transaction lines record the unit (sale) price at the time; cost is taken from
+the item's current purchase_price. NULL prices count as 0.
+
+A plain sell (inventory_cli.py sell) writes a sales row but no transaction, so
+sales_margin adds the sales rows without a transaction_id (migration 13) to the
+sale transactions: one "transaction" per row, priced at the item's current
+sale_price (the sales table keeps no price).
+"""
+STOCK_GROUPS = {
+    None: None,
+    "category": "i.category",
+    "supplier": "i.supplier",
+    "location": "l.name",
+    "item": "i.barcode",
+}
+TRANSACTION_GROUPS = {
+    "type": "t.type",
+    "category": "i.category",
+    "supplier": "i.supplier",
+    "location": "l.name",
+    "item": "ti.barcode",
+    "day": "date(t.timestamp)",
+    "month": "strftime('%Y-%m', t.timestamp)",
+}
+PLAIN_SALE_GROUPS = {
+    "type": "'sale'",
+    "category": "i.category",
+    "supplier": "i.supplier",
+    "location": "l.name",
+    "item": "i.barcode",
+    "day": "date(s.timestamp)",
+    "month": "strftime('%Y-%m', s.timestamp)",
+}
+LOSS_TYPES = ("damage", "adjustment")
+
+def _margin_pct(margin, revenue):
+    return round(100.0 * margin / revenue, 2) if revenue else None
+
+def stock_valuation(c, by=None):
+    """
+    [{"group", "items", "units", "cost_value", "retail_value", "margin_value", "margin_pct"}]
+    per `by` value (one row for the whole stock when by is None), largest retail value first.
+    """
+    if by not in STOCK_GROUPS:
+        raise ValueError(f"by must be one of {[k for k in STOCK_GROUPS if k]}")
+    group = STOCK_GROUPS[by] or "'all'"
+    if by == "location":
+        source = "item_stock s JOIN items i ON i.id = s.item_id JOIN locations l ON l.id = s.location_id"
+        qty = "s.qty"
+    else:
+        source = "items i"
+        qty = "COALESCE(i.quantity, 0)"
+    c.execute(f"""
+        SELECT {group} AS grp, COUNT(*), SUM({qty}),
+               SUM({qty} * COALESCE(i.purchase_price, 0)),
+               SUM({qty} * COALESCE(i.sale_price, 0))
+        FROM {source}
+        WHERE {qty} <> 0
+        GROUP BY grp
+        ORDER BY 5 DESC
+    """)
+    rows = []
+    for grp, items, units, cost, retail in c.fetchall():
+        cost, retail = round(cost or 0.0, 2), round(retail or 0.0, 2)
+        rows.append({"group": grp, "items": items, "units": units or 0, "cost_value": cost,
+                     "retail_value": retail, "margin_value": round(retail - cost, 2),
+                     "margin_pct": _margin_pct(retail - cost, retail)})
+    return rows
+
+def transaction_value(c, types, since=None, until=None, by="type"):
+    """
+    Value of the transactions of `types` with since <= timestamp < until, grouped by `by`:
+    [{"group", "transactions", "units", "retail_value", "cost_value", "margin_value", "margin_pct"}].
+    Units and values are positive for the stock that left (sales, damage, negative
+    adjustments) and negative for stock that came in. margin_pct is the gross margin
+    of the retail value (meaningful for sales).
+    """
+    if by not in TRANSACTION_GROUPS:
+        raise ValueError(f"by must be one of {list(TRANSACTION_GROUPS)}")
+    types = list(types)
+    if not types:
+        raise ValueError("no transaction types given")
+    where = [f"t.type IN ({','.join('?' * len(types))})"]
+    params = types[:]
+    if since:
+        where.append("t.timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("t.timestamp < ?")
+        params.append(until)
+    joins = "LEFT JOIN items i ON i.id = ti.item_id"
+    if by == "location":
+        joins += " LEFT JOIN locations l ON l.id = ti.location_id"
+    c.execute(f"""
+        SELECT {TRANSACTION_GROUPS[by]} AS grp, COUNT(DISTINCT t.id),
+               SUM(-ti.quantity_changed),
+               SUM(-ti.quantity_changed * COALESCE(ti.unit_price, 0)),
+               SUM(-ti.quantity_changed * COALESCE(i.purchase_price, 0))
+        FROM transactions t
+        JOIN transaction_items ti ON ti.transaction_id = t.id
+        {joins}
+        WHERE {' AND '.join(where)}
+        GROUP BY grp
+        ORDER BY 4 DESC
+    """, params)
+    return _value_rows(c.fetchall())
+
+def _value_rows(fetched):
+    rows = []
+    for grp, count, units, retail, cost in fetched:
+        retail, cost = round(retail or 0.0, 2), round(cost or 0.0, 2)
+        rows.append({"group": grp, "transactions": count, "units": units or 0, "retail_value": retail,
+                     "cost_value": cost, "margin_value": round(retail - cost, 2),
+                     "margin_pct": _margin_pct(retail - cost, retail)})
+    return rows
+
+def plain_sales_value(c, since=None, until=None, by="category"):
+    """
+    transaction_value() rows for the sales rows written without a transaction (plain
+    sells), valued at the items' current sale and purchase prices.
+    """
+    if by not in PLAIN_SALE_GROUPS:
+        raise ValueError(f"by must be one of {list(PLAIN_SALE_GROUPS)}")
+    where, params = ["s.transaction_id IS NULL"], []
+    if since:
+        where.append("s.timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("s.timestamp < ?")
+        params.append(until)
+    joins = "LEFT JOIN items i ON i.id = s.item_id"
+    if by == "location":
+        joins += " LEFT JOIN locations l ON l.id = s.location_id"
+    c.execute(f"""
+        SELECT {PLAIN_SALE_GROUPS[by]} AS grp, COUNT(*), SUM(s.qty_sold),
+               SUM(s.qty_sold * COALESCE(i.sale_price, 0)),
+               SUM(s.qty_sold * COALESCE(i.purchase_price, 0))
+        FROM sales s
+        {joins}
+        WHERE {' AND '.join(where)}
+        GROUP BY grp
+        ORDER BY 4 DESC
+    """, params)
+    return _value_rows(c.fetchall())
+
+def losses(c, since=None, until=None, by="type"):
+    """Damage and adjustment value over a period (see transaction_value)."""
+    return transaction_value(c, LOSS_TYPES, since, until, by)
+
+def sales_margin(c, since=None, until=None, by="category"):
+    """Realized revenue, cost and margin of sales over a period: sale transactions
+    (see transaction_value) plus plain sells (see plain_sales_value)."""
+    return merge_rows([transaction_value(c, ("sale",), since, until, by),
+                       plain_sales_value(c, since, until, by)])
+
+def merge_rows(row_lists):
+    """Combine the rows of one report from several databases (shards.fan_out) by group."""
+    merged = {}
+    for rows in row_lists:
+        for r in rows:
+            acc = merged.get(r["group"])
+            if acc is None:
+                merged[r["group"]] = dict(r)
+                continue
+            for k, v in r.items():
+                if k not in ("group", "margin_pct"):
+                    acc[k] += v
+    for r in merged.values():
+        for k in ("cost_value", "retail_value", "margin_value"):
+            r[k] = round(r[k], 2)
+        r["margin_pct"] = _margin_pct(r["margin_value"], r["retail_value"])
+    return sorted(merged.values(), key=lambda r: r["retail_value"], reverse=True)